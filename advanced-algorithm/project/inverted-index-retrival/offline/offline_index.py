@@ -68,6 +68,18 @@ class InvertedIndex:
         # 预处理查询
         query_words = self.preprocess_text(query)
         
+        # 生成摘要
+        results = []
+        for doc_id, score in self.retrieve(query, top_k):
+            summary = self.generate_summary(doc_id, query_words)
+            results.append((doc_id, score, summary))
+        
+        return results
+    
+    def retrieve(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """召回 (文档ID, TF-IDF分数)，不生成摘要"""
+        query_words = self.preprocess_text(query)
+        
         if not query_words:
             return []
         
@@ -76,29 +88,38 @@ class InvertedIndex:
         total_docs = len(self.documents)
         
         for doc_id in self.documents:
-            score = 0
-            for word in query_words:
-                if word in self.index and doc_id in self.index[word]:
-                    # TF
-                    tf = self.term_freq[word][doc_id] / self.doc_lengths[doc_id]
-                    # IDF
-                    idf = math.log(total_docs / self.doc_freq[word])
-                    # TF-IDF
-                    score += tf * idf
-            
+            score = self._tfidf_score(doc_id, query_words, total_docs)
             if score > 0:
                 scores[doc_id] = score
         
         # 排序并返回结果
         sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        
-        # 生成摘要
-        results = []
-        for doc_id, score in sorted_results[:top_k]:
-            summary = self.generate_summary(doc_id, query_words)
-            results.append((doc_id, score, summary))
-        
-        return results
+        return sorted_results[:top_k]
+    
+    def score_documents(self, query: str, doc_ids: List[str]) -> Dict[str, float]:
+        """只对给定文档计算TF-IDF分数(排序阶段对召回候选打分)，不含查询词的文档不返回"""
+        query_words = self.preprocess_text(query)
+        total_docs = len(self.documents)
+        scores = {}
+        for doc_id in doc_ids:
+            if doc_id in self.documents and doc_id not in scores:
+                score = self._tfidf_score(doc_id, query_words, total_docs)
+                if score > 0:
+                    scores[doc_id] = score
+        return scores
+    
+    def _tfidf_score(self, doc_id: str, query_words: List[str], total_docs: int) -> float:
+        """文档对查询词的TF-IDF分数"""
+        score = 0
+        for word in query_words:
+            if word in self.index and doc_id in self.index[word]:
+                # TF
+                tf = self.term_freq[word][doc_id] / self.doc_lengths[doc_id]
+                # IDF
+                idf = math.log(total_docs / self.doc_freq[word])
+                # TF-IDF
+                score += tf * idf
+        return score
     
     def generate_summary(self, doc_id: str, query_words: List[str], max_length: int = 200) -> str:
         """生成文档摘要"""
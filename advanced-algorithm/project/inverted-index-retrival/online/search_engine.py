@@ -22,6 +22,7 @@ class SearchEngine(SearchInterface):
     def __init__(self):
         self.index = None
         self.current_results = []  # 当前搜索结果
+        self.candidates = ("", {})  # 最近一次召回: (查询, {文档ID: TF-IDF分数})，排序阶段复用
         self.ctr_model = CTRModel()  # CTR模型
         self.load_index()
         self.load_ctr_model()
@@ -61,15 +62,22 @@ class SearchEngine(SearchInterface):
             print(f"❌ 加载CTR模型失败: {e}")
     
     def retrieve(self, query: str, top_k: int = 20) -> List[str]:
-        """召回阶段：返回初步相关的文档ID列表（按TF-IDF分数粗排）"""
+        """召回阶段：返回初步相关的文档ID列表（按TF-IDF分数粗排），分数留给排序阶段复用"""
         if not self.index:
             raise Exception("索引未加载")
         if not query.strip():
             return []
-        # 只返回文档ID，按分数降序
-        results = self.index.search(query.strip(), top_k=top_k)
-        doc_ids = [doc_id for doc_id, score, summary in results]
-        return doc_ids
+        # 只打分、不生成摘要，按分数降序
+        results = self.index.retrieve(query.strip(), top_k=top_k)
+        self.candidates = (query.strip(), dict(results))
+        return [doc_id for doc_id, score in results]
+    
+    def _candidate_scores(self, query: str, doc_ids: List[str]) -> Dict[str, float]:
+        """候选文档的TF-IDF分数：召回过同一查询时直接复用，否则只对这些文档打分，不重新检索全库"""
+        candidate_query, scores = self.candidates
+        if candidate_query == query and all(doc_id in scores for doc_id in doc_ids):
+            return {doc_id: scores[doc_id] for doc_id in doc_ids}
+        return self.index.score_documents(query, doc_ids)
     
     def rank(self, query: str, doc_ids: List[str], top_k: int = 10) -> List[Tuple[str, float, str]]:
         """排序阶段：对召回的文档ID进行精排，使用CTR模型重新排序"""
@@ -78,24 +86,19 @@ class SearchEngine(SearchInterface):
         if not query.strip() or not doc_ids:
             return []
         
-        # 第一步：使用离线索引的search方法获取TF-IDF分数和摘要
-        # 这样可以确保分数计算的一致性
-        full_results = self.index.search(query.strip(), top_k=len(doc_ids))
-        
-        # 过滤出在doc_ids中的结果
-        filtered_results = []
-        for doc_id, score, summary in full_results:
-            if doc_id in doc_ids:
-                filtered_results.append((doc_id, score, summary))
-        
-        if not filtered_results:
+        # 第一步：取候选文档的TF-IDF分数(与召回阶段的计算一致)，按分数降序
+        scores = self._candidate_scores(query.strip(), doc_ids)
+        if not scores:
             return []
+        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        query_words = self.index.preprocess_text(query.strip())
         
         # 第二步：使用CTR模型重新排序
         if self.ctr_model.is_trained:
-            # 有CTR模型时，计算CTR分数并重新排序
+            # 有CTR模型时，计算CTR分数并重新排序(摘要是CTR特征，每个候选都要生成)
             ctr_scores = {}
-            for position, (doc_id, tfidf_score, summary) in enumerate(filtered_results, 1):
+            for position, (doc_id, tfidf_score) in enumerate(sorted_scores, 1):
+                summary = self.index.generate_summary(doc_id, query_words)
                 ctr_score = self.ctr_model.predict_ctr(query, doc_id, position, tfidf_score, summary)
                 ctr_scores[doc_id] = (ctr_score, tfidf_score, summary)
             
@@ -108,12 +111,10 @@ class SearchEngine(SearchInterface):
                 # 返回元组：(doc_id, tfidf_score, ctr_score, summary)
                 results.append((doc_id, tfidf_score, ctr_score, summary))
         else:
-            # 没有CTR模型时，使用TF-IDF分数排序
-            sorted_results = sorted(filtered_results, key=lambda x: x[1], reverse=True)
-            
-            # 构建最终结果（只返回TF-IDF分数）
+            # 没有CTR模型时，使用TF-IDF分数排序，摘要只为最终结果生成
             results = []
-            for doc_id, tfidf_score, summary in sorted_results[:top_k]:
+            for doc_id, tfidf_score in sorted_scores[:top_k]:
+                summary = self.index.generate_summary(doc_id, query_words)
                 # 返回元组：(doc_id, tfidf_score, None, summary)
                 results.append((doc_id, tfidf_score, None, summary))
         
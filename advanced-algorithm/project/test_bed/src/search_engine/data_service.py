@@ -1,10 +1,11 @@
 import threading
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
-import jieba
 from .training_tab.ctr_config import CTRSampleConfig
+from .tokenizer import get_tokenizer
+from .query_completion import QueryCompletion
 from abc import ABC, abstractmethod
 import time
 import asyncio
@@ -49,10 +50,12 @@ class DataService(DataServiceInterface):
     - 批量保存：减少频繁的文件IO操作
     - 延迟保存：异步保存数据，不阻塞主线程
     - 数据缓存：内存缓存提高访问速度
+    - 查询联想：展示/点击事件同步增量更新查询前缀树，suggest 按前缀长度常数级返回候选
     """
     
     def __init__(self, auto_save_interval: int = 30, batch_size: int = 100):
         self.ctr_data: List[Dict[str, Any]] = []
+        self.data_epoch = 0  # 数据代数：清空或重新加载时递增，增量读取方据此判断偏移是否失效
         self.lock = threading.Lock()
         self.data_file = "models/ctr_data.json"
         
@@ -71,6 +74,9 @@ class DataService(DataServiceInterface):
         self._stats_cache_time = 0
         self._cache_ttl = 10  # 缓存TTL（秒）
         
+        # 查询联想前缀树
+        self.query_completion = QueryCompletion()
+        
         self._load_existing_data()
         self._start_auto_save_timer()
     
@@ -142,10 +148,13 @@ class DataService(DataServiceInterface):
             if os.path.exists(self.data_file):
                 with open(self.data_file, 'r', encoding='utf-8') as f:
                     self.ctr_data = json.load(f)
+                self.data_epoch += 1
+                self.query_completion.add_samples(self.ctr_data)
                 print(f"✅ 加载CTR数据成功，共{len(self.ctr_data)}条记录")
         except Exception as e:
             print(f"⚠️ 加载CTR数据失败: {e}")
             self.ctr_data = []
+            self.data_epoch += 1
     
     def record_impression(self, query: str, doc_id: str, position: int, 
                          score: float, summary: str, request_id: str) -> Dict[str, Any]:
@@ -165,6 +174,7 @@ class DataService(DataServiceInterface):
                     print(f"⚠️ 发现重复记录: request_id={request_id}, doc_id={doc_id}, position={position}")
                 
                 self.ctr_data.append(sample)
+                self.query_completion.record_impression(sample['query'], sample['request_id'])
                 self.pending_changes += 1
                 self._invalidate_cache()  # 新增数据时清除缓存
                 
@@ -202,6 +212,7 @@ class DataService(DataServiceInterface):
                             sample['click_time'] = datetime.now().isoformat()
                             sample['click_count'] = 1
                             updated_count += 1
+                            self.query_completion.record_click(sample.get('query', ''))
                             print(f"✅ 首次点击: doc_id={doc_id_clean}, request_id={request_id_clean}")
                         else:
                             # 多次点击，递增点击计数
@@ -225,6 +236,12 @@ class DataService(DataServiceInterface):
                 print(f"❌ 记录点击事件失败: {e}")
                 raise
     
+    def suggest(self, prefix: str, k: int = 10) -> List[str]:
+        """按查询日志联想以prefix开头的查询，按搜索次数和点击加权排序，代价与前缀长度成正比"""
+        if not prefix or not prefix.strip():
+            return []
+        return [query for query, _ in self.query_completion.suggest(prefix, k)]
+    
     def get_samples_by_request(self, request_id: str) -> List[Dict[str, Any]]:
         """获取指定请求的CTR样本"""
         with self.lock:
@@ -235,6 +252,26 @@ class DataService(DataServiceInterface):
         with self.lock:
             return self.ctr_data.copy()
     
+    def get_samples_since(self, offset: int, before: Optional[str] = None,
+                          epoch: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """增量读取第offset条之后的样本，返回 (样本列表, 下次读取位置)
+
+        样本按记录顺序追加，before 为ISO时间戳时读到第一条不早于它的样本为止(点击尚未回流完的展示留到下次)；
+        epoch 为调用方计算 offset 时的 data_epoch，与当前代数不同说明数据在此期间被清空或重新加载，
+        offset 已失效，返回空列表和位置0，调用方按新代数从头读取；未传 epoch 时 offset 超出范围也从头读取。
+        """
+        with self.lock:
+            if epoch is not None and epoch != self.data_epoch:
+                return [], 0
+            if offset > len(self.ctr_data):
+                offset = 0
+            end = len(self.ctr_data)
+            if before is not None:
+                end = offset
+                while end < len(self.ctr_data) and self.ctr_data[end].get('timestamp', '') < before:
+                    end += 1
+            return self.ctr_data[offset:end], end
+
     def get_samples_dataframe(self, request_id: Optional[str] = None) -> pd.DataFrame:
         """获取CTR样本DataFrame"""
         with self.lock:
@@ -279,6 +316,7 @@ class DataService(DataServiceInterface):
                     'click_rate': 0.0,
                     'unique_queries': 0,
                     'unique_docs': 0,
+                    **self.query_completion.get_stats(),
                     'cache_hit': False,
                     'cache_time': current_time
                 }
@@ -315,6 +353,7 @@ class DataService(DataServiceInterface):
                     'max_clicks_per_item': max_clicks_per_item,
                     'unique_queries': unique_queries,
                     'unique_docs': unique_docs,
+                    **self.query_completion.get_stats(),
                     'cache_hit': False,
                     'cache_time': current_time
                 }
@@ -329,6 +368,8 @@ class DataService(DataServiceInterface):
         """清空所有CTR数据"""
         with self.lock:
             self.ctr_data = []
+            self.data_epoch += 1
+            self.query_completion.clear()
             self.pending_changes = 0
             self._save_data_async() # 清空后也保存一次
             print("✅ CTR数据已清空")
@@ -355,6 +396,7 @@ class DataService(DataServiceInterface):
             
             with self.lock:
                 self.ctr_data.extend(imported_data)
+                self.query_completion.add_samples(imported_data)
                 self.pending_changes += len(imported_data)
                 if self._should_save_now():
                     self._save_data_async()
@@ -409,6 +451,7 @@ class DataService(DataServiceInterface):
                 # 批量添加到数据中
                 if batch_samples:
                     self.ctr_data.extend(batch_samples)
+                    self.query_completion.add_samples(batch_samples)
                     self.pending_changes += len(batch_samples)
                     self._invalidate_cache()
                     
@@ -447,8 +490,9 @@ class DataService(DataServiceInterface):
         ts = datetime.now().isoformat()
         
         # 计算查询匹配度
-        query_words = set(jieba.lcut(query.strip()))
-        summary_words = set(jieba.lcut(summary or ""))
+        tokenizer = get_tokenizer()
+        query_words = set(tokenizer.cut(query.strip()))
+        summary_words = set(tokenizer.cut(summary or ""))
         match_ratio = 0.0
         if len(query_words) > 0:
             match_ratio = len(query_words.intersection(summary_words)) / len(query_words)
@@ -523,6 +567,7 @@ class DataService(DataServiceInterface):
                                     sample['clicked'] = 1
                                     sample['click_time'] = datetime.now().isoformat()
                                     sample['click_count'] = 1
+                                    self.query_completion.record_click(sample.get('query', ''))
                                     updated = True
                                     break
                                 else:
@@ -1,19 +1,36 @@
 import os
+import html
 import json
 import subprocess
+import time
 import sys
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import pandas as pd
 from .index_tab.index_service import InvertedIndexService
+from .index_tab.segment import detect_index_format
+from .index_tab.candidate_set import CandidateSet
+from .result_cache import ResultCache
+
+# 邻近度排序：最终分数 = 相关性分数 × (1 + PROXIMITY_BOOST × 邻近度)
+PROXIMITY_BOOST = 1.0
 
 
 class IndexService:
-    """索引服务：负责索引构建、文档管理、检索功能"""
+    """索引服务：负责索引构建、文档管理、检索功能
+    
+    index_file 可以是JSON索引，也可以是二进制索引段(.seg，mmap打开)，按文件头自动识别；
+    为目录时使用分段增量索引，新文档先进内存段，定期落盘并在后台合并。
+    num_shards 大于1时文档按哈希分到多个工作进程持有的分片，查询分发到所有分片后归并top_k。
+    retrieve/rank 的结果按归一化查询缓存，索引代数或CTR模型版本变化时缓存自动失效。
+    retrieve 返回带召回分数的候选集，rank 直接复用这些分数，不再对全库重新检索，摘要只为最终结果生成。
+    """
     
-    def __init__(self, index_file: str = "models/index_data.json"):
+    def __init__(self, index_file: str = "models/index_data.json", num_shards: int = 0,
+                 result_cache: Optional[ResultCache] = None):
         self.index_file = index_file
-        self.index_service = InvertedIndexService(index_file)
+        self.index_service = InvertedIndexService(index_file, num_shards=num_shards)
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
         self._ensure_index_exists()
     
     def _ensure_index_exists(self):
@@ -69,29 +86,78 @@ class IndexService:
         """获取文档内容"""
         return self.index_service.get_document(doc_id)
     
-    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float, str]]:
+    def search(self, query: str, top_k: int = 20, scorer: str = "tfidf") -> List[Tuple[str, float, str]]:
         """搜索文档"""
-        return self.index_service.search(query, top_k)
+        return self.index_service.search(query, top_k, scorer=scorer)
+    
+    def search_many(self, queries: List[str], top_k: int = 20,
+                    scorer: str = "tfidf") -> List[List[Tuple[str, float]]]:
+        """批量召回 [(文档ID, 分数), ...]，用于离线评估、回放等批量场景，整批查询一次稀疏矩阵乘法打分"""
+        return self.index_service.search_many(queries, top_k, scorer=scorer)
+    
+    def validate_query(self, query: str) -> Optional[str]:
+        """检查查询语法，正确返回None，否则返回错误信息"""
+        return self.index_service.validate_query(query)
+    
+    def prefix_terms(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """以prefix开头的词项(升序)"""
+        return self.index_service.prefix_terms(prefix, limit)
+    
+    def expand_wildcard(self, pattern: str) -> List[str]:
+        """通配符(* 任意个字符，? 单个字符)展开为匹配的词项"""
+        return self.index_service.expand_wildcard(pattern)
+    
+    def suggest(self, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+        """按文档频率联想以prefix开头的词项 [(词项, 文档频率), ...]"""
+        return self.index_service.suggest(prefix, k)
+    
+    def retrieve(self, query: str, top_k: int = 20, scorer: str = "tfidf") -> CandidateSet:
+        """召回候选集：按召回分数排序、可当作文档ID列表使用，带分数，摘要等特征在rank时按需计算"""
+        results = self._cached(("retrieve", top_k, scorer), query,
+                               lambda: self.index_service.retrieve(query, top_k, scorer=scorer))
+        return self.index_service.candidate_set(query, scorer, results)
     
-    def retrieve(self, query: str, top_k: int = 20) -> List[str]:
-        """检索文档ID列表"""
-        return self.index_service.search_doc_ids(query, top_k)
+    def _cache_version(self) -> Tuple[int, int]:
+        """缓存版本：(索引代数, CTR模型版本)"""
+        from .service_manager import service_manager
+        return self.index_service.generation, service_manager.get_model_version()
     
-    def rank(self, query: str, doc_ids: List[str], top_k: int = 10, sort_mode: str = "tfidf") -> List[Tuple[str, float, str]]:
-        """对文档进行排序，支持TF-IDF和CTR排序模式"""
+    def _cached(self, params: Tuple, query: str, compute) -> list:
+        """按 (归一化查询, 参数) 查缓存，未命中时计算并写入；查询语法错误时不缓存"""
+        query_key = self.index_service.query_key(query) if self.result_cache.enabled else None
+        if query_key is None:
+            return compute()
+        key = (query_key,) + params
+        version = self._cache_version()
+        cached = self.result_cache.get(key, version)
+        if cached is not None:
+            return list(cached)
+        results = compute()
+        self.result_cache.put(key, version, tuple(results))
+        return results
+    
+    def rank(self, query: str, doc_ids: List[str], top_k: int = 10, sort_mode: str = "tfidf",
+             scorer: str = "tfidf") -> List[Tuple[str, float, str]]:
+        """对文档进行排序，支持TF-IDF、CTR和邻近度(proximity)排序模式，scorer指定相关性打分器(tfidf/bm25/bm25+)
+        
+        proximity 模式返回4元组 (doc_id, 相关性分数, 邻近度, summary)，
+        按 相关性分数 × (1 + PROXIMITY_BOOST × 邻近度) 排序。
+        结果按 (归一化查询, 候选文档, top_k, sort_mode, scorer) 缓存。
+        """
         if not doc_ids:
             return []
-        
-        # 获取所有文档的搜索结果
-        all_results = self.search(query, top_k=len(doc_ids))
-        
-        # 过滤出指定doc_ids的结果
-        filtered_results = []
-        for result in all_results:
-            if result[0] in doc_ids:
-                filtered_results.append(result)
-        
-        if not filtered_results:
+        return self._cached(("rank", tuple(doc_ids), top_k, sort_mode, scorer), query,
+                            lambda: self._rank(query, doc_ids, top_k, sort_mode, scorer))
+    
+    def _rank(self, query: str, doc_ids: List[str], top_k: int, sort_mode: str,
+              scorer: str) -> List[Tuple[str, float, str]]:
+        # retrieve 返回的候选集直接复用召回分数；普通文档ID列表只对这些文档打分，不重新检索全库
+        if isinstance(doc_ids, CandidateSet) and doc_ids.matches(query, scorer):
+            candidates = doc_ids
+        else:
+            candidates = self.index_service.retrieve_candidates(query, len(doc_ids), scorer=scorer,
+                                                                doc_ids=list(doc_ids))
+        if not candidates:
             return []
         
         # 如果是CTR排序模式，调用模型服务进行CTR预测
@@ -101,23 +167,24 @@ class IndexService:
                 from .service_manager import service_manager
                 model_service = service_manager.model_service
                 
-                # 计算CTR分数
-                ctr_results = []
-                for position, (doc_id, tfidf_score, summary) in enumerate(filtered_results, 1):
-                    # 准备特征
-                    features = {
-                        'query': query,
-                        'doc_id': doc_id,
-                        'position': position,
-                        'score': tfidf_score,
-                        'summary': summary
-                    }
-                    
-                    # 预测CTR
-                    ctr_score = model_service.predict_ctr(features)
-                    
-                    # 返回4元组: (doc_id, tfidf_score, ctr_score, summary)
-                    ctr_results.append((doc_id, tfidf_score, ctr_score, summary))
+                # 摘要是CTR特征，需要为每个候选生成
+                summaries = candidates.summaries(candidates)
+                ranked = candidates.ranked()
+                # 准备特征
+                features = [{
+                    'query': query,
+                    'doc_id': doc_id,
+                    'position': position,
+                    'score': tfidf_score,
+                    'summary': summaries[doc_id]
+                } for position, (doc_id, tfidf_score) in enumerate(ranked, 1)]
+                
+                # 整批候选一次预测CTR
+                ctr_scores = model_service.predict_ctr_batch(query, features)
+                
+                # 返回4元组: (doc_id, tfidf_score, ctr_score, summary)
+                ctr_results = [(doc_id, tfidf_score, ctr_score, summaries[doc_id])
+                               for (doc_id, tfidf_score), ctr_score in zip(ranked, ctr_scores)]
                 
                 # 按CTR分数排序
                 sorted_results = sorted(ctr_results, key=lambda x: x[2], reverse=True)
@@ -125,16 +192,27 @@ class IndexService:
                 
             except Exception as e:
                 print(f"❌ CTR排序失败，回退到TF-IDF排序: {e}")
-                # 回退到TF-IDF排序
-                sorted_results = sorted(filtered_results, key=lambda x: x[1], reverse=True)
-                return sorted_results[:top_k]
         
-        # 默认TF-IDF排序
-        sorted_results = sorted(filtered_results, key=lambda x: x[1], reverse=True)
-        return sorted_results[:top_k]
+        # 邻近度排序：查询词在文档中越紧凑，相关性分数提升越多；摘要只为入选的文档生成
+        if sort_mode == "proximity":
+            proximity = candidates.proximity_scores(candidates)
+            ranked = sorted(candidates.ranked(), key=lambda x: x[1] * (1 + PROXIMITY_BOOST * proximity[x[0]]),
+                            reverse=True)[:top_k]
+            summaries = candidates.summaries([doc_id for doc_id, _ in ranked])
+            return [(doc_id, score, proximity[doc_id], summaries[doc_id]) for doc_id, score in ranked]
+        
+        # 默认TF-IDF排序：候选已按召回分数降序，摘要只为前top_k生成
+        ranked = candidates.ranked()[:top_k]
+        summaries = candidates.summaries([doc_id for doc_id, _ in ranked])
+        return [(doc_id, score, summaries[doc_id]) for doc_id, score in ranked]
+    
+    def highlight(self, text: str, query: str, escape: bool = True) -> str:
+        """按查询词高亮文本(单遍多模式匹配)，escape为True时其余文本做HTML转义"""
+        return self.index_service.highlight(text, query, escape)
     
-    def get_document_page(self, doc_id: str, request_id: str, data_service=None) -> Dict[str, Any]:
-        """获取文档页面（可选记录点击事件）"""
+    def get_document_page(self, doc_id: str, request_id: str, data_service=None,
+                          query: Optional[str] = None) -> Dict[str, Any]:
+        """获取文档页面（可选记录点击事件），提供查询时高亮正文中的查询词"""
         try:
             # 获取文档内容
             content = self.get_document(doc_id)
@@ -143,6 +221,7 @@ class IndexService:
                     'html': f"<h3>❌ 文档不存在</h3><p>文档ID: {doc_id}</p>",
                     'click_recorded': False
                 }
+            content_html = self.highlight(content, query) if query and query.strip() else html.escape(content)
             
             # 如果提供了数据服务，记录点击事件
             click_recorded = False
@@ -162,7 +241,7 @@ class IndexService:
                 <div style="background-color: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
                     <h3 style="color: #333; border-bottom: 2px solid #007bff; padding-bottom: 10px;">文档内容</h3>
                     <div style="line-height: 1.6; color: #333; white-space: pre-wrap; font-family: 'Courier New', monospace;">
-                        {content}
+                        {content_html}
                     </div>
                 </div>
             </div>
@@ -205,12 +284,9 @@ class IndexService:
             return content[:max_length] + "..."
     
     def get_documents_batch(self, doc_ids: list) -> Dict[str, str]:
-        """批量获取文档内容"""
-        results = {}
-        for doc_id in doc_ids:
-            content = self.get_document(doc_id)
-            results[doc_id] = content if content else "文档不存在"
-        return results
+        """批量获取文档内容，一次调用取回所有正文(同一压缩块只解压一次)"""
+        documents = self.index_service.get_documents(doc_ids)
+        return {doc_id: documents.get(doc_id) or "文档不存在" for doc_id in doc_ids}
     
     def get_stats(self) -> Dict[str, Any]:
         """获取索引统计信息"""
@@ -220,8 +296,23 @@ class IndexService:
                 'total_documents': stats.get('total_documents', 0),
                 'total_terms': stats.get('total_terms', 0),
                 'average_doc_length': stats.get('average_doc_length', 0),
+                'total_postings': stats.get('total_postings', 0),
+                'posting_bytes': stats.get('posting_bytes', 0),
+                'bytes_per_posting': stats.get('bytes_per_posting', 0),
+                'term_table_bytes': stats.get('term_table_bytes', 0),
+                'term_dictionary_bytes': stats.get('term_dictionary_bytes', 0),
+                'document_bytes': stats.get('document_bytes', 0),
+                'document_store_bytes': stats.get('document_store_bytes', 0),
                 'index_size': stats.get('index_size', 0),
+                'segment_count': stats.get('segment_count', 0),
+                'memory_docs': stats.get('memory_docs', 0),
+                'deleted_docs': stats.get('deleted_docs', 0),
+                'merges': stats.get('merges', 0),
+                'shard_count': stats.get('shard_count', 0),
+                'generation': stats.get('generation', 0),
+                **self.result_cache.get_stats(),
                 'index_file': self.index_file,
+                'index_format': detect_index_format(self.index_file) if os.path.exists(self.index_file) else None,
                 'index_exists': os.path.exists(self.index_file)
             }
         except Exception as e:
@@ -230,7 +321,11 @@ class IndexService:
                 'total_documents': 0,
                 'total_terms': 0,
                 'average_doc_length': 0,
+                'total_postings': 0,
+                'posting_bytes': 0,
+                'bytes_per_posting': 0,
                 'index_size': 0,
+                **self.result_cache.get_stats(),
                 'index_file': self.index_file,
                 'index_exists': os.path.exists(self.index_file)
             }
@@ -243,10 +338,22 @@ class IndexService:
         """从索引中删除文档"""
         return self.index_service.delete_document(doc_id)
     
+    def update_document(self, doc_id: str, content: str) -> bool:
+        """用新内容原子替换已有文档"""
+        return self.index_service.update_document(doc_id, content)
+    
     def batch_add_documents(self, documents: Dict[str, str]) -> int:
         """批量添加文档"""
         return self.index_service.batch_add_documents(documents)
     
+    def batch_delete_documents(self, doc_ids: List[str]) -> int:
+        """批量删除文档，返回实际删除的数量"""
+        return self.index_service.batch_delete_documents(doc_ids)
+    
+    def write_batch(self):
+        """把多次写入合并成一代发布的上下文管理器，见 InvertedIndexService.write_batch"""
+        return self.index_service.write_batch()
+    
     def get_all_documents(self) -> Dict[str, str]:
         """获取所有文档"""
         return self.index_service.get_all_documents()
@@ -256,11 +363,11 @@ class IndexService:
         return self.index_service.clear_index()
     
     def save_index(self, filepath: Optional[str] = None) -> bool:
-        """保存索引"""
+        """保存索引，路径以.seg结尾时保存为二进制索引段"""
         return self.index_service.save_index(filepath)
     
     def load_index(self, filepath: str) -> bool:
-        """加载索引"""
+        """加载索引，自动识别JSON索引或二进制索引段"""
         return self.index_service.load_index(filepath)
     
     def export_documents(self) -> Tuple[Optional[str], str]:
@@ -306,12 +413,25 @@ class IndexService:
             if not documents:
                 return "❌ 没有文档数据"
             
-            # 清空现有索引并导入新文档
-            self.clear_index()
-            success_count = self.batch_add_documents(documents)
+            return self.import_document_dict(documents)
+            
+        except Exception as e:
+            return f"❌ 导入文档失败: {str(e)}"
+    
+    def import_document_dict(self, documents: Dict[str, str]) -> str:
+        """清空现有索引后并行批量导入文档，返回包含吞吐量的结果信息"""
+        try:
+            start = time.perf_counter()
+            # 清空和导入在同一批内完成，只发布一代，查询不会看到中间的空索引
+            with self.write_batch():
+                self.clear_index()
+                success_count = self.batch_add_documents(documents)
+            elapsed = time.perf_counter() - start
             self.save_index()
             
-            return f"✅ 文档导入成功！\n导入文档数: {success_count}\n总文档数: {len(documents)}"
+            throughput = success_count / elapsed if elapsed > 0 else 0.0
+            return (f"✅ 文档导入成功！\n导入文档数: {success_count}\n总文档数: {len(documents)}\n"
+                    f"建索引耗时: {elapsed:.2f}s ({throughput:.0f} docs/s)")
             
         except Exception as e:
             return f"❌ 导入文档失败: {str(e)}" 
\ No newline at end of file
@@ -1,9 +1,19 @@
 from .index_tab import build_index_tab, show_index_stats, check_index_quality, view_inverted_index
 from .offline_index import InvertedIndex, create_sample_documents, build_index_from_documents
 from .index_service import IndexServiceInterface, InvertedIndexService, get_index_service, reset_index_service
+from .segment import IndexSegment, DocumentStore, DocumentTable, detect_index_format, convert_json_to_segment
+from .segmented_index import SegmentedIndex
+from .sharded_index import ShardedIndex
+from .term_dictionary import TermDictionary
+from .highlighter import KeywordAutomaton, highlight_keywords
+from .candidate_set import CandidateSet
+from .bulk_builder import build_index_parallel, bulk_add_documents
 
 __all__ = [
     'build_index_tab', 'show_index_stats', 'check_index_quality', 'view_inverted_index',
     'InvertedIndex', 'create_sample_documents', 'build_index_from_documents',
-    'IndexServiceInterface', 'InvertedIndexService', 'get_index_service', 'reset_index_service'
+    'IndexServiceInterface', 'InvertedIndexService', 'get_index_service', 'reset_index_service',
+    'IndexSegment', 'DocumentStore', 'DocumentTable', 'detect_index_format', 'convert_json_to_segment',
+    'SegmentedIndex', 'ShardedIndex', 'TermDictionary', 'KeywordAutomaton', 'highlight_keywords',
+    'CandidateSet', 'build_index_parallel', 'bulk_add_documents'
 ] 
\ No newline at end of file
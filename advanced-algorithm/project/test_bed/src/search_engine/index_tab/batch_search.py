@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量检索(稀疏矩阵打分)
+把索引一次展开成 词项 × 文档 的CSR稀疏矩阵，值为未乘IDF的词项得分(与 _posting_scores 一致)；
+一批查询组成 查询 × 词项 的稀疏矩阵，值为 查询词频 × IDF，
+一次稀疏矩阵乘法得到这批查询对所有文档的分数，再按行取top_k(命中稀疏时直接排序非零元，否则转稠密后 argpartition)。
+分数与逐条TAAT检索相同(只有浮点求和顺序的差异)，用于离线评估、日志回放等一次要打分成千上万条查询的场景。
+"""
+
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from scipy import sparse
+
+# 每次转成稠密矩阵做top_k选择的最大单元数(查询数 × 文档数)，控制峰值内存
+MAX_DENSE_CELLS = 4_000_000
+
+# 分数矩阵的非零元不到总单元数的 1/SPARSE_SELECT_RATIO 时，直接对非零元排序选top_k，不转稠密
+# (排序每个元素的代价比 argpartition 高一个量级，所以只在命中很稀疏时才划算)
+SPARSE_SELECT_RATIO = 32
+
+
+class DocTermMatrix:
+    """某个打分器下的 词项 × 文档 得分矩阵，索引打分表刷新后需要重建"""
+
+    def __init__(self, index, scorer: str):
+        """index 为内存或mmap索引段上的 InvertedIndex，调用方保证打分表已刷新"""
+        terms = []
+        indptr = np.zeros(len(index.postings) + 1, dtype=np.int64)
+        doc_chunks, score_chunks = [], []
+        # 直接解码倒排链，不经过(也不挤占)查询用的解码缓存
+        for term_no, (word, posting_list) in enumerate(index.postings.items()):
+            doc_nums = posting_list.doc_nums()
+            terms.append(word)
+            doc_chunks.append(doc_nums)
+            score_chunks.append(index._tf_scores(doc_nums, posting_list.tf_array(), scorer))
+            indptr[term_no + 1] = indptr[term_no] + len(doc_nums)
+        num_docs = len(index.doc_ids)
+        self.matrix = sparse.csr_matrix(
+            (np.concatenate(score_chunks) if score_chunks else np.zeros(0),
+             np.concatenate(doc_chunks) if doc_chunks else np.zeros(0, dtype=np.int64),
+             indptr),
+            shape=(len(terms), num_docs)
+        )
+        self.term_nos = {word: term_no for term_no, word in enumerate(terms)}
+
+    @property
+    def nbytes(self) -> int:
+        """矩阵占用的字节数"""
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+
+    def query_matrix(self, weights: Sequence[Dict[str, float]]) -> sparse.csr_matrix:
+        """一批查询的 {词项: 权重} 组成 查询 × 词项 稀疏矩阵"""
+        rows, cols, values = [], [], []
+        for row, query_weights in enumerate(weights):
+            for word, weight in query_weights.items():
+                term_no = self.term_nos.get(word)
+                if term_no is not None:
+                    rows.append(row)
+                    cols.append(term_no)
+                    values.append(weight)
+        return sparse.csr_matrix((values, (rows, cols)), shape=(len(weights), len(self.term_nos)))
+
+    def top_k(self, weights: Sequence[Dict[str, float]], top_k: int) -> List[List[Tuple[int, float]]]:
+        """每条查询的top_k (内部文档编号, 分数)，按分数降序、同分按编号升序，只保留正分
+        
+        与TAAT一样，和第k名同分的文档谁入选不确定。
+        """
+        num_docs = self.matrix.shape[1]
+        if not weights or top_k <= 0 or num_docs == 0:
+            return [[] for _ in weights]
+        queries = self.query_matrix(weights)
+        chunk = max(1, MAX_DENSE_CELLS // num_docs)
+        results = []
+        for start in range(0, len(weights), chunk):
+            scores = queries[start:start + chunk] @ self.matrix
+            if scores.nnz * SPARSE_SELECT_RATIO < scores.shape[0] * num_docs:
+                results.extend(top_k_sparse(scores, top_k))
+            else:
+                results.extend(top_k_dense(scores.toarray(), top_k))
+        return results
+
+
+def _split_rows(cols: np.ndarray, values: np.ndarray, counts: np.ndarray) -> List[List[Tuple[int, float]]]:
+    """按每行的个数把拼接在一起的 (列, 分数) 切回每行的列表"""
+    cols, values = cols.tolist(), values.tolist()
+    results = []
+    start = 0
+    for count in counts.tolist():
+        results.append(list(zip(cols[start:start + count], values[start:start + count])))
+        start += count
+    return results
+
+
+def top_k_dense(scores: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+    """稠密分数矩阵每行取top_k正分列：整体 argpartition，再只对选出的k列排序"""
+    num_rows, num_cols = scores.shape
+    k = min(top_k, num_cols)
+    if k < num_cols:
+        selected = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        selected = np.broadcast_to(np.arange(num_cols), (num_rows, num_cols))
+    values = np.take_along_axis(scores, selected, axis=1)
+    order = np.lexsort((selected, -values))
+    selected = np.take_along_axis(selected, order, axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+    positive = values > 0
+    return _split_rows(selected[positive], values[positive], positive.sum(axis=1))
+
+
+def top_k_sparse(scores: sparse.csr_matrix, top_k: int) -> List[List[Tuple[int, float]]]:
+    """稀疏分数矩阵(命中文档远少于总文档数)每行取top_k：所有非零元按 (行, -分数, 列) 一次稳定排序后截取每行前k个"""
+    scores = scores.tocsr()
+    scores.sort_indices()
+    row_sizes = np.diff(scores.indptr)
+    rows = np.repeat(np.arange(scores.shape[0]), row_sizes)
+    order = np.lexsort((-scores.data, rows))
+    cols, values = scores.indices[order], scores.data[order]
+    rank = np.arange(len(order)) - scores.indptr[rows]
+    keep = (rank < top_k) & (values > 0)
+    return _split_rows(cols[keep], values[keep], np.bincount(rows[keep], minlength=scores.shape[0]))
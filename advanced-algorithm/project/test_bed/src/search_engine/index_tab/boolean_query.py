@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布尔查询语言
+语法(运算符大写，优先级 NOT > AND > OR，相邻的项之间默认为 AND)：
+    机器学习 AND (深度学习 OR 神经网络) NOT 图像
+    -图像 推荐            减号等价于 NOT
+    "机器 学习"~2 AND 数据  短语/邻近约束
+    id:doc1  id:doc*       按文档ID精确/前缀限定
+    content:推荐           按正文限定(默认字段)
+    机器*  机*习           通配符(* 匹配任意个字符)，按索引词典展开为匹配词项的 OR
+解析结果为嵌套元组表示的语法树：
+    ("and", [子节点...]) / ("or", [子节点...]) / ("not", 子节点)
+    ("term", 文本) / ("phrase", 文本, slop, 是否有序) / ("field", 字段, 值) / ("wildcard", 模式)
+compile_query_tree 把叶子文本分词后得到索引求值用的查询树：
+    ("terms", [词项...])           同时包含这些词项
+    ("phrase", [词项...], slop, 是否有序)
+    ("id", 文档ID或以*结尾的前缀)
+    ("ids", (文档ID, ...))         限定在给定的一组文档内(不由查询语言产生，见 restrict_to_docs)
+通配符叶子由 expand_wildcard 展开为 ("or", [("terms", [词项]), ...])，没有匹配词项时为空的 ("or", [])。
+"""
+
+import re
+from typing import Callable, List, Optional, Tuple
+
+# 查询语言中的通配符
+WILDCARD = "*"
+
+# 支持的限定字段
+SUPPORTED_FIELDS = ("content", "id")
+
+_TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<phrase>"[^"]*"(?:~\d+)?)
+  | (?P<field>[A-Za-z_]+:(?:"[^"]*"|[^\s()"]+))
+  | (?P<minus>-(?=\S))
+  | (?P<word>[^\s()"]+)
+  | (?P<quote>")
+''', re.VERBOSE)
+
+_OPERATORS = ("AND", "OR", "NOT")
+
+
+class QuerySyntaxError(ValueError):
+    """查询语法错误，position 为出错位置(字符偏移)"""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"查询语法错误(位置{position}): {message}")
+        self.position = position
+
+
+def _tokenize(query: str) -> List[Tuple[str, str, int]]:
+    """切分为 (类型, 文本, 位置)，运算符识别为 AND/OR/NOT 类型"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "space":
+            continue
+        if kind == "quote":
+            raise QuerySyntaxError("引号未闭合", match.start())
+        if kind == "word" and text in _OPERATORS:
+            kind = text
+        elif kind == "word" and WILDCARD in text:
+            kind = "wildcard"
+        tokens.append((kind, text, match.start()))
+    return tokens
+
+
+def is_boolean_query(query: str) -> bool:
+    """查询中出现布尔运算符、括号、减号、字段限定或通配符时按布尔查询处理，否则仍按打分的OR查询处理"""
+    try:
+        tokens = _tokenize(query)
+    except QuerySyntaxError:
+        return True
+    return any(kind in _OPERATORS or kind in ("lparen", "rparen", "minus", "field", "wildcard")
+               for kind, _, _ in tokens)
+
+
+def _phrase_node(text: str) -> Tuple:
+    body, _, slop = text.rpartition('"~') if '"~' in text else (text[:-1], None, None)
+    body = body[1:]
+    if slop is None:
+        return ("phrase", body, 0, True)
+    return ("phrase", body, int(slop), False)
+
+
+class _Parser:
+    """递归下降解析"""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.tokens = _tokenize(query)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> Tuple:
+        if not self.tokens:
+            raise QuerySyntaxError("查询为空", 0)
+        node = self.parse_or()
+        if self.peek() is not None:
+            kind, text, position = self.peek()
+            raise QuerySyntaxError(f"多余的 '{text}'", position)
+        return node
+
+    def parse_or(self) -> Tuple:
+        children = [self.parse_and()]
+        while self.peek() is not None and self.peek()[0] == "OR":
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and(self) -> Tuple:
+        children = [self.parse_unary()]
+        while self.peek() is not None and self.peek()[0] not in ("OR", "rparen"):
+            if self.peek()[0] == "AND":
+                self.take()
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_unary(self) -> Tuple:
+        token = self.peek()
+        if token is None:
+            raise QuerySyntaxError("查询不完整，缺少查询词", len(self.query))
+        if token[0] in ("NOT", "minus"):
+            self.take()
+            return ("not", self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self) -> Tuple:
+        kind, text, position = self.take()
+        if kind == "lparen":
+            node = self.parse_or()
+            if self.peek() is None or self.peek()[0] != "rparen":
+                raise QuerySyntaxError("括号未闭合", position)
+            self.take()
+            return node
+        if kind == "phrase":
+            return _phrase_node(text)
+        if kind == "field":
+            field, _, value = text.partition(":")
+            if field not in SUPPORTED_FIELDS:
+                raise QuerySyntaxError(f"未知字段 '{field}'，支持: {', '.join(SUPPORTED_FIELDS)}", position)
+            if value.startswith('"'):
+                value = value[1:-1]
+            if field == "content":
+                return ("wildcard", value) if WILDCARD in value else ("term", value)
+            return ("field", field, value)
+        if kind == "word":
+            return ("term", text)
+        if kind == "wildcard":
+            return ("wildcard", text)
+        raise QuerySyntaxError(f"运算符 '{text}' 缺少操作数", position)
+
+
+def parse_boolean_query(query: str) -> Tuple:
+    """解析布尔查询为语法树，语法错误抛出 QuerySyntaxError"""
+    return _Parser(query).parse()
+
+
+def compile_query_tree(node: Tuple, tokenize: Callable[[str], List[str]],
+                       expand_wildcard: Callable[[str], List[str]] = None) -> Optional[Tuple]:
+    """把语法树的叶子文本分词，分词后为空(如全是停用词)的叶子及只含这类叶子的子树返回None
+    
+    通配符叶子用 expand_wildcard 展开为匹配的词项，未提供时不匹配任何文档。
+    """
+    kind = node[0]
+    if kind == "wildcard":
+        words = expand_wildcard(node[1]) if expand_wildcard is not None else []
+        if len(words) == 1:
+            return ("terms", words)
+        return ("or", [("terms", [word]) for word in words])
+    if kind == "term":
+        words = tokenize(node[1])
+        return ("terms", words) if words else None
+    if kind == "phrase":
+        words = tokenize(node[1])
+        if len(words) < 2:
+            return ("terms", words) if words else None
+        return ("phrase", words, node[2], node[3])
+    if kind == "field":
+        return ("id", node[2])
+    if kind == "not":
+        child = compile_query_tree(node[1], tokenize, expand_wildcard)
+        return ("not", child) if child is not None else None
+    children = [child for child in (compile_query_tree(c, tokenize, expand_wildcard) for c in node[1])
+                if child is not None]
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else (kind, children)
+
+
+def positive_words(tree: Optional[Tuple]) -> List[str]:
+    """查询树中不在NOT下的词项，用于相关性打分"""
+    if tree is None or tree[0] in ("not", "id", "ids"):
+        return []
+    if tree[0] in ("terms", "phrase"):
+        return list(tree[1])
+    return [word for child in tree[1] for word in positive_words(child)]
+
+
+def restrict_to_docs(query_words: List[str], clauses: List[Tuple], doc_ids) -> List[Tuple]:
+    """给匹配约束加上"只在 doc_ids 中"的限制，用于只对召回候选打分的精排阶段
+    
+    普通查询(没有约束)另外要求至少包含一个查询词，与不加限制时一样不返回0分文档。
+    """
+    restricted = list(clauses) + [("ids", tuple(dict.fromkeys(doc_ids)))]
+    if not clauses and query_words:
+        restricted.append(("or", [("terms", [word]) for word in dict.fromkeys(query_words)]))
+    return restricted
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+召回候选集
+召回阶段对全库打一次分，得到的候选集按分数排好序，可以像文档ID列表一样使用；
+排序阶段直接复用其中的召回分数，摘要、邻近度等特征只在用到时对需要的文档计算并缓存，
+一次搜索请求只对全库打一次分，摘要只为最终展示的文档生成。
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+
+class CandidateSet(list):
+    """按召回分数降序的候选文档ID列表，附带分数和按需计算的特征
+
+    是 list 的子类，按文档ID列表使用的调用方不受影响；
+    index 为召回时的索引快照(InvertedIndex/SegmentedIndex/ShardedIndex)，特征在这个快照上计算。
+    """
+
+    def __init__(self, query: str, scorer: str, results: Iterable[Tuple[str, float]] = (),
+                 index=None, query_words: List[str] = None):
+        self.scores = dict(results)
+        super().__init__(self.scores)
+        self.query = query
+        self.scorer = scorer
+        self.query_words = list(query_words or [])
+        self._index = index
+        self._summaries = {}
+        self._proximity = {}
+
+    def __repr__(self) -> str:
+        return f"CandidateSet({self.query!r}, {self.scorer!r}, {list.__repr__(self)})"
+
+    def matches(self, query: str, scorer: str) -> bool:
+        """是否由同一查询、同一打分器召回且每个文档都有召回分数(排序阶段据此决定能否复用召回分数)"""
+        return (self.query == query.strip() and self.scorer == scorer
+                and all(doc_id in self.scores for doc_id in self))
+
+    def ranked(self) -> List[Tuple[str, float]]:
+        """[(文档ID, 召回分数), ...]，按召回分数降序(同分保持列表顺序)"""
+        return sorted(((doc_id, self.scores[doc_id]) for doc_id in self), key=lambda x: x[1], reverse=True)
+
+    def summaries(self, doc_ids: List[str]) -> Dict[str, str]:
+        """给定文档的摘要，只为还没生成过的文档生成一次"""
+        missing = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id not in self._summaries]
+        if missing and self._index is not None:
+            generated = self._index.get_summaries(missing, self.query_words)
+            for doc_id in missing:
+                self._summaries[doc_id] = generated.get(doc_id, "")
+        return {doc_id: self._summaries.get(doc_id, "") for doc_id in doc_ids}
+
+    def proximity_scores(self, doc_ids: List[str]) -> Dict[str, float]:
+        """给定文档的邻近度特征，每篇文档只计算一次"""
+        if self._index is not None:
+            for doc_id in doc_ids:
+                if doc_id not in self._proximity:
+                    self._proximity[doc_id] = self._index.proximity_score(doc_id, self.query_words)
+        return {doc_id: self._proximity.get(doc_id, 0.0) for doc_id in doc_ids}
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词高亮(Aho-Corasick多模式匹配)
+所有关键词建成一个自动机，文本只扫描一遍就找出全部出现(包括相互重叠的)，
+重叠时长的关键词优先、同样长时靠前的优先，最后一次拼出高亮后的HTML：
+代价 O(文本长度 + 命中数)，与关键词个数无关，也不会像逐个 str.replace 那样替换到已插入的标签里。
+"""
+
+import html
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from .boolean_query import positive_words
+
+HIGHLIGHT_TEMPLATE = '<span style="background-color: yellow; font-weight: bold;">{}</span>'
+
+# 缓存的关键词自动机个数(同一查询的结果页、文档页复用同一个自动机)
+AUTOMATON_CACHE_SIZE = 256
+
+
+def _fold_char(ch: str) -> str:
+    """单字符转小写，转换后长度变化的字符(如'İ')保持原样，保证字符偏移不变"""
+    lower = ch.lower()
+    return lower if len(lower) == 1 else ch
+
+
+def _fold(text: str) -> str:
+    """按字符转小写，结果与原文逐字符对齐"""
+    lower = text.lower()
+    return lower if len(lower) == len(text) else "".join(map(_fold_char, text))
+
+
+class KeywordAutomaton:
+    """关键词自动机：goto表 + 失败指针 + 每个状态的输出(可匹配的关键词长度)，匹配时忽略大小写"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]
+        for keyword in keywords:
+            self._add(_fold(keyword))
+        self._build()
+
+    def __len__(self) -> int:
+        """状态数"""
+        return len(self._goto)
+
+    def _add(self, keyword: str):
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] = (len(keyword),)
+
+    def _build(self):
+        """按层序计算失败指针(第一层指向根)，每个状态的输出并上失败状态的输出"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in goto[state].items():
+                queue.append(child)
+                target = fail[state]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                fail[child] = goto[target].get(ch, 0)
+                outputs[child] = outputs[child] + outputs[fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int]]:
+        """所有关键词出现的字符区间 [(起点, 终点), ...]，可能相互重叠"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        matches = []
+        state = 0
+        for i, ch in enumerate(_fold(text), 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length in outputs[state]:
+                matches.append((i - length, i))
+        return matches
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """不重叠的出现区间，按起点排序；重叠时长的优先，同样长时靠前的优先"""
+        matches = self.find_all(text)
+        matches.sort(key=lambda match: (match[0] - match[1], match[0]))
+        taken = bytearray(len(text))
+        selected = []
+        for start, end in matches:
+            if taken.find(1, start, end) < 0:
+                taken[start:end] = b"\x01" * (end - start)
+                selected.append((start, end))
+        selected.sort()
+        return selected
+
+    def highlight(self, text: str, template: str = HIGHLIGHT_TEMPLATE, escape: bool = False) -> str:
+        """把关键词出现套上高亮模板；escape为True时其余文本按HTML转义(用于展示纯文本正文)"""
+        quote = html.escape if escape else str
+        pieces = []
+        cursor = 0
+        for start, end in self.find(text):
+            pieces.append(quote(text[cursor:start]))
+            pieces.append(template.format(quote(text[start:end])))
+            cursor = end
+        pieces.append(quote(text[cursor:]))
+        return "".join(pieces)
+
+
+def query_keywords(query_words: List[str], clauses: List[Tuple]) -> List[str]:
+    """查询的高亮词：打分用的查询词 + 匹配约束(短语、布尔查询树)中不在NOT下的词，去重"""
+    keywords = list(query_words)
+    for clause in clauses:
+        keywords.extend(positive_words(clause))
+    return list(dict.fromkeys(keywords))
+
+
+@lru_cache(maxsize=AUTOMATON_CACHE_SIZE)
+def _cached_automaton(keywords: Tuple[str, ...]) -> KeywordAutomaton:
+    return KeywordAutomaton(keywords)
+
+
+def build_automaton(keywords: Iterable[str]) -> KeywordAutomaton:
+    """按关键词集合取自动机，相同集合复用已构建的"""
+    return _cached_automaton(tuple(sorted(set(keywords))))
+
+
+def highlight_keywords(text: str, keywords: Iterable[str], template: str = HIGHLIGHT_TEMPLATE,
+                       escape: bool = False) -> str:
+    """单遍扫描高亮文本中的关键词"""
+    return build_automaton(keywords).highlight(text, template, escape)
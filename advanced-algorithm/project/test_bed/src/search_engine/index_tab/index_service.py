@@ -5,11 +5,22 @@
 提供标准的索引写入和查询接口
 """
 
+import html
 import json
 import os
+import threading
+import weakref
+from contextlib import contextmanager
 from typing import List, Dict, Tuple, Optional, Any
 from abc import ABC, abstractmethod
 from .offline_index import InvertedIndex
+from .boolean_query import QuerySyntaxError
+from .segment import detect_index_format, SEGMENT_SUFFIX
+from .segmented_index import SegmentedIndex, is_segmented_index_path
+from .sharded_index import ShardedIndex
+from .bulk_builder import bulk_add_documents
+from .highlighter import highlight_keywords, query_keywords
+from .candidate_set import CandidateSet
 
 class IndexServiceInterface(ABC):
     """倒排索引服务接口"""
@@ -20,7 +31,7 @@ class IndexServiceInterface(ABC):
         pass
     
     @abstractmethod
-    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float, str]]:
+    def search(self, query: str, top_k: int = 20, scorer: str = "tfidf") -> List[Tuple[str, float, str]]:
         """搜索文档"""
         pass
     
@@ -54,33 +65,147 @@ class IndexServiceInterface(ABC):
         """获取所有文档"""
         pass
 
+class IndexSnapshot:
+    """一代索引的快照：发布后不再修改，查询全程使用同一个快照"""
+    
+    __slots__ = ('generation', 'index', '__weakref__')
+    
+    def __init__(self, generation: int, index):
+        self.generation = generation
+        self.index = index
+
+
 class InvertedIndexService(IndexServiceInterface):
-    """倒排索引服务实现"""
+    """倒排索引服务实现
+    
+    索引按代发布为快照：查询只读一次当前快照(一次属性读取，不加锁)，不会被写入阻塞；
+    写入在写锁内基于当前代生成下一代(内存索引用写时复制副本)，完成后原子替换快照，
+    写入失败时当前代保持不变。每一代都要复制一次顶层容器，连续的多次写入应放进
+    write_batch() 合并成一代。分段索引和分片索引自身带同步，原地写入后同样发布新的一代；
+    分段索引的查询与写入共用同一把锁，会等待进行中的写入(含内存段落盘)。
+    """
     
-    def __init__(self, index_file: str = "models/index_data.json"):
+    def __init__(self, index_file: str = "models/index_data.json", num_shards: int = 0):
         """
         初始化倒排索引服务
         
         Args:
-            index_file: 索引文件路径
+            index_file: 索引文件路径；为目录(或不带扩展名的新路径)时使用分段增量索引
+            num_shards: 分片数，大于1时文档按哈希分到多个工作进程，查询分发到所有分片后归并；
+                分段索引不分片
         """
-        self.index = InvertedIndex()
         self.index_file = index_file
+        self.num_shards = num_shards
+        self.index = self._new_index()
         self._load_or_create_index()
     
+    @property
+    def index(self):
+        """当前一代的索引，只能用于查询；修改请通过服务的写入方法"""
+        return self._snapshot.index
+    
+    @index.setter
+    def index(self, index):
+        """整体替换索引，发布为新的一代"""
+        if '_snapshot' not in self.__dict__:
+            self._write_lock = threading.RLock()
+            self._batch_index = None  # write_batch() 进行中时为这一批写入的下一代索引
+            self._snapshot = IndexSnapshot(0, index)
+            return
+        with self._write_lock:
+            self._publish(index)
+    
+    @property
+    def generation(self) -> int:
+        """当前索引的代数，每次写入、加载或清空后加一"""
+        return self._snapshot.generation
+    
+    def snapshot(self) -> IndexSnapshot:
+        """获取当前快照，需要多次访问索引时应始终使用同一个快照"""
+        return self._snapshot
+    
+    def _next_index(self):
+        """下一代索引：内存索引生成写时复制副本，分段/分片索引原地写入"""
+        current = self._snapshot.index
+        return current.copy() if isinstance(current, InvertedIndex) else current
+    
+    def _publish(self, index):
+        """发布新的一代(调用方持有写锁)
+        
+        打分表在发布前刷新(只追加新文档的条目)，查询不再修改快照。被替换的分片索引在最后一个
+        引用旧快照的查询结束后才关闭分片进程，进行中的查询不受影响。
+        批量写入进行中时只替换这一批的下一代索引(如清空、加载)，退出批量写入时一起发布。
+        """
+        if self._batch_index is not None:
+            self._batch_index = index
+            return
+        if isinstance(index, InvertedIndex):
+            index._ensure_scoring_tables()
+        old = self._snapshot
+        self._snapshot = IndexSnapshot(old.generation + 1, index)
+        if old.index is not index and isinstance(old.index, ShardedIndex):
+            weakref.finalize(old, old.index.close)
+    
+    def _apply_write(self, operation):
+        """在下一代索引上执行写操作并发布，返回操作结果；写者之间串行执行
+        
+        批量写入进行中时直接作用在这一批的下一代索引上，不单独发布。
+        """
+        with self._write_lock:
+            if self._batch_index is not None:
+                return operation(self._batch_index)
+            index = self._next_index()
+            result = operation(index)
+            self._publish(index)
+            return result
+    
+    @contextmanager
+    def write_batch(self):
+        """把块内的多次写入合并成一代发布
+        
+        块内的写入都作用在同一个下一代索引上，退出时只复制一次索引、刷新一次打分表、
+        发布一次快照；块内抛出异常时整批不发布(内存索引的当前代保持不变)。
+        块内持有写锁，其他线程的写入等待，查询仍读上一代，退出后才能看到这批写入。可以嵌套。
+        
+        用法:
+            with service.write_batch():
+                service.add_document("doc1", "...")
+                service.delete_document("doc2")
+        """
+        with self._write_lock:
+            if self._batch_index is not None:
+                yield
+                return
+            self._batch_index = self._next_index()
+            try:
+                yield
+                index = self._batch_index
+            finally:
+                self._batch_index = None
+            self._publish(index)
+    
+    def _new_index(self):
+        if is_segmented_index_path(self.index_file):
+            return SegmentedIndex(self.index_file)
+        if self.num_shards > 1:
+            return ShardedIndex(self.num_shards)
+        return InvertedIndex()
+    
     def _load_or_create_index(self):
         """加载或创建索引"""
         try:
-            if os.path.exists(self.index_file):
+            if isinstance(self.index, SegmentedIndex) and self.index.get_index_stats()['total_documents'] > 0:
+                print(f"从目录打开分段索引成功: {self.index_file}")
+            elif not isinstance(self.index, SegmentedIndex) and os.path.exists(self.index_file):
                 self.load_index(self.index_file)
                 print(f"从文件加载索引成功: {self.index_file}")
             else:
                 print(f"索引文件不存在，将创建新索引: {self.index_file}")
                 # 创建示例文档
                 from .offline_index import create_sample_documents
-                documents = create_sample_documents()
-                for doc_id, content in documents.items():
-                    self.add_document(doc_id, content)
+                self.batch_add_documents(create_sample_documents())
+                if isinstance(self.index, SegmentedIndex):
+                    self.index.commit()
                 print("创建示例索引成功")
         except Exception as e:
             print(f"加载索引失败: {e}")
@@ -97,7 +222,7 @@ class InvertedIndexService(IndexServiceInterface):
             bool: 是否添加成功
         """
         try:
-            self.index.add_document(doc_id, content)
+            self._apply_write(lambda index: index.add_document(doc_id, content))
             return True
         except Exception as e:
             print(f"添加文档失败: {e}")
@@ -114,7 +239,7 @@ class InvertedIndexService(IndexServiceInterface):
             bool: 是否删除成功
         """
         try:
-            success = self.index.delete_document(doc_id)
+            success = self._apply_write(lambda index: index.delete_document(doc_id))
             if success:
                 print(f"文档 '{doc_id}' 删除成功")
             else:
@@ -124,13 +249,53 @@ class InvertedIndexService(IndexServiceInterface):
             print(f"删除文档失败: {e}")
             return False
     
-    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float, str]]:
+    def update_document(self, doc_id: str, content: str) -> bool:
+        """
+        用新内容原子替换已有文档
+        
+        Args:
+            doc_id: 文档ID
+            content: 新的文档内容
+            
+        Returns:
+            bool: 是否更新成功，文档不存在时返回False
+        """
+        try:
+            success = self._apply_write(lambda index: index.update_document(doc_id, content))
+            if not success:
+                print(f"文档 '{doc_id}' 不存在")
+            return success
+        except Exception as e:
+            print(f"更新文档失败: {e}")
+            return False
+    
+    def batch_delete_documents(self, doc_ids: List[str]) -> int:
+        """
+        批量删除文档
+        
+        Args:
+            doc_ids: 文档ID列表
+            
+        Returns:
+            int: 实际删除的文档数量
+        """
+        try:
+            return self._apply_write(lambda index: index.batch_delete_documents(doc_ids))
+        except Exception as e:
+            print(f"批量删除文档失败: {e}")
+            return 0
+    
+    def search(self, query: str, top_k: int = 20, scorer: str = "tfidf",
+               strategy: str = "taat") -> List[Tuple[str, float, str]]:
         """
         搜索文档
         
         Args:
-            query: 查询字符串
+            query: 查询字符串，支持 "短语"、"短语"~k 邻近和 A NEAR/k B，
+                   以及 AND/OR/NOT、括号、-排除词、id:/content: 字段限定的布尔查询
             top_k: 返回结果数量
+            scorer: 打分器 ("tfidf"/"bm25"/"bm25+")
+            strategy: 检索策略 ("taat"/"daat"/"wand"/"bmw")，长OR查询、大语料可选wand/bmw剪枝
             
         Returns:
             List[Tuple[str, float, str]]: 搜索结果列表 (doc_id, score, summary)
@@ -138,11 +303,154 @@ class InvertedIndexService(IndexServiceInterface):
         try:
             if not query.strip():
                 return []
-            return self.index.search(query.strip(), top_k=top_k)
+            return self.index.search(query.strip(), top_k=top_k, strategy=strategy, scorer=scorer)
+        except QuerySyntaxError as e:
+            print(f"⚠️ {e}")
+            return []
         except Exception as e:
             print(f"搜索失败: {e}")
             return []
     
+    def search_many(self, queries: List[str], top_k: int = 20,
+                    scorer: str = "tfidf") -> List[List[Tuple[str, float]]]:
+        """
+        批量召回，单个内存/mmap索引上用稀疏得分矩阵一次乘法为整批查询打分
+        
+        Args:
+            queries: 查询字符串列表
+            top_k: 每条查询返回的结果数量
+            scorer: 打分器
+            
+        Returns:
+            List[List[Tuple[str, float]]]: 与queries一一对应的 [(doc_id, score), ...]，出错时全部为空
+        """
+        try:
+            return self.index.search_many([query.strip() for query in queries], top_k, scorer=scorer)
+        except Exception as e:
+            print(f"批量检索失败: {e}")
+            return [[] for _ in queries]
+    
+    def validate_query(self, query: str) -> Optional[str]:
+        """
+        检查查询语法
+        
+        Args:
+            query: 查询字符串
+            
+        Returns:
+            Optional[str]: 语法正确返回None，否则返回错误信息
+        """
+        try:
+            self.index.parse_query(query.strip())
+            return None
+        except QuerySyntaxError as e:
+            return str(e)
+    
+    def query_key(self, query: str) -> Optional[Tuple]:
+        """
+        归一化的查询键：解析后的 (查询词元组, 匹配约束)，大小写、空白、停用词不同但语义相同的查询得到同一个键
+        
+        Args:
+            query: 查询字符串
+            
+        Returns:
+            Optional[Tuple]: 可哈希的查询键，语法错误时返回None
+        """
+        try:
+            query_words, clauses = self.index.parse_query(query.strip())
+            return tuple(query_words), _freeze(clauses)
+        except QuerySyntaxError:
+            return None
+    
+    def highlight(self, text: str, query: str, escape: bool = True) -> str:
+        """
+        按查询词高亮文本，所有查询词一次扫描完成，重叠时长词优先
+        
+        Args:
+            text: 待高亮的文本
+            query: 查询字符串
+            escape: 是否对文本做HTML转义(展示纯文本正文时为True)
+            
+        Returns:
+            str: 高亮后的HTML，查询有语法错误时只做转义
+        """
+        try:
+            query_words, clauses = self.index.parse_query(query.strip())
+            return highlight_keywords(text, query_keywords(query_words, clauses), escape=escape)
+        except QuerySyntaxError:
+            return html.escape(text) if escape else text
+    
+    def get_proximity_scores(self, query: str, doc_ids: List[str]) -> Dict[str, float]:
+        """
+        计算查询词在各文档中的邻近度特征
+        
+        Args:
+            query: 查询字符串
+            doc_ids: 文档ID列表
+            
+        Returns:
+            Dict[str, float]: {doc_id: 邻近度}，取值[0, 1]，全部查询词相邻出现时为1
+        """
+        try:
+            index = self.index
+            query_words, _ = index.parse_query(query)
+            return {doc_id: index.proximity_score(doc_id, query_words) for doc_id in doc_ids}
+        except Exception as e:
+            print(f"计算邻近度失败: {e}")
+            return {}
+    
+    def prefix_terms(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """
+        前缀查询词典
+        
+        Args:
+            prefix: 词项前缀
+            limit: 最多返回的词项数，None表示不限
+            
+        Returns:
+            List[str]: 以prefix开头的词项(升序)
+        """
+        try:
+            return self.index.prefix_terms(prefix.strip(), limit)
+        except Exception as e:
+            print(f"前缀查询失败: {e}")
+            return []
+    
+    def expand_wildcard(self, pattern: str) -> List[str]:
+        """
+        通配符展开
+        
+        Args:
+            pattern: 通配符模式，* 匹配任意个字符，? 匹配单个字符
+            
+        Returns:
+            List[str]: 匹配的词项(升序)，最多 MAX_WILDCARD_EXPANSIONS 个
+        """
+        try:
+            return self.index.expand_wildcard(pattern.strip())
+        except Exception as e:
+            print(f"通配符展开失败: {e}")
+            return []
+    
+    def suggest(self, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+        """
+        按词典联想查询词
+        
+        Args:
+            prefix: 已输入的前缀
+            k: 返回的候选数
+            
+        Returns:
+            List[Tuple[str, int]]: [(词项, 文档频率), ...]，按文档频率从高到低
+        """
+        try:
+            if not prefix.strip():
+                return []
+            return self.index.suggest(prefix.strip(), k)
+        except Exception as e:
+            print(f"查询联想失败: {e}")
+            return []
+    
     def get_document(self, doc_id: str) -> Optional[str]:
         """
         获取文档内容
@@ -159,6 +467,22 @@ class InvertedIndexService(IndexServiceInterface):
             print(f"获取文档失败: {e}")
             return None
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, str]:
+        """
+        批量获取文档内容，压缩文档库中同一块只解压一次
+        
+        Args:
+            doc_ids: 文档ID列表
+            
+        Returns:
+            Dict[str, str]: {doc_id: content}，不存在的文档不出现在结果中
+        """
+        try:
+            return self.index.get_documents(doc_ids)
+        except Exception as e:
+            print(f"批量获取文档失败: {e}")
+            return {}
+    
     def get_stats(self) -> Dict[str, Any]:
         """
         获取索引统计信息
@@ -167,7 +491,10 @@ class InvertedIndexService(IndexServiceInterface):
             Dict[str, Any]: 统计信息
         """
         try:
-            return self.index.get_index_stats()
+            snapshot = self._snapshot
+            stats = snapshot.index.get_index_stats()
+            stats['generation'] = snapshot.generation
+            return stats
         except Exception as e:
             print(f"获取统计信息失败: {e}")
             return {
@@ -181,16 +508,24 @@ class InvertedIndexService(IndexServiceInterface):
         保存索引到文件
         
         Args:
-            filepath: 文件路径，如果为None使用默认路径
+            filepath: 文件路径，如果为None使用默认路径；以.seg结尾时保存为二进制索引段。
+                分段索引保存到自身目录时只落盘内存段和墓碑，不重写已有的段文件
             
         Returns:
             bool: 是否保存成功
         """
         try:
             save_path = filepath or self.index_file
+            index = self.index
+            if isinstance(index, SegmentedIndex) and os.path.abspath(save_path) == os.path.abspath(index.directory):
+                index.commit()
+                return True
             # 确保目录存在
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            self.index.save_to_file(save_path)
+            if save_path.endswith(SEGMENT_SUFFIX):
+                index.save_segment(save_path)
+            else:
+                index.save_to_file(save_path)
             return True
         except Exception as e:
             print(f"保存索引失败: {e}")
@@ -198,7 +533,8 @@ class InvertedIndexService(IndexServiceInterface):
     
     def load_index(self, filepath: str) -> bool:
         """
-        从文件加载索引
+        从文件加载索引，按文件头自动识别JSON索引或二进制索引段(mmap打开)；
+        目录按分段索引打开。新索引在后台加载完成后才替换当前一代，加载期间查询照常进行
         
         Args:
             filepath: 文件路径
@@ -207,7 +543,35 @@ class InvertedIndexService(IndexServiceInterface):
             bool: 是否加载成功
         """
         try:
-            self.index.load_from_file(filepath)
+            index_format = detect_index_format(filepath)
+            current = self.index
+            if isinstance(current, SegmentedIndex) and index_format != "segments":
+                # 分段索引把导入的内容写成新段，自身带同步
+                with self._write_lock:
+                    if index_format == "segment":
+                        current.load_segment(filepath)
+                    else:
+                        current.load_from_file(filepath)
+                    self._publish(current)
+                return True
+            
+            if index_format == "segments":
+                if isinstance(current, SegmentedIndex):
+                    # 同一目录不能同时有两个实例在合并，只停掉旧实例的后台合并，查询仍可进行
+                    current.close()
+                index = SegmentedIndex(filepath)
+            else:
+                index = ShardedIndex(current.num_shards) if isinstance(current, ShardedIndex) else InvertedIndex()
+                try:
+                    if index_format == "segment":
+                        index.load_segment(filepath)
+                    else:
+                        index.load_from_file(filepath)
+                except Exception:
+                    if isinstance(index, ShardedIndex):
+                        index.close()
+                    raise
+            self.index = index
             return True
         except Exception as e:
             print(f"加载索引失败: {e}")
@@ -221,7 +585,13 @@ class InvertedIndexService(IndexServiceInterface):
             bool: 是否清空成功
         """
         try:
-            self.index = InvertedIndex()
+            with self._write_lock:
+                current = self.index
+                if isinstance(current, (SegmentedIndex, ShardedIndex)):
+                    current.clear()
+                    self._publish(current)
+                else:
+                    self._publish(InvertedIndex())
             return True
         except Exception as e:
             print(f"清空索引失败: {e}")
@@ -229,7 +599,7 @@ class InvertedIndexService(IndexServiceInterface):
     
     def batch_add_documents(self, documents: Dict[str, str]) -> int:
         """
-        批量添加文档
+        批量添加文档，在进程池中并行分词构建分片后合并，已存在的文档被新内容覆盖
         
         Args:
             documents: 文档字典 {doc_id: content}
@@ -237,25 +607,87 @@ class InvertedIndexService(IndexServiceInterface):
         Returns:
             int: 成功添加的文档数量
         """
-        success_count = 0
-        for doc_id, content in documents.items():
-            if self.add_document(doc_id, content):
-                success_count += 1
-        return success_count
+        try:
+            def add_documents(index):
+                if isinstance(index, (SegmentedIndex, ShardedIndex)):
+                    return index.add_documents(documents)
+                return bulk_add_documents(index, documents)
+            return self._apply_write(add_documents)['documents']
+        except Exception as e:
+            print(f"批量添加文档失败: {e}")
+            return 0
     
-    def search_doc_ids(self, query: str, top_k: int = 20) -> List[str]:
+    def search_doc_ids(self, query: str, top_k: int = 20, scorer: str = "tfidf",
+                       strategy: str = "taat") -> List[str]:
         """
-        搜索并只返回文档ID列表
+        搜索并只返回文档ID列表（不生成摘要）
         
         Args:
             query: 查询字符串
             top_k: 返回结果数量
+            scorer: 打分器 ("tfidf"/"bm25"/"bm25+")
+            strategy: 检索策略 ("taat"/"daat"/"wand"/"bmw")
             
         Returns:
             List[str]: 文档ID列表
         """
-        results = self.search(query, top_k)
-        return [doc_id for doc_id, score, summary in results]
+        return [doc_id for doc_id, score in self.retrieve(query, top_k, scorer=scorer, strategy=strategy)]
+    
+    def retrieve(self, query: str, top_k: int = 20, scorer: str = "tfidf", strategy: str = "taat",
+                 doc_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """
+        召回 (文档ID, 分数)，不生成摘要
+        
+        Args:
+            query: 查询字符串
+            top_k: 返回结果数量
+            scorer: 打分器 ("tfidf"/"bm25"/"bm25+")
+            strategy: 检索策略 ("taat"/"daat"/"wand"/"bmw")
+            doc_ids: 给出时只对这些文档打分(精排阶段对候选打分)，不再对全库检索
+            
+        Returns:
+            List[Tuple[str, float]]: 按分数降序的 [(doc_id, score), ...]
+        """
+        try:
+            if not query.strip():
+                return []
+            return self.index.retrieve(query.strip(), top_k=top_k, strategy=strategy, scorer=scorer,
+                                       doc_ids=doc_ids)
+        except QuerySyntaxError as e:
+            print(f"⚠️ {e}")
+            return []
+        except Exception as e:
+            print(f"搜索失败: {e}")
+            return []
+    
+    def candidate_set(self, query: str, scorer: str, results: List[Tuple[str, float]]) -> CandidateSet:
+        """
+        把召回结果包装成候选集，摘要和邻近度特征在排序阶段按需在当前索引快照上计算
+        
+        Args:
+            query: 查询字符串
+            scorer: 召回使用的打分器
+            results: [(doc_id, score), ...]
+            
+        Returns:
+            CandidateSet: 候选集，查询有语法错误时不带特征
+        """
+        index = self.index
+        try:
+            query_words, _ = index.parse_query(query.strip())
+        except QuerySyntaxError:
+            index, query_words = None, []
+        return CandidateSet(query.strip(), scorer, results, index, query_words)
+    
+    def retrieve_candidates(self, query: str, top_k: int = 20, scorer: str = "tfidf",
+                            doc_ids: Optional[List[str]] = None) -> CandidateSet:
+        """
+        召回候选集，参数同 retrieve
+        
+        Returns:
+            CandidateSet: 按分数降序的候选集
+        """
+        return self.candidate_set(query, scorer, self.retrieve(query, top_k, scorer=scorer, doc_ids=doc_ids))
     
     def get_document_count(self) -> int:
         """
@@ -280,6 +712,12 @@ class InvertedIndexService(IndexServiceInterface):
             print(f"获取所有文档失败: {e}")
             return {}
 
+def _freeze(node):
+    """把查询树中的列表转成元组，使其可哈希"""
+    if isinstance(node, (list, tuple)):
+        return tuple(_freeze(item) for item in node)
+    return node
+
 # 全局索引服务实例
 _index_service = None
 
@@ -2,12 +2,26 @@ import gradio as gr
 from datetime import datetime
 import json
 import os
+import re
 import tempfile
 
 def show_index_stats(search_engine):
     """显示索引统计信息"""
     try:
         stats = search_engine.get_stats()
+        segment_info = ""
+        if stats.get('index_format') == "segments":
+            segment_info = (f"<li><strong>分段:</strong> {stats.get('segment_count', 0)} 个段, "
+                            f"内存段 {stats.get('memory_docs', 0)} 篇, 墓碑 {stats.get('deleted_docs', 0)} 篇, "
+                            f"已合并 {stats.get('merges', 0)} 次</li>")
+        if stats.get('term_dictionary_bytes'):
+            segment_info += (f"<li><strong>词典:</strong> 前缀压缩 {stats['term_dictionary_bytes'] / 1024:.1f} KB "
+                             f"(词项字符串表 {stats.get('term_table_bytes', 0) / 1024:.1f} KB)</li>")
+        if stats.get('document_store_bytes') or stats.get('document_bytes'):
+            segment_info += (f"<li><strong>正文:</strong> 压缩文档库 {stats.get('document_store_bytes', 0) / 1024:.1f} KB (mmap), "
+                             f"内存中 {stats.get('document_bytes', 0) / 1024:.1f} KB</li>")
+        if stats.get('shard_count', 0) > 1:
+            segment_info += f"<li><strong>分片:</strong> {stats['shard_count']} 个分片(查询分发后归并)</li>"
         html_content = f"""
         <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; border-left: 4px solid #007bff;">
             <h4>📊 索引统计信息</h4>
@@ -15,6 +29,8 @@ def show_index_stats(search_engine):
                 <li><strong>总文档数:</strong> {stats.get('total_documents', 0)}</li>
                 <li><strong>总词项数:</strong> {stats.get('total_terms', 0)}</li>
                 <li><strong>平均文档长度:</strong> {stats.get('average_doc_length', 0):.2f}</li>
+                <li><strong>倒排链:</strong> {stats.get('total_postings', 0)} 个posting, {stats.get('posting_bytes', 0) / 1024:.1f} KB ({stats.get('bytes_per_posting', 0):.2f} 字节/posting)</li>
+                {segment_info}
             </ul>
             <p style="color: #6c757d; font-size: 0.9em;">统计时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
         </div>
@@ -88,11 +104,12 @@ def view_inverted_index(search_engine):
     """查看倒排索引内容"""
     try:
         index_service = search_engine.index_service
-        # 直接访问底层InvertedIndex对象
-        inverted_index = index_service.index.index
-        # 取前20个词项
-        items = list(inverted_index.items())[:20]
-        data = [[term, ', '.join(list(doc_ids)[:10])] for term, doc_ids in items]
+        # 直接访问底层索引对象(InvertedIndex、SegmentedIndex 或 ShardedIndex)
+        inverted_index = index_service.index
+        # 取前20个词项，倒排链解码后展示前10个文档ID
+        terms = inverted_index.get_terms(20)
+        data = [[term, ', '.join(doc_id for doc_id, _ in inverted_index.get_term_postings(term)[:10])]
+                for term in terms]
         return data
     except Exception as e:
         return [["错误", str(e)]]
@@ -141,6 +158,37 @@ def export_documents(search_engine):
     except Exception as e:
         return None, f"❌ 导出文档失败: {str(e)}"
 
+def add_document_from_tab(search_engine, doc_id, content):
+    """增量添加单篇文档(同ID覆盖)，分段索引下只写内存段"""
+    try:
+        doc_id = (doc_id or "").strip()
+        if not doc_id or not (content or "").strip():
+            return "❌ 请输入文档ID和内容"
+        if not search_engine.add_document(doc_id, content):
+            return f"❌ 添加文档失败: {doc_id}"
+        return f"✅ 文档已添加: {doc_id}\n总文档数: {search_engine.get_stats().get('total_documents', 0)}"
+    except Exception as e:
+        return f"❌ 添加文档失败: {str(e)}"
+
+def delete_document_from_tab(search_engine, doc_id):
+    """增量删除文档，多个ID用逗号或空白分隔；分段索引下已落盘的文档只记墓碑"""
+    try:
+        doc_ids = [d for d in re.split(r'[,，\s]+', doc_id or "") if d]
+        if not doc_ids:
+            return "❌ 请输入文档ID"
+        deleted = search_engine.batch_delete_documents(doc_ids)
+        if deleted == 0:
+            return f"❌ 文档不存在: {', '.join(doc_ids)}"
+        return f"✅ 已删除 {deleted}/{len(doc_ids)} 篇文档\n总文档数: {search_engine.get_stats().get('total_documents', 0)}"
+    except Exception as e:
+        return f"❌ 删除文档失败: {str(e)}"
+
+def commit_index(search_engine):
+    """保存索引：分段索引只落盘内存段和墓碑"""
+    if search_engine.save_index():
+        return "✅ 索引已保存"
+    return "❌ 索引保存失败"
+
 def import_documents_from_file(search_engine, file):
     """从文件导入文档并更新索引"""
     try:
@@ -162,16 +210,8 @@ def import_documents_from_file(search_engine, file):
         if not documents:
             return "❌ 文件中没有文档数据"
         
-        # 清空现有索引
-        search_engine.clear_index()
-        
-        # 批量添加新文档
-        success_count = search_engine.batch_add_documents(documents)
-        
-        # 保存更新后的索引
-        search_engine.save_index()
-        
-        return f"✅ 文档导入成功！\n导入文档数: {success_count}\n总文档数: {len(documents)}"
+        # 清空现有索引，并行批量导入新文档并保存
+        return search_engine.import_document_dict(documents)
     except Exception as e:
         return f"❌ 导入文档失败: {str(e)}"
 
@@ -226,6 +266,17 @@ def build_index_tab(search_engine):
                         )
                         import_docs_btn = gr.Button("📥 导入文档并更新索引", variant="primary")
                         import_result = gr.Textbox(label="导入结果", interactive=False)
+                    
+                    with gr.Column(scale=1):
+                        gr.Markdown("### ✍️ 增量写入")
+                        gr.HTML("<p style='color: #6c757d;'>逐篇添加/删除文档，无需重建索引；分段索引目录下写入内存段，满后自动落盘</p>")
+                        ingest_doc_id = gr.Textbox(label="文档ID(删除时可用逗号分隔多个)")
+                        ingest_content = gr.Textbox(label="文档内容", lines=4)
+                        with gr.Row():
+                            add_doc_btn = gr.Button("➕ 添加文档", variant="primary")
+                            delete_doc_btn = gr.Button("🗑️ 删除文档", variant="secondary")
+                            commit_btn = gr.Button("💾 保存索引", variant="secondary")
+                        ingest_result = gr.Textbox(label="写入结果", interactive=False)
         
         # 绑定事件
         # 索引信息相关
@@ -253,6 +304,23 @@ def build_index_tab(search_engine):
             outputs=[export_download, export_result]
         )
         
+        add_doc_btn.click(
+            fn=lambda doc_id, content: add_document_from_tab(search_engine, doc_id, content),
+            inputs=[ingest_doc_id, ingest_content],
+            outputs=ingest_result
+        )
+        
+        delete_doc_btn.click(
+            fn=lambda doc_id: delete_document_from_tab(search_engine, doc_id),
+            inputs=ingest_doc_id,
+            outputs=ingest_result
+        )
+        
+        commit_btn.click(
+            fn=lambda: commit_index(search_engine),
+            outputs=ingest_result
+        )
+        
         import_docs_btn.click(
             fn=lambda file: import_documents_from_file(search_engine, file),
             inputs=import_file,
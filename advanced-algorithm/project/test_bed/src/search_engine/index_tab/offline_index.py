@@ -5,239 +5,1370 @@
 负责倒排索引构建、文档管理、样本收集等离线任务
 """
 
-import jieba
 import re
+import sys
+import copy
 import json
 import math
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
 from typing import List, Dict, Tuple, Set
-from collections import defaultdict, Counter
+from collections import OrderedDict, Counter, defaultdict
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import os
 
+from ..tokenizer import Tokenizer, get_tokenizer
+from .posting_list import PostingList, SKIP_INTERVAL, intersect_sorted
+from .phrase_query import parse_phrase_query, match_positions, proximity_score
+from .boolean_query import is_boolean_query, parse_boolean_query, compile_query_tree, positive_words, restrict_to_docs
+from .segment import IndexSegment, DocumentStore, DocumentTable, DOCSTORE_SUFFIX, atomic_write
+from .term_dictionary import TermDictionary
+from .highlighter import HIGHLIGHT_TEMPLATE, highlight_keywords
+from .batch_search import DocTermMatrix
+
+# 支持的打分器
+SUPPORTED_SCORERS = ("tfidf", "bm25", "bm25+")
+
+# 支持的检索策略
+SUPPORTED_STRATEGIES = ("taat", "daat", "wand", "bmw")
+
+# Block-Max WAND 每个倒排块包含的posting数
+POSTING_BLOCK_SIZE = 64
+
+# 解码后倒排链/得分上界缓存的最大词项数
+POSTING_CACHE_SIZE = 4096
+
+# 按需计算的文档词项位置缓存的最大文档数(正排索引没有位置信息时使用)
+POSITION_CACHE_SIZE = 1024
+
+# 查询中一个通配符最多展开的词项数(超出时保留文档频率最高的)
+MAX_WILDCARD_EXPANSIONS = 64
+
+
+
+def validate_search_args(strategy: str, scorer: str):
+    """校验检索策略和打分器，不支持时抛出ValueError"""
+    if scorer not in SUPPORTED_SCORERS:
+        raise ValueError(f"不支持的打分器: {scorer}")
+    if strategy not in SUPPORTED_STRATEGIES:
+        raise ValueError(f"不支持的检索策略: {strategy}")
+
+
+class _PostingCursor:
+    """WAND遍历用的倒排链游标，倒排链按内部文档编号有序"""
+    
+    __slots__ = ('docs', 'scores', 'weight', 'upper_bound', 'block_last_docs', 'block_maxes',
+                 'pos', 'doc')
+    
+    def __init__(self, docs: List[int], scores: List[float], weight: float, max_score: float,
+                 block_last_docs: List[int], block_maxes: List[float]):
+        self.docs = docs
+        self.scores = scores  # 每个posting的词项得分(未乘IDF)
+        self.weight = weight
+        self.upper_bound = weight * max_score  # 整条倒排链的得分上界
+        self.block_last_docs = block_last_docs
+        self.block_maxes = block_maxes
+        self.pos = 0
+        self.doc = docs[0] if docs else None  # None 表示倒排链已遍历完
+    
+    @property
+    def score(self) -> float:
+        return self.weight * self.scores[self.pos]
+    
+    def _seek(self, pos: int):
+        self.pos = pos
+        self.doc = self.docs[pos] if pos < len(self.docs) else None
+    
+    def next(self):
+        """移动到下一个posting"""
+        self._seek(self.pos + 1)
+    
+    def advance_to(self, target: int):
+        """移动到第一个文档编号 >= target 的posting"""
+        if self.doc is not None and self.doc < target:
+            self._seek(bisect_left(self.docs, target, self.pos + 1))
+    
+    def advance_past(self, target: int):
+        """移动到第一个文档编号 > target 的posting"""
+        if self.doc is not None and self.doc <= target:
+            self._seek(bisect_right(self.docs, target, self.pos + 1))
+    
+    def block_bound(self, target: int) -> Tuple:
+        """返回包含target的块的 (块内最后一个文档编号, 块得分上界)，只查块元数据，不移动游标
+        
+        target超出倒排链末尾时返回 (None, 0.0)，表示该词项对target之后的文档没有贡献。
+        """
+        block = bisect_left(self.block_last_docs, target, self.pos // POSTING_BLOCK_SIZE)
+        if block >= len(self.block_last_docs):
+            return None, 0.0
+        return self.block_last_docs[block], self.weight * self.block_maxes[block]
+
+
+def compute_idf(scorer: str, total_docs: int, df: int) -> float:
+    """按打分器计算IDF：TF-IDF 用 log(N/df)，BM25/BM25+ 用 log(1+(N-df+0.5)/(df+0.5))"""
+    if scorer == "tfidf":
+        return math.log(total_docs / df)
+    return math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+
+
+class IdfTable(Mapping):
+    """词项 -> IDF 的只读视图，按刷新时的文档数N和词项当前的文档频率现算
+    
+    N 每次写入都会变化，预先为全部词项算好的IDF表要整表重算；
+    现算只计算查询用到的词项，刷新打分表时不需要遍历词典。
+    """
+    
+    def __init__(self, scorer: str, postings: Dict[str, PostingList], total_docs: int):
+        self._scorer = scorer
+        self._postings = postings
+        self._total_docs = total_docs
+    
+    def __getitem__(self, word: str) -> float:
+        posting_list = self._postings.get(word)
+        if not posting_list:
+            raise KeyError(word)
+        return compute_idf(self._scorer, self._total_docs, len(posting_list))
+    
+    def __contains__(self, word) -> bool:
+        return bool(self._postings.get(word))
+    
+    def __iter__(self):
+        return (word for word, posting_list in self._postings.items() if posting_list)
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class _LengthBuffer:
+    """文档长度表的缓冲区(第0行为文档长度，第1行为其倒数)，容量按倍数增长
+    
+    写时复制的副本与原索引共享同一个缓冲区，新文档的条目直接写在尾部；
+    filled 为已写入的前缀长度，只有持有完整前缀的索引才能原地追加，否则先复制。
+    """
+    
+    __slots__ = ('data', 'filled')
+    
+    def __init__(self, capacity: int = 0):
+        self.data = np.zeros((2, capacity))
+        self.filled = 0
+
+
+def _lru_get(cache: OrderedDict, key):
+    """取LRU缓存项并移到最近使用端
+
+    已发布的快照由多个查询线程无锁读取，缓存项可能在 get 之后被其他线程淘汰，此时仍返回取到的值。
+    """
+    value = cache.get(key)
+    if value is not None:
+        try:
+            cache.move_to_end(key)
+        except KeyError:
+            pass
+    return value
+
+
+def _lru_put(cache: OrderedDict, key, value, max_size: int):
+    """写入LRU缓存，超出容量时淘汰最久未用的项；并发淘汰时缓存可能已空，忽略即可"""
+    cache[key] = value
+    while len(cache) > max_size:
+        try:
+            cache.popitem(last=False)
+        except KeyError:
+            break
+
+
+def compute_term_bounds(doc_nums: np.ndarray, scores: np.ndarray) -> Tuple[float, List[int], List[float]]:
+    """计算倒排链的得分上界 (整链最大值, 每块最后文档编号, 每块最大值)"""
+    block_starts = np.arange(0, len(doc_nums), POSTING_BLOCK_SIZE)
+    block_last_docs = doc_nums[np.minimum(block_starts + POSTING_BLOCK_SIZE, len(doc_nums)) - 1].tolist()
+    block_maxes = np.maximum.reduceat(scores, block_starts).tolist()
+    return max(block_maxes), block_last_docs, block_maxes
+
+
+def select_snippet_window(occurrences: List[Tuple[int, int, str]], max_length: int) -> Tuple[int, int]:
+    """在按起点排序的查询词出现 (起点, 终点, 词项) 上双指针线性扫描，
+    选出字符跨度不超过max_length、覆盖不同查询词最多(其次出现次数最多)的窗口，
+    返回窗口内第一个和最后一个出现的下标。"""
+    counts = Counter()
+    covered = 0
+    left = 0
+    best_key, best = None, (0, 0)
+    for right, (_, end, word) in enumerate(occurrences):
+        if counts[word] == 0:
+            covered += 1
+        counts[word] += 1
+        while left < right and end - occurrences[left][0] > max_length:
+            left_word = occurrences[left][2]
+            counts[left_word] -= 1
+            if counts[left_word] == 0:
+                covered -= 1
+            left += 1
+        key = (covered, right - left + 1)
+        if best_key is None or key > best_key:
+            best_key, best = key, (left, right)
+    return best
+
+
+def unscored_matches(allowed: np.ndarray, ranked: List[Tuple[int, float]], limit: int) -> List[Tuple[int, float]]:
+    """满足匹配约束但不含打分词的文档(如只有NOT或id:限定的布尔查询)，按文档编号顺序以0分补足"""
+    seen = {doc_num for doc_num, _ in ranked}
+    extra = []
+    for doc_num in allowed.tolist():
+        if len(extra) >= limit:
+            break
+        if doc_num not in seen:
+            extra.append((doc_num, 0.0))
+    return extra
+
+
+def rank_query_terms(strategy: str, terms: List[Tuple], top_k: int) -> List[Tuple[int, float]]:
+    """按检索策略从查询词的倒排链中选出top_k (文档编号, 分数)
+    
+    terms 中每一项为 (查询词权重, 文档编号数组, 词项得分数组, 得分上界)，
+    得分上界只在 wand/bmw 策略下使用，由 compute_term_bounds 计算。
+    """
+    if strategy == "daat":
+        return _daat_top_k(terms, top_k)
+    if strategy == "wand":
+        return _wand_top_k(terms, top_k, block_max=False)
+    if strategy == "bmw":
+        return _wand_top_k(terms, top_k, block_max=True)
+    return _taat_top_k(terms, top_k)
+
+
+def _taat_top_k(terms: List[Tuple], top_k: int) -> List[Tuple[int, float]]:
+    """Term-at-a-time：逐个查询词处理倒排链，按文档编号把分数累加起来"""
+    if not terms:
+        return []
+    if len(terms) == 1:
+        weight, doc_nums, scores, _ = terms[0]
+        totals = weight * scores
+    else:
+        doc_nums, slots = np.unique(np.concatenate([term[1] for term in terms]), return_inverse=True)
+        weighted = np.concatenate([weight * scores for weight, _, scores, _ in terms])
+        totals = np.bincount(slots, weights=weighted, minlength=len(doc_nums))
+    
+    mask = totals > 0
+    doc_nums, totals = doc_nums[mask], totals[mask]
+    if len(totals) > top_k:
+        # 只对前top_k做部分选择，不做全量排序
+        selected = np.argpartition(-totals, top_k - 1)[:top_k]
+        doc_nums, totals = doc_nums[selected], totals[selected]
+    order = np.lexsort((doc_nums, -totals))
+    return list(zip(doc_nums[order].tolist(), totals[order].tolist()))
+
+
+def _daat_top_k(terms: List[Tuple], top_k: int) -> List[Tuple[int, float]]:
+    """Document-at-a-time：多路归并有序倒排链，每篇文档一次性算完整分数"""
+    cursors = []
+    # 游标: (当前文档编号, 词序号, 词项得分, 权重, 倒排链迭代器)，词序号保证元组可比较
+    for term_no, (weight, doc_nums, scores, _) in enumerate(terms):
+        postings = zip(doc_nums.tolist(), scores.tolist())
+        first = next(postings, None)
+        if first is not None:
+            cursors.append((first[0], term_no, first[1], weight, postings))
+    heapq.heapify(cursors)
+    
+    # 容量为top_k的小顶堆，堆顶是当前第k名
+    top_heap = []
+    while cursors:
+        doc_num = cursors[0][0]
+        score = 0.0
+        while cursors and cursors[0][0] == doc_num:
+            _, term_no, term_score, weight, postings = cursors[0]
+            score += weight * term_score
+            nxt = next(postings, None)
+            if nxt is None:
+                heapq.heappop(cursors)
+            else:
+                heapq.heapreplace(cursors, (nxt[0], term_no, nxt[1], weight, postings))
+        
+        if score <= 0:
+            continue
+        if len(top_heap) < top_k:
+            heapq.heappush(top_heap, (score, -doc_num))
+        elif score > top_heap[0][0]:
+            heapq.heapreplace(top_heap, (score, -doc_num))
+    
+    return [(-neg_doc, score) for score, neg_doc in sorted(top_heap, reverse=True)]
+
+
+def _wand_top_k(terms: List[Tuple], top_k: int, block_max: bool = True) -> List[Tuple[int, float]]:
+    """WAND / Block-Max WAND 动态剪枝
+    
+    游标按当前文档编号排序，累加得分上界找到第一个可能超过当前第k名分数(阈值)的pivot，
+    pivot之前的文档无需打分直接跳过；Block-Max模式下再用pivot所在块的块上界复核，
+    块上界不够时整块跳过。只有可能进入top_k的文档才会完整打分。
+    """
+    cursors = [_PostingCursor(doc_nums.tolist(), scores.tolist(), weight, *bounds)
+               for weight, doc_nums, scores, bounds in terms if len(doc_nums)]
+    
+    # 容量为top_k的小顶堆，堆顶是当前第k名
+    top_heap = []
+    threshold = 0.0
+    doc_key = attrgetter('doc')
+    while cursors:
+        cursors.sort(key=doc_key)
+        
+        # 找pivot：上界累加和首次超过阈值的位置
+        pivot = -1
+        accumulated = 0.0
+        for i, cursor in enumerate(cursors):
+            accumulated += cursor.upper_bound
+            if accumulated > threshold:
+                pivot = i
+                break
+        if pivot < 0:
+            break
+        pivot_doc = cursors[pivot].doc
+        # 同样停在pivot文档上的游标一并参与
+        while pivot + 1 < len(cursors) and cursors[pivot + 1].doc == pivot_doc:
+            pivot += 1
+        candidates = cursors[:pivot + 1]
+        
+        if block_max:
+            block_bound = 0.0
+            min_block_last = None
+            for cursor in candidates:
+                block_last, bound = cursor.block_bound(pivot_doc)
+                block_bound += bound
+                if block_last is not None and (min_block_last is None or block_last < min_block_last):
+                    min_block_last = block_last
+            if block_bound <= threshold:
+                # [pivot_doc, 下一个边界) 内的文档都不可能超过阈值，整段跳过
+                if pivot + 1 < len(cursors) and cursors[pivot + 1].doc <= min_block_last:
+                    next_doc = cursors[pivot + 1].doc
+                    for cursor in candidates:
+                        cursor.advance_to(next_doc)
+                else:
+                    for cursor in candidates:
+                        cursor.advance_past(min_block_last)
+                cursors = [cursor for cursor in cursors if cursor.doc is not None]
+                continue
+        
+        if cursors[0].doc == pivot_doc:
+            # 所有候选游标都停在pivot上，完整打分
+            score = 0.0
+            for cursor in candidates:
+                score += cursor.score
+                cursor.next()
+            if len(top_heap) < top_k:
+                if score > 0:
+                    heapq.heappush(top_heap, (score, -pivot_doc))
+            elif score > threshold:
+                heapq.heapreplace(top_heap, (score, -pivot_doc))
+            if len(top_heap) == top_k:
+                threshold = top_heap[0][0]
+        else:
+            # pivot之前的文档不可能进入top_k，直接把前面的游标跳到pivot
+            for cursor in cursors[:pivot]:
+                cursor.advance_to(pivot_doc)
+        cursors = [cursor for cursor in cursors if cursor.doc is not None]
+    
+    return [(-neg_doc, score) for score, neg_doc in sorted(top_heap, reverse=True)]
+
+
 class InvertedIndex:
-    """倒排索引类"""
+    """倒排索引类
     
-    def __init__(self):
-        self.index = defaultdict(set)  # 词项 -> 文档ID集合
-        self.doc_lengths = {}          # 文档ID -> 文档长度
-        self.documents = {}            # 文档ID -> 文档内容
-        self.term_freq = defaultdict(dict)  # 词项 -> {文档ID: 词频}
-        self.doc_freq = defaultdict(int)    # 词项 -> 文档频率
-        
-        # 停用词
-        self.stop_words = {
-            '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这'
-        }
+    文档在内部使用递增分配的整数编号，倒排链为差分+varint压缩的 PostingList，
+    文档长度等按编号存放在紧凑数组中，外部接口仍使用字符串文档ID。
     
-    def preprocess_text(self, text: str) -> List[str]:
-        """文本预处理"""
-        # 分词
-        words = jieba.lcut(text.lower())
+    load_segment 打开二进制索引段后，postings/documents 等直接是mmap上的只读视图；
+    第一次写入时再把索引段整体转成内存结构。
+    """
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75, delta: float = 1.0, tokenizer: Tokenizer = None):
+        self.postings = {}             # 词项 -> PostingList
+        self.doc_ids = []              # 内部文档编号 -> 文档ID (已删除为None)
+        self.doc_nums = {}             # 文档ID -> 内部文档编号
+        self.doc_lengths = array('I')  # 内部文档编号 -> 文档长度
+        self.documents = DocumentTable()  # 文档ID -> 文档内容(落盘的正文在压缩文档库中，按需解压)
         
-        # 过滤停用词和短词
-        words = [word for word in words if len(word) > 1 and word not in self.stop_words]
+        # 正排索引：删除/更新时直接按文档的词项ID找到要修改的倒排链，不再重新分词；
+        # 同时按词项分组记录词元位置，生成摘要时直接定位查询词
+        self.term_ids = {}             # 词项 -> 词项ID
+        self.term_list = []            # 词项ID -> 词项
+        self.forward_index = []        # 内部文档编号 -> (升序词项ID数组, 位置分组偏移数组, 位置数组或None)，已删除为None；整体为None时按倒排链重建
+        self.doc_spans = []            # 内部文档编号 -> 词元字符区间 [起点0, 终点0, 起点1, ...]，按词元位置排列
+        self._positions_cache = OrderedDict()  # 内部文档编号 -> {词项: 位置列表}，正排索引缺少位置时按需计算
+        self.segment = None            # 只读打开的二进制索引段(IndexSegment)，内存索引时为None
         
-        return words
+        # BM25参数
+        self.k1 = k1
+        self.b = b
+        self.delta = delta  # BM25+ 的下界补偿
+        
+        # 预计算的打分表
+        self.total_doc_length = 0      # 所有文档长度之和
+        self.idf_tables = {}           # 打分器 -> {词项: IDF}
+        self.inv_doc_lengths = np.zeros(0)  # 内部文档编号 -> 1/文档长度 (TF-IDF长度归一化)
+        self.bm25_norms = None         # 内部文档编号 -> k1*(1-b+b*dl/avgdl)，只有索引段预存；内存索引查询时按avgdl现算
+        self._lengths = np.zeros(0)    # 内部文档编号 -> 文档长度(浮点)，用于按avgdl现算归一化
+        self._avg_doc_length = 0.0     # 刷新打分表时的平均文档长度
+        self._length_buffer = _LengthBuffer()  # _lengths 和 inv_doc_lengths 所在的缓冲区
+        self._tables_dirty = True      # 依赖N/avgdl的表是否需要刷新
+        self._tables_version = 0       # 打分表版本，用于判断缓存的得分上界是否过期
+        
+        # 解码后的倒排链和WAND得分上界缓存(LRU)，避免每次查询重复解码
+        self._decoded_postings = OrderedDict()  # 词项 -> (文档编号数组, 词频数组)
+        self._term_bounds = OrderedDict()       # (词项, 打分器) -> (打分表版本, (整链上界, 块尾文档编号, 块上界))
+        self._term_dictionary = None            # (打分表版本, TermDictionary)，前缀/通配符/联想查询用的有序词典
+        self._doc_term_matrices = {}            # 打分器 -> (打分表版本, DocTermMatrix)，批量检索用
+        
+        # 写时复制：copy() 之后倒排链与原索引共享，本索引已复制过(可原地修改)的词项记在这里；None表示全部独占
+        self._owned_postings = None
+        
+        # 分词器(含停用词过滤和分词缓存)，默认与数据服务、CTR模型共享同一个
+        self.tokenizer = tokenizer or get_tokenizer()
+    
+    @property
+    def stop_words(self):
+        """停用词"""
+        return self.tokenizer.stop_words
+    
+    @stop_words.setter
+    def stop_words(self, stop_words):
+        # 停用词不同的索引使用自己的分词器，避免共享缓存中的分词结果错用
+        if frozenset(stop_words) != self.tokenizer.stop_words:
+            self.tokenizer = Tokenizer(stop_words=stop_words)
+    
+    def preprocess_text(self, text: str) -> List[str]:
+        """文本预处理"""
+        return [word for word, _, _ in self.tokenize_with_offsets(text)]
+    
+    def tokenize_with_offsets(self, text: str) -> List[Tuple[str, int, int]]:
+        """分词并过滤停用词和短词，返回 (词项, 起点, 终点)，区间为原文中的字符偏移"""
+        return self.tokenizer.tokenize_with_offsets(text)
     
     def add_document(self, doc_id: str, content: str):
-        """添加文档到索引"""
+        """添加文档到索引，文档ID已存在时覆盖旧内容
+        
+        先分词再替换，分词出错时旧版本保持不变。
+        """
+        # 预处理文本，记录每个词元的位置和字符区间
+        tokens = self.tokenize_with_offsets(content)
+        term_positions = defaultdict(list)
+        spans = array('I')
+        for position, (word, start, end) in enumerate(tokens):
+            term_positions[word].append(position)
+            spans.append(start)
+            spans.append(end)
+        
+        self._materialize_segment()
+        self._ensure_forward_index()
+        if doc_id in self.doc_nums:
+            self.batch_delete_documents([doc_id])
+        
         # 保存原始文档
         self.documents[doc_id] = content
         
-        # 预处理文本
-        words = self.preprocess_text(content)
+        # 分配内部文档编号，编号递增，倒排链只需在尾部追加
+        doc_num = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_nums[doc_id] = doc_num
         
         # 计算文档长度
-        self.doc_lengths[doc_id] = len(words)
-        
-        # 统计词频
-        word_freq = Counter(words)
+        self.doc_lengths.append(len(tokens))
+        self.total_doc_length += len(tokens)
+        self.doc_spans.append(spans)
         
         # 更新倒排索引
-        for word, freq in word_freq.items():
-            self.index[word].add(doc_id)
-            self.term_freq[word][doc_id] = freq
+        for word, positions in term_positions.items():
+            posting_list = self._writable_posting_list(word)
+            posting_list.append(doc_num, len(positions))
+            self._decoded_postings.pop(word, None)
         
-        # 更新文档频率
-        for word in word_freq:
-            self.doc_freq[word] = len(self.index[word])
+        # 正排索引按词项ID升序排列，位置按词项分组
+        terms = sorted((self._get_term_id(word), word) for word in term_positions)
+        term_ids = array('I', (term_id for term_id, _ in terms))
+        offsets = array('I', [0])
+        positions = array('I')
+        for _, word in terms:
+            positions.extend(term_positions[word])
+            offsets.append(len(positions))
+        self.forward_index.append((term_ids, offsets, positions))
+        
+        self._tables_dirty = True
+    
+    def update_document(self, doc_id: str, content: str) -> bool:
+        """用新内容原子替换已有文档，文档不存在时返回False"""
+        if doc_id not in self.doc_nums:
+            return False
+        self.add_document(doc_id, content)
+        return True
     
     def delete_document(self, doc_id: str) -> bool:
         """删除文档从索引"""
-        if doc_id not in self.documents:
-            return False
+        return self.batch_delete_documents([doc_id]) == 1
+    
+    def batch_delete_documents(self, doc_ids: List[str]) -> int:
+        """批量删除文档，返回实际删除的文档数
         
-        # 获取文档的词频信息
-        content = self.documents[doc_id]
-        words = self.preprocess_text(content)
-        word_freq = Counter(words)
+        按正排索引找到每篇文档的词项，同一词项的倒排链只重写一次。
+        """
+        doc_ids = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id in self.doc_nums]
+        if not doc_ids:
+            return 0
+        
+        self._materialize_segment()
+        self._ensure_forward_index()
+        removed = defaultdict(set)  # 词项ID -> 要移除的内部文档编号
+        for doc_id in doc_ids:
+            doc_num = self.doc_nums.pop(doc_id)
+            for term_id in self.forward_index[doc_num][0]:
+                removed[term_id].add(doc_num)
+            
+            # 删除文档相关数据，内部编号不复用
+            self.forward_index[doc_num] = None
+            self.doc_spans[doc_num] = array('I')
+            self._positions_cache.pop(doc_num, None)
+            del self.documents[doc_id]
+            self.doc_ids[doc_num] = None
+            self.total_doc_length -= self.doc_lengths[doc_num]
+            self.doc_lengths[doc_num] = 0
         
         # 从倒排索引中移除文档
-        for word in word_freq:
-            if word in self.index:
-                self.index[word].discard(doc_id)
-                # 如果词项没有文档了，删除该词项
-                if not self.index[word]:
-                    del self.index[word]
-                    if word in self.term_freq:
-                        del self.term_freq[word]
-                    if word in self.doc_freq:
-                        del self.doc_freq[word]
-                else:
-                    # 更新词频信息
-                    if word in self.term_freq and doc_id in self.term_freq[word]:
-                        del self.term_freq[word][doc_id]
-                    # 更新文档频率
-                    if word in self.doc_freq:
-                        self.doc_freq[word] = len(self.index[word])
-        
-        # 删除文档相关数据
-        del self.documents[doc_id]
-        if doc_id in self.doc_lengths:
-            del self.doc_lengths[doc_id]
+        for term_id, doc_nums in removed.items():
+            word = self.term_list[term_id]
+            self._decoded_postings.pop(word, None)
+            if word not in self.postings:
+                continue
+            posting_list = self._writable_posting_list(word)
+            posting_list.remove_many(doc_nums)
+            # 如果词项没有文档了，删除该词项
+            if not posting_list:
+                del self.postings[word]
         
-        return True
+        self._tables_dirty = True
+        return len(doc_ids)
     
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float, str]]:
-        """搜索文档"""
-        # 预处理查询
-        query_words = self.preprocess_text(query)
+    def merge_shard(self, shard: 'InvertedIndex'):
+        """把另一个内存索引(如并行构建的分片)的全部文档追加到本索引
         
-        if not query_words:
-            return []
+        分片的内部文档编号整体平移到本索引末尾，倒排链直接拼接编码字节，
+        正排索引只需把分片的词项ID映射为本索引的词项ID，不重新分词。
+        分片中的文档ID不能已存在于本索引。
+        """
+        duplicated = [doc_id for doc_id in shard.doc_nums if doc_id in self.doc_nums]
+        if duplicated:
+            raise ValueError(f"分片中的文档已存在: {duplicated[:5]}")
+        self._materialize_segment()
+        self._ensure_forward_index()
+        shard._materialize_segment()
+        shard._ensure_forward_index()
+        offset = len(self.doc_ids)
+        
+        self.doc_ids.extend(shard.doc_ids)
+        for doc_id, doc_num in shard.doc_nums.items():
+            self.doc_nums[doc_id] = doc_num + offset
+        self.documents.update(shard.documents)
+        self.doc_lengths.extend(shard.doc_lengths)
+        self.total_doc_length += shard.total_doc_length
+        self.doc_spans.extend(shard.doc_spans)
+        
+        for word, posting_list in shard.postings.items():
+            self._writable_posting_list(word).extend(posting_list, offset)
+            self._decoded_postings.pop(word, None)
+        
+        # 分片词项ID -> 本索引词项ID，映射后正排索引按新ID重新排序
+        remap = [self._get_term_id(word) for word in shard.term_list]
+        monotonic = all(a < b for a, b in zip(remap, remap[1:]))
+        for entry in shard.forward_index:
+            if entry is None:
+                self.forward_index.append(None)
+                continue
+            term_ids, offsets, positions = entry
+            if monotonic:
+                # 映射保持顺序(如合并进空索引)，位置分组无需调整
+                self.forward_index.append((array('I', (remap[term_id] for term_id in term_ids)), offsets, positions))
+                continue
+            order = sorted(range(len(term_ids)), key=lambda i: remap[term_ids[i]])
+            new_offsets = array('I', [0])
+            new_positions = array('I') if positions is not None else None
+            for i in order:
+                if new_positions is not None:
+                    new_positions.extend(positions[offsets[i]:offsets[i + 1]])
+                new_offsets.append(new_offsets[-1] + offsets[i + 1] - offsets[i])
+            self.forward_index.append((array('I', (remap[term_ids[i]] for i in order)), new_offsets, new_positions))
         
-        # 计算TF-IDF分数
-        scores = {}
+        self._tables_dirty = True
+    
+    def copy(self) -> 'InvertedIndex':
+        """写时复制的副本：修改副本不影响本索引，用于生成下一代索引快照
+        
+        只复制文档表、词典和正排索引等顶层容器(指针复制)，倒排链在副本第一次修改该词项时才复制；
+        打分表和解码缓存直接共享，写入后由副本自己刷新。
+        """
+        clone = copy.copy(self)
+        if self.segment is None:
+            # mmap索引段上的结构只读，副本写入前整体转成内存结构，无需复制
+            clone.postings = dict(self.postings)
+            clone.doc_ids = list(self.doc_ids)
+            clone.doc_nums = dict(self.doc_nums)
+            clone.doc_lengths = array(self.doc_lengths.typecode, self.doc_lengths)
+            clone.documents = self.documents.copy()
+            clone.doc_spans = list(self.doc_spans)
+            clone.term_ids = dict(self.term_ids)
+            clone.term_list = list(self.term_list)
+            clone.forward_index = list(self.forward_index) if self.forward_index is not None else None
+            self._owned_postings = set()
+        clone._owned_postings = set()
+        clone._positions_cache = OrderedDict(self._positions_cache)
+        clone._decoded_postings = OrderedDict(self._decoded_postings)
+        clone._term_bounds = OrderedDict(self._term_bounds)
+        clone._doc_term_matrices = {}
+        return clone
+    
+    def _writable_posting_list(self, word: str) -> PostingList:
+        """取可原地修改的倒排链，与其他副本共享时先复制一份，词项不存在时新建"""
+        posting_list = self.postings.get(word)
+        if posting_list is None:
+            posting_list = self.postings[word] = PostingList()
+        elif self._owned_postings is not None and word not in self._owned_postings:
+            posting_list = self.postings[word] = posting_list.copy()
+        else:
+            return posting_list
+        if self._owned_postings is not None:
+            self._owned_postings.add(word)
+        return posting_list
+    
+    def get_document_terms(self, doc_id: str) -> Dict[str, int]:
+        """从正排索引获取文档的词项和词频"""
+        if doc_id not in self.doc_nums:
+            return {}
+        self._ensure_forward_index()
+        term_ids, offsets, _ = self.forward_index[self.doc_nums[doc_id]]
+        return {self.term_list[term_id]: offsets[i + 1] - offsets[i] for i, term_id in enumerate(term_ids)}
+    
+    def _get_term_id(self, word: str) -> int:
+        term_id = self.term_ids.get(word)
+        if term_id is None:
+            term_id = self.term_ids[word] = len(self.term_list)
+            self.term_list.append(word)
+        return term_id
+    
+    def _ensure_forward_index(self):
+        """正排索引失效(加载或直接构造倒排链)时按倒排链重建，不需要分词；
+        重建的正排索引不含位置，位置在用到时按文档单独计算。
+        
+        已发布的快照也会在查询时触发重建：先在局部变量中建好，最后才替换 forward_index，
+        其他查询线程要么看到旧的(None)要么看到完整的新正排索引；并发重建的结果相同，谁后写都一样。
+        """
+        if self.forward_index is not None:
+            return
+        word_ids = {}
+        term_ids = [array('I') if doc_id is not None else None for doc_id in self.doc_ids]
+        offsets = [array('I', [0]) if doc_id is not None else None for doc_id in self.doc_ids]
+        for term_id, word in enumerate(self.postings):
+            word_ids[word] = term_id
+            for doc_num, tf in self.postings[word].items():
+                term_ids[doc_num].append(term_id)
+                offsets[doc_num].append(offsets[doc_num][-1] + tf)
+        forward_index = [(ids, offs, None) if ids is not None else None
+                         for ids, offs in zip(term_ids, offsets)]
+        self.term_ids = word_ids
+        self.term_list = list(word_ids)
+        self._positions_cache = OrderedDict()
+        self.forward_index = forward_index
+    
+    def get_term_positions(self, doc_id: str, words: List[str]) -> Dict[str, List[int]]:
+        """获取词项在文档中的位置(第几个词元) {词项: [位置, ...]}，不在文档中的词项不返回"""
+        doc_num = self.doc_nums.get(doc_id)
+        if doc_num is None:
+            return {}
+        return self._term_positions(doc_num, words)
+    
+    def _term_positions(self, doc_num: int, words) -> Dict[str, List[int]]:
+        """正排索引带位置时二分查找词项ID直接切出位置，代价与出现次数成正比"""
+        entry = self.forward_index[doc_num] if self.forward_index is not None else None
+        if entry is not None and entry[2] is not None:
+            term_ids, offsets, positions = entry
+            result = {}
+            for word in words:
+                term_id = self.term_ids.get(word)
+                if term_id is None:
+                    continue
+                i = bisect_left(term_ids, term_id)
+                if i < len(term_ids) and term_ids[i] == term_id:
+                    result[word] = positions[offsets[i]:offsets[i + 1]].tolist()
+            return result
+        
+        all_positions = _lru_get(self._positions_cache, doc_num)
+        if all_positions is None:
+            all_positions = self._compute_doc_positions(doc_num)
+            _lru_put(self._positions_cache, doc_num, all_positions, POSITION_CACHE_SIZE)
+        return {word: all_positions[word] for word in words if word in all_positions}
+    
+    def _compute_doc_positions(self, doc_num: int) -> Dict[str, List[int]]:
+        """由存储的字符区间切出词元得到位置；没有区间(旧格式索引)时对文档分词一次"""
+        positions = defaultdict(list)
+        spans = self._get_doc_spans(doc_num)
+        content = self.documents[self.doc_ids[doc_num]]
+        for position in range(len(spans) // 2):
+            positions[content[spans[2 * position]:spans[2 * position + 1]].lower()].append(position)
+        return dict(positions)
+    
+    def _get_doc_spans(self, doc_num: int):
+        """文档的词元字符区间；区间数与文档长度不符(旧格式索引)时重新分词并补上"""
+        spans = self.doc_spans[doc_num]
+        if len(spans) == 2 * self.doc_lengths[doc_num]:
+            return spans
+        spans = array('I')
+        for _, start, end in self.tokenize_with_offsets(self.documents[self.doc_ids[doc_num]]):
+            spans.append(start)
+            spans.append(end)
+        if self.segment is None:
+            self.doc_spans[doc_num] = spans
+        return spans
+    
+    def refresh_scoring_tables(self):
+        """刷新依赖全局统计(文档数N、平均长度avgdl)的打分表
+        
+        写入只标记失效，写入后(或构建/加载完成时)统一刷新一次，代价只与新增的文档数有关：
+        IDF 按查询词现算(IdfTable)，avgdl 由 total_doc_length 增量维护，
+        BM25长度归一化在查询时按 avgdl 现算，长度表只追加新文档的条目。
+        """
         total_docs = len(self.documents)
+        self._avg_doc_length = self.total_doc_length / total_docs if total_docs > 0 else 0.0
         
-        for doc_id in self.documents:
-            score = 0
-            for word in query_words:
-                if word in self.index and doc_id in self.index[word]:
-                    # TF
-                    tf = self.term_freq[word][doc_id] / self.doc_lengths[doc_id]
-                    # IDF
-                    idf = math.log(total_docs / self.doc_freq[word])
-                    # TF-IDF
-                    score += tf * idf
-            
-            if score > 0:
-                scores[doc_id] = score
+        bm25_idf = IdfTable("bm25", self.postings, total_docs)
+        self.idf_tables = {'tfidf': IdfTable("tfidf", self.postings, total_docs), 'bm25': bm25_idf, 'bm25+': bm25_idf}
+        self._extend_length_tables()
+        self.bm25_norms = None
+        
+        self._tables_dirty = False
+        self._tables_version += 1
+    
+    def _extend_length_tables(self):
+        """只为上次刷新之后新增的文档追加长度表条目
+        
+        已删除文档不在任何倒排链中，它们在表中的旧值不会再被读到，无需改写；
+        缓冲区容量不足或尾部已被其他副本写过时复制一份，不影响共享缓冲区的旧快照。
+        """
+        num_docs = len(self.doc_lengths)
+        known = len(self._lengths)
+        buffer = self._length_buffer
+        if buffer.filled != known or buffer.data.shape[1] < num_docs:
+            grown = _LengthBuffer(max(num_docs, 2 * buffer.data.shape[1]))
+            grown.data[0, :known] = self._lengths
+            grown.data[1, :known] = self.inv_doc_lengths
+            buffer = self._length_buffer = grown
+        if num_docs > known:
+            lengths = np.array(self.doc_lengths[known:], dtype=np.float64)
+            buffer.data[0, known:num_docs] = lengths
+            np.divide(1.0, lengths, out=buffer.data[1, known:num_docs], where=lengths > 0)
+            buffer.data[1, known:num_docs][lengths == 0] = 0.0
+        buffer.filled = num_docs
+        self._lengths = buffer.data[0, :num_docs]
+        self.inv_doc_lengths = buffer.data[1, :num_docs]
+    
+    def _reset_length_tables(self):
+        """文档长度整体替换(加载、索引段转内存结构)后，长度表从头重建"""
+        self._length_buffer = _LengthBuffer()
+        self._lengths = np.zeros(0)
+        self.inv_doc_lengths = np.zeros(0)
+    
+    def _ensure_scoring_tables(self):
+        """按需刷新打分表"""
+        if self._tables_dirty:
+            self.refresh_scoring_tables()
+    
+    def search(self, query: str, top_k: int = 5, strategy: str = "taat",
+               scorer: str = "tfidf") -> List[Tuple[str, float, str]]:
+        """搜索文档
+        
+        只遍历查询词的倒排链，用有界堆选出top_k，而不是对全部文档打分后排序。
+        查询中的 "短语"、"短语"~k 和 NEAR/k 约束先在位置列表上求交得到候选文档，再在候选内打分。
+        含 AND/OR/NOT、括号或字段限定(id:/content:)时按布尔查询求出匹配文档，
+        再用不在NOT下的词打分，不含打分词的匹配文档以0分补足；语法错误抛出 QuerySyntaxError。
         
-        # 排序并返回结果
-        sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        Args:
+            query: 查询字符串
+            top_k: 返回结果数量
+            strategy: 打分策略，"taat"(逐词累加)、"daat"(逐文档合并)、
+                      "wand"/"bmw"(按得分上界动态剪枝的 WAND / Block-Max WAND)
+            scorer: 打分器，"tfidf"、"bm25" 或 "bm25+"
+        """
+        # 预处理查询
+        query_words, clauses = self.parse_query(query)
+        top_results = self._score_query_words(query_words, top_k, strategy, scorer, clauses)
         
         # 生成摘要
         results = []
-        for doc_id, score in sorted_results[:top_k]:
+        for doc_id, score in top_results:
             summary = self.generate_summary(doc_id, query_words)
             results.append((doc_id, score, summary))
         
         return results
     
+    def retrieve(self, query: str, top_k: int = 5, strategy: str = "taat", scorer: str = "tfidf",
+                 doc_ids: List[str] = None) -> List[Tuple[str, float]]:
+        """只召回 (文档ID, 分数)，不生成摘要，参数同 search；给出 doc_ids 时只在这些文档中打分"""
+        query_words, clauses = self.parse_query(query)
+        if doc_ids is not None:
+            clauses = restrict_to_docs(query_words, clauses, doc_ids)
+        return self._score_query_words(query_words, top_k, strategy, scorer, clauses)
+    
+    def get_summaries(self, doc_ids: List[str], query_words: List[str]) -> Dict[str, str]:
+        """批量生成摘要 {文档ID: 摘要}，不存在的文档跳过"""
+        return {doc_id: self.generate_summary(doc_id, query_words) for doc_id in doc_ids if doc_id in self.doc_nums}
+    
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    scorer: str = "tfidf") -> List[List[Tuple[str, float]]]:
+        """批量召回，返回与 queries 一一对应的 [(文档ID, 分数), ...]
+        
+        普通查询用 词项 × 文档 稀疏得分矩阵一次矩阵乘法打分，再向量化地按行取top_k，
+        结果与 retrieve(strategy="taat") 相同；带短语/布尔约束的查询逐条走 retrieve。
+        得分矩阵按打分器缓存，打分表刷新(索引写入)后重建。
+        """
+        validate_search_args("taat", scorer)
+        results = [[] for _ in queries]
+        batch_rows, batch_weights = [], []
+        for row, query in enumerate(queries):
+            query_words, clauses = self.parse_query(query)
+            if clauses:
+                results[row] = self._score_query_words(query_words, top_k, "taat", scorer, clauses)
+            elif query_words:
+                batch_rows.append(row)
+                batch_weights.append(query_words)
+        if not batch_rows or top_k <= 0:
+            return results
+        
+        matrix = self.get_doc_term_matrix(scorer)
+        weights = [self._query_term_weights(query_words, scorer) for query_words in batch_weights]
+        for row, top_results in zip(batch_rows, matrix.top_k(weights, top_k)):
+            results[row] = [(self.doc_ids[doc_num], score) for doc_num, score in top_results]
+        return results
+    
+    def get_doc_term_matrix(self, scorer: str = "tfidf") -> DocTermMatrix:
+        """获取(必要时构建)打分器对应的 词项 × 文档 稀疏得分矩阵"""
+        self._ensure_scoring_tables()
+        cached = self._doc_term_matrices.get(scorer)
+        if cached is None or cached[0] != self._tables_version:
+            cached = (self._tables_version, DocTermMatrix(self, scorer))
+            self._doc_term_matrices[scorer] = cached
+        return cached[1]
+    
+    def parse_query(self, query: str, expand_wildcard=None) -> Tuple[List[str], List[Tuple]]:
+        """解析查询，返回 (打分用的查询词, 匹配约束)
+        
+        匹配约束是 compile_query_tree 格式的查询树节点列表，文档需满足全部约束：
+        普通查询为各短语/邻近约束 ("phrase", 词项列表, slop, 是否有序)，布尔查询为整棵查询树。
+        通配符按 expand_wildcard(默认本索引的词典)展开，展开的词项参与打分。
+        """
+        if is_boolean_query(query):
+            tree = compile_query_tree(parse_boolean_query(query), self.preprocess_text,
+                                      expand_wildcard or self.expand_wildcard)
+            return positive_words(tree), [tree] if tree is not None else []
+        text, phrase_clauses = parse_phrase_query(query)
+        clauses = [("phrase", self.preprocess_text(clause.text), clause.slop, clause.ordered)
+                   for clause in phrase_clauses]
+        return self.preprocess_text(text), [clause for clause in clauses if clause[1]]
+    
+    def _score_query_words(self, query_words: List[str], top_k: int, strategy: str,
+                           scorer: str, clauses: List[Tuple] = None,
+                           global_stats: Tuple[Dict[str, float], float] = None) -> List[Tuple[str, float]]:
+        """按指定策略和打分器计算top_k文档，有匹配约束时只在满足约束的文档中打分
+        
+        global_stats 为 (查询词权重, 平均文档长度) 时不用本索引的IDF和avgdl，
+        用于分片索引按全局统计量打分，各分片的分数可直接比较。
+        """
+        validate_search_args(strategy, scorer)
+        if not (query_words or clauses) or top_k <= 0:
+            return []
+        
+        allowed = self.match_clauses(clauses) if clauses else None
+        if allowed is not None and not len(allowed):
+            return []
+        
+        # 计算相关性分数
+        self._ensure_scoring_tables()
+        with_bounds = strategy in ("wand", "bmw")
+        if global_stats is None:
+            weights, avg_doc_length = self._query_term_weights(query_words, scorer), None
+        else:
+            weights, avg_doc_length = global_stats
+        terms = []
+        for word, weight in weights.items():
+            if avg_doc_length is not None:
+                if word not in self.postings:
+                    continue
+                doc_nums, tfs = self._get_decoded_postings(word)
+                scores = self._tf_scores(doc_nums, tfs, scorer, avg_doc_length)
+            else:
+                doc_nums, scores = self._posting_scores(word, scorer)
+            if allowed is None and avg_doc_length is None:
+                bounds = self._get_term_bounds(word, scorer, doc_nums, scores) if with_bounds else None
+            else:
+                if allowed is not None:
+                    keep = np.isin(doc_nums, allowed, assume_unique=True)
+                    doc_nums, scores = doc_nums[keep], scores[keep]
+                    if not len(doc_nums):
+                        continue
+                bounds = compute_term_bounds(doc_nums, scores) if with_bounds else None
+            terms.append((weight, doc_nums, scores, bounds))
+        top_results = rank_query_terms(strategy, terms, top_k)
+        if allowed is not None and len(top_results) < top_k:
+            top_results += unscored_matches(allowed, top_results, top_k - len(top_results))
+        
+        # 内部文档编号转换回文档ID
+        return [(self.doc_ids[doc_num], score) for doc_num, score in top_results]
+    
+    def match_clauses(self, clauses: List[Tuple]) -> np.ndarray:
+        """返回同时满足所有约束的内部文档编号(升序)"""
+        return self._match_node(("and", clauses))
+    
+    def _match_node(self, node: Tuple) -> np.ndarray:
+        """对查询树节点求值，返回匹配的内部文档编号(升序)"""
+        kind = node[0]
+        if kind in ("and", "terms"):
+            return self._match_conjunction(node[1] if kind == "and" else [node])
+        if kind == "or":
+            matched = np.empty(0, dtype=np.int64)
+            for child in node[1]:
+                matched = np.union1d(matched, self._match_node(child))
+            return matched
+        if kind == "not":
+            return np.setdiff1d(self._live_doc_nums(), self._match_node(node[1]), assume_unique=True)
+        if kind == "phrase":
+            return self._match_phrase(node[1], node[2], node[3])
+        if kind == "id":
+            return self._match_doc_id(node[1])
+        if kind == "ids":
+            return np.unique(np.array([self.doc_nums[doc_id] for doc_id in node[1] if doc_id in self.doc_nums],
+                                      dtype=np.int64))
+        raise ValueError(f"未知的查询树节点: {kind}")
+    
+    def _match_conjunction(self, children: List[Tuple]) -> np.ndarray:
+        """AND求值：从最短的倒排链/子结果出发，依次与更长的倒排链按跳表指针求交，最后减去NOT子句
+        
+        候选集只会越来越小，总代价由最短的一条决定，而不是把每条倒排链完整解码后合并。
+        """
+        words, subsets, excluded, phrases = [], [], [], []
+        for child in children:
+            if child[0] == "terms":
+                words.extend(child[1])
+            elif child[0] == "not":
+                excluded.append(child[1])
+            elif child[0] == "phrase":
+                # 短语需要校验位置，放到候选集缩小之后再做
+                phrases.append(child)
+                words.extend(child[1])
+            else:
+                subsets.append(self._match_node(child))
+        words = list(dict.fromkeys(words))
+        if any(word not in self.postings for word in words):
+            return np.empty(0, dtype=np.int64)
+        words.sort(key=lambda word: len(self.postings[word]))
+        subsets.sort(key=len)
+        
+        if words and (not subsets or len(self.postings[words[0]]) <= len(subsets[0])):
+            candidates = self._get_decoded_postings(words.pop(0))[0]
+        elif subsets:
+            candidates = subsets.pop(0)
+        else:
+            candidates = self._live_doc_nums()
+        for subset in subsets:
+            candidates = intersect_sorted(candidates, subset)
+        for word in words:
+            if not len(candidates):
+                break
+            candidates = self._intersect_postings(candidates, word)
+        for _, phrase_words, slop, ordered in phrases:
+            candidates = self._filter_phrase(candidates, phrase_words, slop, ordered)
+        for child in excluded:
+            if not len(candidates):
+                break
+            candidates = np.setdiff1d(candidates, self._match_node(child), assume_unique=True)
+        return candidates
+    
+    def _intersect_postings(self, candidates: np.ndarray, word: str) -> np.ndarray:
+        """候选文档与词项倒排链求交
+        
+        候选远少于链长时用跳表指针只解码命中的块；否则(或倒排链已解码缓存、来自只读索引段)
+        在解码后的文档编号上二分查找。
+        """
+        posting_list = self.postings[word]
+        if (self.segment is None and word not in self._decoded_postings
+                and len(candidates) * SKIP_INTERVAL < len(posting_list)):
+            return posting_list.intersect(candidates)
+        return intersect_sorted(candidates, self._get_decoded_postings(word)[0])
+    
+    def _live_doc_nums(self) -> np.ndarray:
+        """所有未删除文档的内部编号(升序)"""
+        if self.segment is not None:
+            return np.arange(len(self.doc_ids), dtype=np.int64)
+        return np.array([doc_num for doc_num, doc_id in enumerate(self.doc_ids) if doc_id is not None],
+                        dtype=np.int64)
+    
+    def _match_doc_id(self, pattern: str) -> np.ndarray:
+        """id: 字段限定，精确匹配文档ID，以*结尾时按前缀匹配"""
+        if not pattern.endswith("*"):
+            doc_num = self.doc_nums.get(pattern)
+            return np.array([] if doc_num is None else [doc_num], dtype=np.int64)
+        prefix = pattern[:-1]
+        if self.segment is not None:
+            # 索引段的文档ID表有序，前缀匹配的文档编号是一段连续区间
+            doc_ids = self.doc_ids
+            start = bisect_left(doc_ids, prefix)
+            end = start
+            while end < len(doc_ids) and doc_ids[end].startswith(prefix):
+                end += 1
+            return np.arange(start, end, dtype=np.int64)
+        return np.array([doc_num for doc_num, doc_id in enumerate(self.doc_ids)
+                         if doc_id is not None and doc_id.startswith(prefix)], dtype=np.int64)
+    
+    def _match_phrase(self, words: List[str], slop: int, ordered: bool) -> np.ndarray:
+        """先按倒排链求出包含全部词项的文档，再在每篇文档的位置列表上校验短语/邻近约束"""
+        candidates = self._match_conjunction([("terms", words)])
+        return self._filter_phrase(candidates, words, slop, ordered)
+    
+    def _filter_phrase(self, candidates: np.ndarray, words: List[str], slop: int, ordered: bool) -> np.ndarray:
+        """在候选文档的位置列表上校验短语/邻近约束"""
+        distinct = list(dict.fromkeys(words))
+        matched = [doc_num for doc_num in candidates.tolist()
+                   if match_positions(self._term_positions(doc_num, distinct), words, slop, ordered)]
+        return np.array(matched, dtype=np.int64)
+    
+    def proximity_score(self, doc_id: str, query_words: List[str]) -> float:
+        """查询词在文档中的邻近度特征，取值[0, 1]，全部查询词相邻出现时为1"""
+        distinct = list(dict.fromkeys(query_words))
+        doc_num = self.doc_nums.get(doc_id)
+        if doc_num is None:
+            return 0.0
+        return proximity_score(self._term_positions(doc_num, distinct), len(distinct))
+    
+    def _query_term_weights(self, query_words: List[str], scorer: str) -> Dict[str, float]:
+        """计算查询词权重：查询词频 × IDF，不在索引中的词直接跳过"""
+        idf_table = self.idf_tables[scorer]
+        weights = {}
+        for word, query_tf in Counter(query_words).items():
+            if word in idf_table:
+                weights[word] = query_tf * idf_table[word]
+        return weights
+    
+    def _get_decoded_postings(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """获取解码后的倒排链 (文档编号数组, 词频数组)，按LRU缓存，词项变更时失效"""
+        cached = _lru_get(self._decoded_postings, word)
+        if cached is None:
+            posting_list = self.postings[word]
+            cached = (posting_list.doc_nums(), posting_list.tf_array())
+            _lru_put(self._decoded_postings, word, cached, POSTING_CACHE_SIZE)
+        return cached
+    
+    def _posting_scores(self, word: str, scorer: str) -> Tuple[np.ndarray, np.ndarray]:
+        """向量化计算词项整条倒排链的得分(未乘IDF)，返回 (文档编号数组, 得分数组)"""
+        doc_nums, tfs = self._get_decoded_postings(word)
+        return doc_nums, self._tf_scores(doc_nums, tfs, scorer)
+    
+    def _tf_scores(self, doc_nums: np.ndarray, tfs: np.ndarray, scorer: str,
+                   avg_doc_length: float = None) -> np.ndarray:
+        """词项得分(未乘IDF)，默认只查预计算表
+        
+        avg_doc_length 不为空时按给定的平均文档长度现算BM25长度归一化，
+        用于多个索引段共享全局统计量打分。
+        """
+        if scorer == "tfidf":
+            return tfs * self.inv_doc_lengths[doc_nums]
+        
+        if avg_doc_length is None and self.bm25_norms is not None:
+            norms = self.bm25_norms[doc_nums]
+        else:
+            if avg_doc_length is None:
+                avg_doc_length = self._avg_doc_length
+            norms = self.k1 * (1 - self.b + self.b * self._lengths[doc_nums] / avg_doc_length)
+        scores = tfs * (self.k1 + 1) / (tfs + norms)
+        if scorer == "bm25+":
+            scores += self.delta
+        return scores
+    
+    def _get_term_bounds(self, word: str, scorer: str, doc_nums: np.ndarray,
+                         scores: np.ndarray) -> Tuple[float, List[int], List[float]]:
+        """获取词项的得分上界，按LRU缓存；上界依赖打分表，打分表刷新后按需重新计算"""
+        key = (word, scorer)
+        cached = _lru_get(self._term_bounds, key)
+        if cached is not None and cached[0] == self._tables_version:
+            return cached[1]
+        
+        bounds = compute_term_bounds(doc_nums, scores)
+        _lru_put(self._term_bounds, key, (self._tables_version, bounds), POSTING_CACHE_SIZE)
+        return bounds
+    
     def generate_summary(self, doc_id: str, query_words: List[str], max_length: int = 200) -> str:
-        """生成文档摘要"""
+        """生成文档摘要
+        
+        由正排索引中的词元位置和字符区间取出查询词的所有出现，
+        线性扫描选出覆盖查询词最多的窗口，再按字符区间高亮，不对文档重新分词。
+        """
         content = self.documents[doc_id]
+        doc_num = self.doc_nums[doc_id]
+        
+        spans = self._get_doc_spans(doc_num)
+        occurrences = sorted(
+            (int(spans[2 * position]), int(spans[2 * position + 1]), word)
+            for word, positions in self._term_positions(doc_num, set(query_words)).items()
+            for position in positions
+        )
+        if not occurrences:
+            # 没有命中查询词时使用文档开头
+            return content[:max_length]
+        
+        first, last = select_snippet_window(occurrences, max_length)
+        window_start, window_end = occurrences[first][0], occurrences[last][1]
         
-        # 找到包含最多查询词的文本窗口
-        best_window = ""
-        best_score = 0
-        
-        # 简单的滑动窗口方法
-        words = content.split()
-        for i in range(len(words)):
-            for j in range(i + 1, min(i + 50, len(words) + 1)):  # 最多50个词
-                window = " ".join(words[i:j])
-                window_words = self.preprocess_text(window)
-                
-                # 计算窗口包含的查询词数量
-                score = sum(1 for word in query_words if word in window_words)
-                
-                if score > best_score and len(window) <= max_length:
-                    best_score = score
-                    best_window = window
-        
-        if not best_window:
-            # 如果没有找到好的窗口，使用文档开头
-            best_window = content[:max_length]
-        
-        # 高亮查询词
-        highlighted_summary = self.highlight_keywords(best_window, query_words)
-        
-        return highlighted_summary
-    
-    def highlight_keywords(self, text: str, keywords: List[str]) -> str:
-        """高亮关键词"""
-        highlighted_text = text
-        for keyword in keywords:
-            if keyword in highlighted_text:
-                highlighted_text = highlighted_text.replace(
-                    keyword, 
-                    f'<span style="background-color: yellow; font-weight: bold;">{keyword}</span>'
-                )
-        return highlighted_text
+        # 窗口两侧补足上下文到max_length
+        padding = max(0, max_length - (window_end - window_start))
+        start = max(0, window_start - padding // 2)
+        end = min(len(content), start + max_length)
+        start = max(0, min(start, end - max_length))
+        
+        # 按字符区间高亮摘要范围内的查询词
+        pieces = []
+        cursor = start
+        for occ_start, occ_end, _ in occurrences:
+            if occ_start < start or occ_end > end:
+                continue
+            pieces.append(content[cursor:occ_start])
+            pieces.append(HIGHLIGHT_TEMPLATE.format(content[occ_start:occ_end]))
+            cursor = occ_end
+        pieces.append(content[cursor:end])
+        return "".join(pieces)
+    
+    def highlight_keywords(self, text: str, keywords: List[str], escape: bool = False) -> str:
+        """高亮关键词：多模式自动机单遍扫描，重叠时长词优先"""
+        return highlight_keywords(text, keywords, escape=escape)
     
     def get_document(self, doc_id: str) -> str:
         """获取文档内容"""
         return self.documents.get(doc_id, "")
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, str]:
+        """批量获取文档内容 {文档ID: 正文}，不存在的文档跳过；压缩文档库中同一块只解压一次"""
+        return self.documents.get_many(doc_ids)
+    
     def get_all_documents(self) -> Dict[str, str]:
         """获取所有文档"""
-        return self.documents.copy()
+        return self.documents.get_many(list(self.documents))
+    
+    def get_terms(self, limit: int = None) -> List[str]:
+        """获取词项列表"""
+        terms = iter(self.postings)
+        return list(terms) if limit is None else [word for word, _ in zip(terms, range(limit))]
+    
+    def get_term_dictionary(self) -> TermDictionary:
+        """前缀压缩的有序词典，写入后第一次使用时按当前倒排链重建"""
+        self._ensure_scoring_tables()
+        cached = self._term_dictionary
+        if cached is None or cached[0] != self._tables_version:
+            if self.segment is not None:
+                # 索引段的词项表本身有序，df直接取词项元数据
+                dictionary = TermDictionary(self.segment.terms, self.segment.term_meta['df'])
+            else:
+                dictionary = TermDictionary.from_postings(self.postings)
+            cached = self._term_dictionary = (self._tables_version, dictionary)
+        return cached[1]
+    
+    def prefix_terms(self, prefix: str, limit: int = None) -> List[str]:
+        """以prefix开头的词项(升序)"""
+        return self.get_term_dictionary().prefix_terms(prefix.lower(), limit)
+    
+    def term_matches(self, prefix: str, pattern: str = None) -> List[Tuple[str, int]]:
+        """以prefix开头(且匹配通配符模式pattern)的 [(词项, 文档频率), ...]，供分片/分段索引汇总"""
+        return self.get_term_dictionary().term_matches(prefix, pattern)
+    
+    def expand_wildcard(self, pattern: str, limit: int = MAX_WILDCARD_EXPANSIONS) -> List[str]:
+        """通配符(* 任意个字符，? 单个字符)展开为匹配的词项(升序)，超过limit个时保留文档频率最高的"""
+        return self.get_term_dictionary().expand_wildcard(pattern.lower(), limit)
+    
+    def suggest(self, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+        """按文档频率从高到低返回以prefix开头的k个词项 [(词项, 文档频率), ...]"""
+        return self.get_term_dictionary().suggest(prefix.lower(), k)
+    
+    def get_term_postings(self, word: str) -> List[Tuple[str, int]]:
+        """获取词项的倒排链 [(文档ID, 词频), ...]，按文档加入顺序排列"""
+        posting_list = self.postings.get(word)
+        if posting_list is None:
+            return []
+        return [(self.doc_ids[doc_num], tf) for doc_num, tf in posting_list.items()]
     
     def get_index_stats(self) -> Dict:
-        """获取索引统计信息"""
+        """获取索引统计信息，包含倒排链内存占用"""
         total_documents = len(self.documents)
-        total_terms = len(self.index)
+        total_terms = len(self.postings)
         
         if total_documents > 0:
-            average_doc_length = sum(self.doc_lengths.values()) / total_documents
+            average_doc_length = self.total_doc_length / total_documents
         else:
             average_doc_length = 0
         
+        if self.segment is not None:
+            total_postings = self.segment.total_postings
+            posting_bytes = self.segment.posting_bytes
+            term_table_bytes = self.segment.sections["term_offsets"][1] + self.segment.sections["term_blob"][1]
+            document_bytes = 0
+            document_store_bytes = self.segment.store.nbytes
+        else:
+            total_postings = sum(len(posting_list) for posting_list in self.postings.values())
+            posting_bytes = sum(posting_list.nbytes for posting_list in self.postings.values())
+            term_table_bytes = sys.getsizeof(self.postings) + sum(sys.getsizeof(word) for word in self.postings)
+            document_bytes = self.documents.memory_bytes
+            document_store_bytes = self.documents.store_bytes
+        
         return {
             'total_documents': total_documents,
             'total_terms': total_terms,
-            'average_doc_length': average_doc_length
+            'average_doc_length': average_doc_length,
+            'total_postings': total_postings,
+            'posting_bytes': posting_bytes,
+            'bytes_per_posting': posting_bytes / total_postings if total_postings > 0 else 0,
+            'doc_table_bytes': self.doc_lengths.itemsize * len(self.doc_lengths),
+            'forward_index_bytes': sum(entry[0].itemsize * len(entry[0]) + entry[1].itemsize * len(entry[1])
+                                       for entry in self.forward_index or () if entry is not None),
+            'term_table_bytes': term_table_bytes,
+            'term_dictionary_bytes': self.get_term_dictionary().nbytes,
+            'document_bytes': document_bytes,
+            'document_store_bytes': document_store_bytes
         }
     
     def save_to_file(self, filename: str):
-        """保存索引到文件"""
+        """保存索引到文件
+        
+        倒排表等写入JSON，正文单独写入同名的 .docs 块压缩文档库，
+        JSON中只记录文档ID的存放顺序，加载时文档库用mmap打开，正文不进内存。
+        """
+        index = {}
+        term_freq = {}
+        doc_freq = {}
+        for word in self.postings:
+            postings = self.get_term_postings(word)
+            index[word] = [doc_id for doc_id, _ in postings]
+            term_freq[word] = dict(postings)
+            doc_freq[word] = len(postings)
+        
+        # 先写文档库再写JSON，JSON出现时文档库一定完整
+        doc_ids = [doc_id for doc_id in self.doc_ids if doc_id is not None]
+        store_path = filename + DOCSTORE_SUFFIX
+        DocumentStore.write(store_path, (self.documents[doc_id] for doc_id in doc_ids))
+        
         data = {
-            'index': {k: list(v) for k, v in self.index.items()},
-            'doc_lengths': self.doc_lengths,
-            'documents': self.documents,
-            'term_freq': {k: dict(v) for k, v in self.term_freq.items()},
-            'doc_freq': dict(self.doc_freq)
+            'index': index,
+            'doc_lengths': {doc_id: int(self.doc_lengths[doc_num]) for doc_id, doc_num in self.doc_nums.items()},
+            'doc_ids': doc_ids,
+            'document_store': os.path.basename(store_path),
+            'token_spans': {doc_id: self.doc_spans[doc_num].tolist() for doc_id, doc_num in self.doc_nums.items()},
+            'term_freq': term_freq,
+            'doc_freq': doc_freq
         }
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 写临时文件后替换，写到一半崩溃也不会留下残缺的JSON
+        atomic_write(filename, [json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')])
         
         print(f"✅ 索引已保存到: {filename}")
     
     def load_from_file(self, filename: str):
-        """从文件加载索引"""
+        """从文件加载索引，按文档顺序重新分配内部编号并压缩倒排链"""
         with open(filename, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        self.index = defaultdict(set)
-        for k, v in data['index'].items():
-            self.index[k] = set(v)
+        self.segment = None
+        if 'documents' in data:
+            # 旧格式：正文内嵌在JSON中
+            self.documents = DocumentTable(data['documents'])
+            self.doc_ids = list(self.documents)
+        else:
+            store = DocumentStore(os.path.join(os.path.dirname(filename), data['document_store']))
+            self.documents = DocumentTable(store=store, stored_ids=data['doc_ids'])
+            self.doc_ids = list(data['doc_ids'])
+        self.doc_nums = {doc_id: doc_num for doc_num, doc_id in enumerate(self.doc_ids)}
+        self.doc_lengths = array('I', (data['doc_lengths'].get(doc_id, 0) for doc_id in self.doc_ids))
+        self.total_doc_length = sum(self.doc_lengths)
+        self._reset_length_tables()
+        # 旧格式没有词元字符区间，生成摘要时再按文档分词补上
+        token_spans = data.get('token_spans', {})
+        self.doc_spans = [array('I', token_spans.get(doc_id, ())) for doc_id in self.doc_ids]
         
-        self.doc_lengths = data['doc_lengths']
-        self.documents = data['documents']
+        doc_nums = self.doc_nums
+        self.postings = {}
+        for word, freqs in data['term_freq'].items():
+            postings = sorted((doc_nums[doc_id], tf) for doc_id, tf in freqs.items() if doc_id in doc_nums)
+            if postings:
+                self.postings[word] = PostingList.from_postings(postings)
+        self.forward_index = None
+        self._owned_postings = None
         
-        self.term_freq = defaultdict(dict)
-        for k, v in data['term_freq'].items():
-            self.term_freq[k] = v
+        self._decoded_postings = OrderedDict()
+        self._term_bounds = OrderedDict()
+        self._positions_cache = OrderedDict()
         
-        self.doc_freq = defaultdict(int)
-        for k, v in data['doc_freq'].items():
-            self.doc_freq[k] = v
+        # 预计算打分表
+        self.refresh_scoring_tables()
         
         print(f"✅ 索引已从文件加载: {filename}")
+    
+    def save_segment(self, path: str):
+        """保存为二进制索引段(索引文件 + 独立文档库)"""
+        IndexSegment.write(self, path)
+        print(f"✅ 索引段已保存到: {path}")
+    
+    def load_segment(self, path: str):
+        """用mmap打开二进制索引段
+        
+        只读取文件头，词典、倒排块、文档长度和归一化表、文档正文都是mmap上的视图，
+        查询时按需缺页载入；预计算的IDF和归一化表直接使用，无需刷新。
+        """
+        segment = IndexSegment(path)
+        self.segment = segment
+        self.postings = segment.postings
+        self.doc_ids = segment.doc_ids
+        self.doc_nums = segment.doc_nums
+        self.doc_lengths = segment.doc_lengths
+        self.documents = segment.documents
+        self.total_doc_length = segment.total_doc_length
+        self.doc_spans = segment.doc_spans
+        self.forward_index = None
+        self._owned_postings = None
+        
+        self.idf_tables = segment.idf_tables
+        self._lengths = segment.doc_lengths
+        self.inv_doc_lengths = segment.inv_doc_lengths
+        self._avg_doc_length = segment.total_doc_length / segment.num_docs if segment.num_docs > 0 else 0.0
+        # BM25参数与写入时不同时不用预存的归一化表，查询时按avgdl现算
+        self.bm25_norms = segment.bm25_norms if (segment.k1, segment.b) == (self.k1, self.b) else None
+        
+        self._decoded_postings = OrderedDict()
+        self._term_bounds = OrderedDict()
+        self._positions_cache = OrderedDict()
+        self._tables_dirty = False
+        self._tables_version += 1
+        
+        print(f"✅ 索引段已加载(mmap): {path}")
+    
+    def _materialize_segment(self):
+        """写入前把只读索引段转成可修改的内存结构，内部文档编号保持不变"""
+        segment = self.segment
+        if segment is None:
+            return
+        
+        self.postings = {word: segment.posting_list(term_no) for term_no, word in enumerate(segment.terms)}
+        for posting_list in self.postings.values():
+            posting_list.data = bytearray(posting_list.data)
+        self.doc_ids = list(segment.doc_ids)
+        self.doc_nums = {doc_id: doc_num for doc_num, doc_id in enumerate(self.doc_ids)}
+        self.doc_lengths = array('I', segment.doc_lengths.tolist())
+        self._reset_length_tables()
+        # 正文留在索引段的文档库中，不整体解压
+        self.documents = DocumentTable(store=segment.store, stored_ids=self.doc_ids)
+        self.doc_spans = [array('I', segment.doc_spans[doc_num].tolist()) for doc_num in range(len(self.doc_ids))]
+        self.forward_index = None
+        self._owned_postings = None
+        self.segment = None
+        self._tables_dirty = True
 
 class SampleCollector:
     """样本收集器"""
@@ -324,15 +1455,15 @@ def create_sample_documents():
     }
     return documents
 
-def build_index_from_documents(documents: Dict[str, str], save_path: str = ""):
-    """从文档构建索引"""
-    print("🔨 构建倒排索引...")
+def build_index_from_documents(documents: Dict[str, str], save_path: str = "", workers: int = None):
+    """从文档构建索引，文档较多时在进程池中并行分词后合并分片"""
+    # bulk_builder 依赖本模块，在函数内导入
+    from .bulk_builder import build_index_parallel
     
-    index = InvertedIndex()
+    print("🔨 构建倒排索引...")
     
-    for doc_id, content in documents.items():
-        index.add_document(doc_id, content)
-        print(f"   添加文档: {doc_id}")
+    # 构建完成后已一次性预计算IDF和长度归一化表
+    index = build_index_parallel(documents, workers)
     
     stats = index.get_index_stats()
     print(f"✅ 索引构建完成:")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+短语与邻近查询
+查询语法：
+- "机器 学习"      短语：各词在文档中按顺序相邻出现
+- "机器 学习"~3    邻近：各词(不限顺序)出现在跨度不超过 词数-1+3 个位置的窗口内
+- 机器 NEAR/3 学习  两个词(不限顺序)的位置距离不超过3，NEAR 不带距离时为 DEFAULT_NEAR_DISTANCE
+短语和邻近约束都在词元位置列表上求交/扫描，不回看文档原文。
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# NEAR 不指定距离时的默认距离
+DEFAULT_NEAR_DISTANCE = 5
+
+_PHRASE_PATTERN = re.compile(r'"([^"]*)"(?:~(\d+))?')
+_NEAR_PATTERN = re.compile(r'(\S+)\s+NEAR(?:/(\d+))?\s+(\S+)')
+
+
+class PhraseClause:
+    """短语/邻近约束：text 为约束内的原始文本，slop 为允许的额外跨度，ordered 表示必须按顺序相邻"""
+
+    __slots__ = ('text', 'slop', 'ordered')
+
+    def __init__(self, text: str, slop: int = 0, ordered: bool = True):
+        self.text = text
+        self.slop = slop
+        self.ordered = ordered
+
+    def __repr__(self) -> str:
+        return f"PhraseClause({self.text!r}, slop={self.slop}, ordered={self.ordered})"
+
+
+def parse_phrase_query(query: str) -> Tuple[str, List[PhraseClause]]:
+    """拆出查询中的短语/邻近约束，返回 (去掉语法标记的查询文本, 约束列表)
+
+    去掉标记后的文本仍包含约束内的词，约束内的词同样参与相关性打分。
+    """
+    clauses = []
+
+    def take_phrase(match):
+        slop = match.group(2)
+        if slop is None:
+            clauses.append(PhraseClause(match.group(1)))
+        else:
+            clauses.append(PhraseClause(match.group(1), int(slop), ordered=False))
+        return f" {match.group(1)} "
+
+    def take_near(match):
+        distance = int(match.group(2)) if match.group(2) else DEFAULT_NEAR_DISTANCE
+        # 两个词的跨度 = 位置距离，对应 slop = 距离 - 1
+        clauses.append(PhraseClause(f"{match.group(1)} {match.group(3)}", max(distance - 1, 0), ordered=False))
+        return f" {match.group(1)} {match.group(3)} "
+
+    text = _PHRASE_PATTERN.sub(take_phrase, query)
+    text = _NEAR_PATTERN.sub(take_near, text)
+    return " ".join(text.split()), clauses
+
+
+def min_cover_span(term_positions: Dict[str, List[int]]) -> Optional[int]:
+    """覆盖所有词项至少一次的最小位置窗口跨度(末位置-首位置)，
+    对合并后的出现序列双指针线性扫描；有词项没有出现时返回None"""
+    if not term_positions or any(not positions for positions in term_positions.values()):
+        return None
+    occurrences = sorted((position, word) for word, positions in term_positions.items() for position in positions)
+    counts = {}
+    covered = 0
+    left = 0
+    best = None
+    for position, word in occurrences:
+        counts[word] = counts.get(word, 0) + 1
+        if counts[word] == 1:
+            covered += 1
+        while covered == len(term_positions):
+            span = position - occurrences[left][0]
+            if best is None or span < best:
+                best = span
+            left_word = occurrences[left][1]
+            counts[left_word] -= 1
+            if counts[left_word] == 0:
+                covered -= 1
+            left += 1
+    return best
+
+
+def match_positions(term_positions: Dict[str, List[int]], words: List[str], slop: int, ordered: bool) -> bool:
+    """判断一篇文档中的词元位置是否满足短语/邻近约束"""
+    if any(not term_positions.get(word) for word in words):
+        return False
+    if ordered:
+        # 短语：第i个词的位置减去i后求交，交集非空即存在相邻出现
+        candidates = np.asarray(term_positions[words[0]])
+        for offset, word in enumerate(words[1:], 1):
+            candidates = np.intersect1d(candidates, np.asarray(term_positions[word]) - offset, assume_unique=True)
+            if not len(candidates):
+                return False
+        return True
+    distinct = list(dict.fromkeys(words))
+    span = min_cover_span({word: term_positions[word] for word in distinct})
+    return span is not None and span <= len(distinct) - 1 + slop
+
+
+def proximity_score(term_positions: Dict[str, List[int]], num_query_terms: int) -> float:
+    """邻近度排序特征，取值[0, 1]
+
+    文档中出现的不同查询词不少于2个时，按 (出现词数-1)/最小覆盖跨度 衡量紧凑程度，
+    再乘以查询词覆盖率；全部查询词相邻出现时为1。
+    """
+    present = {word: positions for word, positions in term_positions.items() if positions}
+    if len(present) < 2 or num_query_terms < 2:
+        return 0.0
+    span = min_cover_span(present)
+    return (len(present) - 1) / max(span, 1) * len(present) / num_query_terms
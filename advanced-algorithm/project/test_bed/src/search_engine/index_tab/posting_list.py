@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩倒排链
+文档使用整数内部编号，倒排链按编号升序存储：
+文档编号做差分(delta)后用varint变长编码写入bytearray，词频存放在并行的array中
+每 SKIP_INTERVAL 个posting记一个跳表指针(块尾文档编号、块起始字节偏移、块前文档编号)，
+求交时只解码可能命中的块
+"""
+
+from array import array
+from typing import Iterable, List, Tuple
+import numpy as np
+
+# 词频数组的类型码，按最大词频逐级放宽：1字节 -> 2字节 -> 4字节
+_TF_TYPECODES = (('B', 0xFF), ('H', 0xFFFF), ('I', 0xFFFFFFFF))
+_TF_LIMITS = dict(_TF_TYPECODES)
+
+# 跳表指针间隔(每块posting数)
+SKIP_INTERVAL = 64
+
+
+def _append_varint(out: bytearray, value: int):
+    """把非负整数按varint(每字节7位，高位为续位标记)追加到out"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos: int = 0) -> Tuple[int, int]:
+    """从pos开始读出一个varint，返回 (值, 下一个varint的起始位置)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        value |= (byte & 0x7F) << shift
+        pos += 1
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_doc_nums(doc_nums: Iterable[int]) -> bytearray:
+    """差分+varint编码升序文档编号"""
+    out = bytearray()
+    previous = 0
+    for doc_num in doc_nums:
+        _append_varint(out, doc_num - previous)
+        previous = doc_num
+    return out
+
+
+def decode_doc_nums(data) -> np.ndarray:
+    """解码差分+varint编码的文档编号，用NumPy向量化完成"""
+    if not data:
+        return np.empty(0, dtype=np.int64)
+    buf = np.frombuffer(data, dtype=np.uint8)
+    # 最高位为0的字节是每个varint的最后一个字节
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # 每个字节在所属varint内的位置，决定左移位数
+    byte_pos = np.arange(len(buf)) - np.repeat(starts, ends - starts + 1)
+    payload = (buf & 0x7F).astype(np.int64) << (7 * byte_pos)
+    return np.cumsum(np.add.reduceat(payload, starts))
+
+
+def intersect_sorted(targets: np.ndarray, doc_nums: np.ndarray) -> np.ndarray:
+    """两个升序文档编号数组求交：targets逐个在doc_nums上二分查找，
+    代价 O(len(targets)·log len(doc_nums))，targets取较短的一方"""
+    if not len(targets) or not len(doc_nums):
+        return np.empty(0, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(doc_nums, targets), len(doc_nums) - 1)
+    return targets[doc_nums[positions] == targets]
+
+
+def _tf_typecode(max_tf: int) -> str:
+    """能容纳max_tf的最窄词频类型码"""
+    for typecode, limit in _TF_TYPECODES:
+        if max_tf <= limit:
+            return typecode
+    raise ValueError(f"词频超出范围: {max_tf}")
+
+
+class PostingList:
+    """单个词项的压缩倒排链
+
+    新文档的编号总是递增分配，追加时只需编码一个差值；
+    删除或乱序插入时解码整条链后重新编码。
+    """
+
+    __slots__ = ('data', 'tfs', 'last_doc', '_skips')
+
+    def __init__(self):
+        self.data = bytearray()   # 差分+varint编码的文档编号
+        self.tfs = array('B')     # 与文档编号一一对应的词频
+        self.last_doc = -1        # 链尾文档编号，用于追加时计算差值
+        self._skips = None        # 跳表指针，按需构建，链变更时失效
+
+    @classmethod
+    def from_postings(cls, postings: Iterable[Tuple[int, int]]) -> 'PostingList':
+        """从按文档编号升序的 (文档编号, 词频) 序列构建倒排链"""
+        postings = list(postings)
+        posting_list = cls()
+        if postings:
+            doc_nums = [doc_num for doc_num, _ in postings]
+            tfs = [tf for _, tf in postings]
+            posting_list.data = encode_doc_nums(doc_nums)
+            posting_list.tfs = array(_tf_typecode(max(tfs)), tfs)
+            posting_list.last_doc = doc_nums[-1]
+        return posting_list
+
+    @classmethod
+    def from_encoded(cls, data, tfs: array, last_doc: int) -> 'PostingList':
+        """直接使用已编码的文档编号和词频数组构建倒排链(如从索引段读出)"""
+        posting_list = cls()
+        posting_list.data = data
+        posting_list.tfs = tfs
+        posting_list.last_doc = last_doc
+        return posting_list
+
+    def __len__(self) -> int:
+        return len(self.tfs)
+
+    def copy(self) -> 'PostingList':
+        """复制一条可独立修改的倒排链(跳表指针只读，直接共享)"""
+        posting_list = PostingList.from_encoded(bytearray(self.data), self.tfs[:], self.last_doc)
+        posting_list._skips = self._skips
+        return posting_list
+
+    def append(self, doc_num: int, tf: int):
+        """在链尾追加posting，doc_num必须大于链尾文档编号"""
+        if doc_num <= self.last_doc:
+            raise ValueError(f"文档编号必须递增: {doc_num} <= {self.last_doc}")
+        _append_varint(self.data, doc_num - max(self.last_doc, 0))
+        self._append_tf(tf)
+        self.last_doc = doc_num
+        self._skips = None
+
+    def extend(self, other: 'PostingList', offset: int):
+        """把另一条倒排链整体追加到链尾，other中的文档编号加上offset，须全部大于本链尾
+
+        只需重新编码other的第一个差值，其余字节直接拼接，不解码整条链。
+        """
+        if not len(other):
+            return
+        first_doc, first_end = _read_varint(other.data)
+        first_doc += offset
+        if first_doc <= self.last_doc:
+            raise ValueError(f"文档编号必须递增: {first_doc} <= {self.last_doc}")
+        _append_varint(self.data, first_doc - max(self.last_doc, 0))
+        self.data += other.data[first_end:]
+        if _TF_LIMITS[other.tfs.typecode] > _TF_LIMITS[self.tfs.typecode]:
+            self.tfs = array(other.tfs.typecode, self.tfs)
+        self.tfs.extend(other.tfs if other.tfs.typecode == self.tfs.typecode else array(self.tfs.typecode, other.tfs))
+        self.last_doc = other.last_doc + offset
+        self._skips = None
+
+    def add(self, doc_num: int, tf: int):
+        """插入或覆盖posting"""
+        if doc_num > self.last_doc:
+            self.append(doc_num, tf)
+            return
+        postings = dict(self.items())
+        postings[doc_num] = tf
+        self._rebuild(sorted(postings.items()))
+
+    def remove(self, doc_num: int) -> bool:
+        """删除posting，文档不在链中时返回False"""
+        return self.remove_many((doc_num,)) > 0
+
+    def remove_many(self, doc_nums: Iterable[int]) -> int:
+        """一次删除多篇文档的posting，只重新编码一次，返回实际删除的数量"""
+        nums = self.doc_nums()
+        keep = ~np.isin(nums, np.fromiter(doc_nums, dtype=np.int64))
+        removed = len(nums) - int(keep.sum())
+        if removed:
+            tfs = np.asarray(self.tfs)[keep]
+            self._rebuild(list(zip(nums[keep].tolist(), tfs.tolist())))
+        return removed
+
+    def doc_nums(self) -> np.ndarray:
+        """解码后的文档编号数组(int64，升序)"""
+        return decode_doc_nums(self.data)
+
+    def tf_array(self) -> np.ndarray:
+        """词频数组(float64，便于直接参与打分)"""
+        return np.array(self.tfs, dtype=np.float64)
+
+    def items(self) -> List[Tuple[int, int]]:
+        """(文档编号, 词频) 列表"""
+        return list(zip(self.doc_nums().tolist(), self.tfs.tolist()))
+
+    def skip_pointers(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """跳表指针 (块尾文档编号, 块起始字节偏移, 块前一个文档编号)，每块 SKIP_INTERVAL 个posting"""
+        if self._skips is None:
+            nums = self.doc_nums()
+            buf = np.frombuffer(self.data, dtype=np.uint8) if self.data else np.empty(0, dtype=np.uint8)
+            block_starts = np.arange(0, len(nums), SKIP_INTERVAL)
+            varint_starts = np.concatenate(([0], np.flatnonzero(buf < 0x80)[:-1] + 1))
+            previous = np.concatenate(([0], nums[:-1]))
+            block_ends = np.minimum(block_starts + SKIP_INTERVAL, len(nums)) - 1
+            self._skips = (nums[block_ends], varint_starts[block_starts], previous[block_starts])
+        return self._skips
+
+    def intersect(self, targets: np.ndarray) -> np.ndarray:
+        """返回升序数组targets中出现在本链的文档编号
+
+        在块尾文档编号上二分定位每个目标所在的块，只解码被命中的块，
+        目标远少于链长时代价与目标数成正比，而不是与链长成正比。
+        """
+        if not len(targets) or not len(self):
+            return np.empty(0, dtype=np.int64)
+        block_last, byte_offsets, bases = self.skip_pointers()
+        blocks = np.searchsorted(block_last, targets)
+        in_range = blocks < len(block_last)
+        targets, blocks = targets[in_range], blocks[in_range]
+        matched = []
+        # 目标升序，所在块号也升序，按块分组
+        bounds = np.flatnonzero(np.diff(blocks)) + 1
+        for group in np.split(np.arange(len(blocks)), bounds):
+            if not len(group):
+                continue
+            block = int(blocks[group[0]])
+            end = int(byte_offsets[block + 1]) if block + 1 < len(byte_offsets) else len(self.data)
+            nums = decode_doc_nums(self.data[int(byte_offsets[block]):end]) + int(bases[block])
+            matched.append(intersect_sorted(targets[group], nums))
+        return np.concatenate(matched) if matched else np.empty(0, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        """倒排链占用的字节数(编码后的文档编号 + 词频数组)"""
+        return len(self.data) + len(self.tfs) * self.tfs.itemsize
+
+    def _append_tf(self, tf: int):
+        if tf > _TF_LIMITS[self.tfs.typecode]:
+            self.tfs = array(_tf_typecode(tf), self.tfs)
+        self.tfs.append(tf)
+
+    def _rebuild(self, postings: List[Tuple[int, int]]):
+        rebuilt = PostingList.from_postings(postings)
+        self.data, self.tfs, self.last_doc = rebuilt.data, rebuilt.tfs, rebuilt.last_doc
+        self._skips = None
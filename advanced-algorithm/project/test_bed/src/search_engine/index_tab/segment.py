@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制索引段格式
+一个索引段由两个文件组成：
+- 索引文件(.seg)：文件头 + 文档ID表 + 词典 + 词项元数据 + 倒排块 + 每文档长度/归一化表 + 词元字符区间
+- 文档库(.docs)：独立存放文档正文，按块压缩，按内部文档编号定位
+两个文件都通过mmap打开，加载只解析固定长度的文件头，其余内容在访问时按页缺页载入。
+"""
+
+import os
+import sys
+import mmap
+import math
+import zlib
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from .posting_list import PostingList, encode_doc_nums, _tf_typecode
+
+# 文件魔数，用于格式识别
+SEGMENT_MAGIC = b"SEIDXSEG"
+DOCSTORE_MAGIC = b"SEDOCSTR"
+SEGMENT_VERSION = 2
+DOCSTORE_VERSION = 2
+SEGMENT_SUFFIX = ".seg"
+DOCSTORE_SUFFIX = ".docs"
+
+# 索引文件各区段，文件头中按此顺序记录 (偏移, 长度)；版本2增加每文档的词元字符区间
+SECTIONS_V1 = ("doc_id_offsets", "doc_id_blob", "term_offsets", "term_blob",
+               "term_meta", "postings", "doc_lengths", "inv_doc_lengths", "bm25_norms")
+SECTIONS = SECTIONS_V1 + ("span_offsets", "spans")
+
+# 文件头：魔数、版本、文档数、词项数、总文档长度、posting总数、k1、b、各区段(偏移, 长度)
+_HEADERS = {
+    1: (struct.Struct("<8sIIIQQdd" + "QQ" * len(SECTIONS_V1)), SECTIONS_V1),
+    2: (struct.Struct("<8sIIIQQdd" + "QQ" * len(SECTIONS)), SECTIONS),
+}
+_HEADER = _HEADERS[SEGMENT_VERSION][0]
+_VERSION_FIELD = struct.Struct("<8sI")
+# 文档库文件头：魔数、版本、文档数；版本2增加块数
+_DOCSTORE_HEADERS = {
+    1: struct.Struct("<8sII"),
+    2: struct.Struct("<8sIII"),
+}
+
+# 文档库每块未压缩的目标字节数：越大压缩率越高，读单篇文档要解压的数据越多
+DOCSTORE_BLOCK_BYTES = 16 * 1024
+DOCSTORE_COMPRESS_LEVEL = 6
+# 每个文档库缓存的已解压块数
+DOCSTORE_CACHE_BLOCKS = 32
+
+# 词项元数据：倒排块偏移、文档编号编码字节数、文档频率、链尾文档编号、词频字节宽度、两种IDF
+TERM_META_DTYPE = np.dtype([
+    ('offset', '<u8'), ('doc_bytes', '<u4'), ('df', '<u4'), ('last_doc', '<u4'),
+    ('tf_size', '<u4'), ('idf_tfidf', '<f8'), ('idf_bm25', '<f8')
+])
+
+_TF_TYPECODE_BY_SIZE = {1: 'B', 2: 'H', 4: 'I'}
+
+
+def detect_index_format(path: str) -> str:
+    """根据文件头识别索引格式，返回 "segment" 或 "json"；目录为分段索引，返回 "segments" """
+    if os.path.isdir(path):
+        return "segments"
+    with open(path, 'rb') as f:
+        head = f.read(len(SEGMENT_MAGIC))
+    return "segment" if head == SEGMENT_MAGIC else "json"
+
+
+def document_store_path(segment_path: str) -> str:
+    """索引段对应的文档库路径"""
+    return os.path.splitext(segment_path)[0] + DOCSTORE_SUFFIX
+
+
+def _string_table(strings: List[str]) -> Tuple[np.ndarray, bytes]:
+    """把字符串列表编码为 (偏移数组, UTF-8拼接内容)"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def atomic_write(path: str, chunks: List[bytes]):
+    """先写临时文件再替换：已mmap打开的旧文件不受影响，写到一半中断也不会留下损坏的文件"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def _little_endian(values: array) -> bytes:
+    """array按小端字节序输出"""
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _StringTable(Sequence):
+    """mmap中的只读字符串表，按下标解码单个字符串"""
+
+    def __init__(self, buf, offsets: np.ndarray, blob_offset: int):
+        self._buf = buf
+        self._offsets = offsets
+        self._blob_offset = blob_offset
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start = self._blob_offset + int(self._offsets[i])
+        end = self._blob_offset + int(self._offsets[i + 1])
+        return self._buf[start:end].decode('utf-8')
+
+    def find(self, key: str) -> int:
+        """二分查找有序表中的字符串，不存在返回-1"""
+        i = bisect_left(self, key)
+        return i if i < len(self) and self[i] == key else -1
+
+
+class DocumentStore(Mapping):
+    """块压缩文档库：按内部文档编号存放正文，mmap只读访问
+
+    版本2：正文按编号顺序拼接，每满 DOCSTORE_BLOCK_BYTES 字节切成一块用zlib压缩，
+    文件头后依次是 各块在压缩区中的偏移、各块的首文档编号、每篇文档在未压缩流中的偏移、压缩区。
+    读取时只解压文档所在的块，最近解压的块留在一个小LRU中；get_many 按块分组，每块只解压一次。
+    版本1(未压缩)的文档库仍可读取。
+    """
+
+    def __init__(self, path: str, cache_blocks: int = DOCSTORE_CACHE_BLOCKS):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _VERSION_FIELD.unpack_from(self._mm, 0)
+        if magic != DOCSTORE_MAGIC:
+            raise ValueError(f"不是有效的文档库文件: {path}")
+        if version not in _DOCSTORE_HEADERS:
+            raise ValueError(f"不支持的文档库版本: {version}")
+        self.version = version
+        self._cache_blocks = cache_blocks
+        self._blocks = OrderedDict()  # 块号 -> 解压后的字节
+        self._lock = threading.Lock()
+        if version == 1:
+            _, _, count = _DOCSTORE_HEADERS[1].unpack_from(self._mm, 0)
+            offset = _DOCSTORE_HEADERS[1].size
+            self._count = count
+            self._texts = _StringTable(self._mm, np.frombuffer(self._mm, dtype='<u8', count=count + 1, offset=offset),
+                                       offset + (count + 1) * 8)
+            return
+        _, _, count, num_blocks = _DOCSTORE_HEADERS[2].unpack_from(self._mm, 0)
+        offset = _DOCSTORE_HEADERS[2].size
+        self._count = count
+        self._block_offsets = np.frombuffer(self._mm, dtype='<u8', count=num_blocks + 1, offset=offset)
+        offset += (num_blocks + 1) * 8
+        self._block_first_docs = np.frombuffer(self._mm, dtype='<u4', count=num_blocks + 1, offset=offset)
+        offset += (num_blocks + 1) * 4
+        self._doc_offsets = np.frombuffer(self._mm, dtype='<u8', count=count + 1, offset=offset)
+        self._blob_offset = offset + (count + 1) * 8
+
+    @staticmethod
+    def write(path: str, contents: Iterable[str], block_bytes: int = DOCSTORE_BLOCK_BYTES):
+        """按内部文档编号顺序写入文档正文，contents 可以是生成器(逐块压缩，不整体驻留内存)"""
+        doc_offsets = array('Q', [0])
+        block_offsets = array('Q', [0])
+        block_first_docs = array('I', [0])
+        compressed = []
+        pending = []
+        pending_bytes = 0
+        for text in contents:
+            encoded = text.encode('utf-8')
+            pending.append(encoded)
+            pending_bytes += len(encoded)
+            doc_offsets.append(doc_offsets[-1] + len(encoded))
+            if pending_bytes >= block_bytes:
+                compressed.append(zlib.compress(b"".join(pending), DOCSTORE_COMPRESS_LEVEL))
+                block_offsets.append(block_offsets[-1] + len(compressed[-1]))
+                block_first_docs.append(len(doc_offsets) - 1)
+                pending, pending_bytes = [], 0
+        if pending:
+            compressed.append(zlib.compress(b"".join(pending), DOCSTORE_COMPRESS_LEVEL))
+            block_offsets.append(block_offsets[-1] + len(compressed[-1]))
+            block_first_docs.append(len(doc_offsets) - 1)
+        count = len(doc_offsets) - 1
+        header = _DOCSTORE_HEADERS[2].pack(DOCSTORE_MAGIC, DOCSTORE_VERSION, count, len(compressed))
+        atomic_write(path, [header, _little_endian(block_offsets), _little_endian(block_first_docs),
+                            _little_endian(doc_offsets)] + compressed)
+
+    def __getitem__(self, doc_num: int) -> str:
+        if self.version == 1:
+            return self._texts[doc_num]
+        if doc_num < 0:
+            doc_num += self._count
+        if not 0 <= doc_num < self._count:
+            raise IndexError(doc_num)
+        block_no = self._block_of(doc_num)
+        return self._slice(self._block(block_no), block_no, doc_num)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._count))
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """文件大小(字节)，即压缩后的占用"""
+        return len(self._mm)
+
+    @property
+    def raw_bytes(self) -> int:
+        """正文未压缩的UTF-8字节数"""
+        if self.version == 1:
+            return int(self._texts._offsets[-1]) if self._count else 0
+        return int(self._doc_offsets[-1])
+
+    def get_many(self, doc_nums: Iterable[int]) -> Dict[int, str]:
+        """批量读取 {文档编号: 正文}，同一块的文档只解压一次"""
+        if self.version == 1:
+            return {doc_num: self._texts[doc_num] for doc_num in doc_nums}
+        by_block = {}
+        for doc_num in doc_nums:
+            if not 0 <= doc_num < self._count:
+                raise IndexError(doc_num)
+            by_block.setdefault(self._block_of(doc_num), []).append(doc_num)
+        result = {}
+        for block_no in sorted(by_block):
+            data = self._block(block_no)
+            for doc_num in by_block[block_no]:
+                result[doc_num] = self._slice(data, block_no, doc_num)
+        return result
+
+    def _block_of(self, doc_num: int) -> int:
+        return int(np.searchsorted(self._block_first_docs, doc_num, side='right')) - 1
+
+    def _slice(self, data: bytes, block_no: int, doc_num: int) -> str:
+        base = int(self._doc_offsets[int(self._block_first_docs[block_no])])
+        return data[int(self._doc_offsets[doc_num]) - base:int(self._doc_offsets[doc_num + 1]) - base].decode('utf-8')
+
+    def _block(self, block_no: int) -> bytes:
+        """解压第block_no块，命中LRU时直接返回"""
+        with self._lock:
+            data = self._blocks.get(block_no)
+            if data is not None:
+                self._blocks.move_to_end(block_no)
+                return data
+        start = self._blob_offset + int(self._block_offsets[block_no])
+        end = self._blob_offset + int(self._block_offsets[block_no + 1])
+        data = zlib.decompress(self._mm[start:end])
+        with self._lock:
+            self._blocks[block_no] = data
+            while len(self._blocks) > self._cache_blocks:
+                self._blocks.popitem(last=False)
+        return data
+
+
+class DocumentTable(MutableMapping):
+    """文档ID -> 正文 的可写映射，供 InvertedIndex.documents 使用
+
+    已落盘的文档只记录 文档ID -> 文档库编号，正文留在mmap打开的压缩文档库中按需解压；
+    新增或修改的文档保存在内存里，删除只去掉映射。遍历顺序为 落盘文档(按编号) + 内存文档(按写入顺序)，
+    与 InvertedIndex 的内部文档编号顺序一致。
+    """
+
+    def __init__(self, documents: Optional[Dict[str, str]] = None, store: Optional[DocumentStore] = None,
+                 stored_ids: Iterable[str] = ()):
+        self._memory = dict(documents or {})
+        self._store = store
+        self._stored = {doc_id: doc_num for doc_num, doc_id in enumerate(stored_ids)}
+
+    def __getitem__(self, doc_id: str) -> str:
+        content = self._memory.get(doc_id)
+        if content is not None:
+            return content
+        return self._store[self._stored[doc_id]]
+
+    def __setitem__(self, doc_id: str, content: str):
+        self._stored.pop(doc_id, None)
+        self._memory[doc_id] = content
+
+    def __delitem__(self, doc_id: str):
+        if doc_id in self._memory:
+            del self._memory[doc_id]
+        else:
+            del self._stored[doc_id]
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._memory or doc_id in self._stored
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._stored
+        yield from self._memory
+
+    def __len__(self) -> int:
+        return len(self._stored) + len(self._memory)
+
+    def __reduce__(self):
+        # 跨进程传递(分片子进程)时物化为纯内存表，不依赖对方能打开同一个mmap
+        return (DocumentTable, (self.get_many(list(self)),))
+
+    def copy(self) -> 'DocumentTable':
+        """浅拷贝：共享只读文档库，映射和内存正文各自独立"""
+        clone = DocumentTable.__new__(DocumentTable)
+        clone._memory = dict(self._memory)
+        clone._store = self._store
+        clone._stored = dict(self._stored)
+        return clone
+
+    def get_many(self, doc_ids: Iterable[str]) -> Dict[str, str]:
+        """批量读取 {文档ID: 正文}，按参数顺序返回，不存在的ID跳过；落盘文档按块分组解压"""
+        doc_ids = list(doc_ids)
+        stored = {self._stored[doc_id]: doc_id for doc_id in doc_ids
+                  if doc_id not in self._memory and doc_id in self._stored}
+        texts = {}
+        if stored:
+            texts = {stored[doc_num]: text for doc_num, text in self._store.get_many(stored).items()}
+        return {doc_id: self._memory[doc_id] if doc_id in self._memory else texts[doc_id]
+                for doc_id in doc_ids if doc_id in self._memory or doc_id in texts}
+
+    @property
+    def memory_bytes(self) -> int:
+        """内存中正文的字节数(Python字符串对象大小)"""
+        return sum(sys.getsizeof(text) for text in self._memory.values())
+
+    @property
+    def store_bytes(self) -> int:
+        """落盘文档库的字节数(压缩后，mmap按需载入)"""
+        return self._store.nbytes if self._store is not None else 0
+
+
+class _SegmentPostings(Mapping):
+    """词项 -> PostingList 的只读视图，访问时才从mmap中切出对应倒排块"""
+
+    def __init__(self, segment: 'IndexSegment'):
+        self._segment = segment
+
+    def __getitem__(self, word: str) -> PostingList:
+        term_no = self._segment.terms.find(word)
+        if term_no < 0:
+            raise KeyError(word)
+        return self._segment.posting_list(term_no)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._segment.terms)
+
+    def __len__(self) -> int:
+        return len(self._segment.terms)
+
+
+class _SegmentIdfTable(Mapping):
+    """词项 -> 预计算IDF 的只读视图"""
+
+    def __init__(self, segment: 'IndexSegment', field: str):
+        self._segment = segment
+        self._values = segment.term_meta[field]
+
+    def __getitem__(self, word: str) -> float:
+        term_no = self._segment.terms.find(word)
+        if term_no < 0:
+            raise KeyError(word)
+        return float(self._values[term_no])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._segment.terms)
+
+    def __len__(self) -> int:
+        return len(self._segment.terms)
+
+
+class _SegmentDocNums(Mapping):
+    """文档ID -> 内部文档编号 的只读视图，文档ID表有序，二分查找"""
+
+    def __init__(self, segment: 'IndexSegment'):
+        self._doc_ids = segment.doc_ids
+
+    def __getitem__(self, doc_id: str) -> int:
+        doc_num = self._doc_ids.find(doc_id)
+        if doc_num < 0:
+            raise KeyError(doc_id)
+        return doc_num
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._doc_ids)
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+
+class _SegmentDocSpans(Sequence):
+    """内部文档编号 -> 词元字符区间 [起点0, 终点0, 起点1, ...] (mmap视图)；版本1的索引段没有区间，返回空数组"""
+
+    def __init__(self, segment: 'IndexSegment'):
+        self._segment = segment
+        self._offsets = segment._view("span_offsets", '<u8') if "span_offsets" in segment.sections else None
+        self._spans = segment._view("spans", '<u4') if "spans" in segment.sections else None
+
+    def __getitem__(self, doc_num: int) -> np.ndarray:
+        if self._offsets is None:
+            return np.empty(0, dtype='<u4')
+        return self._spans[int(self._offsets[doc_num]):int(self._offsets[doc_num + 1])]
+
+    def __len__(self) -> int:
+        return self._segment.num_docs
+
+
+class _SegmentDocuments(Mapping):
+    """文档ID -> 正文 的只读视图"""
+
+    def __init__(self, segment: 'IndexSegment'):
+        self._doc_nums = segment.doc_nums
+        self._store = segment.store
+
+    def __getitem__(self, doc_id: str) -> str:
+        return self._store[self._doc_nums[doc_id]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._doc_nums)
+
+    def __len__(self) -> int:
+        return len(self._doc_nums)
+
+    def get_many(self, doc_ids: Iterable[str]) -> Dict[str, str]:
+        """批量读取 {文档ID: 正文}，不存在的ID跳过"""
+        doc_nums = {}
+        for doc_id in doc_ids:
+            doc_num = self._doc_nums.get(doc_id)
+            if doc_num is not None:
+                doc_nums[doc_num] = doc_id
+        texts = self._store.get_many(doc_nums)
+        return {doc_id: texts[doc_num] for doc_num, doc_id in doc_nums.items()}
+
+
+class IndexSegment:
+    """mmap打开的只读索引段
+
+    打开时只解析文件头并建立各区段的零拷贝视图(np.frombuffer)，
+    词典查找、倒排块读取、文档正文读取都直接落到mmap上。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _VERSION_FIELD.unpack_from(self._mm, 0)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"不是有效的索引段文件: {path}")
+        if version not in _HEADERS:
+            raise ValueError(f"不支持的索引段版本: {version}")
+        header, sections = _HEADERS[version]
+        fields = header.unpack_from(self._mm, 0)
+        num_docs, num_terms, total_doc_length, total_postings, k1, b = fields[2:8]
+        self.version = version
+        self.num_docs = num_docs
+        self.num_terms = num_terms
+        self.total_doc_length = total_doc_length
+        self.total_postings = total_postings
+        self.k1 = k1
+        self.b = b
+        self.sections = {name: (fields[8 + 2 * i], fields[9 + 2 * i]) for i, name in enumerate(sections)}
+
+        self.doc_ids = _StringTable(self._mm, self._view("doc_id_offsets", '<u8'),
+                                    self.sections["doc_id_blob"][0])
+        self.terms = _StringTable(self._mm, self._view("term_offsets", '<u8'),
+                                  self.sections["term_blob"][0])
+        self.term_meta = self._view("term_meta", TERM_META_DTYPE)
+        self.doc_lengths = self._view("doc_lengths", '<u4')
+        self.inv_doc_lengths = self._view("inv_doc_lengths", '<f8')
+        self.bm25_norms = self._view("bm25_norms", '<f8')
+        self.store = DocumentStore(document_store_path(path))
+
+        self.postings = _SegmentPostings(self)
+        self.doc_nums = _SegmentDocNums(self)
+        self.documents = _SegmentDocuments(self)
+        self.doc_spans = _SegmentDocSpans(self)
+        self.idf_tables = {
+            'tfidf': _SegmentIdfTable(self, 'idf_tfidf'),
+            'bm25': _SegmentIdfTable(self, 'idf_bm25'),
+            'bm25+': _SegmentIdfTable(self, 'idf_bm25')
+        }
+
+    def _view(self, section: str, dtype) -> np.ndarray:
+        offset, length = self.sections[section]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._mm, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    @property
+    def posting_bytes(self) -> int:
+        return self.sections["postings"][1]
+
+    def posting_list(self, term_no: int) -> PostingList:
+        """切出第term_no个词项的倒排块"""
+        meta = self.term_meta[term_no]
+        start = self.sections["postings"][0] + int(meta['offset'])
+        doc_end = start + int(meta['doc_bytes'])
+        tf_size = int(meta['tf_size'])
+        tfs = array(_TF_TYPECODE_BY_SIZE[tf_size])
+        tfs.frombytes(self._mm[doc_end:doc_end + int(meta['df']) * tf_size])
+        return PostingList.from_encoded(self._mm[start:doc_end], tfs, int(meta['last_doc']))
+
+    @staticmethod
+    def write(index, path: str):
+        """把倒排索引写成索引段 + 文档库
+
+        只写入现存文档，按文档ID排序重新分配内部编号，文档ID表因此可以二分查找。
+        """
+        doc_ids = sorted(index.doc_nums)
+        old_nums = np.array([index.doc_nums[doc_id] for doc_id in doc_ids], dtype=np.int64)
+        remap = np.full(len(index.doc_ids), -1, dtype=np.int64)
+        remap[old_nums] = np.arange(len(doc_ids))
+        doc_lengths = np.asarray(index.doc_lengths, dtype=np.float64)[old_nums]
+
+        num_docs = len(doc_ids)
+        total_doc_length = int(doc_lengths.sum())
+        avg_doc_length = total_doc_length / num_docs if num_docs > 0 else 0
+
+        terms = sorted(index.postings)
+        term_meta = np.zeros(len(terms), dtype=TERM_META_DTYPE)
+        posting_chunks = []
+        posting_offset = 0
+        total_postings = 0
+        for term_no, word in enumerate(terms):
+            posting_list = index.postings[word]
+            new_nums = remap[posting_list.doc_nums()]
+            order = np.argsort(new_nums, kind='stable')
+            new_nums = new_nums[order].tolist()
+            tfs = np.asarray(posting_list.tfs)[order].tolist()
+            doc_data = bytes(encode_doc_nums(new_nums))
+            tf_data = array(_tf_typecode(max(tfs)), tfs)
+            df = len(new_nums)
+            term_meta[term_no] = (posting_offset, len(doc_data), df, new_nums[-1], tf_data.itemsize,
+                                  math.log(num_docs / df),
+                                  math.log(1 + (num_docs - df + 0.5) / (df + 0.5)))
+            posting_chunks.append(doc_data)
+            posting_chunks.append(tf_data.tobytes())
+            posting_offset += len(doc_data) + len(tf_data) * tf_data.itemsize
+            total_postings += df
+
+        inv_doc_lengths = np.divide(1.0, doc_lengths, out=np.zeros_like(doc_lengths), where=doc_lengths > 0)
+        if avg_doc_length > 0:
+            bm25_norms = index.k1 * (1 - index.b + index.b * doc_lengths / avg_doc_length)
+        else:
+            bm25_norms = np.full_like(doc_lengths, index.k1)
+
+        spans = [np.asarray(index.doc_spans[num], dtype='<u4') for num in old_nums.tolist()]
+        span_offsets = np.zeros(num_docs + 1, dtype='<u8')
+        np.cumsum([len(s) for s in spans], out=span_offsets[1:])
+
+        doc_id_offsets, doc_id_blob = _string_table(doc_ids)
+        term_offsets, term_blob = _string_table(terms)
+        section_data = {
+            "doc_id_offsets": doc_id_offsets.tobytes(),
+            "doc_id_blob": doc_id_blob,
+            "term_offsets": term_offsets.tobytes(),
+            "term_blob": term_blob,
+            "term_meta": term_meta.tobytes(),
+            "postings": b"".join(posting_chunks),
+            "doc_lengths": doc_lengths.astype('<u4').tobytes(),
+            "inv_doc_lengths": inv_doc_lengths.astype('<f8').tobytes(),
+            "bm25_norms": bm25_norms.astype('<f8').tobytes(),
+            "span_offsets": span_offsets.tobytes(),
+            "spans": b"".join(s.tobytes() for s in spans)
+        }
+
+        layout = []
+        offset = _HEADER.size
+        for name in SECTIONS:
+            layout.extend((offset, len(section_data[name])))
+            offset += len(section_data[name])
+        header = _HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, num_docs, len(terms), total_doc_length,
+                              total_postings, index.k1, index.b, *layout)
+
+        # 先写文档库，再替换索引文件，索引文件出现时文档库一定完整
+        DocumentStore.write(document_store_path(path), (index.documents[doc_id] for doc_id in doc_ids))
+        atomic_write(path, [header] + [section_data[name] for name in SECTIONS])
+
+
+def convert_json_to_segment(json_path: str, segment_path: Optional[str] = None) -> str:
+    """把JSON格式的索引文件转换为二进制索引段，返回索引段路径"""
+    from .offline_index import InvertedIndex
+
+    segment_path = segment_path or os.path.splitext(json_path)[0] + SEGMENT_SUFFIX
+    index = InvertedIndex()
+    index.load_from_file(json_path)
+    index.save_segment(segment_path)
+    return segment_path
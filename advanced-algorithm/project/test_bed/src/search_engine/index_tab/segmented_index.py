@@ -0,0 +1,793 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段增量索引(LSM风格)
+- 新文档写入内存段(可修改的InvertedIndex)，达到阈值后落盘为不可变的索引段文件
+- 删除和覆盖写对已落盘的文档只记墓碑，不改写段文件
+- 后台合并线程按分层策略把小段合并成大段，同时清理墓碑
+- 查询扇出到所有段，用全局文档数/平均长度/文档频率打分后归并top_k
+段列表和墓碑记录在目录下的 manifest.json 中；上次落盘之后的写入(内存段文档和墓碑)
+先追加到预写日志 wal.log，重新打开时重放，进程崩溃不会丢失未落盘的文档。
+"""
+
+import os
+import json
+import heapq
+import threading
+from array import array
+from collections import Counter, defaultdict
+from typing import List, Dict, Tuple, Optional, Any
+import numpy as np
+
+from .offline_index import (
+    InvertedIndex, MAX_WILDCARD_EXPANSIONS, compute_idf, compute_term_bounds, rank_query_terms, unscored_matches,
+    validate_search_args
+)
+from .boolean_query import restrict_to_docs
+from .term_dictionary import literal_prefix, merge_term_matches, top_terms_by_df, expand_from_matches
+from .posting_list import PostingList
+from .bulk_builder import bulk_add_documents
+from .segment import IndexSegment, SEGMENT_SUFFIX, DOCSTORE_SUFFIX, document_store_path
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+# 预写日志：每行一条写操作(JSON)，内存段落盘、manifest持久化全部状态后清空
+WAL_FILE = "wal.log"
+
+# 内存段达到多少篇文档后落盘
+DEFAULT_FLUSH_THRESHOLD = 1000
+
+# 同一层的段数达到多少时合并
+DEFAULT_MERGE_FACTOR = 4
+
+# 墓碑占比超过该值的段单独重写，回收空间
+EXPUNGE_DELETES_RATIO = 0.5
+
+
+def is_segmented_index_path(path: str) -> bool:
+    """目录或不带扩展名的新路径按分段索引目录处理"""
+    if os.path.isdir(path):
+        return True
+    return not os.path.exists(path) and not os.path.splitext(path)[1]
+
+
+class _SegmentEntry:
+    """一个已落盘的索引段及其墓碑"""
+
+    __slots__ = ('name', 'reader', 'deleted', 'deleted_count', 'deleted_length', 'merging')
+
+    def __init__(self, name: str, reader: InvertedIndex, deleted_doc_nums: List[int]):
+        self.name = name
+        self.reader = reader  # load_segment 打开的只读InvertedIndex
+        self.deleted = np.zeros(reader.segment.num_docs, dtype=bool)
+        self.deleted_count = 0
+        self.deleted_length = 0
+        self.merging = False
+        for doc_num in deleted_doc_nums:
+            self.mark_deleted(doc_num)
+
+    @property
+    def num_docs(self) -> int:
+        return self.reader.segment.num_docs
+
+    @property
+    def live_docs(self) -> int:
+        return self.num_docs - self.deleted_count
+
+    @property
+    def live_length(self) -> int:
+        return self.reader.segment.total_doc_length - self.deleted_length
+
+    def find(self, doc_id: str) -> Optional[int]:
+        """查找未删除文档的段内编号"""
+        doc_num = self.reader.doc_nums.get(doc_id)
+        if doc_num is None or self.deleted[doc_num]:
+            return None
+        return doc_num
+
+    def mark_deleted(self, doc_num: int):
+        if not self.deleted[doc_num]:
+            self.deleted[doc_num] = True
+            self.deleted_count += 1
+            self.deleted_length += int(self.reader.doc_lengths[doc_num])
+
+
+class SegmentedIndex:
+    """分段增量索引，对外接口与 InvertedIndex 保持一致
+
+    查询和写入共用 self.lock：内存段和墓碑原地修改，查询在锁内读取，
+    会等待进行中的写入(包括内存段落盘时写段文件)；后台合并在锁外构建新段，只在替换段列表时持锁。
+
+    持久性：每次写入先追加到预写日志并刷到操作系统，进程崩溃后重新打开时重放；
+    fsync_wal=True 时每条日志还会 fsync，断电也不丢失，代价是每次写入一次磁盘同步。
+    """
+
+    def __init__(self, directory: str, flush_threshold: int = DEFAULT_FLUSH_THRESHOLD,
+                 merge_factor: int = DEFAULT_MERGE_FACTOR, background_merge: bool = True,
+                 k1: float = 1.2, b: float = 0.75, delta: float = 1.0, fsync_wal: bool = False):
+        self.directory = directory
+        self.flush_threshold = flush_threshold
+        self.merge_factor = merge_factor
+        self.background_merge = background_merge
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+        self.fsync_wal = fsync_wal
+
+        self.lock = threading.RLock()
+        self.memory = self._new_memory_segment()
+        self.segments: List[_SegmentEntry] = []
+        self._next_segment_id = 1
+        self.stats = {'flushes': 0, 'merges': 0, 'merged_segments': 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._wal = None
+        self._load_manifest()
+        self._replay_wal()
+
+        # 后台合并线程：_wakeup 触发合并，_idle 表示当前没有待合并的任务
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._merge_thread = None
+        if background_merge:
+            self._merge_thread = threading.Thread(target=self._merge_loop, name="segment-merger", daemon=True)
+            self._merge_thread.start()
+
+    def _new_memory_segment(self) -> InvertedIndex:
+        return InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+
+    def preprocess_text(self, text: str) -> List[str]:
+        """文本预处理，与 InvertedIndex 一致"""
+        return self.memory.preprocess_text(text)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def add_document(self, doc_id: str, content: str):
+        """写入内存段；已落盘的旧版本记墓碑，内存段满时落盘"""
+        with self.lock:
+            self._log_write({'op': 'add', 'doc_id': doc_id, 'content': content})
+            self._apply_add(doc_id, content)
+            if len(self.memory.documents) >= self.flush_threshold:
+                self.flush()
+
+    def _apply_add(self, doc_id: str, content: str):
+        self._tombstone(doc_id)
+        self.memory.add_document(doc_id, content)
+
+    def add_documents(self, documents: Dict[str, str], workers: Optional[int] = None) -> Dict[str, Any]:
+        """批量写入：在进程池中并行构建成一个新段直接落盘，已有文档的旧版本删除或记墓碑，返回构建统计
+
+        内存段先落盘(清空预写日志)，日志重放时不会再给新段里的文档记墓碑。
+        """
+        source = InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+        stats = bulk_add_documents(source, documents, workers)
+        with self.lock:
+            self.memory.batch_delete_documents(list(documents))
+            self.flush()
+            for doc_id in documents:
+                self._tombstone(doc_id)
+            if source.documents:
+                name = self._allocate_segment_name()
+                IndexSegment.write(source, os.path.join(self.directory, name))
+                self.segments.append(self._open_entry(name, []))
+                self._write_manifest()
+        self._request_merge()
+        return stats
+
+    def update_document(self, doc_id: str, content: str) -> bool:
+        """用新内容替换已有文档，文档不存在时返回False"""
+        with self.lock:
+            if doc_id not in self.memory.doc_nums and not any(entry.find(doc_id) is not None
+                                                              for entry in self.segments):
+                return False
+            self.add_document(doc_id, content)
+            return True
+
+    def delete_document(self, doc_id: str) -> bool:
+        """删除文档：内存段直接删除，已落盘的文档记墓碑"""
+        return self.batch_delete_documents([doc_id]) == 1
+
+    def batch_delete_documents(self, doc_ids: List[str]) -> int:
+        """批量删除文档，返回实际删除的文档数"""
+        with self.lock:
+            doc_ids = list(dict.fromkeys(doc_ids))
+            self._log_write({'op': 'delete', 'doc_ids': doc_ids})
+            return self._apply_delete(doc_ids)
+
+    def _apply_delete(self, doc_ids: List[str]) -> int:
+        deleted = self.memory.batch_delete_documents(doc_ids)
+        for doc_id in doc_ids:
+            if self._tombstone(doc_id):
+                deleted += 1
+        return deleted
+
+    def _tombstone(self, doc_id: str) -> bool:
+        for entry in self.segments:
+            doc_num = entry.find(doc_id)
+            if doc_num is not None:
+                entry.mark_deleted(doc_num)
+                return True
+        return False
+
+    def flush(self) -> bool:
+        """把内存段写成不可变的索引段文件，返回是否产生了新段"""
+        with self.lock:
+            if not self.memory.documents:
+                return False
+            name = self._allocate_segment_name()
+            IndexSegment.write(self.memory, os.path.join(self.directory, name))
+            self.segments.append(self._open_entry(name, []))
+            self.memory = self._new_memory_segment()
+            self.stats['flushes'] += 1
+            self._write_manifest()
+            self._truncate_wal()
+        print(f"💾 内存段已落盘: {name}")
+        self._request_merge()
+        return True
+
+    def commit(self):
+        """落盘内存段并持久化墓碑"""
+        with self.lock:
+            if not self.flush():
+                self._write_manifest()
+                self._truncate_wal()
+
+    def clear(self):
+        """删除所有段，清空索引"""
+        with self.lock:
+            names = [entry.name for entry in self.segments]
+            self.segments = []
+            self.memory = self._new_memory_segment()
+            self._write_manifest()
+            self._truncate_wal()
+        for name in names:
+            self._remove_segment_files(name)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, top_k: int = 5, strategy: str = "taat",
+               scorer: str = "tfidf") -> List[Tuple[str, float, str]]:
+        """扇出到所有段检索，返回 (文档ID, 分数, 摘要)；短语/邻近约束和布尔查询在各段内分别求值"""
+        query_words, clauses = self.parse_query(query)
+        with self.lock:
+            results = self._score_query_words(query_words, top_k, strategy, scorer, clauses)
+            return [(doc_id, score, reader.generate_summary(doc_id, query_words))
+                    for doc_id, score, reader in results]
+
+    def retrieve(self, query: str, top_k: int = 5, strategy: str = "taat", scorer: str = "tfidf",
+                 doc_ids: List[str] = None) -> List[Tuple[str, float]]:
+        """只召回 (文档ID, 分数)，不生成摘要；给出 doc_ids 时只在这些文档中打分"""
+        query_words, clauses = self.parse_query(query)
+        if doc_ids is not None:
+            clauses = restrict_to_docs(query_words, clauses, doc_ids)
+        with self.lock:
+            results = self._score_query_words(query_words, top_k, strategy, scorer, clauses)
+        return [(doc_id, score) for doc_id, score, _ in results]
+
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    scorer: str = "tfidf") -> List[List[Tuple[str, float]]]:
+        """批量召回，与 queries 一一对应；各段共享全局统计量，逐条打分"""
+        return [self.retrieve(query, top_k, scorer=scorer) for query in queries]
+
+    def parse_query(self, query: str) -> Tuple[List[str], List[Tuple]]:
+        """解析查询，与 InvertedIndex 一致，通配符按所有段的词典展开"""
+        return self.memory.parse_query(query, self.expand_wildcard)
+
+    def get_summaries(self, doc_ids: List[str], query_words: List[str]) -> Dict[str, str]:
+        """批量生成摘要，由文档所在的段生成，不存在的文档跳过"""
+        summaries = {}
+        with self.lock:
+            for doc_id in doc_ids:
+                if doc_id in self.memory.doc_nums:
+                    summaries[doc_id] = self.memory.generate_summary(doc_id, query_words)
+                    continue
+                for entry in self.segments:
+                    if entry.find(doc_id) is not None:
+                        summaries[doc_id] = entry.reader.generate_summary(doc_id, query_words)
+                        break
+        return summaries
+
+    def proximity_score(self, doc_id: str, query_words: List[str]) -> float:
+        """查询词在文档中的邻近度特征，由文档所在的段计算"""
+        with self.lock:
+            if doc_id in self.memory.doc_nums:
+                return self.memory.proximity_score(doc_id, query_words)
+            for entry in self.segments:
+                if entry.find(doc_id) is not None:
+                    return entry.reader.proximity_score(doc_id, query_words)
+        return 0.0
+
+    def _readers(self) -> List[Tuple[InvertedIndex, Optional[np.ndarray]]]:
+        """所有可检索的段 (只读索引, 墓碑)，内存段没有墓碑"""
+        readers = [(entry.reader, entry.deleted) for entry in self.segments]
+        readers.append((self.memory, None))
+        return readers
+
+    def _score_query_words(self, query_words: List[str], top_k: int, strategy: str, scorer: str,
+                           clauses: List[Tuple] = None) -> List[Tuple[str, float, InvertedIndex]]:
+        """各段用全局统计量打分，各取top_k后归并"""
+        validate_search_args(strategy, scorer)
+        if not (query_words or clauses) or top_k <= 0:
+            return []
+
+        total_docs, total_length = self._live_totals()
+        if total_docs == 0:
+            return []
+        avg_doc_length = total_length / total_docs
+
+        # 先在各段解码查询词的倒排链并去掉墓碑文档，统计全局文档频率
+        query_tf = Counter(query_words)
+        doc_freq = Counter()
+        segment_postings = []
+        for reader, deleted in self._readers():
+            reader._ensure_scoring_tables()
+            postings = {}
+            for word in query_tf:
+                if word not in reader.postings:
+                    continue
+                doc_nums, tfs = reader._get_decoded_postings(word)
+                if deleted is not None and self._has_deletes(deleted):
+                    keep = ~deleted[doc_nums]
+                    doc_nums, tfs = doc_nums[keep], tfs[keep]
+                if len(doc_nums):
+                    postings[word] = (doc_nums, tfs)
+                    doc_freq[word] += len(doc_nums)
+            allowed = reader.match_clauses(clauses) if clauses else None
+            if allowed is not None and deleted is not None and self._has_deletes(deleted):
+                allowed = allowed[~deleted[allowed]]
+            segment_postings.append((reader, postings, allowed))
+
+        weights = {word: query_tf[word] * compute_idf(scorer, total_docs, df) for word, df in doc_freq.items()}
+        with_bounds = strategy in ("wand", "bmw")
+        candidates = []
+        for reader, postings, allowed in segment_postings:
+            if allowed is not None and not len(allowed):
+                continue
+            terms = []
+            for word, (doc_nums, tfs) in postings.items():
+                if allowed is not None:
+                    keep = np.isin(doc_nums, allowed, assume_unique=True)
+                    doc_nums, tfs = doc_nums[keep], tfs[keep]
+                    if not len(doc_nums):
+                        continue
+                scores = reader._tf_scores(doc_nums, tfs, scorer, avg_doc_length)
+                bounds = compute_term_bounds(doc_nums, scores) if with_bounds else None
+                terms.append((weights[word], doc_nums, scores, bounds))
+            ranked = rank_query_terms(strategy, terms, top_k)
+            if allowed is not None and len(ranked) < top_k:
+                ranked += unscored_matches(allowed, ranked, top_k - len(ranked))
+            for doc_num, score in ranked:
+                candidates.append((score, reader.doc_ids[doc_num], reader))
+
+        top = heapq.nsmallest(top_k, candidates, key=lambda x: (-x[0], x[1]))
+        return [(doc_id, score, reader) for score, doc_id, reader in top]
+
+    @staticmethod
+    def _has_deletes(deleted: np.ndarray) -> bool:
+        return bool(deleted.any())
+
+    def _live_totals(self) -> Tuple[int, int]:
+        """全局存活文档数和总文档长度"""
+        total_docs = len(self.memory.documents)
+        total_length = self.memory.total_doc_length
+        for entry in self.segments:
+            total_docs += entry.live_docs
+            total_length += entry.live_length
+        return total_docs, total_length
+
+    # ------------------------------------------------------------------
+    # 文档访问与统计
+    # ------------------------------------------------------------------
+
+    def get_document(self, doc_id: str) -> str:
+        """获取文档内容"""
+        with self.lock:
+            if doc_id in self.memory.documents:
+                return self.memory.documents[doc_id]
+            for entry in self.segments:
+                doc_num = entry.find(doc_id)
+                if doc_num is not None:
+                    return entry.reader.segment.store[doc_num]
+        return ""
+
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, str]:
+        """批量获取文档内容，按索引段分组，每段的文档库中同一块只解压一次"""
+        with self.lock:
+            found = self.memory.get_documents(doc_ids)
+            pending = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id not in found]
+            for entry in self.segments:
+                if not pending:
+                    break
+                doc_nums = {}
+                for doc_id in pending:
+                    doc_num = entry.find(doc_id)
+                    if doc_num is not None:
+                        doc_nums[doc_num] = doc_id
+                for doc_num, text in entry.reader.segment.store.get_many(doc_nums).items():
+                    found[doc_nums[doc_num]] = text
+                pending = [doc_id for doc_id in pending if doc_id not in found]
+            return {doc_id: found[doc_id] for doc_id in doc_ids if doc_id in found}
+
+    def get_all_documents(self) -> Dict[str, str]:
+        """获取所有文档"""
+        with self.lock:
+            documents = {}
+            for entry in self.segments:
+                live = [doc_num for doc_num in range(len(entry.reader.doc_ids)) if not entry.deleted[doc_num]]
+                texts = entry.reader.segment.store.get_many(live)
+                for doc_num in live:
+                    documents[entry.reader.doc_ids[doc_num]] = texts[doc_num]
+            documents.update(self.memory.get_all_documents())
+            return documents
+
+    def get_terms(self, limit: int = None) -> List[str]:
+        """获取词项列表(按段顺序去重)"""
+        with self.lock:
+            terms = {}
+            for reader, _ in self._readers():
+                for word in reader.postings:
+                    terms[word] = None
+                    if limit is not None and len(terms) >= limit:
+                        return list(terms)
+            return list(terms)
+
+    def _term_matches(self, prefix: str, pattern: str = None) -> Counter:
+        """汇总各段词典中以prefix开头(且匹配pattern)的词项，df为各段倒排链长度之和(含未清理的墓碑)"""
+        with self.lock:
+            return merge_term_matches(reader.term_matches(prefix, pattern) for reader, _ in self._readers())
+
+    def prefix_terms(self, prefix: str, limit: int = None) -> List[str]:
+        """以prefix开头的词项(升序)"""
+        return sorted(self._term_matches(prefix.lower()))[:limit]
+
+    def expand_wildcard(self, pattern: str, limit: int = MAX_WILDCARD_EXPANSIONS) -> List[str]:
+        """通配符展开，与 InvertedIndex 一致"""
+        pattern = pattern.lower()
+        return expand_from_matches(self._term_matches(literal_prefix(pattern), pattern), limit)
+
+    def suggest(self, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+        """按文档频率从高到低返回以prefix开头的k个词项 [(词项, 文档频率), ...]"""
+        return top_terms_by_df(self._term_matches(prefix.lower()).items(), k)
+
+    def get_term_postings(self, word: str) -> List[Tuple[str, int]]:
+        """获取词项在所有段中的存活posting [(文档ID, 词频), ...]"""
+        with self.lock:
+            postings = []
+            for reader, deleted in self._readers():
+                if word not in reader.postings:
+                    continue
+                for doc_num, tf in reader.postings[word].items():
+                    if deleted is None or not deleted[doc_num]:
+                        postings.append((reader.doc_ids[doc_num], tf))
+            return postings
+
+    def get_index_stats(self) -> Dict:
+        """获取索引统计信息，包含分段、墓碑和合并情况"""
+        with self.lock:
+            total_docs, total_length = self._live_totals()
+            memory_stats = self.memory.get_index_stats()
+            total_postings = memory_stats['total_postings']
+            posting_bytes = memory_stats['posting_bytes']
+            term_table_bytes = memory_stats['term_table_bytes']
+            term_dictionary_bytes = memory_stats['term_dictionary_bytes']
+            document_store_bytes = memory_stats['document_store_bytes']
+            for entry in self.segments:
+                segment = entry.reader.segment
+                total_postings += segment.total_postings
+                posting_bytes += segment.posting_bytes
+                term_table_bytes += segment.sections["term_offsets"][1] + segment.sections["term_blob"][1]
+                term_dictionary_bytes += entry.reader.get_term_dictionary().nbytes
+                document_store_bytes += segment.store.nbytes
+            return {
+                'total_documents': total_docs,
+                'total_terms': len(self.get_terms()),
+                'average_doc_length': total_length / total_docs if total_docs > 0 else 0,
+                'total_postings': total_postings,
+                'posting_bytes': posting_bytes,
+                'bytes_per_posting': posting_bytes / total_postings if total_postings > 0 else 0,
+                'term_table_bytes': term_table_bytes,
+                'term_dictionary_bytes': term_dictionary_bytes,
+                'document_bytes': memory_stats['document_bytes'],
+                'document_store_bytes': document_store_bytes,
+                'segment_count': len(self.segments),
+                'segment_docs': [entry.live_docs for entry in self.segments],
+                'memory_docs': len(self.memory.documents),
+                'deleted_docs': sum(entry.deleted_count for entry in self.segments),
+                'flushes': self.stats['flushes'],
+                'merges': self.stats['merges']
+            }
+
+    # ------------------------------------------------------------------
+    # 导入导出
+    # ------------------------------------------------------------------
+
+    def to_inverted_index(self) -> InvertedIndex:
+        """把所有段合并成一个内存 InvertedIndex"""
+        with self.lock:
+            merged = self._merge_readers(self._readers())
+            merged.refresh_scoring_tables()
+            return merged
+
+    def save_to_file(self, filename: str):
+        """导出为JSON索引文件"""
+        self.to_inverted_index().save_to_file(filename)
+
+    def save_segment(self, path: str):
+        """导出为单个二进制索引段"""
+        self.to_inverted_index().save_segment(path)
+
+    def load_from_file(self, filename: str):
+        """从JSON索引导入，替换现有内容"""
+        source = InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+        source.load_from_file(filename)
+        self._import_index(source)
+
+    def load_segment(self, path: str):
+        """从单个二进制索引段导入，替换现有内容"""
+        source = InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+        source.load_segment(path)
+        self._import_index(source)
+
+    def _import_index(self, source: InvertedIndex):
+        """把整个索引写成一个新段"""
+        self.clear()
+        with self.lock:
+            name = self._allocate_segment_name()
+            IndexSegment.write(source, os.path.join(self.directory, name))
+            self.segments.append(self._open_entry(name, []))
+            self._write_manifest()
+
+    # ------------------------------------------------------------------
+    # 合并
+    # ------------------------------------------------------------------
+
+    def _request_merge(self):
+        if self.background_merge and not self._closed:
+            self._idle.clear()
+            self._wakeup.set()
+        else:
+            self.maybe_merge()
+
+    def _merge_loop(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.maybe_merge()
+            except Exception as e:
+                print(f"❌ 段合并失败: {e}")
+            finally:
+                if not self._wakeup.is_set():
+                    self._idle.set()
+        self._idle.set()
+
+    def wait_for_merges(self, timeout: float = None) -> bool:
+        """等待后台合并完成"""
+        return self._idle.wait(timeout)
+
+    def close(self):
+        """停止后台合并线程，关闭预写日志"""
+        self._closed = True
+        self._wakeup.set()
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+        with self.lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+    def _pick_merge(self) -> Optional[List[_SegmentEntry]]:
+        """分层合并策略：按存活文档数分层，同层段数达到merge_factor时合并该层最小的几个段；
+        墓碑占比过高的段单独重写。"""
+        tiers = defaultdict(list)
+        for entry in self.segments:
+            if entry.merging:
+                continue
+            if entry.num_docs > 0 and entry.deleted_count / entry.num_docs >= EXPUNGE_DELETES_RATIO:
+                return [entry]
+            tier = 0
+            size = self.flush_threshold
+            while entry.live_docs > size:
+                size *= self.merge_factor
+                tier += 1
+            tiers[tier].append(entry)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return sorted(tiers[tier], key=lambda e: e.live_docs)[:self.merge_factor]
+        return None
+
+    def maybe_merge(self) -> int:
+        """按合并策略执行合并直到没有可合并的段，返回合并次数(被丢弃的合并不计)"""
+        merges = 0
+        while True:
+            with self.lock:
+                sources = self._pick_merge()
+                if not sources:
+                    return merges
+                for entry in sources:
+                    entry.merging = True
+                # 记录合并开始时的墓碑，合并期间新增的墓碑在替换时补记到新段
+                snapshots = [entry.deleted.copy() for entry in sources]
+                name = self._allocate_segment_name()
+            try:
+                if self._merge_segments(sources, snapshots, name):
+                    merges += 1
+            finally:
+                for entry in sources:
+                    entry.merging = False
+
+    def _merge_segments(self, sources: List[_SegmentEntry], snapshots: List[np.ndarray], name: str) -> bool:
+        """合并若干段(不持锁读取不可变段文件)，完成后在锁内替换，返回是否替换成功
+
+        合并期间索引被清空或重新导入时，源段已不在段列表中，合并结果作废并删除其文件。
+        """
+        merged = self._merge_readers([(entry.reader, deleted) for entry, deleted in zip(sources, snapshots)])
+        IndexSegment.write(merged, os.path.join(self.directory, name))
+        merged_entry = self._open_entry(name, [])
+
+        with self.lock:
+            replaced = all(entry in self.segments for entry in sources)
+            if replaced:
+                self._replace_merged(sources, snapshots, merged_entry)
+        if not replaced:
+            self._remove_segment_files(name)
+            print(f"⚠️ 合并期间源段已被移除，丢弃合并结果: {name}")
+            return False
+
+        for entry in sources:
+            self._remove_segment_files(entry.name)
+        print(f"🔀 合并{len(sources)}个段 -> {name} ({merged_entry.live_docs}篇文档)")
+        return True
+
+    def _replace_merged(self, sources: List[_SegmentEntry], snapshots: List[np.ndarray],
+                        merged_entry: _SegmentEntry):
+        """用合并后的段替换源段(调用方持锁)，合并期间新增的墓碑补记到新段"""
+        for entry, snapshot in zip(sources, snapshots):
+            for doc_num in np.flatnonzero(entry.deleted & ~snapshot).tolist():
+                merged_num = merged_entry.find(entry.reader.doc_ids[doc_num])
+                if merged_num is not None:
+                    merged_entry.mark_deleted(merged_num)
+        position = self.segments.index(sources[0])
+        self.segments = [entry for entry in self.segments if entry not in sources]
+        self.segments.insert(min(position, len(self.segments)), merged_entry)
+        self.stats['merges'] += 1
+        self.stats['merged_segments'] += len(sources)
+        self._write_manifest()
+
+    def _merge_readers(self, readers: List[Tuple[InvertedIndex, Optional[np.ndarray]]]) -> InvertedIndex:
+        """按段顺序拼接存活文档，直接重排倒排链，不重新分词"""
+        merged = self._new_memory_segment()
+        term_parts = defaultdict(list)
+        for reader, deleted in readers:
+            live = [doc_num for doc_num, doc_id in enumerate(reader.doc_ids)
+                    if doc_id is not None and (deleted is None or not deleted[doc_num])]
+            remap = np.full(len(reader.doc_ids), -1, dtype=np.int64)
+            remap[live] = np.arange(len(merged.doc_ids), len(merged.doc_ids) + len(live))
+            for doc_num in live:
+                doc_id = reader.doc_ids[doc_num]
+                merged.doc_nums[doc_id] = len(merged.doc_ids)
+                merged.doc_ids.append(doc_id)
+                merged.doc_lengths.append(int(reader.doc_lengths[doc_num]))
+                merged.doc_spans.append(array('I', reader.doc_spans[doc_num]))
+                merged.documents[doc_id] = reader.documents[doc_id]
+            for word in reader.postings:
+                posting_list = reader.postings[word]
+                doc_nums = remap[posting_list.doc_nums()]
+                keep = doc_nums >= 0
+                if keep.any():
+                    term_parts[word].append((doc_nums[keep], np.asarray(posting_list.tfs)[keep]))
+
+        for word, parts in term_parts.items():
+            # 各段的新编号区间依次递增，拼接后仍然有序
+            doc_nums = np.concatenate([part[0] for part in parts]).tolist()
+            tfs = np.concatenate([part[1] for part in parts]).tolist()
+            merged.postings[word] = PostingList.from_postings(zip(doc_nums, tfs))
+        merged.total_doc_length = sum(merged.doc_lengths)
+        merged.forward_index = None
+        return merged
+
+    # ------------------------------------------------------------------
+    # 段文件与manifest
+    # ------------------------------------------------------------------
+
+    def _allocate_segment_name(self) -> str:
+        name = f"seg_{self._next_segment_id:06d}{SEGMENT_SUFFIX}"
+        self._next_segment_id += 1
+        return name
+
+    def _open_entry(self, name: str, deleted_doc_nums: List[int]) -> _SegmentEntry:
+        reader = InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+        reader.load_segment(os.path.join(self.directory, name))
+        return _SegmentEntry(name, reader, deleted_doc_nums)
+
+    def _remove_segment_files(self, name: str):
+        path = os.path.join(self.directory, name)
+        for file_path in (path, document_store_path(path)):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    def _wal_path(self) -> str:
+        return os.path.join(self.directory, WAL_FILE)
+
+    def _log_write(self, record: Dict[str, Any]):
+        """写操作先追加到预写日志(调用方持锁)，落盘到操作系统后再修改内存段"""
+        if self._wal is None:
+            self._wal = open(self._wal_path(), 'a', encoding='utf-8')
+        self._wal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._wal.flush()
+        if self.fsync_wal:
+            os.fsync(self._wal.fileno())
+
+    def _truncate_wal(self):
+        """内存段已落盘、墓碑已写入manifest，日志中的写入都已持久化，清空日志"""
+        if self._wal is not None:
+            self._wal.truncate(0)
+        elif os.path.exists(self._wal_path()):
+            open(self._wal_path(), 'w').close()
+
+    def _replay_wal(self):
+        """重放上次落盘之后的写入，恢复内存段和墓碑；写到一半的最后一行忽略"""
+        if not os.path.exists(self._wal_path()):
+            return
+        replayed = 0
+        with open(self._wal_path(), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                try:
+                    if record['op'] == 'add':
+                        self._apply_add(record['doc_id'], record['content'])
+                    elif record['op'] == 'delete':
+                        self._apply_delete(record['doc_ids'])
+                    replayed += 1
+                except Exception as e:
+                    print(f"❌ 重放预写日志失败: {e}")
+        if replayed:
+            print(f"📜 重放预写日志: {replayed}条写入")
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _write_manifest(self):
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'next_segment_id': self._next_segment_id,
+            'segments': [
+                {'name': entry.name, 'deleted': np.flatnonzero(entry.deleted).tolist()}
+                for entry in self.segments
+            ]
+        }
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _load_manifest(self):
+        """加载manifest，删除未被引用的段文件(如中断的合并留下的)"""
+        if not os.path.exists(self._manifest_path()):
+            self._write_manifest()
+            return
+        with open(self._manifest_path(), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        self._next_segment_id = manifest.get('next_segment_id', 1)
+        for item in manifest.get('segments', []):
+            self.segments.append(self._open_entry(item['name'], item.get('deleted', [])))
+
+        referenced = {entry.name for entry in self.segments}
+        for file_name in os.listdir(self.directory):
+            stem, suffix = os.path.splitext(file_name)
+            if suffix in (SEGMENT_SUFFIX, DOCSTORE_SUFFIX) and stem + SEGMENT_SUFFIX not in referenced:
+                self._remove_segment_files(stem + SEGMENT_SUFFIX)
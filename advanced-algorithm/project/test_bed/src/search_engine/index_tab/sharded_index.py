@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片索引(scatter-gather)
+- 文档按文档ID的哈希(crc32，跨进程稳定)划分到N个分片，每个分片是一个独立的 InvertedIndex，
+  由一个工作进程持有；写入只发给文档所在的分片
+- 查询在协调方解析后分发到所有分片，各分片返回自己的top_k，协调方用堆归并出全局top_k，
+  摘要只向最终入选文档所在的分片请求
+- 打分用全局统计量：协调方汇总各分片的文档数、总长度和查询词文档频率，算出全局IDF和avgdl
+  下发给各分片，分片的分数与单个索引一致、可直接比较；统计量按词缓存，任何写入后失效
+- 每个分片进程按请求编号异步应答，多个查询线程可同时把请求排进所有分片，吞吐随分片数(CPU核数)扩展
+- 进程不可用时退回当前进程内的分片，接口和结果不变
+"""
+
+import heapq
+import threading
+import time
+import zlib
+import multiprocessing
+from collections import Counter, defaultdict
+from concurrent.futures import Future
+from itertools import count
+from typing import List, Dict, Tuple, Optional, Any
+
+from .offline_index import InvertedIndex, MAX_WILDCARD_EXPANSIONS, compute_idf, validate_search_args
+from .boolean_query import restrict_to_docs
+from .term_dictionary import literal_prefix, merge_term_matches, top_terms_by_df, expand_from_matches
+
+# 默认分片数
+DEFAULT_NUM_SHARDS = 4
+
+
+def shard_of(doc_id: str, num_shards: int) -> int:
+    """文档所在的分片编号，用crc32而不是hash()，保证不同进程、不同次启动结果一致"""
+    return zlib.crc32(doc_id.encode('utf-8')) % num_shards
+
+
+class _ShardServer:
+    """分片上可执行的命令，在工作进程(或进程内分片)中持有该分片的索引"""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self.index = self._new_index()
+
+    def _new_index(self) -> InvertedIndex:
+        return InvertedIndex(k1=self.params['k1'], b=self.params['b'], delta=self.params['delta'])
+
+    def add_document(self, doc_id: str, content: str) -> bool:
+        self.index.add_document(doc_id, content)
+        return True
+
+    def add_documents(self, documents: Dict[str, str]) -> int:
+        for doc_id, content in documents.items():
+            self.index.add_document(doc_id, content)
+        self.index.refresh_scoring_tables()
+        return len(documents)
+
+    def update_document(self, doc_id: str, content: str) -> bool:
+        return self.index.update_document(doc_id, content)
+
+    def batch_delete_documents(self, doc_ids: List[str]) -> int:
+        return self.index.batch_delete_documents(doc_ids)
+
+    def clear(self) -> bool:
+        self.index = self._new_index()
+        return True
+
+    def term_stats(self, words: List[str]) -> Tuple[int, int, Dict[str, int]]:
+        """(文档数, 总文档长度, {查询词: 文档频率})"""
+        postings = self.index.postings
+        return (len(self.index.documents), self.index.total_doc_length,
+                {word: len(postings[word]) for word in words if word in postings})
+
+    def top_k(self, query_words: List[str], clauses: List[Tuple], weights: Dict[str, float],
+              avg_doc_length: float, top_k: int, strategy: str, scorer: str) -> List[Tuple[str, float]]:
+        return self.index._score_query_words(query_words, top_k, strategy, scorer, clauses,
+                                             global_stats=(weights, avg_doc_length))
+
+    def summaries(self, doc_ids: List[str], query_words: List[str]) -> Dict[str, str]:
+        return self.index.get_summaries(doc_ids, query_words)
+
+    def proximity_score(self, doc_id: str, query_words: List[str]) -> float:
+        return self.index.proximity_score(doc_id, query_words)
+
+    def get_document(self, doc_id: str) -> str:
+        return self.index.get_document(doc_id)
+
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, str]:
+        return self.index.get_documents(doc_ids)
+
+    def get_all_documents(self) -> Dict[str, str]:
+        return self.index.get_all_documents()
+
+    def get_terms(self, limit: int = None) -> List[str]:
+        return self.index.get_terms(limit)
+
+    def get_term_postings(self, word: str) -> List[Tuple[str, int]]:
+        return self.index.get_term_postings(word)
+
+    def term_matches(self, prefix: str, pattern: str = None) -> List[Tuple[str, int]]:
+        return self.index.term_matches(prefix, pattern)
+
+    def get_index_stats(self) -> Dict:
+        return self.index.get_index_stats()
+
+    def export(self) -> InvertedIndex:
+        self.index._decoded_postings.clear()
+        return self.index
+
+
+def _shard_main(conn, params: Dict[str, Any]):
+    """工作进程主循环：按顺序执行请求，应答 (请求编号, 是否成功, 结果或错误信息)"""
+    server = _ShardServer(params)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        request_id, method, args = message
+        try:
+            reply = (request_id, True, getattr(server, method)(*args))
+        except Exception as e:
+            reply = (request_id, False, f"{type(e).__name__}: {e}")
+        conn.send(reply)
+    conn.close()
+
+
+class _LocalShard:
+    """进程内分片：同步执行，用锁串行化同一分片上的请求"""
+
+    mode = "local"
+
+    def __init__(self, params: Dict[str, Any]):
+        self.server = _ShardServer(params)
+        self.lock = threading.Lock()
+
+    def submit(self, method: str, *args) -> Future:
+        future = Future()
+        try:
+            with self.lock:
+                future.set_result(getattr(self.server, method)(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def call(self, method: str, *args):
+        return self.submit(method, *args).result()
+
+    def close(self):
+        pass
+
+
+class _ProcessShard:
+    """工作进程中的分片：请求带编号异步发送，后台线程按编号把应答交给对应的Future"""
+
+    mode = "process"
+
+    def __init__(self, shard_no: int, params: Dict[str, Any]):
+        context = multiprocessing.get_context()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_shard_main, args=(child_conn, params),
+                                       name=f"index-shard-{shard_no}", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = count()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_loop, name=f"index-shard-{shard_no}-reader", daemon=True)
+        self._reader.start()
+
+    def submit(self, method: str, *args) -> Future:
+        future = Future()
+        with self._send_lock:
+            if self._closed:
+                raise RuntimeError("分片进程已关闭")
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            self.conn.send((request_id, method, args))
+        return future
+
+    def call(self, method: str, *args):
+        return self.submit(method, *args).result()
+
+    def _read_loop(self):
+        while True:
+            try:
+                request_id, ok, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+        # 进程退出后，未应答的请求全部失败
+        with self._send_lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("分片进程已退出"))
+
+    def close(self):
+        with self._send_lock:
+            if not self._closed:
+                self._closed = True
+                try:
+                    self.conn.send(None)
+                except OSError:
+                    pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class ShardedIndex:
+    """分片索引，对外接口与 InvertedIndex 保持一致"""
+
+    def __init__(self, num_shards: int = DEFAULT_NUM_SHARDS, use_processes: bool = True,
+                 k1: float = 1.2, b: float = 0.75, delta: float = 1.0):
+        if num_shards < 1:
+            raise ValueError(f"分片数必须为正整数: {num_shards}")
+        self.num_shards = num_shards
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+        # 查询只在协调方解析一次，分片收到的是解析好的查询词和匹配约束
+        self.parser = InvertedIndex(k1=k1, b=b, delta=delta)
+
+        params = {'k1': k1, 'b': b, 'delta': delta}
+        self.shards = []
+        if use_processes:
+            try:
+                for shard_no in range(num_shards):
+                    self.shards.append(_ProcessShard(shard_no, params))
+            except OSError as e:
+                # 环境不允许创建子进程时退回进程内分片
+                print(f"⚠️ 分片进程不可用，改为进程内分片: {e}")
+                for shard in self.shards:
+                    shard.close()
+                self.shards = []
+        if not self.shards:
+            self.shards = [_LocalShard(params) for _ in range(num_shards)]
+
+        # 全局统计量缓存：写入时generation加一并清空，查询期间发生写入则不回填
+        self._stats_lock = threading.Lock()
+        self._generation = 0
+        self._totals: Optional[Tuple[int, int]] = None
+        self._doc_freq: Dict[str, int] = {}
+
+    @property
+    def mode(self) -> str:
+        return self.shards[0].mode
+
+    def shard_of(self, doc_id: str) -> int:
+        """文档所在的分片编号"""
+        return shard_of(doc_id, self.num_shards)
+
+    def preprocess_text(self, text: str) -> List[str]:
+        """文本预处理，与 InvertedIndex 一致"""
+        return self.parser.preprocess_text(text)
+
+    def parse_query(self, query: str) -> Tuple[List[str], List[Tuple]]:
+        """解析查询，与 InvertedIndex 一致，通配符按所有分片的词典展开"""
+        return self.parser.parse_query(query, self.expand_wildcard)
+
+    def _gather(self, method: str, *args) -> List[Any]:
+        """同一命令发给所有分片，按分片顺序返回结果"""
+        futures = [shard.submit(method, *args) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def _invalidate_stats(self):
+        with self._stats_lock:
+            self._generation += 1
+            self._totals = None
+            self._doc_freq = {}
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def add_document(self, doc_id: str, content: str):
+        """写入文档所在的分片，文档ID已存在时覆盖旧内容"""
+        try:
+            self.shards[self.shard_of(doc_id)].call("add_document", doc_id, content)
+        finally:
+            self._invalidate_stats()
+
+    def add_documents(self, documents: Dict[str, str], workers: Optional[int] = None) -> Dict[str, Any]:
+        """批量写入：按分片拆分后各分片同时构建，返回构建统计
+
+        workers 仅为与 InvertedIndex/SegmentedIndex 接口一致，并行度等于分片数。
+        """
+        start = time.perf_counter()
+        groups = defaultdict(dict)
+        for doc_id, content in documents.items():
+            groups[self.shard_of(doc_id)][doc_id] = content
+        try:
+            futures = [self.shards[shard_no].submit("add_documents", group) for shard_no, group in groups.items()]
+            added = sum(future.result() for future in futures)
+        finally:
+            self._invalidate_stats()
+        seconds = time.perf_counter() - start
+        stats = {
+            'documents': added,
+            'workers': self.num_shards if self.mode == "process" else 1,
+            'shards': self.num_shards,
+            'seconds': seconds,
+            'docs_per_sec': added / seconds if seconds > 0 else 0.0
+        }
+        print(f"⚡ 分片批量建索引: {added}个文档, {self.num_shards}个分片, "
+              f"耗时{seconds:.2f}s, {stats['docs_per_sec']:.0f} docs/s")
+        return stats
+
+    def update_document(self, doc_id: str, content: str) -> bool:
+        """用新内容替换已有文档，文档不存在时返回False"""
+        try:
+            return self.shards[self.shard_of(doc_id)].call("update_document", doc_id, content)
+        finally:
+            self._invalidate_stats()
+
+    def delete_document(self, doc_id: str) -> bool:
+        """删除文档"""
+        return self.batch_delete_documents([doc_id]) == 1
+
+    def batch_delete_documents(self, doc_ids: List[str]) -> int:
+        """批量删除文档，按分片分组后同时删除，返回实际删除的文档数"""
+        groups = defaultdict(list)
+        for doc_id in dict.fromkeys(doc_ids):
+            groups[self.shard_of(doc_id)].append(doc_id)
+        try:
+            futures = [self.shards[shard_no].submit("batch_delete_documents", group)
+                       for shard_no, group in groups.items()]
+            return sum(future.result() for future in futures)
+        finally:
+            self._invalidate_stats()
+
+    def clear(self):
+        """清空所有分片"""
+        try:
+            self._gather("clear")
+        finally:
+            self._invalidate_stats()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, top_k: int = 5, strategy: str = "taat",
+               scorer: str = "tfidf") -> List[Tuple[str, float, str]]:
+        """分发到所有分片检索，返回 (文档ID, 分数, 摘要)，只为最终入选的文档生成摘要"""
+        query_words, clauses = self.parse_query(query)
+        results = self._score_query_words(query_words, top_k, strategy, scorer, clauses)
+        summaries = self.get_summaries([doc_id for doc_id, _ in results], query_words)
+        return [(doc_id, score, summaries.get(doc_id, "")) for doc_id, score in results]
+
+    def retrieve(self, query: str, top_k: int = 5, strategy: str = "taat", scorer: str = "tfidf",
+                 doc_ids: List[str] = None) -> List[Tuple[str, float]]:
+        """只召回 (文档ID, 分数)，不生成摘要；给出 doc_ids 时只在这些文档中打分"""
+        query_words, clauses = self.parse_query(query)
+        if doc_ids is not None:
+            clauses = restrict_to_docs(query_words, clauses, doc_ids)
+        return self._score_query_words(query_words, top_k, strategy, scorer, clauses)
+
+    def get_summaries(self, doc_ids: List[str], query_words: List[str]) -> Dict[str, str]:
+        """按分片分组并行生成摘要，不存在的文档跳过"""
+        groups = defaultdict(list)
+        for doc_id in doc_ids:
+            groups[self.shard_of(doc_id)].append(doc_id)
+        futures = [self.shards[shard_no].submit("summaries", group, query_words)
+                   for shard_no, group in groups.items()]
+        summaries = {}
+        for future in futures:
+            summaries.update(future.result())
+        return summaries
+
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    scorer: str = "tfidf") -> List[List[Tuple[str, float]]]:
+        """批量召回，与 queries 一一对应；分片按全局统计量打分，逐条分发"""
+        return [self.retrieve(query, top_k, scorer=scorer) for query in queries]
+
+    def proximity_score(self, doc_id: str, query_words: List[str]) -> float:
+        """查询词在文档中的邻近度特征，由文档所在的分片计算"""
+        return self.shards[self.shard_of(doc_id)].call("proximity_score", doc_id, query_words)
+
+    def _score_query_words(self, query_words: List[str], top_k: int, strategy: str, scorer: str,
+                           clauses: List[Tuple] = None) -> List[Tuple[str, float]]:
+        """用全局统计量在各分片打分，各取top_k后用堆归并"""
+        validate_search_args(strategy, scorer)
+        if not (query_words or clauses) or top_k <= 0:
+            return []
+
+        total_docs, total_length, doc_freq = self._global_stats(query_words)
+        if total_docs == 0:
+            return []
+        avg_doc_length = total_length / total_docs
+        weights = {word: query_tf * compute_idf(scorer, total_docs, doc_freq[word])
+                   for word, query_tf in Counter(query_words).items() if doc_freq.get(word, 0) > 0}
+
+        candidates = []
+        for ranked in self._gather("top_k", query_words, clauses or [], weights, avg_doc_length,
+                                   top_k, strategy, scorer):
+            candidates.extend(ranked)
+        return heapq.nsmallest(top_k, candidates, key=lambda x: (-x[1], x[0]))
+
+    def _global_stats(self, query_words: List[str]) -> Tuple[int, int, Dict[str, int]]:
+        """全局 (文档数, 总文档长度, {查询词: 文档频率})，已缓存的部分不再询问分片"""
+        words = list(dict.fromkeys(query_words))
+        with self._stats_lock:
+            generation = self._generation
+            totals = self._totals
+            doc_freq = {word: self._doc_freq[word] for word in words if word in self._doc_freq}
+        missing = [word for word in words if word not in doc_freq]
+        if totals is not None and not missing:
+            return totals[0], totals[1], doc_freq
+
+        total_docs, total_length = 0, 0
+        fetched = dict.fromkeys(missing, 0)
+        for num_docs, length, shard_freq in self._gather("term_stats", missing):
+            total_docs += num_docs
+            total_length += length
+            for word, df in shard_freq.items():
+                fetched[word] += df
+        with self._stats_lock:
+            if generation == self._generation:
+                self._totals = (total_docs, total_length)
+                self._doc_freq.update(fetched)
+        doc_freq.update(fetched)
+        return total_docs, total_length, doc_freq
+
+    # ------------------------------------------------------------------
+    # 文档访问与统计
+    # ------------------------------------------------------------------
+
+    def get_document(self, doc_id: str) -> str:
+        """获取文档内容"""
+        return self.shards[self.shard_of(doc_id)].call("get_document", doc_id)
+
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, str]:
+        """批量获取文档内容，按分片分组后并发读取"""
+        groups = defaultdict(list)
+        for doc_id in dict.fromkeys(doc_ids):
+            groups[self.shard_of(doc_id)].append(doc_id)
+        futures = [self.shards[shard_no].submit("get_documents", group) for shard_no, group in groups.items()]
+        found = {}
+        for future in futures:
+            found.update(future.result())
+        return {doc_id: found[doc_id] for doc_id in doc_ids if doc_id in found}
+
+    def get_all_documents(self) -> Dict[str, str]:
+        """获取所有文档"""
+        documents = {}
+        for shard_documents in self._gather("get_all_documents"):
+            documents.update(shard_documents)
+        return documents
+
+    def get_terms(self, limit: int = None) -> List[str]:
+        """获取词项列表(按分片顺序去重)"""
+        terms = {}
+        for shard_terms in self._gather("get_terms", limit):
+            for word in shard_terms:
+                terms[word] = None
+        terms = list(terms)
+        return terms if limit is None else terms[:limit]
+
+    def _term_matches(self, prefix: str, pattern: str = None) -> Counter:
+        """汇总各分片词典中以prefix开头(且匹配pattern)的词项，df为各分片文档频率之和"""
+        return merge_term_matches(self._gather("term_matches", prefix, pattern))
+
+    def prefix_terms(self, prefix: str, limit: int = None) -> List[str]:
+        """以prefix开头的词项(升序)"""
+        return sorted(self._term_matches(prefix.lower()))[:limit]
+
+    def expand_wildcard(self, pattern: str, limit: int = MAX_WILDCARD_EXPANSIONS) -> List[str]:
+        """通配符展开，与 InvertedIndex 一致"""
+        pattern = pattern.lower()
+        return expand_from_matches(self._term_matches(literal_prefix(pattern), pattern), limit)
+
+    def suggest(self, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+        """按全局文档频率从高到低返回以prefix开头的k个词项 [(词项, 文档频率), ...]"""
+        return top_terms_by_df(self._term_matches(prefix.lower()).items(), k)
+
+    def get_term_postings(self, word: str) -> List[Tuple[str, int]]:
+        """获取词项在所有分片中的posting [(文档ID, 词频), ...]"""
+        postings = []
+        for shard_postings in self._gather("get_term_postings", word):
+            postings.extend(shard_postings)
+        return postings
+
+    def get_index_stats(self) -> Dict:
+        """获取索引统计信息，包含各分片的文档数"""
+        shard_stats = self._gather("get_index_stats")
+        total_docs = sum(stats['total_documents'] for stats in shard_stats)
+        total_length = sum(stats['average_doc_length'] * stats['total_documents'] for stats in shard_stats)
+        total_postings = sum(stats['total_postings'] for stats in shard_stats)
+        posting_bytes = sum(stats['posting_bytes'] for stats in shard_stats)
+        return {
+            'total_documents': total_docs,
+            'total_terms': len(self.get_terms()),
+            'average_doc_length': total_length / total_docs if total_docs > 0 else 0,
+            'total_postings': total_postings,
+            'posting_bytes': posting_bytes,
+            'bytes_per_posting': posting_bytes / total_postings if total_postings > 0 else 0,
+            'term_table_bytes': sum(stats['term_table_bytes'] for stats in shard_stats),
+            'term_dictionary_bytes': sum(stats['term_dictionary_bytes'] for stats in shard_stats),
+            'document_bytes': sum(stats['document_bytes'] for stats in shard_stats),
+            'document_store_bytes': sum(stats['document_store_bytes'] for stats in shard_stats),
+            'shard_count': self.num_shards,
+            'shard_docs': [stats['total_documents'] for stats in shard_stats],
+            'shard_mode': self.mode
+        }
+
+    # ------------------------------------------------------------------
+    # 导入导出
+    # ------------------------------------------------------------------
+
+    def to_inverted_index(self) -> InvertedIndex:
+        """把所有分片合并成一个内存 InvertedIndex"""
+        merged = InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+        for shard in self._gather("export"):
+            merged.merge_shard(shard)
+        merged.refresh_scoring_tables()
+        return merged
+
+    def save_to_file(self, filename: str):
+        """导出为JSON索引文件"""
+        self.to_inverted_index().save_to_file(filename)
+
+    def save_segment(self, path: str):
+        """导出为单个二进制索引段"""
+        self.to_inverted_index().save_segment(path)
+
+    def load_from_file(self, filename: str):
+        """从JSON索引导入，替换现有内容"""
+        source = InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+        source.load_from_file(filename)
+        self._import_index(source)
+
+    def load_segment(self, path: str):
+        """从二进制索引段导入，替换现有内容"""
+        source = InvertedIndex(k1=self.k1, b=self.b, delta=self.delta)
+        source.load_segment(path)
+        self._import_index(source)
+
+    def _import_index(self, source: InvertedIndex):
+        """按分片重新写入全部文档(各分片同时分词)"""
+        self.clear()
+        self.add_documents(source.get_all_documents())
+
+    def close(self):
+        """关闭分片进程"""
+        for shard in self.shards:
+            shard.close()
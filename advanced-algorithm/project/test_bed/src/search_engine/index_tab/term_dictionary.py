@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有序词典(前缀压缩)
+词项按UTF-8字节序(与Python字符串按码位排序一致)排列，每 FRONT_CODING_BLOCK_SIZE 个词项一块：
+块内第一个词项完整存储，其余词项只存 (与前一词项的公共前缀长度, 后缀长度, 后缀字节)，长度用varint编码。
+查找时先在块首词项上二分定位块，再在块内顺序解码，
+前缀/通配符查询只解码前缀所在的一段连续区间，不扫描整个词典。
+"""
+
+import heapq
+import os
+import re
+from collections import Counter
+from itertools import dropwhile, islice
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
+import numpy as np
+
+from .posting_list import _append_varint, _read_varint
+
+# 每块的词项数，越大压缩越好，单次查找要顺序解码的词项越多
+FRONT_CODING_BLOCK_SIZE = 16
+
+# 通配符：* 匹配任意个字符，? 匹配单个字符
+WILDCARD_CHARS = "*?"
+
+
+def compile_wildcard(pattern: str) -> re.Pattern:
+    """把通配符模式转换为整词匹配的正则"""
+    return re.compile("".join(".*" if ch == "*" else "." if ch == "?" else re.escape(ch) for ch in pattern),
+                      re.DOTALL)
+
+
+def literal_prefix(pattern: str) -> str:
+    """通配符模式中第一个通配符之前的固定前缀"""
+    match = re.search(f"[{re.escape(WILDCARD_CHARS)}]", pattern)
+    return pattern[:match.start()] if match else pattern
+
+
+def top_terms_by_df(matches: Iterable[Tuple[str, int]], k: int) -> List[Tuple[str, int]]:
+    """按文档频率从高到低取k个 (词项, df)，df相同时按词项排序"""
+    if k <= 0:
+        return []
+    return heapq.nsmallest(k, matches, key=lambda match: (-match[1], match[0]))
+
+
+def merge_term_matches(match_lists: Iterable[List[Tuple[str, int]]]) -> Counter:
+    """合并多个分片/索引段的 term_matches 结果，同一词项的df相加"""
+    doc_freqs = Counter()
+    for matches in match_lists:
+        for term, df in matches:
+            doc_freqs[term] += df
+    return doc_freqs
+
+
+def expand_from_matches(doc_freqs: Mapping[str, int], limit: Optional[int]) -> List[str]:
+    """通配符匹配结果按df截取limit个后按词项升序返回"""
+    if limit is None or len(doc_freqs) <= limit:
+        return sorted(doc_freqs)
+    return sorted(term for term, _ in top_terms_by_df(doc_freqs.items(), limit))
+
+
+class TermDictionary:
+    """前缀压缩的只读有序词典，附带每个词项的文档频率(df)
+
+    词项序号(ordinal)即升序排名，用于 prefix_terms / expand_wildcard / suggest；
+    索引写入后整体重建(由 InvertedIndex 在词项集合变化后按需重建)。
+    """
+
+    def __init__(self, terms: Iterable[str], doc_freqs: Iterable[int],
+                 block_size: int = FRONT_CODING_BLOCK_SIZE):
+        """terms 必须升序且不重复，doc_freqs 与之一一对应"""
+        data = bytearray()
+        block_offsets = []
+        previous = b""
+        count = 0
+        for term in terms:
+            encoded = term.encode('utf-8')
+            if count % block_size == 0:
+                block_offsets.append(len(data))
+                shared = 0
+            else:
+                shared = len(os.path.commonprefix([previous, encoded]))
+            _append_varint(data, shared)
+            _append_varint(data, len(encoded) - shared)
+            data += encoded[shared:]
+            previous = encoded
+            count += 1
+        self.block_size = block_size
+        self._data = bytes(data)
+        self._block_offsets = np.array(block_offsets, dtype=np.uint32)
+        self.doc_freqs = np.fromiter(doc_freqs, dtype=np.uint32, count=count)
+        self._size = count
+
+    @classmethod
+    def from_postings(cls, postings: Mapping, block_size: int = FRONT_CODING_BLOCK_SIZE) -> 'TermDictionary':
+        """从 词项 -> 倒排链 的映射构建，df取倒排链长度"""
+        terms = sorted(postings)
+        return cls(terms, (len(postings[term]) for term in terms), block_size)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[str]:
+        for _, term in self._iter_from(0):
+            yield term.decode('utf-8')
+
+    def __contains__(self, term: str) -> bool:
+        return self.find(term) >= 0
+
+    def __getitem__(self, ordinal: int) -> str:
+        if ordinal < 0:
+            ordinal += self._size
+        if not 0 <= ordinal < self._size:
+            raise IndexError(ordinal)
+        for i, term in self._iter_from(ordinal // self.block_size):
+            if i == ordinal:
+                return term.decode('utf-8')
+
+    @property
+    def nbytes(self) -> int:
+        """压缩后占用的字节数(词项字节 + 块偏移 + df数组)"""
+        return len(self._data) + self._block_offsets.nbytes + self.doc_freqs.nbytes
+
+    def find(self, term: str) -> int:
+        """词项序号，不存在返回-1"""
+        key = term.encode('utf-8')
+        for ordinal, current in self._seek(key):
+            return ordinal if current == key else -1
+        return -1
+
+    def doc_freq(self, term: str) -> int:
+        """词项的文档频率，不存在返回0"""
+        ordinal = self.find(term)
+        return int(self.doc_freqs[ordinal]) if ordinal >= 0 else 0
+
+    def prefix_terms(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """以prefix开头的词项(升序)，最多limit个"""
+        return [term for term, _ in islice(self._prefix_matches(prefix), limit)]
+
+    def term_matches(self, prefix: str, pattern: Optional[str] = None) -> List[Tuple[str, int]]:
+        """以prefix开头(且整词匹配通配符模式pattern)的 [(词项, df), ...]，按词项升序"""
+        matches = self._prefix_matches(prefix)
+        if pattern is not None:
+            regex = compile_wildcard(pattern)
+            matches = (match for match in matches if regex.fullmatch(match[0]))
+        return list(matches)
+
+    def expand_wildcard(self, pattern: str, limit: Optional[int] = None) -> List[str]:
+        """通配符展开，返回匹配的词项(升序)；超过limit个时保留文档频率最高的limit个
+
+        只在模式的固定前缀对应的区间内逐个匹配，以通配符开头的模式才会遍历整个词典。
+        """
+        return expand_from_matches(dict(self.term_matches(literal_prefix(pattern), pattern)), limit)
+
+    def suggest(self, prefix: str, k: int = 10) -> List[Tuple[str, int]]:
+        """按文档频率从高到低返回以prefix开头的k个词项 [(词项, df), ...]，df相同时按词项排序"""
+        return top_terms_by_df(self._prefix_matches(prefix), k)
+
+    def _prefix_matches(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """以prefix开头的 (词项, df)，按词项升序"""
+        key = prefix.encode('utf-8')
+        for ordinal, term in self._seek(key):
+            if not term.startswith(key):
+                return
+            yield term.decode('utf-8'), int(self.doc_freqs[ordinal])
+
+    def _seek(self, key: bytes) -> Iterator[Tuple[int, bytes]]:
+        """从第一个 >= key 的词项开始顺序解码，块首词项上二分找到最后一个 <= key 的块"""
+        lo, hi = 0, len(self._block_offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._decode_head(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        block = max(lo - 1, 0)
+        return dropwhile(lambda item: item[1] < key, self._iter_from(block))
+
+    def _iter_from(self, block: int) -> Iterator[Tuple[int, bytes]]:
+        """从第block块开始顺序解码 (序号, 词项字节)，后续块紧接着存放，一直解码到词典末尾"""
+        if block >= len(self._block_offsets):
+            return
+        data = self._data
+        pos = int(self._block_offsets[block])
+        term = b""
+        for ordinal in range(block * self.block_size, self._size):
+            shared, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            term = term[:shared] + data[pos:pos + length]
+            pos += length
+            yield ordinal, term
+
+    def _decode_head(self, block: int) -> bytes:
+        """块首词项(完整存储)"""
+        pos = int(self._block_offsets[block])
+        _, pos = _read_varint(self._data, pos)
+        length, pos = _read_varint(self._data, pos)
+        return self._data[pos:pos + length]
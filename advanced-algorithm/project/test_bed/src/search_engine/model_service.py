@@ -1,24 +1,56 @@
 import os
 import json
 import pickle
+import threading
 from typing import Dict, Any, Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
 from .training_tab.ctr_model import CTRModel
-from .training_tab.ctr_config import CTRSampleConfig
+from .training_tab.online_ctr_model import OnlineCTRModel
+from .training_tab.hashed_features import HashedFeaturizer
+from .training_tab.ctr_config import CTRSampleConfig, CTROnlineConfig, CTRTrainingConfig
 
 
 class ModelService:
-    """模型服务：负责模型训练、配置管理、模型文件等"""
+    """模型服务：负责模型训练、配置管理、模型文件等
     
-    def __init__(self, model_file: str = "models/ctr_model.pkl"):
+    训练、加载、导入都在新的 CTRModel 上完成后再整体替换 self.ctr_model，
+    进行中的预测继续使用旧模型，不会读到加载了一半的模型；每次替换 model_version 加一。
+    
+    在线学习模式下，online_update 把 DataService 中新回流的样本按小批次喂给增量模型，
+    每轮结束发布模型快照作为 self.ctr_model，并定期把模型和点击流读取位置写入检查点，
+    代价只与新样本数有关，不随日志总量增长。
+    """
+    
+    def __init__(self, model_file: str = "models/ctr_model.pkl", online_checkpoint_file: Optional[str] = None):
         self.model_file = model_file
         self.ctr_model = CTRModel()
+        self.model_version = 0
+        self._swap_lock = threading.Lock()
+        
+        # 在线学习状态
+        self.online_checkpoint_file = online_checkpoint_file or model_file.replace('.pkl', '_online.pkl')
+        self.online_model: Optional[OnlineCTRModel] = None
+        self.stream_offset = 0
+        self.stream_epoch: Optional[int] = None  # stream_offset 对应的 DataService.data_epoch，None 表示尚未读取过
+        self._batches_since_checkpoint = 0
+        self._online_lock = threading.Lock()
+        self._online_stop: Optional[threading.Event] = None
+        self._online_thread: Optional[threading.Thread] = None
+        
         self._load_model()
     
+    def _swap_model(self, model: CTRModel):
+        """原子替换当前模型"""
+        with self._swap_lock:
+            self.ctr_model = model
+            self.model_version += 1
+    
     def _load_model(self):
         """加载模型"""
-        if self.ctr_model.load_model(self.model_file):
+        model = CTRModel()
+        if model.load_model(self.model_file):
+            self._swap_model(model)
             print(f"✅ CTR模型加载成功: {self.model_file}")
         else:
             print(f"⚠️ CTR模型未找到，将使用未训练状态: {self.model_file}")
@@ -36,10 +68,13 @@ class ModelService:
                     'error': '没有CTR数据用于训练'
                 }
             
-            # 训练模型
-            result = self.ctr_model.train(samples)
+            # 在新模型上训练，成功后再替换，训练期间预测仍使用旧模型；按配置加上哈希ID/交叉特征
+            hash_features = CTRTrainingConfig.HASH_FEATURES
+            model = CTRModel(vectorizer=HashedFeaturizer(hash_features) if hash_features else None)
+            result = model.train(samples)
             
             if result.get('success', False):
+                self._swap_model(model)
                 # 保存模型
                 self.save_model()
                 print("✅ 模型训练完成并保存")
@@ -56,6 +91,101 @@ class ModelService:
                 'error': error_msg
             }
     
+    def online_update(self, data_service, batch_size: Optional[int] = None,
+                      label_delay: Optional[float] = None) -> Dict[str, Any]:
+        """在线增量学习一轮：读取上次位置之后、展示超过 label_delay 秒的样本，按小批次更新增量模型
+        
+        模型训练完成(见过足够样本且点击、未点击都出现过)后发布快照替换当前模型；
+        每学习 CTROnlineConfig.CHECKPOINT_EVERY 个小批次保存一次检查点。
+        数据服务清空或重新加载数据(data_epoch 变化)后读取位置归零，从新数据的第一条开始学习；
+        data_epoch 只在进程内有效，从检查点恢复的读取位置沿用 offset 越界时从头读取的规则。
+        """
+        batch_size = batch_size or CTROnlineConfig.BATCH_SIZE
+        label_delay = CTROnlineConfig.LABEL_DELAY if label_delay is None else label_delay
+        try:
+            with self._online_lock:
+                if self.online_model is None:
+                    self.online_model, self.stream_offset = OnlineCTRModel.load_checkpoint(self.online_checkpoint_file)
+                
+                epoch = data_service.data_epoch
+                if self.stream_epoch is not None and epoch != self.stream_epoch:
+                    print("⚠️ CTR数据已清空或重新加载，在线学习从头读取")
+                    self.stream_offset = 0
+                self.stream_epoch = epoch
+                
+                cutoff = (datetime.now() - timedelta(seconds=label_delay)).isoformat()
+                samples, next_offset = data_service.get_samples_since(self.stream_offset, cutoff, epoch)
+                batches = 0
+                for start in range(0, len(samples), batch_size):
+                    self.online_model.partial_fit(samples[start:start + batch_size])
+                    batches += 1
+                self.stream_offset = next_offset
+                
+                published = bool(samples) and self.online_model.is_trained
+                if published:
+                    self._swap_model(self.online_model.snapshot())
+                
+                self._batches_since_checkpoint += batches
+                if self._batches_since_checkpoint >= CTROnlineConfig.CHECKPOINT_EVERY:
+                    self._save_online_checkpoint()
+                
+                if samples:
+                    print(f"✅ 在线学习: {len(samples)}条新样本, {batches}个小批次, 累计{self.online_model.samples_seen}条")
+                return {
+                    'success': True,
+                    'new_samples': len(samples),
+                    'batches': batches,
+                    'samples_seen': self.online_model.samples_seen,
+                    'published': published,
+                    'model_version': self.model_version
+                }
+        except Exception as e:
+            error_msg = f"在线学习过程中发生错误: {str(e)}"
+            print(f"❌ {error_msg}")
+            return {
+                'success': False,
+                'error': error_msg
+            }
+    
+    def _save_online_checkpoint(self) -> bool:
+        """保存在线模型检查点(调用方持有 _online_lock)"""
+        if self.online_model is None:
+            return False
+        self._batches_since_checkpoint = 0
+        if self.online_model.save_checkpoint(self.online_checkpoint_file, self.stream_offset):
+            print(f"✅ 在线模型检查点已保存: {self.online_checkpoint_file}")
+            return True
+        return False
+    
+    def start_online_learning(self, data_service, interval: Optional[float] = None) -> bool:
+        """启动后台线程，每 interval 秒执行一轮 online_update"""
+        if self._online_thread is not None and self._online_thread.is_alive():
+            return False
+        interval = interval or CTROnlineConfig.UPDATE_INTERVAL
+        stop = threading.Event()
+        
+        def run():
+            while not stop.wait(interval):
+                self.online_update(data_service)
+        
+        self._online_stop = stop
+        self._online_thread = threading.Thread(target=run, daemon=True, name="OnlineCTRLearner")
+        self._online_thread.start()
+        print(f"🚀 在线学习已启动，每{interval}秒增量更新一次")
+        return True
+    
+    def stop_online_learning(self) -> bool:
+        """停止后台在线学习并保存检查点"""
+        if self._online_thread is None:
+            return False
+        self._online_stop.set()
+        self._online_thread.join()
+        self._online_thread = None
+        with self._online_lock:
+            self._save_online_checkpoint()
+        print("✅ 在线学习已停止")
+        return True
+    
     def save_model(self, filepath: Optional[str] = None) -> bool:
         """保存模型"""
         try:
@@ -89,7 +219,9 @@ class ModelService:
         """加载模型"""
         try:
             load_path = filepath or self.model_file
-            if self.ctr_model.load_model(load_path):
+            model = CTRModel()
+            if model.load_model(load_path):
+                self._swap_model(model)
                 print(f"✅ 模型加载成功: {load_path}")
                 return True
             else:
@@ -102,7 +234,8 @@ class ModelService:
     def predict_ctr(self, features: Dict[str, Any]) -> float:
         """预测CTR"""
         try:
-            if not self.ctr_model.is_trained:
+            model = self.ctr_model
+            if not model.is_trained:
                 return 0.1  # 默认CTR
             
             # 使用CTRModel的predict_ctr方法
@@ -112,13 +245,31 @@ class ModelService:
             score = features.get('score', 0.0)
             summary = features.get('summary', '')
             
-            ctr_score = self.ctr_model.predict_ctr(query, doc_id, position, score, summary)
+            ctr_score = model.predict_ctr(query, doc_id, position, score, summary)
             return float(ctr_score)
             
         except Exception as e:
             print(f"❌ CTR预测失败: {e}")
             return 0.1
     
+    def predict_ctr_batch(self, query: str, candidates: List[Dict[str, Any]]) -> List[float]:
+        """批量预测同一查询下多个候选的CTR，候选为含 doc_id/position/score/summary 的特征字典
+        
+        整批候选只构建一次特征矩阵、调用一次模型，排序20~100个候选时比逐个 predict_ctr 快得多。
+        """
+        try:
+            model = self.ctr_model
+            if not model.is_trained:
+                return [0.1] * len(candidates)  # 默认CTR
+            
+            rows = [(features.get('doc_id', ''), features.get('position', 1), features.get('score', 0.0),
+                     features.get('summary', '')) for features in candidates]
+            return [float(ctr_score) for ctr_score in model.predict_ctr_batch(query, rows)]
+            
+        except Exception as e:
+            print(f"❌ 批量CTR预测失败: {e}")
+            return [0.1] * len(candidates)
+    
     def _prepare_features(self, features: Dict[str, Any]) -> Optional[List[float]]:
         """准备特征向量"""
         try:
@@ -163,6 +314,9 @@ class ModelService:
             # 添加当前状态
             model_info.update({
                 'is_trained': self.ctr_model.is_trained,
+                'model_version': self.model_version,
+                'online_learning': self._online_thread is not None,
+                'online_samples': self.online_model.samples_seen if self.online_model else 0,
                 'model_exists': os.path.exists(self.model_file),
                 'last_modified': datetime.fromtimestamp(os.path.getmtime(self.model_file)).isoformat() if os.path.exists(self.model_file) else None
             })
@@ -279,8 +433,17 @@ class ModelService:
                 os.remove(info_path)
                 print(f"✅ 模型信息文件删除成功: {info_path}")
             
+            # 在线模型从头学习
+            with self._online_lock:
+                if os.path.exists(self.online_checkpoint_file):
+                    os.remove(self.online_checkpoint_file)
+                self.online_model = OnlineCTRModel()
+                self.stream_offset = 0
+                self.stream_epoch = None
+                self._batches_since_checkpoint = 0
+            
             # 重置模型
-            self.ctr_model = CTRModel()
+            self._swap_model(CTRModel())
             
             return True
             
@@ -152,10 +152,26 @@ def build_monitoring_tab(data_service=None, index_service=None, model_service=No
             return html
         
         def show_performance():
-            html = """
+            cache_html = ""
+            if index_service is not None:
+                index_stats = index_service.get_stats()
+                cache_html = f"""
+                <div style="margin-bottom: 15px;">
+                    <h5 style="margin: 0 0 10px 0; color: #6f42c1;">🗃️ 查询结果缓存</h5>
+                    <ul style="margin: 0; padding-left: 20px;">
+                        <li><strong>命中率:</strong> {index_stats.get('cache_hit_rate', 0):.2%}</li>
+                        <li><strong>命中/未命中:</strong> {index_stats.get('cache_hits', 0)} / {index_stats.get('cache_misses', 0)}</li>
+                        <li><strong>淘汰/过期/失效:</strong> {index_stats.get('cache_evictions', 0)} / {index_stats.get('cache_expirations', 0)} / {index_stats.get('cache_invalidations', 0)}</li>
+                        <li><strong>缓存条目:</strong> {index_stats.get('cache_entries', 0)} ({index_stats.get('cache_bytes', 0) / 1024:.1f} KB)</li>
+                        <li><strong>索引代数:</strong> {index_stats.get('generation', 0)}</li>
+                    </ul>
+                </div>
+                """
+            
+            html = f"""
             <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px;">
                 <h4 style="margin: 0 0 15px 0; color: #333;">⚡ 性能监控</h4>
-                
+                {cache_html}
                 <div style="margin-bottom: 15px;">
                     <h5 style="margin: 0 0 10px 0; color: #007bff;">🔍 搜索性能</h5>
                     <ul style="margin: 0; padding-left: 20px;">
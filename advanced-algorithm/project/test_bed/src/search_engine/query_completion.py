@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询自动补全
+用CTR日志(DataService.ctr_data)中的查询构建前缀树，供搜索框联想：
+- 每个节点缓存以该前缀开头的 top-k 查询，suggest 只需沿前缀走到对应节点，代价 O(前缀长度)
+- 查询得分 = 搜索次数 + CLICK_WEIGHT × 点击次数，同样常搜的查询中点击多(CTR高)的排在前面
+- 得分只增不减，新的展示/点击到来时只需沿该查询的路径更新各节点的 top-k，无需重建；
+  平滑CTR(点击/搜索)会随无点击的搜索下降，节点缓存的 top-k 就要按子树重算，所以不用它排序
+- 写入串行化，节点的 top-k 整体替换为新元组，查询不加锁
+- 去重搜索次数只记住最近 MAX_TRACKED_REQUESTS 个请求ID(LRU)，内存有上界
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 每个节点缓存的候选数
+DEFAULT_TOP_K = 10
+
+# 一次点击相当于多少次搜索
+CLICK_WEIGHT = 2.0
+
+# 记住最近多少个请求ID用于搜索次数去重；同一请求的展示是连续写入的，只需覆盖最近的请求
+MAX_TRACKED_REQUESTS = 10000
+
+
+def normalize_query(query: str) -> str:
+    """查询归一化：小写、去掉首尾空白、连续空白合并为一个空格"""
+    return " ".join(query.lower().split())
+
+
+def normalize_prefix(prefix: str) -> str:
+    """前缀归一化，与 normalize_query 一致，但保留末尾的一个空格(已输入完一个词)"""
+    normalized = normalize_query(prefix)
+    if normalized and prefix[-1:].isspace():
+        normalized += " "
+    return normalized
+
+
+class _TrieNode:
+    """前缀树节点，top 为 ((-得分, 查询), ...)，按得分降序、同分按查询升序"""
+
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.top = ()
+
+
+class QueryCompletion:
+    """基于查询日志的前缀树自动补全，线程安全"""
+
+    def __init__(self, top_k: int = DEFAULT_TOP_K, click_weight: float = CLICK_WEIGHT,
+                 max_tracked_requests: int = MAX_TRACKED_REQUESTS):
+        self.top_k = top_k
+        self.click_weight = click_weight
+        self.max_tracked_requests = max_tracked_requests
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """清空前缀树和查询统计"""
+        with self._lock:
+            self._root = _TrieNode()
+            self._node_count = 1
+            self._query_stats = {}        # 查询 -> [搜索次数, 展示次数, 点击次数]
+            self._seen_requests = OrderedDict()  # 最近已计入搜索次数的请求ID(LRU)
+
+    def record_impression(self, query: str, request_id: str):
+        """记录一次展示，同一请求的多条展示只算一次搜索；没有请求ID(旧格式日志)时每条展示各算一次搜索"""
+        key = normalize_query(query)
+        if not key:
+            return
+        with self._lock:
+            stats = self._query_stats.setdefault(key, [0, 0, 0])
+            stats[1] += 1
+            if request_id:
+                if request_id in self._seen_requests:
+                    self._seen_requests.move_to_end(request_id)
+                    return
+                self._seen_requests[request_id] = None
+                if len(self._seen_requests) > self.max_tracked_requests:
+                    self._seen_requests.popitem(last=False)
+            stats[0] += 1
+            self._update(key, stats)
+
+    def record_click(self, query: str):
+        """记录一次点击(展示的首次点击)"""
+        key = normalize_query(query)
+        if not key:
+            return
+        with self._lock:
+            stats = self._query_stats.setdefault(key, [0, 0, 0])
+            stats[2] += 1
+            self._update(key, stats)
+
+    def add_samples(self, samples: Iterable[Dict[str, Any]]):
+        """批量加入CTR样本(加载、导入时使用)"""
+        for sample in samples:
+            query = sample.get('query', '')
+            self.record_impression(query, sample.get('request_id') or '')
+            if sample.get('clicked', 0):
+                self.record_click(query)
+
+    def suggest(self, prefix: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """以prefix开头的得分最高的k个查询 [(查询, 得分), ...]，k不超过 top_k"""
+        node = self._root
+        for ch in normalize_prefix(prefix):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        top = node.top if k is None else node.top[:k]
+        return [(query, -neg_score) for neg_score, query in top]
+
+    def get_query_stats(self, query: str) -> Dict[str, float]:
+        """查询的搜索次数、展示次数、点击次数和点击率"""
+        searches, impressions, clicks = self._query_stats.get(normalize_query(query), (0, 0, 0))
+        return {
+            'searches': searches,
+            'impressions': impressions,
+            'clicks': clicks,
+            'ctr': clicks / impressions if impressions > 0 else 0.0
+        }
+
+    def get_stats(self) -> Dict[str, int]:
+        """前缀树统计"""
+        return {
+            'completion_queries': len(self._query_stats),
+            'completion_nodes': self._node_count
+        }
+
+    def _update(self, key: str, stats: List[int]):
+        """查询得分增加后，沿路径更新每个节点的 top-k(调用方持有锁)"""
+        entry = (-(stats[0] + self.click_weight * stats[2]), key)
+        node = self._root
+        self._offer(node, entry)
+        for ch in key:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _TrieNode()
+                self._node_count += 1
+            node = child
+            self._offer(node, entry)
+
+    def _offer(self, node: _TrieNode, entry: Tuple[float, str]):
+        """把 (得分, 查询) 放入节点的 top-k：得分只增不减，已在其中的直接替换，否则与第k名比较"""
+        top = [item for item in node.top if item[1] != entry[1]]
+        if len(top) >= self.top_k and entry >= top[-1]:
+            return
+        top.append(entry)
+        top.sort()
+        node.top = tuple(top[:self.top_k])
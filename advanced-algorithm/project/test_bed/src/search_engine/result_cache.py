@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询结果缓存
+热门查询在搜索页反复计算相关性分数、摘要和CTR分数，IndexService 把结果缓存在这里：
+- 键由调用方给出，通常是解析后的查询(词项元组+匹配约束)、top_k、排序方式等
+- LRU淘汰 + TTL过期 + 按估算字节数的内存上限，三者任一触发都会淘汰最久未用的条目
+- 缓存带版本号(索引代数、CTR模型版本)，版本变化时整体失效，不会返回旧索引或旧模型的结果
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# 默认条目数上限
+DEFAULT_MAX_ENTRIES = 1024
+
+# 默认过期时间(秒)
+DEFAULT_TTL_SECONDS = 300.0
+
+# 默认内存上限(字节，按结果中的字符串和数值估算)
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算结果占用的字节数(容器本身+字符串+数值)"""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """带版本号的 LRU + TTL 结果缓存，线程安全"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # 键 -> (写入时间, 估算字节数, 结果)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key: Hashable, version: Tuple) -> Optional[Any]:
+        """查找未过期的结果，没有时返回None；version 与缓存版本不同时先清空缓存"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds > 0 and time.monotonic() - entry[0] > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, version: Tuple, value: Any):
+        """写入结果；结果应为不再修改的对象(如元组)，超过内存上限的单个结果不缓存"""
+        if not self.enabled:
+            return
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存(计数保留)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, float]:
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'cache_entries': len(self._entries),
+                'cache_bytes': self._bytes,
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'cache_evictions': self.evictions,
+                'cache_expirations': self.expirations,
+                'cache_invalidations': self.invalidations,
+                'cache_hit_rate': self.hits / total if total else 0.0
+            }
+
+    def _check_version(self, version: Tuple):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -10,7 +10,7 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from .search_interface import SearchInterface
-from ..index_tab import get_index_service
+from ..index_tab import get_index_service, CandidateSet
 from ..training_tab import CTRModel
 from typing import List, Dict, Any, Tuple
 import math
@@ -34,55 +34,53 @@ class SearchEngine(SearchInterface):
         except Exception as e:
             print(f"加载CTR模型失败: {e}")
     
-    def retrieve(self, query: str, top_k: int = 20) -> List[str]:
-        """召回阶段：返回初步相关的文档ID列表（按TF-IDF分数粗排）"""
+    def retrieve(self, query: str, top_k: int = 20, scorer: str = "tfidf") -> List[str]:
+        """召回阶段：返回初步相关的文档ID候选集（按相关性分数粗排，scorer可选tfidf/bm25/bm25+）"""
         if not query.strip():
             return []
-        # 使用索引服务进行召回
-        return self.index_service.search_doc_ids(query.strip(), top_k=top_k)
+        # 使用索引服务进行召回，候选集带召回分数，排序阶段复用
+        return self.index_service.retrieve_candidates(query.strip(), top_k=top_k, scorer=scorer)
     
-    def rank(self, query: str, doc_ids: List[str], top_k: int = 10) -> List[Tuple[str, float, str]]:
+    def rank(self, query: str, doc_ids: List[str], top_k: int = 10, scorer: str = "tfidf") -> List[Tuple[str, float, str]]:
         """排序阶段：对召回的文档ID进行精排，使用CTR模型重新排序"""
         if not query.strip() or not doc_ids:
             return []
         
-        # 第一步：使用索引服务获取TF-IDF分数和摘要
-        full_results = self.index_service.search(query.strip(), top_k=len(doc_ids))
-        
-        # 过滤出在doc_ids中的结果
-        filtered_results = []
-        for doc_id, score, summary in full_results:
-            if doc_id in doc_ids:
-                filtered_results.append((doc_id, score, summary))
-        
-        if not filtered_results:
+        # 第一步：取候选的相关性分数，召回的候选集直接复用，否则只对这些文档打分
+        if isinstance(doc_ids, CandidateSet) and doc_ids.matches(query, scorer):
+            candidates = doc_ids
+        else:
+            candidates = self.index_service.retrieve_candidates(query.strip(), top_k=len(doc_ids), scorer=scorer,
+                                                                doc_ids=list(doc_ids))
+        if not candidates:
             return []
+        ranked = candidates.ranked()
         
         # 第二步：使用CTR模型重新排序
         if self.ctr_model.is_trained:
-            # 有CTR模型时，计算CTR分数并重新排序
-            ctr_scores = {}
-            for position, (doc_id, tfidf_score, summary) in enumerate(filtered_results, 1):
-                ctr_score = self.ctr_model.predict_ctr(query, doc_id, position, tfidf_score, summary)
-                ctr_scores[doc_id] = (ctr_score, tfidf_score, summary)
+            # 有CTR模型时，整批候选一次计算CTR分数并重新排序(摘要是CTR特征，每个候选都要生成)
+            summaries = candidates.summaries(candidates)
+            ctr_scores = self.ctr_model.predict_ctr_batch(
+                query, [(doc_id, position, tfidf_score, summaries[doc_id])
+                        for position, (doc_id, tfidf_score) in enumerate(ranked, 1)])
             
             # 按CTR分数排序
-            sorted_results = sorted(ctr_scores.items(), key=lambda x: x[1][0], reverse=True)
+            sorted_results = sorted(zip(ranked, ctr_scores), key=lambda x: x[1], reverse=True)
             
             # 构建最终结果（同时保存TF-IDF和CTR分数）
             results = []
-            for doc_id, (ctr_score, tfidf_score, summary) in sorted_results[:top_k]:
+            for (doc_id, tfidf_score), ctr_score in sorted_results[:top_k]:
                 # 返回元组：(doc_id, tfidf_score, ctr_score, summary)
-                results.append((doc_id, tfidf_score, ctr_score, summary))
+                results.append((doc_id, tfidf_score, ctr_score, summaries[doc_id]))
         else:
-            # 没有CTR模型时，使用TF-IDF分数排序
-            sorted_results = sorted(filtered_results, key=lambda x: x[1], reverse=True)
+            # 没有CTR模型时，候选已按相关性分数排序，摘要只为最终结果生成
+            summaries = candidates.summaries([doc_id for doc_id, _ in ranked[:top_k]])
             
             # 构建最终结果（只返回TF-IDF分数）
             results = []
-            for doc_id, tfidf_score, summary in sorted_results[:top_k]:
+            for doc_id, tfidf_score in ranked[:top_k]:
                 # 返回元组：(doc_id, tfidf_score, None, summary)
-                results.append((doc_id, tfidf_score, None, summary))
+                results.append((doc_id, tfidf_score, None, summaries[doc_id]))
         
         self.current_results = results
         return results
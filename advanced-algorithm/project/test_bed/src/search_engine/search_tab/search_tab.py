@@ -15,15 +15,15 @@ import re
 # 全局变量用于存储当前request_id
 current_request_id = None
 
-def perform_search(index_service, data_service, query: str, sort_mode: str = "ctr"):
+def perform_search(index_service, data_service, query: str, sort_mode: str = "ctr", scorer: str = "tfidf"):
     if not query or not query.strip():
         return [], pd.DataFrame(), ""
     try:
         query_clean = query.strip()
-        doc_ids = index_service.retrieve(query_clean, top_k=20)
+        doc_ids = index_service.retrieve(query_clean, top_k=20, scorer=scorer)
         
-        # 调用rank方法时传递sort_mode参数
-        ranked = index_service.rank(query_clean, doc_ids, top_k=10, sort_mode=sort_mode)
+        # 调用rank方法时传递sort_mode和scorer参数
+        ranked = index_service.rank(query_clean, doc_ids, top_k=10, sort_mode=sort_mode, scorer=scorer)
         
         # 现在ranked已经是正确排序的结果，不需要再次排序
         final = ranked
@@ -53,9 +53,9 @@ def perform_search(index_service, data_service, query: str, sort_mode: str = "ct
                 'position': position
             }
             
-            # 如果结果包含CTR分数（4元组），则添加到信息中
+            # 如果结果包含CTR分数或邻近度（4元组），则添加到信息中
             if len(result) == 4:
-                doc_info['ctr_score'] = result[2]
+                doc_info['proximity_score' if sort_mode == "proximity" else 'ctr_score'] = result[2]
             
             docs_info.append(doc_info)
         
@@ -119,8 +119,8 @@ def on_view_fulltext(search_engine, ctr_collector, current_query, request_id, do
     except Exception as e:
         return f"获取文档详情失败: {str(e)}", pd.DataFrame()
 
-def on_document_click(index_service, data_service, doc_id, request_id):
-    """处理文档点击事件"""
+def on_document_click(index_service, data_service, doc_id, request_id, query=None):
+    """处理文档点击事件，提供查询时在正文中高亮查询词"""
     try:
         # 记录文档点击事件
         
@@ -137,7 +137,7 @@ def on_document_click(index_service, data_service, doc_id, request_id):
             print(f"⚠️ 点击记录失败: doc_id={doc_id}, request_id={request_id}")
         
         # 获取文档内容
-        result = index_service.get_document_page(doc_id, request_id, data_service)
+        result = index_service.get_document_page(doc_id, request_id, data_service, query=query)
         html_content = result['html']
         
         # 获取更新后的CTR样本
@@ -164,14 +164,22 @@ def build_search_tab(index_service, data_service):
     with gr.Blocks() as search_tab:
         gr.Markdown("""### 🔍 第二部分：在线召回排序""")
         sort_mode = gr.Dropdown(
-            choices=["tfidf", "ctr"],
+            choices=["tfidf", "ctr", "proximity"],
             value="ctr",
             label="排序算法",
-            info="选择排序算法进行对比实验：TF-IDF/CTR"
+            info="选择排序算法进行对比实验：TF-IDF/CTR/邻近度"
+        )
+        scorer = gr.Dropdown(
+            choices=["tfidf", "bm25", "bm25+"],
+            value="tfidf",
+            label="召回打分器",
+            info="选择召回阶段的相关性打分：TF-IDF/BM25/BM25+"
         )
         with gr.Row():
             with gr.Column(scale=3):
-                query_input = gr.Textbox(label="实验查询", placeholder="输入测试查询进行检索实验...", lines=1)
+                query_input = gr.Textbox(label="实验查询", placeholder='输入测试查询进行检索实验，支持 "短语"、"短语"~3、A NEAR/3 B、A AND (B OR C) NOT D、id:doc* ...', lines=1)
+                query_suggestions = gr.Radio(choices=[], label="查询联想(来自查询日志)", visible=False)
+                query_error = gr.Markdown(visible=False)
                 with gr.Row():
                     search_btn = gr.Button("🔬 执行检索", variant="primary")
                     search_stats_btn = gr.Button("📊 搜索统计")
@@ -191,11 +199,16 @@ def build_search_tab(index_service, data_service):
             interactive=False
         )
         request_id_state = gr.State("")
+        query_state = gr.State("")  # 产生当前结果的查询，文档页按它高亮
         with gr.Accordion("🧪 测试用例", open=False):
             gr.Markdown("""推荐测试查询：人工智能、机器学习、深度学习等""")
         # 检索按钮事件
-        def update_results(query, sort_mode):
-            docs_info, df, request_id = perform_search(index_service, data_service, query, sort_mode)
+        def update_results(query, sort_mode, scorer):
+            # 布尔查询语法错误直接提示，不执行检索
+            error = index_service.validate_query(query) if query and query.strip() else None
+            if error:
+                return pd.DataFrame(), pd.DataFrame(), "", "", gr.update(value=f"❌ {error}", visible=True)
+            docs_info, df, request_id = perform_search(index_service, data_service, query, sort_mode, scorer)
             
             # 转换为 DataFrame 展示格式，根据排序模式显示不同的列
             formatted_results = []
@@ -210,6 +223,14 @@ def build_search_tab(index_service, data_service):
                         f"{doc['ctr_score']:.4f}",
                         summary_plain[:100] + ("..." if len(summary_plain) > 100 else "")
                     ])
+                elif sort_mode == "proximity" and 'proximity_score' in doc:
+                    # 邻近度排序模式：显示邻近度
+                    formatted_results.append([
+                        doc['doc_id'],
+                        f"{doc['tfidf_score']:.4f}",
+                        f"{doc['proximity_score']:.4f}",
+                        summary_plain[:100] + ("..." if len(summary_plain) > 100 else "")
+                    ])
                 else:
                     # TF-IDF排序模式：显示文档长度
                     formatted_results.append([
@@ -224,6 +245,9 @@ def build_search_tab(index_service, data_service):
                 # 创建CTR模式的DataFrame
                 df_display = pd.DataFrame(formatted_results, columns=["文档ID", "TF-IDF分数", "CTR分数", "摘要"])
                 mode_text = "CTR智能排序"
+            elif sort_mode == "proximity":
+                df_display = pd.DataFrame(formatted_results, columns=["文档ID", "TF-IDF分数", "邻近度", "摘要"])
+                mode_text = "邻近度排序"
             else:
                 # 创建TF-IDF模式的DataFrame
                 df_display = pd.DataFrame(formatted_results, columns=["文档ID", "TF-IDF分数", "文档长度", "摘要"])
@@ -232,11 +256,11 @@ def build_search_tab(index_service, data_service):
             # 显示当前排序模式
             print(f"🔍 当前排序模式: {mode_text}")
             
-            return df_display, df, request_id
+            return df_display, df, request_id, query, gr.update(value="", visible=False)
         search_btn.click(
             fn=update_results,
-            inputs=[query_input, sort_mode],
-            outputs=[results_df, sample_output, request_id_state]
+            inputs=[query_input, sort_mode, scorer],
+            outputs=[results_df, sample_output, request_id_state, query_state, query_error]
         )
         search_stats_btn.click(
             fn=show_search_stats,
@@ -244,8 +268,8 @@ def build_search_tab(index_service, data_service):
         )
         query_input.submit(
             fn=update_results,
-            inputs=[query_input, sort_mode],
-            outputs=[results_df, sample_output, request_id_state]
+            inputs=[query_input, sort_mode, scorer],
+            outputs=[results_df, sample_output, request_id_state, query_state, query_error]
         )
         def refresh_samples(rid):
             if rid:
@@ -257,19 +281,35 @@ def build_search_tab(index_service, data_service):
             inputs=request_id_state,
             outputs=sample_output
         )
+        # 输入时按查询日志联想，选中候选后填入查询框
+        def update_suggestions(query):
+            suggestions = data_service.suggest(query) if data_service is not None and query else []
+            if query and query.strip() in suggestions:
+                suggestions = [item for item in suggestions if item != query.strip()]
+            return gr.update(choices=suggestions, value=None, visible=bool(suggestions))
+        query_input.change(
+            fn=update_suggestions,
+            inputs=query_input,
+            outputs=query_suggestions
+        )
+        query_suggestions.input(
+            fn=lambda suggestion: suggestion,
+            inputs=query_suggestions,
+            outputs=query_input
+        )
         # 绑定 DataFrame 行点击事件
-        def on_row_select(evt: gr.SelectData, df, request_id):
+        def on_row_select(evt: gr.SelectData, df, request_id, query):
             if evt is None or evt.index is None:
                 return "未选中行", pd.DataFrame(), gr.update(visible=False), gr.update(visible=True)
             # 只处理单行
             idx = evt.index[0] if isinstance(evt.index, (list, tuple)) else evt.index
             row = df.iloc[idx]
             doc_id = row["文档ID"]
-            html, samples = on_document_click(index_service, data_service, doc_id, request_id)
+            html, samples = on_document_click(index_service, data_service, doc_id, request_id, query)
             return html, samples, gr.update(visible=True), gr.update(visible=False)
         results_df.select(
             fn=on_row_select,
-            inputs=[results_df, request_id_state],
+            inputs=[results_df, request_id_state, query_state],
             outputs=[doc_content, sample_output, back_btn, results_df]
         )
         def on_back_click():
@@ -52,6 +52,10 @@ class ServiceManager:
             self._model_service = ModelService()
         return self._model_service
     
+    def get_model_version(self) -> int:
+        """当前CTR模型版本，模型服务未初始化时为0(不会因此触发模型加载)"""
+        return self._model_service.model_version if self._model_service else 0
+    
     def get_service_status(self) -> dict:
         """获取所有服务状态"""
         return {
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享分词组件
+索引、数据服务和CTR模型对同一批查询和摘要反复分词，统一走这里：
+- 有界LRU缓存，按文本(字典内部按其哈希)查找，命中时不再调用jieba；
+  只缓存不超过 MAX_CACHED_TEXT_LENGTH 的文本(查询、摘要)，整篇文档只在建索引时分词一次，不占缓存
+- cut 返回jieba原始切分(与 jieba.lcut 一致，CTR特征沿用)；
+  tokenize/tokenize_with_offsets 在缓存前完成小写化、短词和停用词过滤，命中后无需再过滤
+- tokenize_many 批量分词，未命中的文本较多时可用jieba并行模式
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import jieba
+
+# 默认停用词
+DEFAULT_STOP_WORDS = frozenset({
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这'
+})
+
+# 缓存条目数上限
+DEFAULT_CACHE_SIZE = 20000
+
+# 超过该长度的文本不缓存
+MAX_CACHED_TEXT_LENGTH = 512
+
+# tokenize_many 中未命中的文本达到该数量时才启用jieba并行模式
+PARALLEL_MIN_TEXTS = 1000
+
+
+class Tokenizer:
+    """带缓存的分词器，线程安全"""
+
+    def __init__(self, stop_words: Optional[Iterable[str]] = None, min_length: int = 2,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        self.stop_words = frozenset(stop_words) if stop_words is not None else DEFAULT_STOP_WORDS
+        self.min_length = min_length
+        self.cache_size = cache_size
+        self._raw_cache = OrderedDict()       # 文本 -> jieba原始切分
+        self._filtered_cache = OrderedDict()  # 文本 -> 过滤后的 (词项, 起点, 终点)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # 跨进程传递(如并行建索引的分片)时只带配置，不带锁和缓存
+        return {'stop_words': self.stop_words, 'min_length': self.min_length, 'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    def _lookup(self, cache: OrderedDict, text: str):
+        with self._lock:
+            cached = cache.get(text)
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                cache.move_to_end(text)
+            return cached
+
+    def _store(self, cache: OrderedDict, text: str, value):
+        if len(text) > MAX_CACHED_TEXT_LENGTH or self.cache_size <= 0:
+            return
+        with self._lock:
+            cache[text] = value
+            cache.move_to_end(text)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def clear_cache(self):
+        """清空缓存和命中计数"""
+        with self._lock:
+            self._raw_cache.clear()
+            self._filtered_cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict[str, float]:
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'cache_entries': len(self._raw_cache) + len(self._filtered_cache),
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    # ------------------------------------------------------------------
+    # 分词
+    # ------------------------------------------------------------------
+
+    def cut(self, text: str) -> List[str]:
+        """jieba原始切分(含单字、标点和空白)，与 jieba.lcut(text) 一致"""
+        cached = self._lookup(self._raw_cache, text)
+        if cached is None:
+            cached = self._compute(text, raw=True)
+        return list(cached)
+
+    def tokenize_with_offsets(self, text: str) -> List[Tuple[str, int, int]]:
+        """分词并过滤停用词和短词，返回 (词项, 起点, 终点)，区间为原文中的字符偏移"""
+        cached = self._lookup(self._filtered_cache, text)
+        if cached is None:
+            cached = self._compute(text, raw=False)
+        return list(cached)
+
+    def tokenize(self, text: str) -> List[str]:
+        """分词并过滤停用词和短词，只返回词项"""
+        return [word for word, _, _ in self.tokenize_with_offsets(text)]
+
+    def tokenize_many(self, texts: List[str], parallel: Optional[bool] = None, raw: bool = False) -> List[List[str]]:
+        """批量分词，结果与逐条 tokenize(raw=True 时与逐条 cut)一致
+
+        parallel 为None时，未命中的文本不少于 PARALLEL_MIN_TEXTS 且有多个CPU核才用jieba并行模式；
+        并行模式不可用(如Windows)时退回逐条分词。
+        """
+        cache = self._raw_cache if raw else self._filtered_cache
+        results = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            cached = self._lookup(cache, text)
+            if cached is None:
+                pending.append(i)
+            else:
+                results[i] = self._words(cached, raw)
+        if parallel is None:
+            parallel = len(pending) >= PARALLEL_MIN_TEXTS and (os.cpu_count() or 1) > 1
+
+        # 并行模式按行切分，含换行的文本单独分词
+        batch = [i for i in pending if "\n" not in texts[i] and "\r" not in texts[i]] if parallel else []
+        lines = [texts[i] if raw else self._source(texts[i]) for i in batch]
+        for i, tokens in zip(batch, self._cut_lines_parallel(lines)):
+            value = tuple(word for word, _, _ in tokens) if raw else self._filter(tokens)
+            self._store(cache, texts[i], value)
+            results[i] = self._words(value, raw)
+        for i in pending:
+            if results[i] is None:
+                results[i] = self._words(self._compute(texts[i], raw), raw)
+        return results
+
+    def _compute(self, text: str, raw: bool):
+        """调用jieba分词并写入缓存"""
+        if raw:
+            value = tuple(jieba.lcut(text))
+            self._store(self._raw_cache, text, value)
+        else:
+            value = self._filter(jieba.tokenize(self._source(text)))
+            self._store(self._filtered_cache, text, value)
+        return value
+
+    @staticmethod
+    def _words(value, raw: bool) -> List[str]:
+        return list(value) if raw else [word for word, _, _ in value]
+
+    def _cut_lines_parallel(self, lines: List[str]) -> List[List[Tuple[str, int, int]]]:
+        """单行文本用换行拼接后交给jieba并行模式切分，再按换行拆回每行的 (词, 起点, 终点)"""
+        if not lines:
+            return []
+        try:
+            with _PARALLEL_LOCK:
+                jieba.enable_parallel(os.cpu_count())
+                try:
+                    words = list(jieba.cut("\n".join(lines)))
+                finally:
+                    jieba.disable_parallel()
+        except NotImplementedError:
+            return [list(jieba.tokenize(line)) for line in lines]
+
+        results = [[]]
+        start = 0
+        for word in words:
+            if word == "\n":
+                results.append([])
+                start = 0
+                continue
+            results[-1].append((word, start, start + len(word)))
+            start += len(word)
+        if len(results) != len(lines):
+            return [list(jieba.tokenize(line)) for line in lines]
+        return results
+
+    @staticmethod
+    def _source(text: str) -> str:
+        # 小写化不改变长度时在小写文本上分词(与只分词的结果一致)，否则在原文上分词后再小写
+        lowered = text.lower()
+        return lowered if len(lowered) == len(text) else text
+
+    def _filter(self, tokens) -> Tuple[Tuple[str, int, int], ...]:
+        stop_words = self.stop_words
+        filtered = []
+        for word, start, end in tokens:
+            word = word.lower()
+            if len(word) >= self.min_length and word not in stop_words:
+                filtered.append((word, start, end))
+        return tuple(filtered)
+
+
+# jieba并行模式是全局状态，同一时间只允许一个批量任务开启
+_PARALLEL_LOCK = threading.Lock()
+
+_default_tokenizer = None
+_default_lock = threading.Lock()
+
+
+def get_tokenizer() -> Tokenizer:
+    """获取进程内共享的分词器(单例)"""
+    global _default_tokenizer
+    if _default_tokenizer is None:
+        with _default_lock:
+            if _default_tokenizer is None:
+                _default_tokenizer = Tokenizer()
+    return _default_tokenizer
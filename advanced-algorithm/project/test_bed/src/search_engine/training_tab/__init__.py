@@ -1,11 +1,13 @@
 from .training_tab import build_training_tab, get_history_html, train_ctr_model
 from .ctr_model import CTRModel
+from .online_ctr_model import OnlineCTRModel, FTRLProximal
+from .hashed_features import HashedFeaturizer
 from .ctr_collector import CTRCollector
 from .ctr_lr_model import load_ctr_data, preprocess_features, train_logistic_regression, evaluate_model, analyze_feature_importance, visualize_results, generate_report, save_model
 
 __all__ = [
     'build_training_tab', 'get_history_html', 'train_ctr_model',
-    'CTRModel', 'CTRCollector',
+    'CTRModel', 'OnlineCTRModel', 'FTRLProximal', 'HashedFeaturizer', 'CTRCollector',
     'load_ctr_data', 'preprocess_features', 'train_logistic_regression', 
     'evaluate_model', 'analyze_feature_importance', 'visualize_results', 
     'generate_report', 'save_model'
@@ -141,6 +141,7 @@ class CTRTrainingConfig:
     MIN_SAMPLES = 10  # 最小训练样本数
     TEST_SIZE = 0.2   # 测试集比例
     RANDOM_STATE = 42 # 随机种子
+    HASH_FEATURES = 2 ** 18  # 查询/文档ID及交叉特征的哈希空间大小，0 表示只用稠密特征
     
     # 模型参数
     MODEL_PARAMS = {
@@ -162,7 +163,29 @@ class CTRTrainingConfig:
         """获取评估指标"""
         return cls.EVALUATION_METRICS.copy()
 
+class CTROnlineConfig:
+    """CTR在线增量学习配置类"""
+    
+    # FTRL-Proximal参数：学习率 alpha/(beta + sqrt(梯度平方和)) 按特征各自衰减
+    FTRL_PARAMS = {
+        'alpha': 0.05,  # 学习率
+        'beta': 1.0,    # 学习率平滑项
+        'l1': 0.01,     # L1正则(稀疏化)
+        'l2': 1.0       # L2正则
+    }
+    
+    BATCH_SIZE = 256       # 小批次样本数
+    LABEL_DELAY = 60       # 展示后等待点击回流的秒数，超过才作为样本学习
+    UPDATE_INTERVAL = 30   # 后台增量更新间隔（秒）
+    CHECKPOINT_EVERY = 20  # 每学习多少个小批次保存一次检查点
+    
+    @classmethod
+    def get_ftrl_params(cls) -> Dict[str, float]:
+        """获取FTRL参数"""
+        return cls.FTRL_PARAMS.copy()
+
 # 导出配置实例
 ctr_sample_config = CTRSampleConfig()
 ctr_feature_config = CTRFeatureConfig()
-ctr_training_config = CTRTrainingConfig() 
\ No newline at end of file
+ctr_training_config = CTRTrainingConfig()
+ctr_online_config = CTROnlineConfig()
@@ -7,6 +7,7 @@
 
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, roc_auc_score, log_loss, accuracy_score
@@ -14,6 +15,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import glob
 import os
+from .hashed_features import HashedFeaturizer
 
 def load_ctr_data():
     """加载最新的CTR数据文件"""
@@ -36,8 +38,12 @@ def load_ctr_data():
         print(f"❌ 加载数据失败: {e}")
         return None
 
-def preprocess_features(df):
-    """特征预处理"""
+def preprocess_features(df, featurizer=None):
+    """特征预处理
+    
+    返回 (稀疏特征矩阵, 数值特征名列表)：前面是数值特征列，后面是查询、文档ID及交叉特征的哈希列，
+    矩阵宽度为 数值特征数 + featurizer.n_features，不随查询、文档数增长。
+    """
     print("🔧 特征预处理...")
     
     # 基础特征
@@ -59,14 +65,15 @@ def preprocess_features(df):
     features['position_score'] = features['position'] * features['score']
     features['position_length'] = features['position'] * features['doc_length_log']
     
-    # 查询特征（one-hot编码）
-    query_encoded = pd.get_dummies(df['query'], prefix='query')
-    features = pd.concat([features, query_encoded], axis=1)
+    # 查询、文档ID及交叉特征（哈希稀疏编码）
+    featurizer = featurizer or HashedFeaturizer()
+    hashed = featurizer.transform(df)
+    matrix = sparse.hstack([sparse.csr_matrix(features.values.astype(float)), hashed], format='csr')
     
-    print(f"   特征数量: {features.shape[1]}")
-    print(f"   特征列表: {list(features.columns)}")
+    print(f"   特征数量: {matrix.shape[1]} (数值特征{features.shape[1]} + 哈希特征{featurizer.n_features})")
+    print(f"   数值特征列表: {list(features.columns)}")
     
-    return features
+    return matrix, list(features.columns)
 
 def train_logistic_regression(X, y):
     """训练逻辑回归模型"""
@@ -77,8 +84,8 @@ def train_logistic_regression(X, y):
         X, y, test_size=0.2, random_state=42, stratify=y
     )
     
-    print(f"   训练集大小: {len(X_train)}")
-    print(f"   测试集大小: {len(X_test)}")
+    print(f"   训练集大小: {X_train.shape[0]}")
+    print(f"   测试集大小: {X_test.shape[0]}")
     print(f"   训练集点击率: {np.mean(y_train):.4f}")
     print(f"   测试集点击率: {np.mean(y_test):.4f}")
     
@@ -121,20 +128,22 @@ def evaluate_model(y_test, y_pred, y_prob):
         'log_loss': loss
     }
 
-def analyze_feature_importance(model, X):
-    """分析特征重要性"""
+def analyze_feature_importance(model, feature_names):
+    """分析特征重要性(只列出非零系数，哈希列记为 hash_<桶号>)"""
     print("\n🎯 特征重要性分析:")
     print("=" * 50)
     
     # 获取特征系数
     coefficients = model.coef_[0]
-    feature_names = X.columns
+    columns = np.flatnonzero(coefficients)
+    names = [feature_names[column] if column < len(feature_names) else f"hash_{column - len(feature_names)}"
+             for column in columns]
     
     # 创建特征重要性DataFrame
     importance_df = pd.DataFrame({
-        'feature': feature_names,
-        'coefficient': coefficients,
-        'abs_coefficient': np.abs(coefficients)
+        'feature': names,
+        'coefficient': coefficients[columns],
+        'abs_coefficient': np.abs(coefficients[columns])
     }).sort_values('abs_coefficient', ascending=False)
     
     print("\n📈 特征系数 (按重要性排序):")
@@ -235,7 +244,7 @@ def generate_report(model, metrics, importance_df, X):
 - **分数特征**: score_squared, score_log
 - **长度特征**: doc_length_log, doc_length_ratio
 - **交互特征**: position_score, position_length
-- **查询特征**: 查询词one-hot编码
+- **ID与交叉特征**: 查询、文档ID、查询×文档、查询词×文档、位置×文档的哈希稀疏编码
 
 ## 特征重要性分析
 
@@ -265,7 +274,7 @@ def generate_report(model, metrics, importance_df, X):
 - **位置特征**: 位置越靠前，点击率越高
 - **分数特征**: 相似度分数越高，点击率越高
 - **长度特征**: 文档长度适中时点击率较高
-- **查询特征**: 不同查询词的点击偏好不同
+- **ID与交叉特征**: 不同查询、文档及其组合的点击偏好不同
 
 ## 应用建议
 
@@ -307,13 +316,14 @@ def generate_report(model, metrics, importance_df, X):
     
     print("   报告已保存为: ctr_lr_analysis_report.md")
 
-def save_model(model, X, importance_df):
-    """保存模型和特征信息"""
+def save_model(model, feature_names, importance_df, featurizer=None):
+    """保存模型和特征信息(哈希特征器一并保存，预测时用同一配置生成哈希列)"""
     import pickle
     
     model_info = {
         'model': model,
-        'feature_names': list(X.columns),
+        'feature_names': list(feature_names),
+        'featurizer': featurizer,
         'importance_df': importance_df
     }
     
@@ -344,7 +354,8 @@ def main():
         print("⚠️  警告: 点击数据较少，可能影响模型训练效果")
     
     # 特征预处理
-    X = preprocess_features(df)
+    featurizer = HashedFeaturizer()
+    X, feature_names = preprocess_features(df, featurizer)
     y = df['clicked']
     
     # 训练模型
@@ -354,7 +365,7 @@ def main():
     metrics = evaluate_model(y_test, y_pred, y_prob)
     
     # 特征重要性分析
-    importance_df = analyze_feature_importance(model, X)
+    importance_df = analyze_feature_importance(model, feature_names)
     
     # 可视化结果
     visualize_results(importance_df, metrics)
@@ -363,7 +374,7 @@ def main():
     generate_report(model, metrics, importance_df, X)
     
     # 保存模型
-    save_model(model, X, importance_df)
+    save_model(model, feature_names, importance_df, featurizer)
     
     print("\n🎉 逻辑回归CTR模型训练完成!")
     print("📁 生成的文件:")
@@ -13,27 +13,81 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, roc_auc_score
 import pickle
 import os
-from typing import List, Dict, Any, Tuple
-import jieba
+from typing import List, Dict, Any, Tuple, Optional
+from scipy import sparse
 from sklearn.model_selection import StratifiedShuffleSplit
+from ..tokenizer import get_tokenizer
 from .ctr_config import CTRFeatureConfig, CTRTrainingConfig, ctr_feature_config, ctr_training_config
+from .hashed_features import HashedFeaturizer
+
+# 没有历史样本时的默认点击率
+DEFAULT_HISTORY_CTR = 0.1
+
+
+def history_counts(df: pd.DataFrame, key: str, order: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """每个样本按 key 分组、时间顺序(order)上排在它之前的同组样本的 (点击数, 展示数)，按原始行顺序返回
+    
+    排序后分组累计点击数(去掉自身)和组内序号，O(n log n)。
+    """
+    ordered = df.iloc[order]
+    clicks = ordered['clicked'].astype(float)
+    grouped = clicks.groupby(ordered[key].values, sort=False)
+    previous_clicks = np.empty(len(df))
+    previous_count = np.empty(len(df))
+    previous_clicks[order] = (grouped.cumsum() - clicks).values
+    previous_count[order] = grouped.cumcount().values
+    return previous_clicks, previous_count
+
+
+def historical_ctr(df: pd.DataFrame, key: str, order: np.ndarray) -> np.ndarray:
+    """每个样本按 key 分组的历史点击率，只统计时间顺序(order)上排在它之前的同组样本，没有历史时取默认值"""
+    previous_clicks, previous_count = history_counts(df, key, order)
+    return smoothed_ctr(previous_clicks, previous_count)
+
+
+def smoothed_ctr(clicks: np.ndarray, impressions: np.ndarray) -> np.ndarray:
+    """点击数/展示数，没有展示的取默认点击率"""
+    ctr = np.full(len(clicks), DEFAULT_HISTORY_CTR)
+    seen = impressions > 0
+    ctr[seen] = clicks[seen] / impressions[seen]
+    return ctr
+
+
+def timestamp_hash(timestamps: pd.Series) -> np.ndarray:
+    """时间戳字符串各字符编码之和对1000取模，按定长UTF-32数组整体求和"""
+    chars = np.array(timestamps.astype(str).tolist(), dtype=str)
+    if chars.size == 0 or chars.dtype.itemsize == 0:
+        return np.zeros(len(timestamps))
+    codes = chars.view(np.uint32).reshape(len(chars), -1)
+    return (codes.sum(axis=1, dtype=np.int64) % 1000).astype(float)
+
 
 class CTRModel:
-    """CTR模型类"""
+    """CTR模型类
     
-    def __init__(self):
+    vectorizer 为 HashedFeaturizer 时，在标准化后的稠密特征后拼上查询、文档ID及其交叉的哈希稀疏特征，
+    模型在稀疏矩阵上训练和预测；特征器随模型一起保存和加载。
+    """
+    
+    def __init__(self, vectorizer: Optional[HashedFeaturizer] = None):
         self.model = None
-        self.vectorizer = None
+        self.vectorizer = vectorizer
         self.scaler = None
         self.is_trained = False
     
     def extract_features(self, ctr_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
-        """从CTR数据中提取特征"""
+        """从CTR数据中提取特征
+        
+        全部特征按列向量化计算，代价与样本数成线性：分词和匹配度只对去重后的查询/摘要(对)计算，
+        历史CTR按时间排序后分组累加，每个样本只看到时间上在它之前的样本。
+        """
         if not ctr_data:
             return np.array([]), np.array([])
         
         # 转换为DataFrame
         df = pd.DataFrame(ctr_data)
+        queries = df['query'].fillna('').astype(str)
+        summaries = df['summary'].fillna('').astype(str)
         
         # 1. 位置特征（绝对位置）
         position_features = df['position'].values.reshape(-1, 1)
@@ -47,82 +101,43 @@ class CTRModel:
         # 4. 摘要长度特征
         summary_lengths = df['summary'].str.len().values.reshape(-1, 1)
         
-        # 5. 查询词在摘要中的匹配度
-        match_scores = []
-        for _, row in df.iterrows():
-            query_words = set(jieba.lcut(row['query']))
-            summary_words = set(jieba.lcut(row['summary']))
+        # 5. 查询词在摘要中的匹配度：只对不同的查询、摘要分词，只对不同的(查询, 摘要)对求匹配度
+        tokenizer = get_tokenizer()
+        query_codes, unique_queries = pd.factorize(queries)
+        summary_codes, unique_summaries = pd.factorize(summaries)
+        query_tokens = tokenizer.tokenize_many(list(unique_queries), raw=True)
+        summary_tokens = tokenizer.tokenize_many(list(unique_summaries), raw=True)
+        query_sets = [set(tokens) for tokens in query_tokens]
+        summary_sets = [set(tokens) for tokens in summary_tokens]
+        num_summaries = max(len(unique_summaries), 1)
+        pairs, pair_codes = np.unique(query_codes.astype(np.int64) * num_summaries + summary_codes,
+                                      return_inverse=True)
+        pair_scores = []
+        for pair in pairs.tolist():
+            query_words = query_sets[pair // num_summaries]
+            summary_words = summary_sets[pair % num_summaries]
             if len(query_words) > 0:
                 match_ratio = len(query_words.intersection(summary_words)) / len(query_words)
             else:
                 match_ratio = 0
-            match_scores.append(match_ratio)
-        match_scores = np.array(match_scores).reshape(-1, 1)
-        
-        # 6. 历史点击率特征（基于查询的统计）- 修复数据泄露
-        # 按时间戳排序，确保历史特征只使用过去的数据
-        df_sorted = df.sort_values('timestamp').reset_index(drop=True)
-        
-        query_ctr_features = []
-        doc_ctr_features = []
-        
-        for idx, row in df_sorted.iterrows():
-            # 查询历史CTR - 只使用当前样本之前的数据
-            query = row['query']
-            query_history = df_sorted.loc[:idx-1]  # 不包括当前样本
-            query_history_filtered = query_history[query_history['query'] == query]
-            
-            if len(query_history_filtered) > 0:
-                query_ctr = query_history_filtered['clicked'].mean()
-            else:
-                query_ctr = 0.1  # 默认值
-            query_ctr_features.append(query_ctr)
-            
-            # 文档历史CTR - 只使用当前样本之前的数据
-            doc_id = row['doc_id']
-            doc_history = df_sorted.loc[:idx-1]  # 不包括当前样本
-            doc_history_filtered = doc_history[doc_history['doc_id'] == doc_id]
-            
-            if len(doc_history_filtered) > 0:
-                doc_ctr = doc_history_filtered['clicked'].mean()
-            else:
-                doc_ctr = 0.1  # 默认值
-            doc_ctr_features.append(doc_ctr)
-        
-        # 按原始顺序重新排列
-        original_order = df.index
-        query_ctr_features = [query_ctr_features[i] for i in original_order]
-        doc_ctr_features = [doc_ctr_features[i] for i in original_order]
+            pair_scores.append(match_ratio)
+        match_scores = np.array(pair_scores, dtype=float)[pair_codes.reshape(-1)].reshape(-1, 1)
         
-        query_ctr_features = np.array(query_ctr_features).reshape(-1, 1)
-        doc_ctr_features = np.array(doc_ctr_features).reshape(-1, 1)
+        # 6. 历史点击率特征（基于查询/文档的统计）- 无数据泄露
+        # 按时间戳稳定排序，每个样本只使用排在它之前的样本：分组累计点击数减去自身，除以组内序号
+        order = np.argsort(df['timestamp'].values, kind='stable')
+        query_ctr_features = historical_ctr(df, 'query', order).reshape(-1, 1)
+        doc_ctr_features = historical_ctr(df, 'doc_id', order).reshape(-1, 1)
         
         # 7. 添加更多变化性特征
         # 查询词数量
-        query_word_counts = []
-        for _, row in df.iterrows():
-            word_count = len(jieba.lcut(row['query']))
-            query_word_counts.append(word_count)
-        query_word_counts = np.array(query_word_counts).reshape(-1, 1)
+        query_word_counts = np.array([len(tokens) for tokens in query_tokens])[query_codes].reshape(-1, 1)
         
         # 摘要词数量
-        summary_word_counts = []
-        for _, row in df.iterrows():
-            word_count = len(jieba.lcut(row['summary']))
-            summary_word_counts.append(word_count)
-        summary_word_counts = np.array(summary_word_counts).reshape(-1, 1)
+        summary_word_counts = np.array([len(tokens) for tokens in summary_tokens])[summary_codes].reshape(-1, 1)
         
-        # 时间特征（基于timestamp的数值化）
-        time_features = []
-        for _, row in df.iterrows():
-            try:
-                # 提取时间戳中的数值部分作为特征
-                timestamp_str = str(row['timestamp'])
-                time_value = sum(ord(c) for c in timestamp_str) % 1000  # 简单的哈希
-                time_features.append(time_value)
-            except:
-                time_features.append(0)
-        time_features = np.array(time_features).reshape(-1, 1)
+        # 时间特征（时间戳字符串各字符编码之和取模，简单的哈希）
+        time_features = timestamp_hash(df['timestamp']).reshape(-1, 1)
         
         # 8. 位置衰减特征（位置越靠前，权重越高）
         position_decay = 1.0 / (position_features + 1)  # 避免除零
@@ -204,9 +219,8 @@ class CTRModel:
             if np.any(feature_std < 1e-8):  # 降低阈值从1e-6到1e-8
                 print(f"警告: 特征标准差过小: {feature_std}")
                 # 不直接返回错误，而是尝试继续训练
-            # 数据标准化
-            self.scaler = StandardScaler()
-            features_scaled = self.scaler.fit_transform(features)
+            # 数据标准化(配置了哈希特征器时拼上稀疏的ID/交叉特征)
+            features_scaled = self._model_input(features, ctr_data, fit=True)
             sss = StratifiedShuffleSplit(n_splits=1, test_size=0.3, random_state=42)
             for train_idx, test_idx in sss.split(features_scaled, labels):
                 X_train, X_test = features_scaled[train_idx], features_scaled[test_idx]
@@ -275,8 +289,8 @@ class CTRModel:
                 'precision': round(precision, 4),
                 'recall': round(recall, 4),
                 'f1': round(f1, 4),
-                'train_samples': len(X_train),
-                'test_samples': len(X_test),
+                'train_samples': X_train.shape[0],
+                'test_samples': X_test.shape[0],
                 'train_score': round(train_score, 4),
                 'test_score': round(test_score, 4),
                 'feature_weights': feature_weights,
@@ -293,62 +307,77 @@ class CTRModel:
     
     def predict_ctr(self, query: str, doc_id: str, position: int, score: float, summary: str) -> float:
         """预测CTR分数"""
-        if not self.is_trained or not self.model:
-            return score  # 如果模型未训练，返回原始分数
+        return self.predict_ctr_batch(query, [(doc_id, position, score, summary)])[0]
+    
+    def predict_ctr_batch(self, query: str, candidates: List[Tuple[str, int, float, str]]) -> List[float]:
+        """批量预测同一查询下多个候选的CTR分数
+        
+        candidates 为 [(doc_id, position, score, summary), ...]。查询只分词一次，
+        所有候选拼成一个特征矩阵，标准化和 predict_proba 各调用一次，而不是每个候选一次。
+        模型未训练或预测失败时返回原始分数。
+        """
+        scores = [score for _, _, score, _ in candidates]
+        if not candidates or not self.is_trained or not self.model:
+            return scores  # 如果模型未训练，返回原始分数
         
         try:
-            # 构建特征（与训练时保持一致）
-            position_feature = np.array([[position]])
-            doc_length = np.array([[len(summary)]])
-            query_length = np.array([[len(query)]])
-            summary_length = np.array([[len(summary)]])
-            
-            # 查询匹配度
-            query_words = set(jieba.lcut(query))
-            summary_words = set(jieba.lcut(summary))
-            if len(query_words) > 0:
-                match_ratio = len(query_words.intersection(summary_words)) / len(query_words)
-            else:
-                match_ratio = 0
-            match_score = np.array([[match_ratio]])
-            
-            # 历史CTR特征（简化版本，实际应用中需要从数据库获取）
-            query_ctr = np.array([[0.1]])  # 默认值
-            doc_ctr = np.array([[0.1]])    # 默认值
-            
-            # 位置衰减
-            position_decay = np.array([[1.0 / (position + 1)]])
-            
-            # 组合特征
-            features = np.hstack([
-                position_feature,      # 位置
-                doc_length,            # 文档长度
-                query_length,          # 查询长度
-                summary_length,        # 摘要长度
-                match_score,           # 查询匹配度
-                query_ctr,             # 查询历史CTR
-                doc_ctr,               # 文档历史CTR
-                position_decay,        # 位置衰减
-                np.array([[len(jieba.lcut(query))]]),  # 查询词数量
-                np.array([[len(jieba.lcut(summary))]]), # 摘要词数量
-                np.array([[0]]),       # 时间特征（预测时设为0）
-                np.array([[score]])    # 原始相似度分数
-            ])
+            features = self._prediction_features(query, candidates)
             
             # 标准化
-            if self.scaler:
-                features_scaled = self.scaler.transform(features)
-            else:
-                features_scaled = features
+            rows = [{'query': query, 'doc_id': doc_id, 'position': position} for doc_id, position, _, _ in candidates]
+            features_scaled = self._model_input(features, rows)
             
             # 预测CTR概率
-            ctr_score = self.model.predict_proba(features_scaled)[0, 1]
-            
-            return ctr_score
+            return self.model.predict_proba(features_scaled)[:, 1].tolist()
             
         except Exception as e:
             print(f"CTR预测失败: {e}")
-            return score  # 返回原始分数
+            return scores  # 返回原始分数
+    
+    def _model_input(self, features: np.ndarray, ctr_data: List[Dict[str, Any]], fit: bool = False):
+        """模型输入：稠密特征标准化(fit 时重新拟合标准化器)，有哈希特征器时横向拼接哈希稀疏特征"""
+        if fit:
+            self.scaler = StandardScaler()
+            features_scaled = self.scaler.fit_transform(features)
+        elif self.scaler:
+            features_scaled = self.scaler.transform(features)
+        else:
+            features_scaled = features
+        if self.vectorizer is None:
+            return features_scaled
+        return sparse.hstack([sparse.csr_matrix(features_scaled), self.vectorizer.transform(ctr_data)], format='csr')
+    
+    def _prediction_features(self, query: str, candidates: List[Tuple[str, int, float, str]]) -> np.ndarray:
+        """构建预测特征矩阵(与训练时的特征列保持一致)，每行一个候选"""
+        positions = np.array([position for _, position, _, _ in candidates], dtype=float)
+        summaries = [summary for _, _, _, summary in candidates]
+        summary_lengths = np.array([len(summary) for summary in summaries], dtype=float)
+        
+        # 查询匹配度：查询只分词一次，摘要批量分词(同一摘要的分词结果来自缓存)
+        tokenizer = get_tokenizer()
+        query_tokens = tokenizer.cut(query)
+        query_words = set(query_tokens)
+        summary_tokens = tokenizer.tokenize_many(summaries, raw=True)
+        if query_words:
+            match_scores = [len(query_words.intersection(tokens)) / len(query_words) for tokens in summary_tokens]
+        else:
+            match_scores = [0] * len(candidates)
+        
+        num_rows = len(candidates)
+        return np.column_stack([
+            positions,                                   # 位置
+            summary_lengths,                             # 文档长度
+            np.full(num_rows, len(query)),               # 查询长度
+            summary_lengths,                             # 摘要长度
+            match_scores,                                # 查询匹配度
+            np.full(num_rows, 0.1),                      # 查询历史CTR(简化版本，实际应用中需要从数据库获取)
+            np.full(num_rows, 0.1),                      # 文档历史CTR
+            1.0 / (positions + 1),                       # 位置衰减
+            np.full(num_rows, len(query_tokens)),        # 查询词数量
+            [len(tokens) for tokens in summary_tokens],  # 摘要词数量
+            np.zeros(num_rows),                          # 时间特征（预测时设为0）
+            [score for _, _, score, _ in candidates]     # 原始相似度分数
+        ]).astype(float)
     
     def save_model(self, filepath: str = None):
         """保存模型"""
@@ -402,7 +431,6 @@ class CTRModel:
     def reset(self):
         """重置模型"""
         self.model = None
-        self.vectorizer = None
         self.scaler = None
         self.is_trained = False
         print("CTR模型已重置") 
\ No newline at end of file
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+哈希稀疏特征 - 用哈希技巧把查询、文档ID及其交叉特征映射到固定宽度的稀疏矩阵
+特征维度固定为 n_features，不随查询数、文档数增长，模型权重的内存有上界；
+每个不同的查询、文档、词项只做一次 murmurhash，交叉特征由两个哈希值做整数混合得到，
+整批样本的列号用 numpy 一次算出，不为每个样本拼接字符串。
+"""
+
+from typing import List, Dict, Any, Sequence, Union
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.utils import murmurhash3_32
+from ..tokenizer import get_tokenizer
+
+# 默认哈希空间大小
+DEFAULT_HASH_FEATURES = 2 ** 18
+
+# 支持的特征域：查询、文档、查询×文档、查询词×文档、位置×文档
+HASHED_FIELDS = ('query', 'doc', 'query_doc', 'term_doc', 'position_doc')
+
+# 交叉特征混合用的乘数(FNV-1 64位素数)和各特征域的盐，保证不同特征域的同一取值落到不同的桶
+_MIX_PRIME = np.uint64(0x100000001B3)
+_FIELD_SALTS = {field: np.uint64(murmurhash3_32(field, seed=0, positive=True)) << np.uint64(32)
+                for field in HASHED_FIELDS}
+
+
+def _hash_values(field: str, values: Sequence[str]) -> np.ndarray:
+    """每个取值的32位 murmurhash (与进程无关，可跨进程复现)"""
+    return np.array([murmurhash3_32(f"{field}\x00{value}", seed=0, positive=True) for value in values],
+                    dtype=np.uint64)
+
+
+def _mix(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """两个哈希值组合成交叉特征的哈希值"""
+    return (left * _MIX_PRIME) ^ right
+
+
+def _bucket(hashes: np.ndarray, field: str, n_features: int) -> np.ndarray:
+    """加上特征域的盐后做 splitmix64 末端混合，再对哈希空间取模得到列号"""
+    with np.errstate(over='ignore'):
+        h = hashes ^ _FIELD_SALTS[field]
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        h = h ^ (h >> np.uint64(31))
+    return (h % np.uint64(n_features)).astype(np.int64)
+
+
+class HashedFeaturizer:
+    """把CTR样本的ID和交叉特征哈希成 样本数 × n_features 的CSR稀疏矩阵(值为出现次数)
+
+    无状态，只有 n_features 和 fields 两个参数，训练和预测用同一配置即得到同样的列。
+    不同取值落到同一个桶(哈希冲突)时共享权重，n_features 越大冲突越少。
+    """
+
+    def __init__(self, n_features: int = DEFAULT_HASH_FEATURES, fields: Sequence[str] = HASHED_FIELDS):
+        unknown = [field for field in fields if field not in HASHED_FIELDS]
+        if unknown:
+            raise ValueError(f"不支持的哈希特征域: {unknown}")
+        if n_features <= 0:
+            raise ValueError("哈希空间大小必须大于0")
+        self.n_features = n_features
+        self.fields = tuple(fields)
+
+    def transform(self, ctr_data: Union[List[Dict[str, Any]], pd.DataFrame]) -> sparse.csr_matrix:
+        """样本需要 query、doc_id、position 三个字段"""
+        if isinstance(ctr_data, pd.DataFrame):
+            columns = [ctr_data[name].tolist() for name in ('query', 'doc_id', 'position')]
+        else:
+            columns = [[sample.get(name) for sample in ctr_data] for name in ('query', 'doc_id', 'position')]
+        return self.transform_columns(*columns)
+
+    def transform_columns(self, queries: Sequence[str], doc_ids: Sequence[str],
+                          positions: Sequence[int]) -> sparse.csr_matrix:
+        """按列传入的样本，预测时不必构造 DataFrame"""
+        num_rows = len(queries)
+        if num_rows == 0:
+            return sparse.csr_matrix((0, self.n_features))
+
+        query_codes, unique_queries = pd.factorize(np.array([str(query or '').strip() for query in queries],
+                                                            dtype=object))
+        doc_codes, unique_docs = pd.factorize(np.array([str(doc_id) for doc_id in doc_ids], dtype=object))
+        query_hashes = _hash_values('query', unique_queries)[query_codes]
+        doc_hashes = _hash_values('doc', unique_docs)[doc_codes]
+        rows = np.arange(num_rows)
+
+        row_parts, column_parts = [], []
+        if 'query' in self.fields:
+            row_parts.append(rows)
+            column_parts.append(_bucket(query_hashes, 'query', self.n_features))
+        if 'doc' in self.fields:
+            row_parts.append(rows)
+            column_parts.append(_bucket(doc_hashes, 'doc', self.n_features))
+        if 'query_doc' in self.fields:
+            row_parts.append(rows)
+            column_parts.append(_bucket(_mix(query_hashes, doc_hashes), 'query_doc', self.n_features))
+        if 'position_doc' in self.fields:
+            position_codes, unique_positions = pd.factorize(np.asarray(positions, dtype=np.int64))
+            position_hashes = _hash_values('position', [str(p) for p in unique_positions])[position_codes]
+            row_parts.append(rows)
+            column_parts.append(_bucket(_mix(position_hashes, doc_hashes), 'position_doc', self.n_features))
+        if 'term_doc' in self.fields:
+            term_rows, term_hashes = self._query_terms(unique_queries, query_codes)
+            row_parts.append(term_rows)
+            column_parts.append(_bucket(_mix(term_hashes, doc_hashes[term_rows]), 'term_doc', self.n_features))
+
+        row_index = np.concatenate(row_parts)
+        columns = np.concatenate(column_parts)
+        return sparse.csr_matrix((np.ones(len(columns)), (row_index, columns)), shape=(num_rows, self.n_features))
+
+    @staticmethod
+    def _query_terms(unique_queries: Sequence[str], query_codes: np.ndarray):
+        """每个样本的查询词(同一查询内去重)展开成 (样本行号, 词哈希)；每个不同的查询只分词一次"""
+        term_lists = [list(dict.fromkeys(terms))
+                      for terms in get_tokenizer().tokenize_many(list(unique_queries), raw=True)]
+        counts = np.array([len(terms) for terms in term_lists], dtype=np.int64)
+        flat_hashes = _hash_values('term', [term for terms in term_lists for term in terms])
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+        row_counts = counts[query_codes]
+        term_rows = np.repeat(np.arange(len(query_codes)), row_counts)
+        offsets = np.arange(row_counts.sum()) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+        return term_rows, flat_hashes[np.repeat(starts[query_codes], row_counts) + offsets]
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在线增量CTR模型 - 用点击流小批次增量更新的 FTRL-Proximal 逻辑回归
+每个小批次只做一次前向和一次按特征的梯度累加，代价与批次大小成正比，与历史日志总量无关；
+特征标准化用增量的均值/方差，查询/文档历史CTR用累计的 (点击数, 展示数) 计数，
+训练和预测用同一份计数，排序跟随最新的点击行为。
+"""
+
+import copy
+import os
+import pickle
+from typing import List, Dict, Any, Tuple
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from .ctr_model import CTRModel, history_counts, smoothed_ctr
+from .ctr_config import CTROnlineConfig, CTRTrainingConfig
+
+# extract_features 特征矩阵中查询历史CTR、文档历史CTR所在的列
+QUERY_CTR_COLUMN = 5
+DOC_CTR_COLUMN = 6
+
+
+class FTRLProximal:
+    """FTRL-Proximal 逻辑回归，每个特征有自己的学习率 alpha/(beta + sqrt(n_i))
+
+    接口与 sklearn 分类器一致(predict_proba、coef_、intercept_)，可直接替换 CTRModel.model；
+    partial_fit 按小批次更新：批内梯度求和，n 累加逐样本梯度的平方。截距作为最后一维，不参与L1。
+    """
+
+    def __init__(self, alpha: float = 0.05, beta: float = 1.0, l1: float = 0.01, l2: float = 1.0):
+        self.alpha = alpha
+        self.beta = beta
+        self.l1 = l1
+        self.l2 = l2
+        self.z = None
+        self.n = None
+
+    def _weights(self) -> np.ndarray:
+        """由累计量 z、n 得到当前权重(|z| 不超过L1的特征权重为0)"""
+        l1 = np.full(len(self.z), self.l1)
+        l1[-1] = 0.0
+        weights = -(self.z - np.sign(self.z) * l1) / ((self.beta + np.sqrt(self.n)) / self.alpha + self.l2)
+        weights[np.abs(self.z) <= l1] = 0.0
+        return weights
+
+    def _with_intercept(self, features: np.ndarray) -> np.ndarray:
+        return np.hstack([features, np.ones((len(features), 1))])
+
+    def partial_fit(self, features: np.ndarray, labels: np.ndarray) -> 'FTRLProximal':
+        """用一个小批次更新模型"""
+        features = self._with_intercept(np.asarray(features, dtype=float))
+        if self.z is None:
+            self.z = np.zeros(features.shape[1])
+            self.n = np.zeros(features.shape[1])
+        weights = self._weights()
+        errors = 1.0 / (1.0 + np.exp(-np.clip(features @ weights, -35, 35))) - np.asarray(labels, dtype=float)
+        gradients = features * errors[:, None]
+        gradient = gradients.sum(axis=0)
+        squared = (gradients ** 2).sum(axis=0)
+        sigma = (np.sqrt(self.n + squared) - np.sqrt(self.n)) / self.alpha
+        self.z += gradient - sigma * weights
+        self.n += squared
+        return self
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """[[未点击概率, 点击概率], ...]"""
+        features = np.asarray(features, dtype=float)
+        if self.z is None:
+            clicks = np.full(len(features), 0.5)
+        else:
+            logits = self._with_intercept(features) @ self._weights()
+            clicks = 1.0 / (1.0 + np.exp(-np.clip(logits, -35, 35)))
+        return np.column_stack([1.0 - clicks, clicks])
+
+    @property
+    def coef_(self) -> np.ndarray:
+        return self._weights()[None, :-1] if self.z is not None else np.zeros((1, 0))
+
+    @property
+    def intercept_(self) -> np.ndarray:
+        return self._weights()[-1:] if self.z is not None else np.zeros(1)
+
+
+class OnlineCTRModel(CTRModel):
+    """增量学习的CTR模型：模型为 FTRLProximal，标准化器用 StandardScaler.partial_fit 增量更新
+
+    查询、文档的 (点击数, 展示数) 随学习累计，训练样本的历史CTR特征只用时间上更早的样本，
+    预测时用截至目前的累计值(批量训练的模型预测时这两列固定为默认值)。
+    见过 CTRTrainingConfig.MIN_SAMPLES 条样本且点击、未点击都出现过后才算训练完成。
+    """
+
+    def __init__(self, **ftrl_params):
+        super().__init__()
+        self.model = FTRLProximal(**(ftrl_params or CTROnlineConfig.get_ftrl_params()))
+        self.scaler = StandardScaler()
+        self.query_history: Dict[str, Tuple[float, float]] = {}
+        self.doc_history: Dict[str, Tuple[float, float]] = {}
+        self.samples_seen = 0
+        self.clicks_seen = 0
+
+    def partial_fit(self, ctr_data: List[Dict[str, Any]]) -> int:
+        """用一个小批次的CTR样本增量更新，返回学习的样本数"""
+        if not ctr_data:
+            return 0
+        features, labels = self.extract_features(ctr_data)
+        df = pd.DataFrame(ctr_data)
+        order = np.argsort(df['timestamp'].values, kind='stable')
+        for column, key, history in ((QUERY_CTR_COLUMN, 'query', self.query_history),
+                                     (DOC_CTR_COLUMN, 'doc_id', self.doc_history)):
+            features[:, column] = self._update_history(df, key, order, history)
+
+        features = features.astype(float)
+        self.scaler.partial_fit(features)
+        self.model.partial_fit(self.scaler.transform(features), labels)
+        self.samples_seen += len(labels)
+        self.clicks_seen += int(np.sum(labels))
+        self.is_trained = (self.samples_seen >= CTRTrainingConfig.MIN_SAMPLES
+                           and 0 < self.clicks_seen < self.samples_seen)
+        return len(labels)
+
+    @staticmethod
+    def _update_history(df: pd.DataFrame, key: str, order: np.ndarray,
+                        history: Dict[str, Tuple[float, float]]) -> np.ndarray:
+        """本批样本的历史CTR(之前批次的累计 + 批内更早的样本)，并把本批计入累计"""
+        keys = df[key].astype(str)
+        previous_clicks, previous_count = history_counts(df, key, order)
+        prior = np.array([history.get(value, (0.0, 0.0)) for value in keys.tolist()]).reshape(-1, 2)
+        ctr = smoothed_ctr(prior[:, 0] + previous_clicks, prior[:, 1] + previous_count)
+
+        totals = df['clicked'].astype(float).groupby(keys.values, sort=False).agg(['sum', 'count'])
+        for value, clicks, count in zip(totals.index.tolist(), totals['sum'].tolist(), totals['count'].tolist()):
+            old_clicks, old_count = history.get(value, (0.0, 0.0))
+            history[value] = (old_clicks + clicks, old_count + count)
+        return ctr
+
+    def _prediction_features(self, query: str, candidates: List[Tuple[str, int, float, str]]) -> np.ndarray:
+        """在批量模型的预测特征上填入累计的查询/文档历史CTR"""
+        features = super()._prediction_features(query, candidates)
+        query_clicks, query_count = self.query_history.get(query.strip(), (0.0, 0.0))
+        features[:, QUERY_CTR_COLUMN] = smoothed_ctr(np.array([query_clicks]), np.array([query_count]))[0]
+        doc_counts = np.array([self.doc_history.get(doc_id, (0.0, 0.0)) for doc_id, _, _, _ in candidates])
+        features[:, DOC_CTR_COLUMN] = smoothed_ctr(doc_counts[:, 0], doc_counts[:, 1])
+        return features
+
+    def snapshot(self) -> 'OnlineCTRModel':
+        """当前模型的副本，用于发布给预测：之后的增量更新不影响副本
+
+        历史计数的值是不可变的元组，字典浅拷贝即可。
+        """
+        model = copy.copy(self)
+        model.model = copy.deepcopy(self.model)
+        model.scaler = copy.deepcopy(self.scaler)
+        model.query_history = dict(self.query_history)
+        model.doc_history = dict(self.doc_history)
+        return model
+
+    def save_checkpoint(self, filepath: str, stream_offset: int) -> bool:
+        """保存检查点(模型、标准化器、历史计数和点击流读取位置)，先写临时文件再原子替换"""
+        try:
+            os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+            temp_file = filepath + ".tmp"
+            with open(temp_file, 'wb') as f:
+                pickle.dump({'model': self, 'stream_offset': stream_offset}, f)
+            os.replace(temp_file, filepath)
+            return True
+        except Exception as e:
+            print(f"⚠️ 保存在线模型检查点失败: {e}")
+            return False
+
+    @staticmethod
+    def load_checkpoint(filepath: str) -> Tuple['OnlineCTRModel', int]:
+        """加载检查点，返回 (模型, 点击流读取位置)；文件不存在或损坏时返回 (新模型, 0)"""
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, 'rb') as f:
+                    checkpoint = pickle.load(f)
+                return checkpoint['model'], int(checkpoint['stream_offset'])
+            except Exception as e:
+                print(f"⚠️ 加载在线模型检查点失败: {e}")
+        return OnlineCTRModel(), 0
@@ -111,6 +111,7 @@ def build_training_tab(model_service, data_service):
         with gr.Row():
             with gr.Column(scale=2):
                 train_btn = gr.Button("🚀 开始训练", variant="primary")
+                online_btn = gr.Button("⚡ 在线增量更新", variant="secondary")
                 clear_data_btn = gr.Button("🗑️ 清空数据", variant="secondary")
                 export_data_btn = gr.Button("📤 导出数据", variant="secondary")
                 import_data_btn = gr.Button("📥 导入数据", variant="secondary")
@@ -189,6 +190,31 @@ def build_training_tab(model_service, data_service):
             
             return html
         
+        def online_update():
+            result = model_service.online_update(data_service)
+            
+            if result.get('success', False):
+                html = f"""
+                <div style="background-color: #d4edda; color: #155724; padding: 15px; border-radius: 8px; border: 1px solid #c3e6cb;">
+                    <h4 style="margin: 0 0 10px 0;">✅ 增量更新完成</h4>
+                    <ul style="margin: 0; padding-left: 20px;">
+                        <li><strong>新样本数:</strong> {result.get('new_samples', 0)}</li>
+                        <li><strong>小批次数:</strong> {result.get('batches', 0)}</li>
+                        <li><strong>累计学习样本:</strong> {result.get('samples_seen', 0)}</li>
+                        <li><strong>模型已发布:</strong> {'是' if result.get('published') else '否(样本不足)'}</li>
+                    </ul>
+                </div>
+                """
+            else:
+                html = f"""
+                <div style="background-color: #f8d7da; color: #721c24; padding: 15px; border-radius: 8px; border: 1px solid #f5c6cb;">
+                    <h4 style="margin: 0 0 10px 0;">❌ 增量更新失败</h4>
+                    <p style="margin: 0;">{result.get('error', '未知错误')}</p>
+                </div>
+                """
+            
+            return html
+        
         def clear_data():
             # 使用新的工具函数
             clear_all_data()
@@ -223,6 +249,7 @@ def build_training_tab(model_service, data_service):
         
         # 绑定事件
         train_btn.click(fn=train_model, outputs=training_output)
+        online_btn.click(fn=online_update, outputs=training_output)
         clear_data_btn.click(fn=clear_data, outputs=training_output)
         export_data_btn.click(fn=export_data, outputs=training_output)
         
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量检索(稀疏得分矩阵)测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from scipy import sparse
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.batch_search import top_k_dense, top_k_sparse
+from search_engine.index_tab.index_service import InvertedIndexService
+from search_engine.index_tab.segmented_index import SegmentedIndex
+from search_engine.index_tab.sharded_index import ShardedIndex
+
+
+class TestBatchSearch(unittest.TestCase):
+    """批量检索测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(20)
+        cls.vocabulary = ["机器学习", "深度学习", "神经网络", "数据挖掘", "搜索引擎", "倒排索引",
+                          "python", "算法", "推荐系统", "自然语言"]
+        cls.documents = {f"batch{i}": " ".join(rng.choice(cls.vocabulary) for _ in range(rng.randint(1, 30)))
+                         for i in range(300)}
+        cls.queries = [" ".join(rng.sample(cls.vocabulary, rng.randint(1, 3))) for _ in range(60)]
+        cls.queries += ["", "不存在的词", "机器学习 机器学习 算法"]
+
+    def assert_same_results(self, actual, expected):
+        """分数序列一致，分数高于末位的文档集合一致(浮点求和顺序不同，同分文档的先后和谁入选不确定)"""
+        self.assertEqual(len(actual), len(expected))
+        for (_, score), (_, expected_score) in zip(actual, expected):
+            self.assertAlmostEqual(score, expected_score, places=9)
+        if expected:
+            cutoff = expected[-1][1] + 1e-9
+            self.assertEqual({doc_id for doc_id, score in actual if score > cutoff},
+                             {doc_id for doc_id, score in expected if score > cutoff})
+
+    def test_matches_retrieve(self):
+        """测试各打分器下批量结果与逐条TAAT检索一致，带短语/布尔约束的查询也一致"""
+        index = InvertedIndex()
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        queries = self.queries + ['"机器学习 算法"', "机器学习 AND NOT 算法", "(python OR 推荐系统) AND 数据挖掘"]
+        for scorer in ("tfidf", "bm25", "bm25+"):
+            for top_k in (1, 5, 400):
+                results = index.search_many(queries, top_k, scorer=scorer)
+                self.assertEqual(len(results), len(queries))
+                for query, actual in zip(queries, results):
+                    self.assert_same_results(actual, index.retrieve(query, top_k, scorer=scorer))
+        self.assertEqual(index.search_many(self.queries, 0), [[] for _ in self.queries])
+        self.assertEqual(index.search_many([]), [])
+
+    def test_matrix_rebuilt_after_writes(self):
+        """测试写入后得分矩阵重建，复制的索引不共享矩阵，mmap索引段同样可用"""
+        index = InvertedIndex()
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        matrix = index.get_doc_term_matrix("bm25")
+        self.assertIs(index.get_doc_term_matrix("bm25"), matrix)
+        self.assertGreater(matrix.nbytes, 0)
+
+        index.delete_document("batch1")
+        index.add_document("batch_new", "量子计算 " * 5)
+        self.assertIsNot(index.get_doc_term_matrix("bm25"), matrix)
+        results = index.search_many(["量子计算", self.queries[0]], 10, scorer="bm25")
+        self.assertEqual([doc_id for doc_id, _ in results[0]], ["batch_new"])
+        self.assert_same_results(results[1], index.retrieve(self.queries[0], 10, scorer="bm25"))
+        self.assertNotIn("batch1", [doc_id for doc_id, _ in results[1]])
+
+        clone = index.copy()
+        clone.add_document("batch_clone", "量子计算")
+        self.assertEqual(len(clone.search_many(["量子计算"], 10)[0]), 2)
+        self.assertEqual(len(index.search_many(["量子计算"], 10)[0]), 1)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.seg")
+            index.save_segment(path)
+            loaded = InvertedIndex()
+            loaded.load_segment(path)
+            for query, actual in zip(self.queries, loaded.search_many(self.queries, 5, scorer="bm25")):
+                self.assert_same_results(actual, index.retrieve(query, 5, scorer="bm25"))
+
+    def test_top_k_selection(self):
+        """测试稠密与稀疏两种选择方式结果相同：分数降序、同分按编号升序、只保留正分"""
+        rng = np.random.default_rng(20)
+        scores = rng.permuted(np.tile(np.arange(50.0), (30, 1)), axis=1)
+        scores[3] = 0
+        scores[4, :45] = 0
+        for top_k in (1, 3, 50, 80):
+            expected = []
+            for row in scores:
+                ranked = sorted((-value, col) for col, value in enumerate(row) if value > 0)[:top_k]
+                expected.append([(col, -value) for value, col in ranked])
+            expected = [[(col, float(value)) for col, value in row] for row in expected]
+            self.assertEqual(top_k_dense(scores, top_k), expected)
+            self.assertEqual(top_k_sparse(sparse.csr_matrix(scores), top_k), expected)
+
+    def test_sharded_segmented_and_service(self):
+        """测试分片、分段索引和服务层的批量检索与逐条检索一致"""
+        sharded = ShardedIndex(num_shards=3, use_processes=False)
+        sharded.add_documents(self.documents)
+        for query, actual in zip(self.queries, sharded.search_many(self.queries, 5, scorer="bm25")):
+            self.assert_same_results(actual, sharded.retrieve(query, 5, scorer="bm25"))
+        sharded.close()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            segmented = SegmentedIndex(os.path.join(tmpdir, "segments"), flush_threshold=100, background_merge=False)
+            segmented.add_documents(self.documents)
+            for query, actual in zip(self.queries, segmented.search_many(self.queries, 5)):
+                self.assert_same_results(actual, segmented.retrieve(query, 5))
+            segmented.close()
+
+            service = InvertedIndexService(os.path.join(tmpdir, "index.json"))
+            service.clear_index()
+            service.batch_add_documents(self.documents)
+            results = service.search_many([" 机器学习 ", "算法"], top_k=3)
+            self.assert_same_results(results[0], service.index.retrieve("机器学习", 3))
+            self.assertEqual(len(results[1]), 3)
+            self.assertEqual(service.search_many(["算法", "(机器学习"]), [[], []])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布尔查询与跳表求交测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex, SUPPORTED_STRATEGIES
+from search_engine.index_tab.boolean_query import (
+    parse_boolean_query, is_boolean_query, QuerySyntaxError
+)
+from search_engine.index_tab.posting_list import PostingList, SKIP_INTERVAL, intersect_sorted
+from search_engine.index_tab.segmented_index import SegmentedIndex
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+def reference_eval(node, doc_id, tokens):
+    """直接在文档分词结果上对语法树求值"""
+    kind = node[0]
+    if kind == "and":
+        return all(reference_eval(child, doc_id, tokens) for child in node[1])
+    if kind == "or":
+        return any(reference_eval(child, doc_id, tokens) for child in node[1])
+    if kind == "not":
+        return not reference_eval(node[1], doc_id, tokens)
+    if kind == "term":
+        return node[1] in tokens
+    if kind == "field":
+        value = node[2]
+        return doc_id.startswith(value[:-1]) if value.endswith("*") else doc_id == value
+    raise ValueError(kind)
+
+
+class TestBooleanQuery(unittest.TestCase):
+    """布尔查询测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(23)
+        cls.vocabulary = ["机器", "学习", "深度", "神经网络", "数据", "算法", "模型", "推荐", "搜索", "人工智能"]
+        cls.index = InvertedIndex()
+        for i in range(400):
+            words = [rng.choice(cls.vocabulary) for _ in range(rng.randint(2, 12))]
+            cls.index.add_document(f"{'a' if i % 3 else 'b'}doc{i}", " ".join(words))
+        cls.tokens = {doc_id: set(cls.index.preprocess_text(content)) for doc_id, content in cls.index.documents.items()}
+
+    def test_parse(self):
+        """测试运算符优先级、隐式AND、减号和字段限定"""
+        self.assertEqual(parse_boolean_query("机器 OR 学习 数据"),
+                         ("or", [("term", "机器"), ("and", [("term", "学习"), ("term", "数据")])]))
+        self.assertEqual(parse_boolean_query("(机器 OR 学习) AND NOT -数据"),
+                         ("and", [("or", [("term", "机器"), ("term", "学习")]), ("not", ("not", ("term", "数据")))]))
+        self.assertEqual(parse_boolean_query('id:doc* content:推荐 "机器 学习"~2'),
+                         ("and", [("field", "id", "doc*"), ("term", "推荐"), ("phrase", "机器 学习", 2, False)]))
+        self.assertTrue(is_boolean_query("机器 AND 学习"))
+        self.assertTrue(is_boolean_query("id:doc1"))
+        self.assertFalse(is_boolean_query('"机器 学习" 数据 NEAR/2 模型'))
+        self.assertFalse(is_boolean_query("and or not"))
+
+    def test_syntax_errors(self):
+        """测试语法错误给出位置信息"""
+        for query, position in [("机器 AND", 6), ("(机器 OR 学习", 0), ("机器)", 2), ('"机器 学习', 0),
+                                ("OR 机器", 0), ("title:机器", 0), ("", 0)]:
+            with self.assertRaises(QuerySyntaxError) as context:
+                parse_boolean_query(query)
+            self.assertEqual(context.exception.position, position, query)
+            self.assertIn("查询语法错误", str(context.exception))
+
+    def test_matches_reference(self):
+        """测试随机布尔查询的匹配结果与逐文档求值一致"""
+        rng = random.Random(8)
+
+        def random_query(depth):
+            if depth == 0 or rng.random() < 0.3:
+                choice = rng.random()
+                if choice < 0.1:
+                    return rng.choice(["id:adoc*", "id:bdoc1*", "id:adoc5"])
+                return rng.choice(self.vocabulary)
+            left, right = random_query(depth - 1), random_query(depth - 1)
+            template = rng.choice(["({} AND {})", "({} OR {})", "({} NOT {})", "({} -{})", "({} {})", "NOT {} OR {}"])
+            return template.format(left, right)
+
+        for _ in range(150):
+            query = random_query(3)
+            tree = parse_boolean_query(query)
+            expected = {doc_id for doc_id, tokens in self.tokens.items() if reference_eval(tree, doc_id, tokens)}
+            for strategy in SUPPORTED_STRATEGIES:
+                actual = self.index.retrieve(query, top_k=1000, strategy=strategy)
+                self.assertEqual({doc_id for doc_id, _ in actual}, expected, f"{strategy}: {query}")
+
+    def test_scoring(self):
+        """测试布尔查询只用不在NOT下的词打分，无打分词的匹配以0分补足"""
+        bag = dict(self.index.retrieve("机器 学习", top_k=1000))
+        for doc_id, score in self.index.retrieve("机器 AND 学习 NOT 数据", top_k=1000):
+            self.assertAlmostEqual(score, bag[doc_id], places=9)
+        results = self.index.retrieve("id:bdoc*", top_k=5)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(doc_id.startswith("bdoc") and score == 0.0 for doc_id, score in results))
+        self.assertEqual(self.index.retrieve("id:adoc1"), [("adoc1", 0.0)])
+        self.assertEqual(self.index.retrieve("的 AND 了"), [])
+
+    def test_skip_pointer_intersection(self):
+        """测试跳表求交与直接求交一致，变更后跳表失效重建"""
+        rng = np.random.default_rng(4)
+        doc_nums = np.unique(rng.integers(0, 200000, 20000))
+        posting_list = PostingList.from_postings((int(doc_num), 1) for doc_num in doc_nums)
+        for size in (1, 10, 100, 5000):
+            targets = np.unique(np.concatenate([rng.choice(doc_nums, size), rng.integers(0, 210000, size)]))
+            expected = np.intersect1d(targets, doc_nums)
+            self.assertTrue(np.array_equal(posting_list.intersect(targets), expected))
+            self.assertTrue(np.array_equal(intersect_sorted(targets, doc_nums), expected))
+        self.assertEqual(len(posting_list.skip_pointers()[0]), -(-len(doc_nums) // SKIP_INTERVAL))
+        posting_list.append(300000, 2)
+        self.assertEqual(posting_list.intersect(np.array([5, 300000])).tolist(),
+                         [5, 300000] if 5 in doc_nums else [300000])
+
+    def test_segments_and_service(self):
+        """测试分段索引上的布尔查询和服务层的语法错误提示"""
+        queries = ["(机器 OR 深度) AND NOT 数据", "id:bdoc* 推荐", "NOT 算法", '"机器 学习" OR 人工智能 -搜索']
+        with tempfile.TemporaryDirectory() as tmpdir:
+            segmented = SegmentedIndex(os.path.join(tmpdir, "segments"), flush_threshold=70, background_merge=False)
+            for doc_id, content in self.index.documents.items():
+                segmented.add_document(doc_id, content)
+            segmented.delete_document("bdoc3")
+            path = os.path.join(tmpdir, "index.seg")
+            self.index.save_segment(path)
+            loaded = InvertedIndex()
+            loaded.load_segment(path)
+            for query in queries:
+                expected = {doc_id for doc_id, _ in self.index.retrieve(query, top_k=1000)}
+                self.assertEqual({doc_id for doc_id, _ in loaded.retrieve(query, top_k=1000)}, expected)
+                actual = {doc_id for doc_id, _ in segmented.retrieve(query, top_k=1000)}
+                self.assertEqual(actual, expected - {"bdoc3"})
+            segmented.close()
+
+        service = InvertedIndexService.__new__(InvertedIndexService)
+        service.index = self.index
+        self.assertIsNone(service.validate_query("机器 AND (学习 OR 数据)"))
+        self.assertIn("括号未闭合", service.validate_query("机器 AND (学习 OR 数据"))
+        self.assertEqual(service.search("机器 AND"), [])
+        self.assertTrue(service.search("机器 AND 学习", top_k=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
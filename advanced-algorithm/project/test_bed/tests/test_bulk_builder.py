@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行批量建索引测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.posting_list import PostingList
+from search_engine.index_tab import bulk_builder
+from search_engine.index_tab.bulk_builder import bulk_add_documents, build_index_parallel
+from search_engine.index_tab.segmented_index import SegmentedIndex
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+class TestBulkBuilder(unittest.TestCase):
+    """并行批量建索引测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(11)
+        vocabulary = ["机器", "学习", "深度", "神经网络", "数据", "算法", "模型", "推荐", "搜索", "人工智能"]
+        cls.documents = {f"bdoc{i}": "，".join(rng.choice(vocabulary) for _ in range(rng.randint(2, 20)))
+                         for i in range(300)}
+        cls.queries = ["机器 学习", '"深度 神经网络"', "推荐 AND NOT 搜索", "数据 NEAR/2 算法"]
+
+    def build_serial(self, documents) -> InvertedIndex:
+        index = InvertedIndex()
+        for doc_id, content in documents.items():
+            index.add_document(doc_id, content)
+        return index
+
+    def assert_same_index(self, actual: InvertedIndex, expected: InvertedIndex):
+        """内部编号、倒排链、正排位置和检索结果都与串行构建一致"""
+        self.assertEqual(actual.doc_ids, expected.doc_ids)
+        self.assertEqual(actual.get_all_documents(), expected.get_all_documents())
+        self.assertEqual(list(actual.doc_lengths), list(expected.doc_lengths))
+        self.assertEqual(set(actual.postings), set(expected.postings))
+        for word, posting_list in expected.postings.items():
+            self.assertEqual(actual.postings[word].items(), posting_list.items(), word)
+        for doc_id in expected.doc_nums:
+            words = list(expected.get_document_terms(doc_id))
+            self.assertEqual(actual.get_document_terms(doc_id), expected.get_document_terms(doc_id))
+            self.assertEqual(actual.get_term_positions(doc_id, words), expected.get_term_positions(doc_id, words))
+            self.assertEqual(actual.generate_summary(doc_id, ["数据"]), expected.generate_summary(doc_id, ["数据"]))
+        for query in self.queries:
+            for scorer in ("tfidf", "bm25"):
+                self.assertEqual(actual.retrieve(query, top_k=50, scorer=scorer),
+                                 expected.retrieve(query, top_k=50, scorer=scorer))
+
+    def test_extend_posting_list(self):
+        """测试倒排链拼接只改写第一个差值，词频类型按需放宽"""
+        left = PostingList.from_postings([(1, 2), (5, 1), (300, 3)])
+        right = PostingList.from_postings([(0, 1), (7, 1000), (200, 1)])
+        left.extend(right, 400)
+        self.assertEqual(left.items(), [(1, 2), (5, 1), (300, 3), (400, 1), (407, 1000), (600, 1)])
+        self.assertEqual(left.tfs.typecode, 'H')
+        left.append(601, 1)
+        self.assertEqual(left.last_doc, 601)
+        with self.assertRaises(ValueError):
+            left.extend(right, 0)
+        empty = PostingList()
+        empty.extend(PostingList.from_postings([(3, 1)]), 0)
+        self.assertEqual(empty.items(), [(3, 1)])
+
+    def test_parallel_build_matches_serial(self):
+        """测试多进程分片构建与串行逐篇写入完全一致"""
+        with mock.patch.object(bulk_builder, "MIN_PARALLEL_DOCS", 10), \
+                mock.patch.object(bulk_builder, "MAX_SHARD_DOCS", 40):
+            index = InvertedIndex()
+            stats = bulk_add_documents(index, self.documents, workers=2)
+        self.assertEqual(stats['documents'], len(self.documents))
+        self.assertGreater(stats['shards'], 1)
+        self.assertGreater(stats['docs_per_sec'], 0)
+        self.assert_same_index(index, self.build_serial(self.documents))
+
+    def test_merge_into_existing_index(self):
+        """测试合并进已有索引：已存在的文档被覆盖，词项ID重新映射"""
+        existing = {f"bdoc{i}": "图像，识别，数据" for i in range(0, 300, 7)}
+        existing["old"] = "图像，检索，算法"
+        index = self.build_serial(existing)
+        index.delete_document("bdoc7")
+        expected = self.build_serial(existing)
+        expected.delete_document("bdoc7")
+        for doc_id, content in self.documents.items():
+            expected.add_document(doc_id, content)
+
+        with mock.patch.object(bulk_builder, "MIN_PARALLEL_DOCS", 10), \
+                mock.patch.object(bulk_builder, "MAX_SHARD_DOCS", 25):
+            bulk_add_documents(index, self.documents, workers=2)
+        self.assertEqual(index.get_all_documents(), expected.get_all_documents())
+        for doc_id in expected.doc_nums:
+            self.assertEqual(index.get_document_terms(doc_id), expected.get_document_terms(doc_id))
+        for word, posting_list in expected.postings.items():
+            self.assertEqual(index.get_term_postings(word), expected.get_term_postings(word))
+        for query in self.queries + ["图像"]:
+            self.assertEqual(index.retrieve(query, top_k=50), expected.retrieve(query, top_k=50))
+
+    def test_segmented_and_service(self):
+        """测试分段索引批量写入成一个新段，服务层批量添加走并行构建"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            segmented = SegmentedIndex(os.path.join(tmpdir, "segments"), background_merge=False)
+            segmented.add_document("bdoc1", "旧版本，图像")
+            segmented.add_document("extra", "图像，数据")
+            segmented.flush()
+            segmented.add_documents(self.documents, workers=1)
+            documents = dict(self.documents, extra="图像，数据")
+            self.assertEqual(segmented.get_all_documents(), documents)
+            self.assertEqual(segmented.get_index_stats()['segment_count'], 2)
+            reference = self.build_serial(documents)
+            for query in self.queries:
+                self.assertEqual({doc_id for doc_id, _ in segmented.retrieve(query, top_k=1000)},
+                                 {doc_id for doc_id, _ in reference.retrieve(query, top_k=1000)})
+            segmented.close()
+
+        service = InvertedIndexService.__new__(InvertedIndexService)
+        service.index = InvertedIndex()
+        self.assertEqual(service.batch_add_documents(self.documents), len(self.documents))
+        self.assertEqual(service.get_document_count(), len(self.documents))
+        self.assertEqual(build_index_parallel({}).get_index_stats()['total_documents'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+召回候选集与两阶段排序测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_service import IndexService, PROXIMITY_BOOST
+from search_engine.index_tab.candidate_set import CandidateSet
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.segmented_index import SegmentedIndex
+from search_engine.index_tab.sharded_index import ShardedIndex
+from search_engine.result_cache import ResultCache
+
+
+class TestCandidateSet(unittest.TestCase):
+    """召回候选集测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(21)
+        vocabulary = ["机器学习", "深度学习", "神经网络", "数据挖掘", "搜索引擎", "倒排索引", "python", "算法"]
+        cls.documents = {f"cand{i}": " ".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 40)))
+                         for i in range(200)}
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        # 预先建好空索引，避免触发离线构建改写 models/ 下的索引文件
+        index_file = os.path.join(cls.tmpdir.name, "index.json")
+        InvertedIndex().save_to_file(index_file)
+        cls.service = IndexService(index_file,
+                                   result_cache=ResultCache(max_entries=0))
+        cls.service.clear_index()
+        cls.service.batch_add_documents(cls.documents)
+        cls.index = cls.service.index_service.index
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def count_calls(self, name):
+        """统计索引方法的调用参数"""
+        calls = []
+        original = getattr(self.index, name)
+
+        def wrapper(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+        setattr(self.index, name, wrapper)
+        self.addCleanup(delattr, self.index, name)
+        return calls
+
+    def test_rank_reuses_retrieve_scores(self):
+        """测试排序复用召回分数，全库只打分一次，摘要只为最终结果生成，结果与一体化搜索一致"""
+        expected_ids = [doc_id for doc_id, _ in self.index.retrieve("机器学习 算法", 20, scorer="bm25")]
+        expected = self.index.search("机器学习 算法", top_k=5, scorer="bm25")
+        retrieves = self.count_calls("retrieve")
+        summaries = self.count_calls("get_summaries")
+        candidates = self.service.retrieve("机器学习 算法", top_k=20, scorer="bm25")
+        self.assertIsInstance(candidates, CandidateSet)
+        self.assertEqual(candidates, expected_ids)
+        ranked = self.service.rank("机器学习 算法", candidates, top_k=5, scorer="bm25")
+        self.assertEqual(len(retrieves), 1)
+        self.assertEqual([len(args[0]) for args in summaries], [5])
+        self.assertEqual([result[1] for result in ranked], [result[1] for result in expected])
+        self.assertEqual(ranked, [(doc_id, score, self.index.generate_summary(doc_id, candidates.query_words))
+                                  for doc_id, score, _ in ranked])
+
+        # 邻近度排序：为全部候选算邻近度，摘要只补生成新入选的文档
+        proximity = self.service.rank("机器学习 算法", candidates, top_k=5, sort_mode="proximity", scorer="bm25")
+        boosted = [score * (1 + PROXIMITY_BOOST * closeness) for _, score, closeness, _ in proximity]
+        self.assertEqual(boosted, sorted(boosted, reverse=True))
+        self.assertEqual(len(retrieves), 1)
+        self.assertEqual(sum(len(args[0]) for args in summaries), len({doc_id for doc_id, *_ in ranked + proximity}))
+
+        # 打分器不同时不复用召回分数
+        self.service.rank("机器学习 算法", candidates, top_k=5, scorer="tfidf")
+        self.assertEqual(len(retrieves), 2)
+
+    def test_rank_plain_doc_ids(self):
+        """测试对普通文档ID列表排序时只对这些文档打分：分数与全库检索相同，不含查询词的文档不返回"""
+        all_scores = dict(self.index.retrieve("神经网络", top_k=1000))
+        matched = sorted(all_scores)[:6]
+        unmatched = [doc_id for doc_id in self.documents if doc_id not in all_scores][:2]
+        doc_ids = unmatched + matched + ["missing", matched[0]]
+        ranked = self.service.rank("神经网络", doc_ids, top_k=10)
+        self.assertEqual({doc_id for doc_id, _, _ in ranked}, set(matched))
+        for doc_id, score, summary in ranked:
+            self.assertAlmostEqual(score, all_scores[doc_id])
+            self.assertTrue(summary)
+        self.assertEqual([score for _, score, _ in ranked], sorted((score for _, score, _ in ranked), reverse=True))
+
+        # 调用方改动过的候选集按普通列表处理
+        candidates = self.service.retrieve("神经网络", top_k=3)
+        candidates.append(matched[-1])
+        self.assertIn(matched[-1], [doc_id for doc_id, _, _ in self.service.rank("神经网络", candidates, top_k=10)])
+
+        # 布尔查询的约束仍然生效
+        ranked = self.service.rank("神经网络 AND NOT 算法", doc_ids, top_k=10)
+        expected = {doc_id for doc_id, _ in self.index.retrieve("神经网络 AND NOT 算法", top_k=1000)}
+        self.assertEqual({doc_id for doc_id, _, _ in ranked}, expected & set(matched))
+        self.assertEqual(self.service.rank("(神经网络", doc_ids), [])
+
+    def test_restricted_retrieve_on_segments_and_shards(self):
+        """测试分段、分片索引只在给定文档中打分，分数与全库检索一致"""
+        doc_ids = list(self.documents)[::7]
+        expected = {doc_id: score for doc_id, score in self.index.retrieve("深度学习 python", top_k=1000)
+                    if doc_id in doc_ids}
+        sharded = ShardedIndex(num_shards=3, use_processes=False)
+        sharded.add_documents(self.documents)
+        segmented = SegmentedIndex(os.path.join(self.tmpdir.name, "segments"), flush_threshold=60,
+                                   background_merge=False)
+        segmented.add_documents(self.documents)
+        try:
+            for index in (self.index, sharded, segmented):
+                actual = dict(index.retrieve("深度学习 python", top_k=1000, doc_ids=doc_ids))
+                self.assertEqual(set(actual), set(expected))
+                for doc_id, score in actual.items():
+                    self.assertAlmostEqual(score, expected[doc_id])
+                summaries = index.get_summaries(doc_ids[:3] + ["missing"], ["python"])
+                self.assertEqual(set(summaries), set(doc_ids[:3]))
+        finally:
+            sharded.close()
+            segmented.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
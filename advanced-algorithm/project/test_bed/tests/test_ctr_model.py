@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTR模型批量预测与特征提取测试用例
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import random
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from search_engine.training_tab.ctr_model import CTRModel
+from search_engine.model_service import ModelService
+from search_engine.tokenizer import get_tokenizer
+
+
+def trained_model() -> CTRModel:
+    """在随机特征上拟合的模型(不落盘)，只用于检查预测流程"""
+    rng = np.random.default_rng(22)
+    features = rng.normal(size=(200, 12))
+    labels = (features[:, 4] + rng.normal(scale=0.5, size=200) > 0).astype(int)
+    model = CTRModel()
+    model.scaler = StandardScaler().fit(features)
+    model.model = LogisticRegression().fit(model.scaler.transform(features), labels)
+    model.is_trained = True
+    return model
+
+
+class TestCTRModel(unittest.TestCase):
+    """CTR模型批量预测与特征提取测试类"""
+
+    candidates = [
+        ("doc1", 1, 0.8, "机器学习是人工智能的一个分支"),
+        ("doc2", 2, 0.5, "深度学习使用神经网络"),
+        ("doc3", 3, 0.3, ""),
+        ("doc4", 4, 0.1, "机器学习 机器学习 算法"),
+    ]
+
+    def test_batch_matches_single(self):
+        """测试批量预测与逐个预测结果一致，整批只调用一次标准化和模型"""
+        model = trained_model()
+        expected = [model.predict_ctr("机器学习", *candidate) for candidate in self.candidates]
+
+        calls = []
+        predict_proba = model.model.predict_proba
+        model.model.predict_proba = lambda features: calls.append(len(features)) or predict_proba(features)
+        actual = model.predict_ctr_batch("机器学习", self.candidates)
+        self.assertEqual(calls, [len(self.candidates)])
+        np.testing.assert_allclose(actual, expected)
+        self.assertTrue(all(0 <= score <= 1 for score in actual))
+        self.assertEqual(model.predict_ctr_batch("机器学习", []), [])
+
+        # 特征列与训练时一致: 位置、文档长度、查询长度、摘要长度、匹配度、两个历史CTR、位置衰减、词数、时间、分数
+        summary = self.candidates[3][3]
+        query_tokens, summary_tokens = get_tokenizer().cut("机器学习"), get_tokenizer().cut(summary)
+        match = len(set(query_tokens) & set(summary_tokens)) / len(set(query_tokens))
+        np.testing.assert_allclose(model._prediction_features("机器学习", self.candidates)[3],
+                                   [4, len(summary), 4, len(summary), match, 0.1, 0.1, 0.2,
+                                    len(query_tokens), len(summary_tokens), 0, 0.1])
+
+    def test_untrained_and_service(self):
+        """测试未训练时返回原始分数，服务层批量预测与逐个预测一致"""
+        self.assertEqual(CTRModel().predict_ctr_batch("机器学习", self.candidates), [0.8, 0.5, 0.3, 0.1])
+
+        service = ModelService(model_file=os.path.join("nonexistent", "ctr_model.pkl"))
+        features = [{'query': "机器学习", 'doc_id': doc_id, 'position': position, 'score': score, 'summary': summary}
+                    for doc_id, position, score, summary in self.candidates]
+        self.assertEqual(service.predict_ctr_batch("机器学习", features), [0.1] * 4)
+
+        service.ctr_model = trained_model()
+        np.testing.assert_allclose(service.predict_ctr_batch("机器学习", features),
+                                   [service.predict_ctr(feature) for feature in features])
+
+    def test_history_features_without_leakage(self):
+        """测试历史CTR只用时间上更早的样本(同时间戳按输入顺序)，乱序输入按原始行顺序返回，与逐条统计一致"""
+        rng = random.Random(23)
+        samples = [{'query': rng.choice(["机器学习", "深度学习", "算法"]), 'doc_id': f"doc{rng.randint(0, 5)}",
+                    'position': rng.randint(1, 10), 'score': rng.random(), 'summary': rng.choice(self.candidates)[3],
+                    'clicked': rng.randint(0, 1), 'timestamp': f"2024-01-01T00:00:{rng.randint(0, 30):02d}"}
+                   for _ in range(300)]
+        features, labels = CTRModel().extract_features(samples)
+        self.assertEqual(features.shape, (300, 12))
+        self.assertEqual(labels.tolist(), [sample['clicked'] for sample in samples])
+
+        order = sorted(range(len(samples)), key=lambda i: samples[i]['timestamp'])
+        for rank, i in enumerate(order):
+            history = [samples[j] for j in order[:rank]]
+            for column, key in ((5, 'query'), (6, 'doc_id')):
+                clicks = [sample['clicked'] for sample in history if sample[key] == samples[i][key]]
+                expected = sum(clicks) / len(clicks) if clicks else 0.1
+                self.assertAlmostEqual(features[i, column], expected)
+            self.assertEqual(features[i, 10], sum(ord(c) for c in samples[i]['timestamp']) % 1000)
+
+        # 与逐条提取的匹配度、词数一致
+        tokenizer = get_tokenizer()
+        for sample, row in zip(samples[:20], features[:20]):
+            query_tokens, summary_tokens = tokenizer.cut(sample['query']), tokenizer.cut(sample['summary'])
+            match = len(set(query_tokens) & set(summary_tokens)) / len(set(query_tokens))
+            self.assertAlmostEqual(row[4], match)
+            self.assertEqual((row[8], row[9]), (len(query_tokens), len(summary_tokens)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+块压缩文档库测试用例
+"""
+
+import unittest
+import pickle
+import random
+import tempfile
+import json
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.segment import DocumentStore, DocumentTable, _DOCSTORE_HEADERS, atomic_write, _string_table
+from search_engine.index_tab.segmented_index import SegmentedIndex
+from search_engine.index_tab.sharded_index import ShardedIndex
+
+
+class TestDocumentStore(unittest.TestCase):
+    """块压缩文档库测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(18)
+        vocabulary = ["机器学习", "深度学习", "神经网络", "数据挖掘", "搜索引擎", "倒排索引", "python", "算法"]
+        cls.documents = {f"store{i}": " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 80)))
+                         for i in range(400)}
+        cls.documents["store_empty"] = ""
+
+    def test_blocks_and_batch_reads(self):
+        """测试按编号读取、批量读取与原文一致，文件比原文小，批量读取每块只解压一次"""
+        contents = list(self.documents.values())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "docs.docs")
+            DocumentStore.write(path, iter(contents), block_bytes=2048)
+            store = DocumentStore(path, cache_blocks=2)
+            self.assertEqual(len(store), len(contents))
+            self.assertEqual([store[i] for i in range(len(contents))], contents)
+            self.assertEqual(store[-1], "")
+            self.assertGreater(len(store._block_offsets), 10)
+            self.assertEqual(store.raw_bytes, sum(len(text.encode('utf-8')) for text in contents))
+            self.assertLess(store.nbytes, store.raw_bytes / 2)
+            with self.assertRaises(IndexError):
+                store[len(contents)]
+
+            decompressed = []
+            original = store._block
+            store._block = lambda block_no: decompressed.append(block_no) or original(block_no)
+            doc_nums = list(range(0, len(contents), 3))
+            self.assertEqual(store.get_many(doc_nums), {i: contents[i] for i in doc_nums})
+            self.assertEqual(sorted(decompressed), sorted(set(decompressed)))
+
+            empty_path = os.path.join(tmpdir, "empty.docs")
+            DocumentStore.write(empty_path, [])
+            self.assertEqual(len(DocumentStore(empty_path)), 0)
+
+    def test_version1_store(self):
+        """测试仍能读取未压缩的版本1文档库"""
+        contents = ["第一篇", "", "third document"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "v1.docs")
+            offsets, blob = _string_table(contents)
+            atomic_write(path, [_DOCSTORE_HEADERS[1].pack(b"SEDOCSTR", 1, len(contents)), offsets.tobytes(), blob])
+            store = DocumentStore(path)
+            self.assertEqual(store.version, 1)
+            self.assertEqual(list(store.values()), contents)
+            self.assertEqual(store.get_many([2, 0]), {2: contents[2], 0: contents[0]})
+
+    def test_document_table(self):
+        """测试落盘文档与内存文档混合的映射：修改、删除、复制和跨进程序列化"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "table.docs")
+            DocumentStore.write(path, ["a", "b", "c"])
+            table = DocumentTable({"d": "dd"}, store=DocumentStore(path), stored_ids=["x", "y", "z"])
+            self.assertEqual(list(table), ["x", "y", "z", "d"])
+            table["y"] = "new y"
+            del table["z"]
+            clone = table.copy()
+            clone["x"] = "new x"
+            self.assertEqual(dict(table), {"x": "a", "y": "new y", "d": "dd"})
+            self.assertEqual(clone.get_many(["d", "x", "missing", "y"]), {"d": "dd", "x": "new x", "y": "new y"})
+            restored = pickle.loads(pickle.dumps(table))
+            self.assertEqual(dict(restored), dict(table))
+            self.assertEqual(restored.store_bytes, 0)
+
+    def test_index_save_load(self):
+        """测试JSON索引的正文写入独立文档库，加载后正文不进内存，写入、旧格式与索引段都能正常读取"""
+        index = InvertedIndex()
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        index.delete_document("store3")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.json")
+            index.save_to_file(path)
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.assertNotIn('documents', data)
+            self.assertTrue(os.path.exists(path + ".docs"))
+            self.assertEqual(sorted(os.listdir(tmpdir)), ["index.json", "index.json.docs"])  # 没有残留的临时文件
+
+            loaded = InvertedIndex()
+            loaded.load_from_file(path)
+            stats = loaded.get_index_stats()
+            self.assertEqual(stats['document_bytes'], 0)
+            self.assertGreater(stats['document_store_bytes'], 0)
+            self.assertEqual(loaded.get_all_documents(), index.get_all_documents())
+            self.assertEqual(loaded.get_documents(["store5", "store3", "store1"]),
+                             {"store5": self.documents["store5"], "store1": self.documents["store1"]})
+            self.assertEqual(loaded.search("倒排索引 算法", top_k=5), index.search("倒排索引 算法", top_k=5))
+
+            loaded.add_document("store5", "搜索引擎 新内容")
+            loaded.delete_document("store7")
+            self.assertEqual(loaded.get_document("store5"), "搜索引擎 新内容")
+            self.assertEqual(loaded.get_document("store7"), "")
+            self.assertEqual(len(loaded.get_all_documents()), len(self.documents) - 2)
+
+            # 旧格式：正文内嵌在JSON中
+            data['documents'] = index.get_all_documents()
+            del data['doc_ids'], data['document_store']
+            legacy_path = os.path.join(tmpdir, "legacy.json")
+            with open(legacy_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            legacy = InvertedIndex()
+            legacy.load_from_file(legacy_path)
+            self.assertEqual(legacy.get_all_documents(), index.get_all_documents())
+
+            segment_path = os.path.join(tmpdir, "index.seg")
+            index.save_segment(segment_path)
+            segment_index = InvertedIndex()
+            segment_index.load_segment(segment_path)
+            self.assertEqual(segment_index.get_documents(["store9", "nope"]), {"store9": self.documents["store9"]})
+            segment_index.add_document("extra", "新文档")
+            self.assertEqual(segment_index.get_document("store9"), self.documents["store9"])
+            self.assertEqual(segment_index.get_index_stats()['document_store_bytes'],
+                             os.path.getsize(os.path.join(tmpdir, "index.docs")))
+
+    def test_segments_and_shards(self):
+        """测试分段/分片索引的批量读取"""
+        doc_ids = ["store1", "store200", "missing", "store399", "store1"]
+        expected = {doc_id: self.documents[doc_id] for doc_id in doc_ids if doc_id in self.documents}
+        sharded = ShardedIndex(num_shards=3, use_processes=False)
+        sharded.add_documents(self.documents)
+        self.assertEqual(sharded.get_documents(doc_ids), expected)
+        sharded.close()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            segmented = SegmentedIndex(os.path.join(tmpdir, "segments"), flush_threshold=150, background_merge=False)
+            segmented.add_documents(self.documents)
+            segmented.delete_document("store200")
+            del expected["store200"]
+            self.assertEqual(segmented.get_documents(doc_ids), expected)
+            self.assertEqual(segmented.get_all_documents(),
+                             {doc_id: text for doc_id, text in self.documents.items() if doc_id != "store200"})
+            segmented.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
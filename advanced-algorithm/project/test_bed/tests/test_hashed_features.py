@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+哈希稀疏交叉特征测试用例
+"""
+
+import unittest
+import tempfile
+import os
+import sys
+from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from search_engine.training_tab.hashed_features import HashedFeaturizer, HASHED_FIELDS
+from search_engine.training_tab.ctr_model import CTRModel
+from search_engine.training_tab.ctr_lr_model import preprocess_features, train_logistic_regression, \
+    analyze_feature_importance
+from search_engine.tokenizer import get_tokenizer
+
+
+def popular_doc_log(num_samples: int, seed: int = 25):
+    """合成点击日志：各文档的稠密特征分布相同，只有 doc0 几乎总被点击，只能靠文档ID特征区分"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    samples = []
+    for i in range(num_samples):
+        doc_id = f"doc{int(rng.integers(0, 6))}"
+        probability = 0.9 if doc_id == "doc0" else 0.1
+        samples.append({'query': ["机器学习", "深度学习 算法", "推荐系统"][i % 3], 'doc_id': doc_id,
+                        'position': int(rng.integers(1, 6)), 'score': 0.5, 'summary': "机器学习 算法",
+                        'clicked': int(rng.random() < probability), 'doc_length': 7,
+                        'timestamp': (start + timedelta(seconds=i)).isoformat()})
+    return samples
+
+
+class TestHashedFeatures(unittest.TestCase):
+    """哈希稀疏交叉特征测试类"""
+
+    def test_featurizer_columns(self):
+        """测试每个特征域各占一列(查询词×文档每个词一列)，同样的取值得到同样的列，宽度固定"""
+        samples = [{'query': "机器学习 算法", 'doc_id': "doc1", 'position': 1},
+                   {'query': " 机器学习 算法 ", 'doc_id': "doc1", 'position': 1},
+                   {'query': "机器学习", 'doc_id': "doc2", 'position': 3}]
+        featurizer = HashedFeaturizer(n_features=2 ** 20)
+        matrix = featurizer.transform(samples)
+        self.assertIsInstance(matrix, sparse.csr_matrix)
+        self.assertEqual(matrix.shape, (3, 2 ** 20))
+        terms = len(set(get_tokenizer().cut("机器学习 算法")))
+        self.assertEqual(matrix[0].sum(), 4 + terms)
+        self.assertEqual((matrix[0] != matrix[1]).nnz, 0)
+        # 查询、文档都不同的两行没有共享的列
+        self.assertEqual(matrix[0].multiply(matrix[2]).nnz, 0)
+
+        # 无状态：新实例、DataFrame输入结果相同；特征域可以裁剪
+        again = HashedFeaturizer(n_features=2 ** 20).transform(pd.DataFrame(samples))
+        self.assertEqual((matrix != again).nnz, 0)
+        only_docs = HashedFeaturizer(n_features=2 ** 20, fields=['doc']).transform(samples)
+        self.assertEqual(only_docs.nnz, 3)
+        self.assertEqual(set(only_docs.indices) - set(matrix.indices), set())
+        self.assertEqual(featurizer.transform([]).shape, (0, 2 ** 20))
+        with self.assertRaises(ValueError):
+            HashedFeaturizer(fields=['user'])
+
+        # 词表增长时宽度不变
+        many = [{'query': f"查询{i}", 'doc_id': f"doc{i}", 'position': i % 10 + 1} for i in range(5000)]
+        small = HashedFeaturizer(n_features=1024).transform(many)
+        self.assertEqual(small.shape, (5000, 1024))
+        term_counts = [len(set(tokens)) for tokens in get_tokenizer().tokenize_many([s['query'] for s in many], raw=True)]
+        self.assertEqual(small.sum(), 5000 * (len(HASHED_FIELDS) - 1) + sum(term_counts))
+
+    def test_ctr_model_learns_id_features(self):
+        """测试带哈希特征的CTR模型在稀疏矩阵上训练，能学到只靠文档ID区分的点击偏好，保存加载后一致"""
+        samples = popular_doc_log(600)
+        candidates = [("doc0", 2, 0.5, "机器学习 算法"), ("doc3", 2, 0.5, "机器学习 算法")]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dense = CTRModel()
+            dense.save_model = lambda filepath=None: None
+            self.assertTrue(dense.train(samples)['success'])
+            hashed = CTRModel(vectorizer=HashedFeaturizer(n_features=2 ** 16))
+            hashed.save_model = lambda filepath=None: CTRModel.save_model(hashed, os.path.join(temp_dir, "m.pkl"))
+            self.assertTrue(hashed.train(samples)['success'])
+            self.assertEqual(hashed.model.coef_.shape, (1, 12 + 2 ** 16))
+
+            # 比较模型打分(logit)：预测时时间特征固定为0，标准化后偏离训练分布，概率会饱和
+            rows = [{'query': "机器学习", 'doc_id': doc_id, 'position': position} for doc_id, position, _, _ in candidates]
+            features = hashed._prediction_features("机器学习", candidates)
+            popular, other = hashed.model.decision_function(hashed._model_input(features, rows))
+            self.assertGreater(popular - other, 1.0)
+            dense_popular, dense_other = dense.model.decision_function(dense._model_input(features, rows))
+            self.assertAlmostEqual(dense_popular, dense_other)
+
+            loaded = CTRModel()
+            self.assertTrue(loaded.load_model(os.path.join(temp_dir, "m.pkl")))
+            self.assertEqual(loaded.vectorizer.n_features, 2 ** 16)
+            np.testing.assert_allclose(loaded.predict_ctr_batch("机器学习", candidates),
+                                       hashed.predict_ctr_batch("机器学习", candidates))
+            np.testing.assert_allclose(loaded.model.decision_function(loaded._model_input(features, rows)),
+                                       [popular, other])
+
+    def test_lr_preprocess_without_dummies(self):
+        """测试逻辑回归脚本的特征矩阵为稀疏矩阵，宽度与查询数无关"""
+        df = pd.DataFrame(popular_doc_log(300))
+        featurizer = HashedFeaturizer(n_features=4096)
+        matrix, names = preprocess_features(df, featurizer)
+        self.assertTrue(sparse.issparse(matrix))
+        self.assertEqual(matrix.shape, (300, len(names) + 4096))
+        self.assertNotIn("query_机器学习", names)
+
+        more = pd.DataFrame(popular_doc_log(300, seed=1)).assign(query=[f"查询{i}" for i in range(300)])
+        self.assertEqual(preprocess_features(more, featurizer)[0].shape, matrix.shape)
+
+        model, _, _ = train_logistic_regression(matrix, df['clicked'])
+        importance = analyze_feature_importance(model, names)
+        self.assertTrue(importance['feature'].str.startswith("hash_").any())
+        self.assertTrue((importance['abs_coefficient'] > 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
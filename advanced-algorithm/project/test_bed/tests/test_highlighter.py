@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词高亮(Aho-Corasick)测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.highlighter import KeywordAutomaton, highlight_keywords, HIGHLIGHT_TEMPLATE
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+def mark(text: str) -> str:
+    return HIGHLIGHT_TEMPLATE.format(text)
+
+
+class TestHighlighter(unittest.TestCase):
+    """关键词高亮测试类"""
+
+    def test_find_all_matches_brute_force(self):
+        """测试自动机找到的全部出现与逐个位置比较一致，不重叠结果满足长词优先"""
+        rng = random.Random(19)
+        for _ in range(50):
+            keywords = {"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))}
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 60)))
+            automaton = KeywordAutomaton(keywords)
+            expected = sorted((i, i + len(keyword)) for keyword in keywords
+                              for i in range(len(text)) if text.startswith(keyword, i))
+            self.assertEqual(sorted(automaton.find_all(text)), expected)
+
+            selected = automaton.find(text)
+            self.assertTrue(all(a[1] <= b[0] for a, b in zip(selected, selected[1:])))
+            covered = set()
+            for start, end in sorted(expected, key=lambda match: (match[0] - match[1], match[0])):
+                if not covered.intersection(range(start, end)):
+                    covered.update(range(start, end))
+                    self.assertIn((start, end), selected)
+
+    def test_overlapping_keywords(self):
+        """测试重叠/包含的关键词不产生嵌套标签，长词优先"""
+        self.assertEqual(highlight_keywords("机器学习算法", ["机器", "机器学习", "学习算法"]),
+                         mark("机器学习") + "算法")
+        self.assertEqual(highlight_keywords("abcd", ["ab", "bcd", "cd"]), "a" + mark("bcd"))
+        self.assertEqual(highlight_keywords("span style", ["span", "style", "a"]),
+                         mark("span") + " " + mark("style"))
+        self.assertEqual(highlight_keywords("无匹配", ["机器"]), "无匹配")
+        self.assertEqual(highlight_keywords("任意文本", []), "任意文本")
+        self.assertEqual(highlight_keywords("", ["a"]), "")
+
+    def test_case_and_escape(self):
+        """测试忽略大小写但保留原文，escape时正文中的HTML被转义"""
+        self.assertEqual(highlight_keywords("Python and PYTHON", ["python"]),
+                         mark("Python") + " and " + mark("PYTHON"))
+        self.assertEqual(highlight_keywords("İstanbul python", ["python"]), "İstanbul " + mark("python"))
+        self.assertEqual(highlight_keywords("<b>a&b</b>", ["a&b"], escape=True),
+                         "&lt;b&gt;" + mark("a&amp;b") + "&lt;/b&gt;")
+
+    def test_service_highlight(self):
+        """测试服务层按查询解析结果高亮：短语中的词参与，NOT下的词不参与，语法错误时只转义"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            service = InvertedIndexService(os.path.join(tmpdir, "index.json"))
+            service.clear_index()
+            service.add_document("h1", "机器学习 图像识别")
+            text = "机器学习 与 图像识别 <b>"
+            highlighted = service.highlight(text, '"机器学习" AND NOT 图像识别')
+            self.assertTrue(highlighted.startswith(mark("机器")))
+            self.assertEqual(highlighted.split(" 与 ")[1], "图像识别 &lt;b&gt;")
+            self.assertTrue(highlighted.endswith("&lt;b&gt;"))
+            self.assertEqual(service.highlight("a<b", "(机器"), "a&lt;b")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引快照(写时复制、按代原子替换)测试用例
+"""
+
+import unittest
+import gc
+import pickle
+import tempfile
+import threading
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab import offline_index
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.index_service import InvertedIndexService
+from search_engine.index_service import IndexService
+from search_engine.model_service import ModelService
+
+
+class TestIndexSnapshot(unittest.TestCase):
+    """索引快照测试类"""
+
+    documents = {
+        "doc1": "机器学习是人工智能的一个分支",
+        "doc2": "深度学习使用神经网络进行学习",
+        "doc3": "推荐系统根据用户行为推荐内容",
+        "doc4": "搜索引擎使用倒排索引检索文档",
+    }
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_file = os.path.join(self.tmpdir.name, "index.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_service(self, **kwargs) -> InvertedIndexService:
+        service = InvertedIndexService(self.index_file, **kwargs)
+        service.clear_index()
+        service.batch_add_documents(self.documents)
+        return service
+
+    def test_copy_is_isolated(self):
+        """测试写时复制副本的增删不影响原索引，倒排链只在修改时复制"""
+        index = InvertedIndex()
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        before = {word: index.get_term_postings(word) for word in index.get_terms()}
+        results = index.retrieve("学习", top_k=10)
+
+        clone = index.copy()
+        self.assertIs(clone.postings["推荐"], index.postings["推荐"])
+        clone.add_document("doc5", "强化学习和深度学习")
+        clone.delete_document("doc1")
+        clone.update_document("doc3", "推荐算法")
+        self.assertIsNot(clone.postings["学习"], index.postings["学习"])
+
+        self.assertEqual({word: index.get_term_postings(word) for word in index.get_terms()}, before)
+        self.assertEqual(index.retrieve("学习", top_k=10), results)
+        self.assertEqual(index.get_all_documents(), self.documents)
+        self.assertEqual({doc_id for doc_id, _ in clone.retrieve("学习", top_k=10)}, {"doc2", "doc5"})
+
+        # 原索引后续写入同样不影响副本
+        index.add_document("doc6", "学习")
+        self.assertNotIn("doc6", clone.doc_nums)
+
+    def test_snapshot_generations(self):
+        """测试写入发布新的一代，旧快照保持不变，写入失败时当前代不变"""
+        service = self.make_service()
+        old = service.snapshot()
+        service.add_document("doc5", "强化学习")
+        self.assertEqual(service.generation, old.generation + 1)
+        self.assertEqual(service.get_stats()['generation'], service.generation)
+        self.assertNotIn("doc5", old.index.get_all_documents())
+        self.assertIn("doc5", service.search_doc_ids("强化学习"))
+
+        current = service.snapshot()
+
+        def fail(text):
+            raise RuntimeError("分词失败")
+
+        tokenizer = current.index.tokenizer
+        original = tokenizer.tokenize_with_offsets
+        tokenizer.tokenize_with_offsets = fail
+        try:
+            self.assertFalse(service.add_document("doc6", "失败"))
+        finally:
+            tokenizer.tokenize_with_offsets = original
+        self.assertIs(service.snapshot(), current)
+
+        self.assertTrue(service.clear_index())
+        self.assertEqual(service.get_document_count(), 0)
+        self.assertEqual(len(current.index.get_all_documents()), len(self.documents) + 1)
+
+    def test_write_batch(self):
+        """测试批量写入只复制一次、发布一代，块内查询看到上一代，异常时整批不发布"""
+        service = self.make_service()
+        old = service.snapshot()
+        copies = []
+        original_copy = InvertedIndex.copy
+
+        def counting_copy(index):
+            copies.append(index)
+            return original_copy(index)
+
+        InvertedIndex.copy = counting_copy
+        try:
+            with service.write_batch():
+                for i in range(20):
+                    service.add_document(f"new{i}", f"强化学习{i}")
+                with service.write_batch():
+                    service.delete_document("doc1")
+                self.assertIs(service.snapshot(), old)
+                self.assertNotIn("new7", service.search_doc_ids("强化学习", top_k=30))
+        finally:
+            InvertedIndex.copy = original_copy
+        self.assertEqual(len(copies), 1)
+        self.assertEqual(service.generation, old.generation + 1)
+        self.assertEqual(service.get_document_count(), len(self.documents) + 19)
+        self.assertIn("new7", service.search_doc_ids("强化学习", top_k=30))
+
+        current = service.snapshot()
+        with self.assertRaises(RuntimeError):
+            with service.write_batch():
+                service.add_document("doc9", "推荐")
+                raise RuntimeError("中途失败")
+        self.assertIs(service.snapshot(), current)
+        self.assertNotIn("doc9", service.get_all_documents())
+
+        # 块内清空只作用于这一批
+        with service.write_batch():
+            service.clear_index()
+            service.add_document("doc9", "推荐")
+        self.assertEqual(service.get_document_count(), 1)
+        self.assertEqual(service.generation, current.generation + 1)
+
+    def test_import_publishes_one_generation(self):
+        """测试重新导入文档只发布一代，查询看不到清空后的空索引"""
+        InvertedIndex().save_to_file(self.index_file)
+        service = IndexService(self.index_file)
+        service.import_document_dict(self.documents)
+        generation = service.index_service.generation
+        self.assertIn("✅", service.import_document_dict({"doc9": "推荐系统", **self.documents}))
+        self.assertEqual(service.index_service.generation, generation + 1)
+        self.assertEqual(len(service.get_all_documents()), len(self.documents) + 1)
+
+    def test_concurrent_reads_during_writes(self):
+        """测试批量写入期间的查询不报错，每次看到的都是完整的某一代"""
+        service = self.make_service()
+        batch = {f"new{i}": f"学习文档{i}" for i in range(200)}
+        base = len(service.search_doc_ids("学习 文档", top_k=1000))
+        errors = []
+        done = threading.Event()
+
+        def reader():
+            while not done.is_set():
+                try:
+                    snapshot = service.snapshot()
+                    count = len(snapshot.index.retrieve("学习 文档", top_k=1000))
+                    if count != base + sum(doc_id.startswith("new") for doc_id in snapshot.index.doc_nums):
+                        errors.append(count)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        service.batch_add_documents(batch)
+        for doc_id in list(batch)[:20]:
+            service.delete_document(doc_id)
+        done.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(service.search_doc_ids("学习 文档", top_k=1000)), base + len(batch) - 20)
+
+    def test_concurrent_reads_share_caches(self):
+        """测试多个线程无锁读同一快照时，LRU缓存并发淘汰和正排索引按需重建不会让查询出错"""
+        index = InvertedIndex()
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        index.save_to_file(self.index_file)
+        index = InvertedIndex()
+        index.load_from_file(self.index_file)
+        self.assertIsNone(index.forward_index)
+        words = ["学习", "机器", "推荐", "索引", "搜索引擎", "神经网络"]
+        expected = {word: index.retrieve(word, top_k=10) for word in words}
+        terms = {doc_id: index.copy().get_document_terms(doc_id) for doc_id in self.documents}
+        errors = []
+
+        def reader(seed):
+            try:
+                for i in range(300):
+                    word = words[(seed + i) % len(words)]
+                    if index.retrieve(word, top_k=10) != expected[word]:
+                        errors.append(word)
+                    doc_id = f"doc{(seed + i) % len(self.documents) + 1}"
+                    if index.get_document_terms(doc_id) != terms[doc_id]:
+                        errors.append(doc_id)
+                    index.get_term_positions(doc_id, words)
+            except Exception as e:
+                errors.append(e)
+
+        sizes = (offline_index.POSTING_CACHE_SIZE, offline_index.POSITION_CACHE_SIZE)
+        offline_index.POSTING_CACHE_SIZE = offline_index.POSITION_CACHE_SIZE = 1
+        try:
+            threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            offline_index.POSTING_CACHE_SIZE, offline_index.POSITION_CACHE_SIZE = sizes
+        self.assertEqual(errors, [])
+
+        # 取到缓存项后被其他线程淘汰，仍返回取到的值
+        class EvictedCache(offline_index.OrderedDict):
+            def move_to_end(self, key, last=True):
+                raise KeyError(key)
+
+        cache = EvictedCache(a=1)
+        self.assertEqual(offline_index._lru_get(cache, "a"), 1)
+        offline_index._lru_put(cache, "b", 2, 1)
+        self.assertEqual(list(cache), ["b"])
+
+    def test_hot_swap_load(self):
+        """测试加载索引时原子替换，持有旧快照的查询继续可用，分片进程在旧快照释放后关闭"""
+        service = self.make_service(num_shards=2)
+        service.save_index()
+        service.add_document("doc5", "强化学习")
+        old = service.snapshot()
+        process = old.index.shards[0].process
+
+        self.assertTrue(service.load_index(self.index_file))
+        self.assertNotIn("doc5", service.get_all_documents())
+        self.assertIn("doc5", [doc_id for doc_id, _ in old.index.retrieve("强化学习", top_k=5)])
+        self.assertTrue(process.is_alive())
+
+        del old
+        gc.collect()
+        process.join(timeout=5)
+        self.assertFalse(process.is_alive())
+        self.assertEqual(service.get_document_count(), len(self.documents))
+        service.index.close()
+
+    def test_model_hot_swap(self):
+        """测试模型加载在新对象上完成后替换，加载失败时保留旧模型"""
+        model_file = os.path.join(self.tmpdir.name, "ctr_model.pkl")
+        service = ModelService(model_file)
+        version = service.model_version
+        with open(model_file, 'wb') as f:
+            pickle.dump({'model': None, 'vectorizer': None, 'scaler': None, 'is_trained': True}, f)
+
+        old_model = service.ctr_model
+        self.assertTrue(service.load_model())
+        self.assertIsNot(service.ctr_model, old_model)
+        self.assertFalse(old_model.is_trained)
+        self.assertTrue(service.ctr_model.is_trained)
+        self.assertEqual(service.model_version, version + 1)
+        self.assertEqual(service.get_model_info()['model_version'], version + 1)
+
+        loaded = service.ctr_model
+        self.assertFalse(service.load_model(os.path.join(self.tmpdir.name, "missing.pkl")))
+        self.assertIs(service.ctr_model, loaded)
+        self.assertEqual(service.model_version, version + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
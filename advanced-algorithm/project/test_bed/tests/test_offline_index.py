@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+倒排索引测试用例
+"""
+
+import unittest
+import math
+import random
+import tempfile
+from collections import Counter
+import os
+import re
+import json
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import (
+    InvertedIndex, create_sample_documents, select_snippet_window, SUPPORTED_STRATEGIES
+)
+
+
+def tokenized_documents(index):
+    """直接对原始文档分词统计词频，不依赖索引内部结构"""
+    return {doc_id: Counter(index.preprocess_text(content)) for doc_id, content in index.documents.items()}
+
+
+def reference_search(index, query, top_k):
+    """原始全量扫描打分实现，作为倒排链打分的对照"""
+    query_words = index.preprocess_text(query)
+    docs = tokenized_documents(index)
+    total_docs = len(docs)
+    doc_freq = Counter(word for freqs in docs.values() for word in freqs)
+    scores = {}
+    for doc_id, freqs in docs.items():
+        score = 0
+        for word in query_words:
+            if word in freqs:
+                tf = freqs[word] / sum(freqs.values())
+                idf = math.log(total_docs / doc_freq[word])
+                score += tf * idf
+        if score > 0:
+            scores[doc_id] = score
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+
+
+def reference_bm25(index, query, k1=1.2, b=0.75, delta=0.0):
+    """直接按公式计算的BM25/BM25+分数"""
+    query_words = index.preprocess_text(query)
+    docs = tokenized_documents(index)
+    total_docs = len(docs)
+    doc_freq = Counter(word for freqs in docs.values() for word in freqs)
+    avgdl = sum(sum(freqs.values()) for freqs in docs.values()) / total_docs
+    scores = {}
+    for doc_id, freqs in docs.items():
+        score = 0
+        for word in query_words:
+            if word in freqs:
+                df = doc_freq[word]
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                tf = freqs[word]
+                norm = k1 * (1 - b + b * sum(freqs.values()) / avgdl)
+                score += idf * (tf * (k1 + 1) / (tf + norm) + delta)
+        if score > 0:
+            scores[doc_id] = score
+    return scores
+
+
+class TestInvertedIndex(unittest.TestCase):
+    """倒排索引测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        """构建示例索引和随机语料索引"""
+        cls.sample_index = InvertedIndex()
+        for doc_id, content in create_sample_documents().items():
+            cls.sample_index.add_document(doc_id, content)
+
+        rng = random.Random(42)
+        vocabulary = ["人工智能", "机器学习", "深度学习", "神经网络", "自然语言",
+                      "计算机", "视觉", "数据", "算法", "模型", "推荐系统", "搜索引擎"]
+        cls.random_index = InvertedIndex()
+        for i in range(300):
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(3, 30))]
+            cls.random_index.add_document(f"rdoc{i}", "，".join(words))
+        cls.vocabulary = vocabulary
+
+    def assert_same_ranking(self, index, query, top_k):
+        expected = reference_search(index, query, top_k)
+        for strategy in SUPPORTED_STRATEGIES:
+            actual = [(doc_id, score) for doc_id, score, _ in index.search(query, top_k=top_k, strategy=strategy)]
+            self.assertEqual(len(actual), len(expected), f"{strategy}: {query}")
+            for (_, actual_score), (_, expected_score) in zip(actual, expected):
+                self.assertAlmostEqual(actual_score, expected_score, places=9)
+            # 分数相同的文档顺序可以不同，但每篇文档的分数必须一致
+            expected_scores = dict(reference_search(index, query, len(index.documents)))
+            for doc_id, score in actual:
+                self.assertAlmostEqual(score, expected_scores[doc_id], places=9)
+
+    def test_search_matches_reference_on_samples(self):
+        """测试示例文档上与全量扫描结果一致"""
+        for query in ["人工智能", "机器学习", "深度学习 神经网络", "自然语言处理 机器翻译", "云计算 大数据"]:
+            for top_k in (1, 3, 10):
+                self.assert_same_ranking(self.sample_index, query, top_k)
+
+    def test_search_matches_reference_on_random_corpus(self):
+        """测试随机语料上与全量扫描结果一致"""
+        rng = random.Random(7)
+        for _ in range(30):
+            query = " ".join(rng.sample(self.vocabulary, rng.randint(1, 4)))
+            self.assert_same_ranking(self.random_index, query, rng.choice([1, 5, 20, 500]))
+
+    def test_repeated_query_terms(self):
+        """测试重复查询词按查询词频累加"""
+        self.assert_same_ranking(self.sample_index, "机器学习 机器学习 深度学习", 5)
+
+    def test_unknown_and_empty_query(self):
+        """测试未登录词和空查询"""
+        self.assertEqual(self.sample_index.search("不存在的词语组合xyz"), [])
+        self.assertEqual(self.sample_index.search(""), [])
+        self.assertEqual(self.sample_index.search("人工智能", top_k=0), [])
+
+    def test_invalid_strategy(self):
+        """测试非法检索策略"""
+        with self.assertRaises(ValueError):
+            self.sample_index.search("人工智能", strategy="unknown")
+
+    def test_bm25_matches_formula(self):
+        """测试BM25/BM25+与公式直接计算一致"""
+        for scorer, delta in (("bm25", 0.0), ("bm25+", 1.0)):
+            for query in ["机器学习", "深度学习 神经网络 算法", "推荐系统 搜索引擎"]:
+                expected = reference_bm25(self.random_index, query, delta=delta)
+                for strategy in SUPPORTED_STRATEGIES:
+                    results = self.random_index.search(query, top_k=20, strategy=strategy, scorer=scorer)
+                    self.assertEqual(len(results), min(20, len(expected)))
+                    for doc_id, score, _ in results:
+                        self.assertAlmostEqual(score, expected[doc_id], places=9)
+                    top_scores = sorted(expected.values(), reverse=True)[:20]
+                    for (_, score, _), expected_score in zip(results, top_scores):
+                        self.assertAlmostEqual(score, expected_score, places=9)
+
+    def test_pruned_strategies_match_exhaustive(self):
+        """测试WAND/BMW剪枝结果与穷举打分的top_k分数一致"""
+        rng = random.Random(11)
+        for _ in range(40):
+            query = " ".join(rng.sample(self.vocabulary, rng.randint(2, 6)))
+            top_k = rng.choice([1, 3, 10, 50])
+            scorer = rng.choice(["tfidf", "bm25", "bm25+"])
+            expected = self.random_index.retrieve(query, top_k=top_k, strategy="taat", scorer=scorer)
+            for strategy in ("wand", "bmw"):
+                actual = self.random_index.retrieve(query, top_k=top_k, strategy=strategy, scorer=scorer)
+                self.assertEqual(len(actual), len(expected))
+                for (_, actual_score), (_, expected_score) in zip(actual, expected):
+                    self.assertAlmostEqual(actual_score, expected_score, places=9)
+
+    def test_pruned_strategies_after_updates(self):
+        """测试增删文档后得分上界缓存随之失效"""
+        index = InvertedIndex()
+        for i in range(200):
+            index.add_document(f"d{i:03d}", "机器学习，" * (i % 7 + 1) + "深度学习，" * (i % 3 + 1) + "数据")
+        index.retrieve("机器学习 深度学习", top_k=5, strategy="bmw", scorer="bm25")
+        index.add_document("d999", "机器学习，" * 30 + "深度学习")
+        index.delete_document("d006")
+        for scorer in ("tfidf", "bm25"):
+            expected = index.retrieve("机器学习 深度学习", top_k=5, strategy="taat", scorer=scorer)
+            actual = index.retrieve("机器学习 深度学习", top_k=5, strategy="bmw", scorer=scorer)
+            self.assertEqual([round(s, 9) for _, s in actual], [round(s, 9) for _, s in expected])
+            self.assertNotIn("d006", [doc_id for doc_id, _ in actual])
+
+    def test_scoring_tables_follow_updates(self):
+        """测试增删文档后打分表与重新构建的索引一致"""
+        documents = create_sample_documents()
+        index = InvertedIndex()
+        for doc_id, content in documents.items():
+            index.add_document(doc_id, content)
+        index.search("人工智能", scorer="bm25")
+        index.delete_document("doc1")
+        index.add_document("doc11", "机器学习和深度学习推动了人工智能的发展")
+
+        rebuilt = InvertedIndex()
+        for doc_id, content in documents.items():
+            if doc_id != "doc1":
+                rebuilt.add_document(doc_id, content)
+        rebuilt.add_document("doc11", "机器学习和深度学习推动了人工智能的发展")
+
+        for scorer in ("tfidf", "bm25", "bm25+"):
+            actual = {d: s for d, s, _ in index.search("人工智能 机器学习", top_k=20, scorer=scorer)}
+            expected = {d: s for d, s, _ in rebuilt.search("人工智能 机器学习", top_k=20, scorer=scorer)}
+            self.assertEqual(set(actual), set(expected))
+            for doc_id in expected:
+                self.assertAlmostEqual(actual[doc_id], expected[doc_id], places=9)
+
+    def test_incremental_scoring_tables(self):
+        """测试刷新打分表只追加新文档的长度条目，写时复制的副本刷新后不影响原索引的打分"""
+        index = InvertedIndex()
+        for doc_id, content in create_sample_documents().items():
+            index.add_document(doc_id, content)
+        index.refresh_scoring_tables()
+        index.add_document("doc11", "机器学习和深度学习推动了人工智能的发展")
+        expected = {scorer: index.search("人工智能 机器学习", top_k=20, scorer=scorer)
+                    for scorer in ("tfidf", "bm25")}
+        buffer = index._length_buffer
+        self.assertGreater(buffer.data.shape[1], len(index.doc_lengths))  # 容量按倍数增长
+
+        clone = index.copy()
+        clone.add_document("doc12", "深度学习")
+        clone.refresh_scoring_tables()
+        self.assertIs(clone._length_buffer, buffer)  # 只在缓冲区尾部追加
+        clone.delete_document("doc2")
+        clone.add_document("doc13", "人工智能")
+        clone.refresh_scoring_tables()
+        self.assertEqual(len(clone._lengths), len(clone.doc_lengths))
+        self.assertEqual(set(clone.idf_tables['bm25']), set(clone.postings))
+
+        # 另一个副本从原索引继续写入，缓冲区尾部已被占用时复制一份
+        sibling = index.copy()
+        sibling.add_document("doc14", "深度学习")
+        sibling.refresh_scoring_tables()
+        self.assertIsNot(sibling._length_buffer, buffer)
+        self.assertEqual(clone._lengths[-1], clone.doc_lengths[-1])
+
+        for scorer, results in expected.items():
+            self.assertEqual(index.search("人工智能 机器学习", top_k=20, scorer=scorer), results)
+            rebuilt = InvertedIndex()
+            for doc_id, content in clone.get_all_documents().items():
+                rebuilt.add_document(doc_id, content)
+            actual = {d: s for d, s, _ in clone.search("人工智能 机器学习", top_k=20, scorer=scorer)}
+            for doc_id, score, _ in rebuilt.search("人工智能 机器学习", top_k=20, scorer=scorer):
+                self.assertAlmostEqual(actual[doc_id], score, places=9)
+
+    def test_invalid_scorer(self):
+        """测试非法打分器"""
+        with self.assertRaises(ValueError):
+            self.sample_index.search("人工智能", scorer="unknown")
+
+    def test_search_after_delete(self):
+        """测试删除文档后检索结果同步更新"""
+        index = InvertedIndex()
+        for doc_id, content in create_sample_documents().items():
+            index.add_document(doc_id, content)
+        self.assertTrue(index.delete_document("doc2"))
+        results = index.search("机器学习", top_k=10)
+        self.assertNotIn("doc2", [doc_id for doc_id, _, _ in results])
+        self.assert_same_ranking(index, "机器学习", 10)
+
+    
+    def test_readd_document_overwrites(self):
+        """测试重复添加同一文档ID时覆盖旧内容"""
+        index = InvertedIndex()
+        for doc_id, content in create_sample_documents().items():
+            index.add_document(doc_id, content)
+        index.add_document("doc2", "云计算提供弹性的计算资源")
+        self.assertEqual(len(index.documents), 10)
+        self.assertNotIn("doc2", [doc_id for doc_id, _ in index.retrieve("机器学习", top_k=10)])
+        self.assertIn("doc2", [doc_id for doc_id, _ in index.retrieve("云计算", top_k=10)])
+        self.assert_same_ranking(index, "云计算 机器学习", 10)
+    
+    def test_delete_uses_forward_index(self):
+        """测试删除和批量删除走正排索引，不重新分词"""
+        index = InvertedIndex()
+        for doc_id, content in create_sample_documents().items():
+            index.add_document(doc_id, content)
+        self.assertEqual(index.get_document_terms("doc1"), dict(Counter(index.preprocess_text(index.documents["doc1"]))))
+        
+        def fail(text):
+            raise AssertionError("删除时不应重新分词")
+        index.tokenize_with_offsets = fail
+        self.assertTrue(index.delete_document("doc1"))
+        self.assertEqual(index.batch_delete_documents(["doc2", "doc3", "doc3", "missing"]), 2)
+        self.assertFalse(index.delete_document("doc1"))
+        del index.tokenize_with_offsets
+        
+        self.assertEqual(index.get_document_terms("doc2"), {})
+        self.assertEqual(len(index.documents), 7)
+        for doc_id in ("doc1", "doc2", "doc3"):
+            self.assertNotIn(doc_id, [d for word in index.postings for d, _ in index.get_term_postings(word)])
+        self.assert_same_ranking(index, "人工智能 机器学习 深度学习", 10)
+    
+    def test_update_document(self):
+        """测试update_document原子替换，分词失败时旧版本保持不变"""
+        index = InvertedIndex()
+        for doc_id, content in create_sample_documents().items():
+            index.add_document(doc_id, content)
+        self.assertFalse(index.update_document("missing", "云计算"))
+        self.assertTrue(index.update_document("doc2", "云计算提供弹性的计算资源"))
+        self.assertEqual(index.get_document("doc2"), "云计算提供弹性的计算资源")
+        self.assertIn("doc2", [doc_id for doc_id, _ in index.retrieve("云计算", top_k=10)])
+        self.assert_same_ranking(index, "云计算 机器学习", 10)
+        
+        def fail(text):
+            raise RuntimeError("分词失败")
+        index.tokenize_with_offsets = fail
+        with self.assertRaises(RuntimeError):
+            index.update_document("doc2", "新的内容")
+        del index.tokenize_with_offsets
+        self.assertEqual(index.get_document("doc2"), "云计算提供弹性的计算资源")
+        self.assert_same_ranking(index, "云计算 机器学习", 10)
+    
+    def test_forward_index_rebuilt_after_load(self):
+        """测试从JSON加载后按倒排链重建正排索引"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.json")
+            self.sample_index.save_to_file(path)
+            loaded = InvertedIndex()
+            loaded.load_from_file(path)
+        self.assertEqual(loaded.get_document_terms("doc4"), self.sample_index.get_document_terms("doc4"))
+        self.assertEqual(loaded.batch_delete_documents(["doc4", "doc5"]), 2)
+        self.assert_same_ranking(loaded, "自然语言处理 计算机视觉", 10)
+    
+    def test_token_offsets_and_positions(self):
+        """测试词元字符区间和位置与分词结果一致"""
+        index = InvertedIndex()
+        content = "Python机器学习入门：机器学习是人工智能的核心，深度学习是机器学习的分支"
+        index.add_document("d1", content)
+        tokens = index.tokenize_with_offsets(content)
+        self.assertEqual([word for word, _, _ in tokens], index.preprocess_text(content))
+        for word, start, end in tokens:
+            self.assertEqual(content[start:end].lower(), word)
+        positions = index.get_term_positions("d1", ["学习", "python", "不存在"])
+        self.assertEqual(positions["学习"], [i for i, (w, _, _) in enumerate(tokens) if w == "学习"])
+        self.assertEqual(positions["python"], [0])
+        self.assertNotIn("不存在", positions)
+    
+    def test_select_snippet_window(self):
+        """测试线性扫描选出覆盖查询词最多的窗口"""
+        occurrences = [(0, 2, "a"), (50, 52, "a"), (300, 302, "a"), (310, 312, "b"), (320, 322, "c"), (900, 902, "b")]
+        self.assertEqual(select_snippet_window(occurrences, 100), (2, 4))
+        self.assertEqual(select_snippet_window(occurrences[:2], 100), (0, 1))
+        self.assertEqual(select_snippet_window(occurrences[:1], 100), (0, 0))
+    
+    def test_summary_uses_stored_offsets(self):
+        """测试摘要选取查询词最密集的窗口，按字符区间高亮，且不重新分词"""
+        index = InvertedIndex()
+        filler = "天气晴朗适合出门散步。" * 30
+        content = filler + "机器学习和深度学习是人工智能的重要方向。" + filler + "深度学习"
+        index.add_document("d1", content)
+        
+        def fail(text):
+            raise AssertionError("生成摘要时不应重新分词")
+        index.tokenize_with_offsets = fail
+        summary = index.generate_summary("d1", ["机器", "深度", "人工智能"], max_length=60)
+        del index.tokenize_with_offsets
+        
+        plain = re.sub(r"<[^>]+>", "", summary)
+        self.assertLessEqual(len(plain), 60)
+        self.assertIn(plain, content)
+        for word in ("机器", "深度", "人工智能"):
+            self.assertIn(f">{word}</span>", summary)
+        self.assertEqual(index.generate_summary("d1", ["不存在的词"], max_length=20), content[:20])
+    
+    def test_summary_after_load(self):
+        """测试从JSON加载(含旧格式无字符区间)后摘要不变"""
+        query_words = self.sample_index.preprocess_text("机器学习 深度学习")
+        expected = {doc_id: self.sample_index.generate_summary(doc_id, query_words, max_length=40)
+                    for doc_id in self.sample_index.documents}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.json")
+            self.sample_index.save_to_file(path)
+            loaded = InvertedIndex()
+            loaded.load_from_file(path)
+            
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            del data['token_spans']
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            legacy = InvertedIndex()
+            legacy.load_from_file(path)
+        for doc_id, summary in expected.items():
+            self.assertEqual(loaded.generate_summary(doc_id, query_words, max_length=40), summary)
+            self.assertEqual(legacy.generate_summary(doc_id, query_words, max_length=40), summary)
+    
+    def test_memory_stats(self):
+        """测试索引统计中的倒排链内存占用"""
+        stats = self.random_index.get_index_stats()
+        expected_postings = sum(len(freqs) for freqs in tokenized_documents(self.random_index).values())
+        self.assertEqual(stats['total_postings'], expected_postings)
+        self.assertGreater(stats['posting_bytes'], 0)
+        # 差分后的文档编号间隔很小，varint + 1字节词频每个posting约2字节
+        self.assertLess(stats['bytes_per_posting'], 3)
+    
+    def test_save_and_load_round_trip(self):
+        """测试保存后重新加载，检索结果一致"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index.json")
+            self.random_index.save_to_file(path)
+            loaded = InvertedIndex()
+            loaded.load_from_file(path)
+        self.assertEqual(loaded.get_index_stats()['total_postings'],
+                         self.random_index.get_index_stats()['total_postings'])
+        for query in ["机器学习", "深度学习 神经网络 算法"]:
+            for scorer in ("tfidf", "bm25"):
+                self.assertEqual(loaded.retrieve(query, top_k=20, scorer=scorer),
+                                 self.random_index.retrieve(query, top_k=20, scorer=scorer))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在线增量CTR学习测试用例
+"""
+
+import unittest
+import tempfile
+import os
+import sys
+from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+from search_engine.training_tab.online_ctr_model import OnlineCTRModel, FTRLProximal, QUERY_CTR_COLUMN, DOC_CTR_COLUMN
+from search_engine.model_service import ModelService
+from search_engine.data_service import DataService
+
+
+def click_stream(num_samples: int, start: datetime, seed: int = 24):
+    """合成点击流：点击概率随位置衰减，doc0 格外受欢迎，时间戳按秒递增"""
+    rng = np.random.default_rng(seed)
+    samples = []
+    for i in range(num_samples):
+        position = int(rng.integers(1, 11))
+        doc_id = f"doc{int(rng.integers(0, 8))}"
+        probability = 0.6 / position + (0.3 if doc_id == "doc0" else 0.0)
+        samples.append({'query': ["机器学习", "深度学习", "算法"][i % 3], 'doc_id': doc_id, 'position': position,
+                        'score': float(rng.random()), 'summary': "机器学习 算法 神经网络",
+                        'clicked': int(rng.random() < probability),
+                        'timestamp': (start + timedelta(seconds=i)).isoformat()})
+    return samples
+
+
+class TestOnlineCTR(unittest.TestCase):
+    """在线增量CTR学习测试类"""
+
+    def test_ftrl_learns_with_sparse_weights(self):
+        """测试FTRL小批次学习到有效权重，无关特征在L1下权重为0"""
+        rng = np.random.default_rng(24)
+        features = rng.normal(size=(4000, 3))
+        labels = (rng.random(4000) < 1 / (1 + np.exp(-(2 * features[:, 0] - features[:, 1])))).astype(int)
+        model = FTRLProximal(alpha=0.5, l1=5.0)
+        np.testing.assert_allclose(model.predict_proba(features[:2]), 0.5)
+        for start in range(0, 4000, 200):
+            model.partial_fit(features[start:start + 200], labels[start:start + 200])
+        self.assertGreater(model.coef_[0, 0], 1.0)
+        self.assertLess(model.coef_[0, 1], -0.3)
+        self.assertEqual(model.coef_[0, 2], 0.0)
+        self.assertGreater(roc_auc_score(labels, model.predict_proba(features)[:, 1]), 0.8)
+
+    def test_history_counts_across_batches(self):
+        """测试跨批次累计历史CTR：分批学习与整批学习的计数一致，训练特征只用更早的样本，预测使用累计值"""
+        samples = click_stream(300, datetime(2024, 1, 1))
+        whole, batched = OnlineCTRModel(), OnlineCTRModel()
+        whole.partial_fit(samples)
+        for start in range(0, 300, 64):
+            batched.partial_fit(samples[start:start + 64])
+        self.assertEqual(batched.query_history, whole.query_history)
+        self.assertEqual(batched.doc_history, whole.doc_history)
+        self.assertEqual(batched.samples_seen, 300)
+        self.assertTrue(batched.is_trained)
+
+        clicks = sum(sample['clicked'] for sample in samples if sample['doc_id'] == "doc0")
+        shown = sum(1 for sample in samples if sample['doc_id'] == "doc0")
+        self.assertEqual(batched.doc_history["doc0"], (clicks, shown))
+
+        features = batched._prediction_features("机器学习", [("doc0", 1, 0.5, "机器学习"), ("new", 2, 0.5, "")])
+        self.assertAlmostEqual(features[0, DOC_CTR_COLUMN], clicks / shown)
+        self.assertAlmostEqual(features[1, DOC_CTR_COLUMN], 0.1)
+        self.assertAlmostEqual(features[0, QUERY_CTR_COLUMN], features[1, QUERY_CTR_COLUMN])
+
+        # 快照不受之后更新影响
+        snapshot = batched.snapshot()
+        batched.partial_fit(click_stream(50, datetime(2024, 1, 2), seed=1))
+        self.assertEqual(snapshot.samples_seen, 300)
+        self.assertEqual(snapshot.doc_history, whole.doc_history)
+
+    def test_model_service_online_update(self):
+        """测试服务层只学习新回流的样本、发布模型、定期保存检查点并能从检查点续学"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_service = DataService(auto_save_interval=60, batch_size=100000)
+            data_service.data_file = os.path.join(temp_dir, "ctr_data.json")
+            past = datetime.now() - timedelta(hours=2)
+            data_service.ctr_data = click_stream(600, past)
+            model_file = os.path.join(temp_dir, "ctr_model.pkl")
+            service = ModelService(model_file=model_file)
+            self.assertFalse(service.ctr_model.is_trained)
+
+            result = service.online_update(data_service, batch_size=25)
+            self.assertEqual((result['new_samples'], result['batches']), (600, 24))
+            self.assertTrue(result['published'])
+            self.assertTrue(os.path.exists(service.online_checkpoint_file))  # 超过 CHECKPOINT_EVERY 个小批次
+            self.assertIsInstance(service.ctr_model, OnlineCTRModel)
+            self.assertIsNot(service.ctr_model, service.online_model)
+            features = [{'query': "算法", 'doc_id': "doc3", 'position': position, 'score': 0.5,
+                         'summary': "机器学习 算法"} for position in (1, 9)]
+            top, bottom = service.predict_ctr_batch("算法", features)
+            self.assertGreater(top, bottom)
+
+            # 没有新样本时不重复学习；点击窗口内的新展示留到下次
+            self.assertEqual(service.online_update(data_service)['new_samples'], 0)
+            data_service.ctr_data.extend(click_stream(50, past + timedelta(hours=1), seed=2))
+            data_service.ctr_data.extend(click_stream(10, datetime.now() - timedelta(seconds=30), seed=3))
+            self.assertEqual(service.online_update(data_service, label_delay=600)['new_samples'], 50)
+            self.assertEqual(service.stream_offset, 650)
+
+            # 新的服务从检查点续学，不重新学习已学过的样本
+            service.start_online_learning(data_service, interval=3600)
+            self.assertTrue(service.get_model_info()['online_learning'])
+            self.assertTrue(service.stop_online_learning())  # 停止时保存检查点
+            resumed = ModelService(model_file=model_file)
+            result = resumed.online_update(data_service, label_delay=0)
+            self.assertEqual(result['new_samples'], 10)
+            self.assertEqual(result['samples_seen'], 660)
+            self.assertIn('online_samples', resumed.get_model_info())
+
+            # 数据清空后从头读取，即使新数据已超过旧的读取位置
+            data_service.clear_data()
+            data_service.ctr_data.extend(click_stream(700, past, seed=4))
+            result = resumed.online_update(data_service, label_delay=0)
+            self.assertEqual(result['new_samples'], 700)
+            self.assertEqual(resumed.stream_offset, 700)
+            epoch = data_service.data_epoch
+            data_service.clear_data()
+            self.assertEqual(data_service.get_samples_since(700, epoch=epoch), ([], 0))
+            data_service.ctr_data = click_stream(5, past)
+            self.assertEqual(data_service.get_samples_since(resumed.stream_offset), (data_service.ctr_data, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+短语与邻近查询测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex, SUPPORTED_STRATEGIES
+from search_engine.index_tab.phrase_query import (
+    parse_phrase_query, min_cover_span, match_positions, proximity_score, DEFAULT_NEAR_DISTANCE
+)
+from search_engine.index_tab.segmented_index import SegmentedIndex
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+def reference_matches(tokens, words, slop, ordered):
+    """直接在分词结果上枚举判断短语/邻近约束"""
+    if ordered:
+        n = len(words)
+        return any(tokens[i:i + n] == words for i in range(len(tokens) - n + 1))
+    distinct = set(words)
+    width = len(distinct) + slop
+    return any(distinct <= set(tokens[i:i + width]) for i in range(len(tokens)))
+
+
+class TestPhraseQuery(unittest.TestCase):
+    """短语与邻近查询测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(17)
+        cls.vocabulary = ["机器", "学习", "深度", "神经网络", "数据", "算法", "模型", "推荐", "搜索", "人工智能"]
+        cls.index = InvertedIndex()
+        for i in range(300):
+            words = [rng.choice(cls.vocabulary) for _ in range(rng.randint(3, 25))]
+            cls.index.add_document(f"pdoc{i}", " ".join(words))
+        cls.tokens = {doc_id: cls.index.preprocess_text(content) for doc_id, content in cls.index.documents.items()}
+
+    def test_parse_phrase_query(self):
+        """测试查询语法解析"""
+        text, clauses = parse_phrase_query('"机器 学习" 推荐 "深度 神经网络"~2 数据 NEAR/3 算法 模型 NEAR 搜索')
+        self.assertEqual(text, "机器 学习 推荐 深度 神经网络 数据 算法 模型 搜索")
+        self.assertEqual([(c.text, c.slop, c.ordered) for c in clauses], [
+            ("机器 学习", 0, True), ("深度 神经网络", 2, False),
+            ("数据 算法", 2, False), ("模型 搜索", DEFAULT_NEAR_DISTANCE - 1, False)
+        ])
+        self.assertEqual(parse_phrase_query("机器学习"), ("机器学习", []))
+
+    def test_position_helpers(self):
+        """测试最小覆盖跨度、位置匹配和邻近度"""
+        positions = {"a": [1, 10, 20], "b": [5, 12], "c": [14]}
+        self.assertEqual(min_cover_span(positions), 4)
+        self.assertIsNone(min_cover_span({"a": [1], "b": []}))
+        self.assertTrue(match_positions({"a": [3, 7], "b": [8]}, ["a", "b"], 0, True))
+        self.assertFalse(match_positions({"a": [3, 7], "b": [4]}, ["b", "a"], 0, True))
+        self.assertTrue(match_positions({"a": [3, 7], "b": [4]}, ["b", "a"], 0, False))
+        self.assertTrue(match_positions({"a": [3], "b": [6]}, ["a", "b"], 2, False))
+        self.assertFalse(match_positions({"a": [3], "b": [6]}, ["a", "b"], 1, False))
+        self.assertEqual(proximity_score({"a": [3], "b": [4]}, 2), 1.0)
+        self.assertAlmostEqual(proximity_score({"a": [3], "b": [7]}, 2), 0.25)
+        self.assertAlmostEqual(proximity_score({"a": [3], "b": [4], "c": []}, 3), 2 / 3)
+        self.assertEqual(proximity_score({"a": [3]}, 2), 0.0)
+
+    def test_phrase_search_matches_reference(self):
+        """测试短语/邻近检索与逐文档枚举的结果一致"""
+        rng = random.Random(5)
+        for _ in range(40):
+            words = rng.sample(self.vocabulary, rng.randint(2, 3))
+            slop = rng.choice([None, 0, 1, 3])
+            phrase = " ".join(words)
+            query = f'"{phrase}"' if slop is None else f'"{phrase}"~{slop}'
+            expected = {doc_id for doc_id, tokens in self.tokens.items()
+                        if reference_matches(tokens, words, slop or 0, slop is None)}
+            for strategy in SUPPORTED_STRATEGIES:
+                actual = self.index.retrieve(query, top_k=1000, strategy=strategy)
+                self.assertEqual({doc_id for doc_id, _ in actual}, expected, f"{strategy}: {query}")
+            # 约束内的词仍按普通查询词打分
+            bag = dict(self.index.retrieve(phrase, top_k=1000))
+            for doc_id, score in self.index.retrieve(query, top_k=1000):
+                self.assertAlmostEqual(score, bag[doc_id], places=9)
+
+    def test_near_operator(self):
+        """测试NEAR/k与普通查询词组合"""
+        query = "机器 NEAR/2 学习 数据"
+        expected = {doc_id for doc_id, tokens in self.tokens.items()
+                    if reference_matches(tokens, ["机器", "学习"], 1, False)}
+        actual = {doc_id for doc_id, _ in self.index.retrieve(query, top_k=1000)}
+        self.assertEqual(actual, expected)
+        self.assertEqual(self.index.retrieve('"机器 不存在的词"'), [])
+
+    def test_phrase_search_on_segments(self):
+        """测试分段索引和从JSON加载的索引上的短语检索"""
+        queries = ['"机器 学习"', '"深度 神经网络 数据"~2', "推荐 NEAR/1 搜索 算法"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            segmented = SegmentedIndex(os.path.join(tmpdir, "segments"), flush_threshold=40, background_merge=False)
+            for doc_id, content in self.index.documents.items():
+                segmented.add_document(doc_id, content)
+            segmented.delete_document("pdoc3")
+            path = os.path.join(tmpdir, "index.json")
+            self.index.save_to_file(path)
+            loaded = InvertedIndex()
+            loaded.load_from_file(path)
+            for query in queries:
+                expected = self.index.retrieve(query, top_k=1000, scorer="bm25")
+                self.assertEqual(loaded.retrieve(query, top_k=1000, scorer="bm25"), expected)
+                actual = dict(segmented.retrieve(query, top_k=1000))
+                self.assertEqual(set(actual), {doc_id for doc_id, _ in expected} - {"pdoc3"})
+            segmented.close()
+
+    def test_proximity_feature(self):
+        """测试服务层的邻近度特征"""
+        index = InvertedIndex()
+        index.add_document("near", "机器 学习 数据 模型")
+        index.add_document("far", "机器 数据 模型 算法 推荐 学习")
+        index.add_document("single", "机器 数据")
+        service = InvertedIndexService.__new__(InvertedIndexService)
+        service.index = index
+        scores = service.get_proximity_scores("机器 学习", ["near", "far", "single", "missing"])
+        self.assertEqual(scores["near"], 1.0)
+        self.assertAlmostEqual(scores["far"], 0.2)
+        self.assertEqual(scores["single"], 0.0)
+        self.assertEqual(scores["missing"], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
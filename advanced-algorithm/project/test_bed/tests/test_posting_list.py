@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩倒排链测试用例
+"""
+
+import unittest
+import random
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.posting_list import PostingList, encode_doc_nums, decode_doc_nums
+
+
+class TestPostingList(unittest.TestCase):
+    """压缩倒排链测试类"""
+
+    def test_encode_decode_round_trip(self):
+        """测试差分+varint编码可以无损还原，包括跨多字节的大间隔"""
+        rng = random.Random(3)
+        doc_nums = sorted(rng.sample(range(10 ** 7), 2000)) + [2 ** 40]
+        self.assertEqual(decode_doc_nums(encode_doc_nums(doc_nums)).tolist(), doc_nums)
+        self.assertEqual(decode_doc_nums(encode_doc_nums([0])).tolist(), [0])
+        self.assertEqual(decode_doc_nums(encode_doc_nums([])).tolist(), [])
+
+    def test_small_gaps_use_one_byte(self):
+        """测试间隔小于128时每个文档编号只占1字节"""
+        self.assertEqual(len(encode_doc_nums(range(0, 1000, 3))), len(range(0, 1000, 3)))
+
+    def test_append_add_remove(self):
+        """测试追加、乱序插入和删除"""
+        posting_list = PostingList()
+        for doc_num in (0, 5, 300, 70000):
+            posting_list.append(doc_num, doc_num % 7 + 1)
+        with self.assertRaises(ValueError):
+            posting_list.append(300, 1)
+        posting_list.add(6, 2)
+        posting_list.add(5, 9)
+        self.assertEqual(posting_list.items(), [(0, 1), (5, 9), (6, 2), (300, 7), (70000, 1)])
+        self.assertTrue(posting_list.remove(300))
+        self.assertFalse(posting_list.remove(301))
+        self.assertEqual(posting_list.doc_nums().tolist(), [0, 5, 6, 70000])
+        posting_list.append(70001, 3)
+        self.assertEqual(posting_list.items()[-1], (70001, 3))
+
+    def test_tf_array_widens(self):
+        """测试词频超过1字节/2字节范围时数组自动放宽"""
+        posting_list = PostingList()
+        posting_list.append(1, 3)
+        self.assertEqual(posting_list.tfs.itemsize, 1)
+        posting_list.append(2, 300)
+        posting_list.append(3, 70000)
+        self.assertEqual(posting_list.tfs.tolist(), [3, 300, 70000])
+        self.assertEqual(posting_list.tf_array().tolist(), [3.0, 300.0, 70000.0])
+        self.assertEqual(posting_list.nbytes, len(posting_list.data) + 3 * posting_list.tfs.itemsize)
+
+
+if __name__ == '__main__':
+    unittest.main()
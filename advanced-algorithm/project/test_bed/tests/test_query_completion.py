@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询自动补全测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import shutil
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.query_completion import QueryCompletion
+from search_engine.data_service import DataService
+
+
+class TestQueryCompletion(unittest.TestCase):
+    """查询自动补全测试类"""
+
+    def test_incremental_matches_rebuild(self):
+        """测试增量维护的每个节点top-k与按最终统计量暴力排序一致"""
+        rng = random.Random(17)
+        queries = ["机器学习", "机器人", "机器学习算法", "深度学习", "深度神经网络", "数据挖掘", "数据库", "ab", "abc"]
+        completion = QueryCompletion(top_k=3, click_weight=2.0)
+        searches = {query: 0 for query in queries}
+        clicks = {query: 0 for query in queries}
+        for i in range(500):
+            query = rng.choice(queries)
+            for position in range(rng.randint(1, 3)):
+                completion.record_impression(query, f"req{i}")
+            searches[query] += 1
+            if rng.random() < 0.3:
+                completion.record_click(query)
+                clicks[query] += 1
+
+        for prefix in ["", "机", "机器", "机器学习", "深度", "数据", "a", "abc", "x"]:
+            matched = [query for query in queries if query.startswith(prefix) and searches[query]]
+            ranked = sorted(matched, key=lambda query: (-(searches[query] + 2.0 * clicks[query]), query))[:3]
+            self.assertEqual(completion.suggest(prefix), [(query, searches[query] + 2.0 * clicks[query])
+                                                          for query in ranked], prefix)
+        self.assertEqual(len(completion.suggest("机", k=1)), 1)
+        stats = completion.get_query_stats(" 机器人 ")
+        self.assertEqual((stats['searches'], stats['clicks']), (searches["机器人"], clicks["机器人"]))
+
+    def test_normalization_and_click_weight(self):
+        """测试大小写/空白归一化，点击多的查询排在同样常搜的查询前面"""
+        completion = QueryCompletion()
+        for i in range(3):
+            completion.record_impression("Machine  Learning", f"a{i}")
+            completion.record_impression("machine vision", f"b{i}")
+        completion.record_click("machine vision")
+        self.assertEqual([query for query, _ in completion.suggest("MACHINE")], ["machine vision", "machine learning"])
+        self.assertEqual([query for query, _ in completion.suggest("machine ")], ["machine vision", "machine learning"])
+        self.assertEqual(completion.suggest("machinel"), [])
+        completion.clear()
+        self.assertEqual(completion.suggest("m"), [])
+        self.assertEqual(completion.get_stats()['completion_queries'], 0)
+
+    def test_seen_requests_bounded(self):
+        """测试去重用的请求ID只保留最近的若干个，连续写入的同一请求仍只算一次搜索"""
+        completion = QueryCompletion(max_tracked_requests=5)
+        for i in range(100):
+            for _ in range(3):
+                completion.record_impression("推荐系统", f"req{i}")
+        self.assertEqual(len(completion._seen_requests), 5)
+        self.assertEqual(completion.get_query_stats("推荐系统")['searches'], 100)
+        self.assertEqual(completion.get_query_stats("推荐系统")['impressions'], 300)
+
+    def test_samples_without_request_id(self):
+        """测试没有请求ID的旧格式样本每条展示各算一次搜索，不被当成同一请求去重"""
+        completion = QueryCompletion()
+        completion.add_samples([{'query': "推荐系统", 'clicked': 0}] * 3
+                               + [{'query': "推荐算法", 'request_id': None, 'clicked': 1}]
+                               + [{'query': "推荐引擎", 'request_id': "req1"}] * 2)
+        self.assertEqual(completion.get_query_stats("推荐系统")['searches'], 3)
+        self.assertEqual(completion.get_query_stats("推荐引擎")['searches'], 1)
+        self.assertEqual(completion.suggest("推荐"), [("推荐算法", 3.0), ("推荐系统", 3.0), ("推荐引擎", 1.0)])
+        self.assertEqual(len(completion._seen_requests), 1)
+
+    def test_data_service_updates(self):
+        """测试数据服务的展示/点击、批量写入、导入和清空同步更新联想"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            service = DataService(auto_save_interval=60, batch_size=1000)
+            service.data_file = os.path.join(temp_dir, "ctr_data.json")
+            service.clear_data()
+            for i in range(3):
+                service.record_impression("机器学习入门", f"doc{i}", i + 1, 0.5, "摘要", "req1")
+            service.record_impression("机器人", "doc1", 1, 0.5, "摘要", "req2")
+            service.record_impression("机器人", "doc1", 1, 0.5, "摘要", "req3")
+            self.assertEqual(service.suggest("机器"), ["机器人", "机器学习入门"])
+
+            service.record_click("doc0", "req1")
+            service.record_click("doc0", "req1")  # 重复点击不重复加分
+            self.assertEqual(service.suggest("机器"), ["机器学习入门", "机器人"])
+            self.assertEqual(service.query_completion.get_query_stats("机器学习入门")['clicks'], 1)
+
+            service.batch_record_impressions([{'query': "深度学习", 'doc_id': "doc1", 'position': 1, 'score': 0.5,
+                                               'summary': "", 'request_id': "req4"}])
+            service.batch_record_clicks([{'doc_id': "doc1", 'request_id': "req4"}])
+            self.assertEqual(service.suggest("深"), ["深度学习"])
+            self.assertEqual(service.get_stats()['completion_queries'], 3)
+
+            export_file = os.path.join(temp_dir, "export.json")
+            self.assertTrue(service.export_data(export_file))
+            service.clear_data()
+            self.assertEqual(service.suggest("机器"), [])
+            self.assertTrue(service.import_data(export_file))
+            self.assertEqual(service.suggest("机器"), ["机器学习入门", "机器人"])
+            self.assertEqual(service.suggest("  "), [])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
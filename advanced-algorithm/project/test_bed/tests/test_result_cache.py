@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询结果缓存测试用例
+"""
+
+import unittest
+import tempfile
+import time
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.result_cache import ResultCache, estimate_size
+from search_engine.index_service import IndexService
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.service_manager import service_manager
+
+
+class TestResultCache(unittest.TestCase):
+    """查询结果缓存测试类"""
+
+    documents = {
+        "doc1": "机器学习是人工智能的一个分支",
+        "doc2": "深度学习使用神经网络进行学习",
+        "doc3": "推荐系统根据用户行为推荐内容",
+    }
+
+    def test_lru_and_memory_cap(self):
+        """测试条目数和内存上限按LRU淘汰"""
+        cache = ResultCache(max_entries=2)
+        cache.put("a", (0,), (1,))
+        cache.put("b", (0,), (2,))
+        self.assertEqual(cache.get("a", (0,)), (1,))
+        cache.put("c", (0,), (3,))
+        self.assertIsNone(cache.get("b", (0,)))
+        self.assertEqual(cache.get("c", (0,)), (3,))
+        self.assertEqual(cache.get_stats()['cache_evictions'], 1)
+
+        value = ("x" * 100,)
+        size = estimate_size("k0") + estimate_size(value)
+        cache = ResultCache(max_bytes=size * 2)
+        for i in range(3):
+            cache.put(f"k{i}", (0,), value)
+        stats = cache.get_stats()
+        self.assertEqual(stats['cache_entries'], 2)
+        self.assertLessEqual(stats['cache_bytes'], size * 2)
+        self.assertIsNone(cache.get("k0", (0,)))
+        cache.put("big", (0,), ("x" * size * 3,))
+        self.assertIsNone(cache.get("big", (0,)))
+
+    def test_ttl_and_version(self):
+        """测试过期条目不再返回，版本变化时整体失效"""
+        cache = ResultCache(ttl_seconds=0.05)
+        cache.put("a", (1, 0), ("doc1",))
+        self.assertEqual(cache.get("a", (1, 0)), ("doc1",))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a", (1, 0)))
+        self.assertEqual(cache.get_stats()['cache_expirations'], 1)
+
+        cache.put("a", (1, 0), ("doc1",))
+        self.assertIsNone(cache.get("a", (2, 0)))
+        stats = cache.get_stats()
+        self.assertEqual(stats['cache_invalidations'], 1)
+        self.assertEqual(stats['cache_entries'], 0)
+        self.assertAlmostEqual(stats['cache_hit_rate'], 1 / 3)
+
+    def test_index_service_cache(self):
+        """测试相同的归一化查询命中缓存，索引写入或模型版本变化后重新计算"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # 预先建好空索引，避免触发离线构建改写 models/ 下的索引文件
+            index_file = os.path.join(tmpdir, "index.json")
+            InvertedIndex().save_to_file(index_file)
+            service = IndexService(index_file)
+            service.clear_index()
+            service.batch_add_documents(self.documents)
+
+            doc_ids = service.retrieve("机器 学习", top_k=10)
+            self.assertEqual(service.retrieve("机器  学习", top_k=10), doc_ids)
+            ranked = service.rank("机器 学习", doc_ids, top_k=10)
+            self.assertEqual(service.rank("机器 学习", doc_ids, top_k=10), ranked)
+            stats = service.get_stats()
+            self.assertEqual((stats['cache_hits'], stats['cache_misses']), (2, 2))
+
+            # 返回的是副本，调用方修改不影响缓存
+            doc_ids.append("doc9")
+            self.assertNotIn("doc9", service.retrieve("机器 学习", top_k=10))
+
+            service.add_document("doc4", "机器学习算法")
+            self.assertIn("doc4", service.retrieve("机器 学习", top_k=10))
+            self.assertEqual(service.get_stats()['cache_invalidations'], 1)
+
+            original = service_manager.get_model_version
+            service_manager.get_model_version = lambda: original() + 1
+            try:
+                misses = service.get_stats()['cache_misses']
+                service.retrieve("机器 学习", top_k=10)
+                self.assertEqual(service.get_stats()['cache_misses'], misses + 1)
+            finally:
+                service_manager.get_model_version = original
+
+            # 语法错误的查询不进缓存
+            service.retrieve("(机器", top_k=10)
+            self.assertEqual(service.get_stats()['cache_misses'], misses + 1)
+
+            disabled = IndexService(index_file, result_cache=ResultCache(max_entries=0))
+            disabled.retrieve("机器 学习")
+            self.assertEqual(disabled.get_stats()['cache_entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制索引段测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex, create_sample_documents, SUPPORTED_STRATEGIES
+from search_engine.index_tab.segment import (
+    IndexSegment, detect_index_format, convert_json_to_segment, document_store_path
+)
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+class TestIndexSegment(unittest.TestCase):
+    """二进制索引段测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(5)
+        vocabulary = ["人工智能", "机器学习", "深度学习", "神经网络", "自然语言",
+                      "计算机", "视觉", "数据", "算法", "模型", "推荐系统", "搜索引擎"]
+        cls.documents = {f"rdoc{i}": "，".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 30)))
+                         for i in range(200)}
+        cls.documents.update(create_sample_documents())
+        cls.index = InvertedIndex()
+        for doc_id, content in cls.documents.items():
+            cls.index.add_document(doc_id, content)
+        # 删除的文档不会写入索引段
+        cls.index.delete_document("rdoc7")
+        cls.queries = ["机器学习", "深度学习 神经网络 算法", "推荐系统 搜索引擎 数据", "人工智能 计算机视觉"]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "index.seg")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def open_segment(self):
+        self.index.save_segment(self.path)
+        loaded = InvertedIndex()
+        loaded.load_segment(self.path)
+        return loaded
+
+    def test_round_trip_search(self):
+        """测试索引段加载后各策略、各打分器的检索结果与内存索引一致"""
+        loaded = self.open_segment()
+        self.assertIsNotNone(loaded.segment)
+        for query in self.queries:
+            for scorer in ("tfidf", "bm25", "bm25+"):
+                expected = self.index.retrieve(query, top_k=15, scorer=scorer)
+                all_scores = dict(self.index.retrieve(query, top_k=len(self.documents), scorer=scorer))
+                for strategy in SUPPORTED_STRATEGIES:
+                    actual = loaded.retrieve(query, top_k=15, strategy=strategy, scorer=scorer)
+                    # 索引段按文档ID重新编号，同分文档的先后顺序可以不同
+                    self.assertEqual(len(actual), len(expected))
+                    for (doc_id, a), (_, e) in zip(actual, expected):
+                        self.assertAlmostEqual(a, e, places=9)
+                        self.assertAlmostEqual(a, all_scores[doc_id], places=9)
+        self.assertEqual(loaded.search("机器学习", top_k=3)[0][2], self.index.search("机器学习", top_k=3)[0][2])
+
+    def test_summaries_from_stored_offsets(self):
+        """测试索引段中保存词元字符区间，摘要与内存索引一致且不重新分词"""
+        loaded = self.open_segment()
+        self.assertEqual(loaded.segment.version, 2)
+        query_words = self.index.preprocess_text("深度学习 神经网络")
+
+        def fail(text):
+            raise AssertionError("生成摘要时不应重新分词")
+        loaded.tokenize_with_offsets = fail
+        for doc_id in ("doc1", "doc2", "rdoc3", "rdoc50"):
+            self.assertEqual(loaded.generate_summary(doc_id, query_words, max_length=30),
+                             self.index.generate_summary(doc_id, query_words, max_length=30))
+
+    def test_round_trip_documents_and_stats(self):
+        """测试文档库、文档ID查找和统计信息"""
+        loaded = self.open_segment()
+        self.assertEqual(loaded.get_all_documents(), self.index.get_all_documents())
+        self.assertEqual(loaded.get_document("doc3"), self.documents["doc3"])
+        self.assertEqual(loaded.get_document("rdoc7"), "")
+        self.assertNotIn("rdoc7", loaded.documents)
+        stats, expected = loaded.get_index_stats(), self.index.get_index_stats()
+        for key in ("total_documents", "total_terms", "average_doc_length", "total_postings"):
+            self.assertEqual(stats[key], expected[key])
+        self.assertEqual(sorted(loaded.get_term_postings("机器学习")),
+                         sorted(self.index.get_term_postings("机器学习")))
+
+    def test_writes_after_load(self):
+        """测试加载索引段后仍可增删文档"""
+        loaded = self.open_segment()
+        loaded.add_document("new1", "推荐系统和搜索引擎都依赖机器学习")
+        self.assertTrue(loaded.delete_document("doc2"))
+        self.assertIsNone(loaded.segment)
+
+        rebuilt = InvertedIndex()
+        for doc_id in sorted(self.index.documents):
+            if doc_id != "doc2":
+                rebuilt.add_document(doc_id, self.documents[doc_id])
+        rebuilt.add_document("new1", "推荐系统和搜索引擎都依赖机器学习")
+        for query in self.queries:
+            actual = dict(loaded.retrieve(query, top_k=300, scorer="bm25"))
+            expected = dict(rebuilt.retrieve(query, top_k=300, scorer="bm25"))
+            self.assertEqual(set(actual), set(expected))
+            for doc_id, score in expected.items():
+                self.assertAlmostEqual(actual[doc_id], score, places=9)
+
+    def test_overwrite_open_segment(self):
+        """测试覆盖写入正在mmap打开的索引段"""
+        loaded = self.open_segment()
+        loaded.add_document("new2", "云计算")
+        loaded.save_segment(self.path)
+        reopened = InvertedIndex()
+        reopened.load_segment(self.path)
+        self.assertEqual(reopened.get_document("new2"), "云计算")
+        self.assertEqual(len(reopened.documents), len(self.index.documents) + 1)
+
+    def test_empty_index(self):
+        """测试空索引"""
+        InvertedIndex().save_segment(self.path)
+        loaded = InvertedIndex()
+        loaded.load_segment(self.path)
+        self.assertEqual(loaded.search("机器学习"), [])
+        self.assertEqual(loaded.get_index_stats()['total_documents'], 0)
+
+    def test_format_detection_and_conversion(self):
+        """测试格式识别、JSON转换和服务层自动识别"""
+        json_path = os.path.join(self.tmpdir.name, "index_data.json")
+        self.index.save_to_file(json_path)
+        self.assertEqual(detect_index_format(json_path), "json")
+
+        segment_path = convert_json_to_segment(json_path)
+        self.assertEqual(segment_path, os.path.join(self.tmpdir.name, "index_data.seg"))
+        self.assertEqual(detect_index_format(segment_path), "segment")
+        self.assertTrue(os.path.exists(document_store_path(segment_path)))
+        self.assertEqual(IndexSegment(segment_path).num_docs, len(self.index.documents))
+
+        service = InvertedIndexService(segment_path)
+        self.assertIsNotNone(service.index.segment)
+        self.assertEqual(set(service.search_doc_ids("机器学习", top_k=300)),
+                         {doc_id for doc_id, _ in self.index.retrieve("机器学习", top_k=300)})
+
+        # 按后缀选择保存格式
+        json_copy = os.path.join(self.tmpdir.name, "copy.json")
+        self.assertTrue(service.save_index(json_copy))
+        self.assertEqual(detect_index_format(json_copy), "json")
+        json_service = InvertedIndexService(json_copy)
+        self.assertIsNone(json_service.index.segment)
+        self.assertEqual(json_service.get_document_count(), len(self.index.documents))
+
+    def test_invalid_file(self):
+        """测试非索引段文件"""
+        with open(self.path, 'wb') as f:
+            f.write(b"not a segment" * 20)
+        with self.assertRaises(ValueError):
+            IndexSegment(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段增量索引测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex, create_sample_documents, SUPPORTED_STRATEGIES
+from search_engine.index_tab.segmented_index import SegmentedIndex, MANIFEST_FILE, WAL_FILE
+from search_engine.index_tab.segment import detect_index_format
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+class TestSegmentedIndex(unittest.TestCase):
+    """分段增量索引测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(3)
+        vocabulary = ["人工智能", "机器学习", "深度学习", "神经网络", "自然语言",
+                      "计算机", "视觉", "数据", "算法", "模型", "推荐系统", "搜索引擎"]
+        cls.documents = {f"rdoc{i:03d}": "，".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 30)))
+                         for i in range(120)}
+        cls.queries = ["机器学习", "深度学习 神经网络 算法", "推荐系统 搜索引擎 数据", "人工智能 计算机 视觉"]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, "segments")
+        self.opened = []
+
+    def tearDown(self):
+        for index in self.opened:
+            index.close()
+        self.tmpdir.cleanup()
+
+    def open_index(self, **kwargs) -> SegmentedIndex:
+        kwargs.setdefault('flush_threshold', 10)
+        kwargs.setdefault('background_merge', False)
+        index = SegmentedIndex(self.directory, **kwargs)
+        self.opened.append(index)
+        return index
+
+    def assert_same_results(self, index, expected_index):
+        """分段检索与同样内容的单一索引逐篇分数一致"""
+        for query in self.queries:
+            for scorer in ("tfidf", "bm25", "bm25+"):
+                for strategy in SUPPORTED_STRATEGIES:
+                    actual = index.retrieve(query, top_k=15, strategy=strategy, scorer=scorer)
+                    expected = expected_index.retrieve(query, top_k=15, strategy="taat", scorer=scorer)
+                    self.assertEqual([round(s, 9) for _, s in actual], [round(s, 9) for _, s in expected],
+                                     f"{strategy}/{scorer}: {query}")
+                    expected_scores = dict(expected_index.retrieve(query, top_k=1000, scorer=scorer))
+                    for doc_id, score in actual:
+                        self.assertAlmostEqual(score, expected_scores[doc_id], places=9)
+
+    def build_reference(self, documents) -> InvertedIndex:
+        reference = InvertedIndex()
+        for doc_id, content in documents.items():
+            reference.add_document(doc_id, content)
+        return reference
+
+    def test_fan_out_matches_single_index(self):
+        """测试多段扇出检索与单一索引一致"""
+        index = self.open_index(merge_factor=100)
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        stats = index.get_index_stats()
+        self.assertEqual(stats['segment_count'], 12)
+        self.assertEqual(stats['memory_docs'], 0)
+        self.assertEqual(stats['total_documents'], len(self.documents))
+        self.assert_same_results(index, self.build_reference(self.documents))
+
+    def test_tombstones_and_overwrites(self):
+        """测试删除已落盘的文档记墓碑，覆盖写只保留新版本"""
+        index = self.open_index(merge_factor=100)
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        index.add_document("rdoc200", "机器学习，数据")
+        documents = dict(self.documents)
+        documents["rdoc200"] = "机器学习，数据"
+        for doc_id in ("rdoc005", "rdoc050", "rdoc200"):
+            self.assertTrue(index.delete_document(doc_id))
+            del documents[doc_id]
+        self.assertFalse(index.delete_document("rdoc005"))
+        index.add_document("rdoc010", "推荐系统，搜索引擎，推荐系统")
+        documents["rdoc010"] = "推荐系统，搜索引擎，推荐系统"
+
+        self.assertEqual(index.batch_delete_documents(["rdoc011", "rdoc012", "rdoc011", "missing"]), 2)
+        del documents["rdoc011"], documents["rdoc012"]
+        self.assertFalse(index.update_document("missing", "数据"))
+        self.assertTrue(index.update_document("rdoc013", "算法，模型"))
+        documents["rdoc013"] = "算法，模型"
+
+        self.assertEqual(index.get_index_stats()['deleted_docs'], 6)
+        self.assertEqual(index.get_document("rdoc005"), "")
+        self.assertEqual(index.get_document("rdoc010"), documents["rdoc010"])
+        self.assertEqual(index.get_all_documents(), documents)
+        self.assertEqual(sorted(index.get_term_postings("推荐系统"))[0:1],
+                         sorted(self.build_reference(documents).get_term_postings("推荐系统"))[0:1])
+        self.assert_same_results(index, self.build_reference(documents))
+
+    def test_merge_policy(self):
+        """测试分层合并后段数减少、墓碑被清理，检索结果不变"""
+        index = self.open_index(merge_factor=4)
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        stats = index.get_index_stats()
+        self.assertGreater(stats['merges'], 0)
+        self.assertLess(stats['segment_count'], 12)
+        self.assertEqual(stats['total_documents'], len(self.documents))
+        self.assert_same_results(index, self.build_reference(self.documents))
+
+        # 墓碑过半的段单独重写
+        documents = dict(self.documents)
+        for doc_id in list(documents)[:80]:
+            index.delete_document(doc_id)
+            del documents[doc_id]
+        index.maybe_merge()
+        self.assertLess(index.get_index_stats()['deleted_docs'], 80)
+        self.assertEqual(index.get_all_documents(), documents)
+        self.assert_same_results(index, self.build_reference(documents))
+
+        segment_files = {name for name in os.listdir(self.directory) if name.endswith(".seg")}
+        self.assertEqual(len(segment_files), index.get_index_stats()['segment_count'])
+
+    def test_background_merge(self):
+        """测试后台线程合并"""
+        index = self.open_index(merge_factor=2, background_merge=True)
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        self.assertTrue(index.wait_for_merges(timeout=30))
+        stats = index.get_index_stats()
+        self.assertGreater(stats['merges'], 0)
+        self.assertEqual(stats['total_documents'], len(self.documents))
+        self.assert_same_results(index, self.build_reference(self.documents))
+
+    def test_delete_during_merge(self):
+        """测试合并期间新增的墓碑会补记到合并后的段"""
+        index = self.open_index(merge_factor=100)
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        sources = index.segments[:4]
+        snapshots = [entry.deleted.copy() for entry in sources]
+        index.delete_document("rdoc003")
+        index.delete_document("rdoc025")
+        index._merge_segments(sources, snapshots, index._allocate_segment_name())
+
+        documents = dict(self.documents)
+        del documents["rdoc003"], documents["rdoc025"]
+        self.assertEqual(index.get_index_stats()['segment_count'], 9)
+        self.assertEqual(index.get_all_documents(), documents)
+        self.assert_same_results(index, self.build_reference(documents))
+
+    def test_merge_discarded_after_clear(self):
+        """测试合并期间索引被清空时丢弃合并结果并删除其文件，不影响清空后的写入"""
+        index = self.open_index(merge_factor=100)
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        sources = index.segments[:4]
+        snapshots = [entry.deleted.copy() for entry in sources]
+        name = index._allocate_segment_name()
+        index.clear()
+        index.add_document("rdoc999", "深度学习，神经网络")
+
+        self.assertFalse(index._merge_segments(sources, snapshots, name))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, name)))
+        self.assertEqual(index.get_all_documents(), {"rdoc999": "深度学习，神经网络"})
+        self.assertEqual(index.stats['merges'], 0)
+
+    def test_recover_from_wal(self):
+        """测试未落盘的写入和墓碑在崩溃(未提交、未关闭)后重新打开时从预写日志恢复"""
+        index = self.open_index()
+        for doc_id, content in list(self.documents.items())[:25]:
+            index.add_document(doc_id, content)
+        index.delete_document("rdoc001")
+        index.delete_document("rdoc021")
+        index.add_document("rdoc003", "深度学习，神经网络")
+        self.assertEqual(len(index.memory.documents), 5)
+
+        # 模拟崩溃：不提交，并在日志末尾留下写到一半的一行
+        with open(os.path.join(self.directory, WAL_FILE), 'a', encoding='utf-8') as f:
+            f.write('{"op": "add", "doc_id": "rdoc9')
+        reopened = self.open_index()
+        documents = dict(list(self.documents.items())[:25])
+        del documents["rdoc001"], documents["rdoc021"]
+        documents["rdoc003"] = "深度学习，神经网络"
+        self.assertEqual(reopened.get_all_documents(), documents)
+        self.assert_same_results(reopened, self.build_reference(documents))
+
+        # 提交后日志清空
+        reopened.commit()
+        self.assertEqual(os.path.getsize(os.path.join(self.directory, WAL_FILE)), 0)
+        self.assertEqual(self.open_index().get_all_documents(), documents)
+
+    def test_reopen_from_manifest(self):
+        """测试提交后重新打开，段和墓碑从manifest恢复"""
+        index = self.open_index()
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        index.delete_document("rdoc001")
+        index.add_document("rdoc999", "深度学习，神经网络")
+        index.commit()
+        index.close()
+        # 未被manifest引用的段文件在打开时清理
+        open(os.path.join(self.directory, "seg_999999.seg"), "wb").close()
+
+        reopened = self.open_index()
+        documents = dict(self.documents)
+        del documents["rdoc001"]
+        documents["rdoc999"] = "深度学习，神经网络"
+        self.assertEqual(reopened.get_all_documents(), documents)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "seg_999999.seg")))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, MANIFEST_FILE)))
+        self.assert_same_results(reopened, self.build_reference(documents))
+
+    def test_export_and_import(self):
+        """测试导出为JSON再导入"""
+        index = self.open_index()
+        for doc_id, content in self.documents.items():
+            index.add_document(doc_id, content)
+        path = os.path.join(self.tmpdir.name, "index.json")
+        index.save_to_file(path)
+
+        loaded = InvertedIndex()
+        loaded.load_from_file(path)
+        self.assertEqual(loaded.get_all_documents(), self.documents)
+
+        index.clear()
+        self.assertEqual(index.get_index_stats()['total_documents'], 0)
+        index.load_from_file(path)
+        self.assertEqual(index.get_index_stats()['segment_count'], 1)
+        self.assert_same_results(index, loaded)
+
+    def test_service_uses_directory(self):
+        """测试服务以目录路径打开分段索引"""
+        service = InvertedIndexService(self.directory)
+        self.opened.append(service.index)
+        self.assertIsInstance(service.index, SegmentedIndex)
+        self.assertEqual(detect_index_format(self.directory), "segments")
+        self.assertEqual(service.get_stats()['total_documents'], len(create_sample_documents()))
+
+        self.assertTrue(service.add_document("new_doc", "增量写入的新文档介绍搜索引擎"))
+        self.assertTrue(service.delete_document("doc1"))
+        self.assertTrue(service.save_index())
+        service.index.close()
+
+        reopened = InvertedIndexService(self.directory)
+        self.opened.append(reopened.index)
+        self.assertIn("new_doc", reopened.search_doc_ids("搜索引擎"))
+        self.assertIsNone(reopened.get_all_documents().get("doc1"))
+        self.assertTrue(reopened.clear_index())
+        self.assertEqual(reopened.get_stats()['total_documents'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片索引(scatter-gather)测试用例
+"""
+
+import unittest
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.sharded_index import ShardedIndex, shard_of
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+class TestShardedIndex(unittest.TestCase):
+    """分片索引测试类"""
+
+    queries = ["机器 学习", '"深度 神经网络"', "推荐 AND NOT 搜索", "NOT 数据", "数据 NEAR/2 算法", "id:sdoc1*"]
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(13)
+        vocabulary = ["机器", "学习", "深度", "神经网络", "数据", "算法", "模型", "推荐", "搜索", "人工智能"]
+        cls.documents = {f"sdoc{i}": "，".join(rng.choice(vocabulary) for _ in range(rng.randint(2, 20)))
+                         for i in range(200)}
+        cls.sharded = ShardedIndex(num_shards=3)
+        cls.sharded.add_documents(cls.documents)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sharded.close()
+
+    def build_reference(self, documents) -> InvertedIndex:
+        index = InvertedIndex()
+        for doc_id, content in documents.items():
+            index.add_document(doc_id, content)
+        return index
+
+    def assert_same_results(self, sharded, reference, queries):
+        """全局统计量打分后，分片归并的结果与单个索引的分数一致"""
+        for query in queries:
+            for scorer in ("tfidf", "bm25", "bm25+"):
+                for strategy in ("taat", "wand"):
+                    expected = dict(reference.retrieve(query, top_k=1000, scorer=scorer, strategy=strategy))
+                    actual = dict(sharded.retrieve(query, top_k=1000, scorer=scorer, strategy=strategy))
+                    self.assertEqual(set(actual), set(expected), (query, scorer, strategy))
+                    for doc_id, score in expected.items():
+                        self.assertAlmostEqual(actual[doc_id], score, places=9)
+                    top = sharded.retrieve(query, top_k=5, scorer=scorer, strategy=strategy)
+                    self.assertEqual([score for _, score in top],
+                                     sorted(expected.values(), reverse=True)[:5])
+
+    def test_matches_single_index(self):
+        """测试多进程分片与单个索引检索结果一致，文档均匀分到各分片"""
+        self.assertEqual(self.sharded.mode, "process")
+        self.assert_same_results(self.sharded, self.build_reference(self.documents), self.queries)
+        stats = self.sharded.get_index_stats()
+        self.assertEqual(stats['total_documents'], len(self.documents))
+        self.assertEqual(len(stats['shard_docs']), 3)
+        self.assertTrue(all(count > 0 for count in stats['shard_docs']))
+        self.assertEqual(self.sharded.get_all_documents(), self.documents)
+
+    def test_search_and_document_access(self):
+        """测试摘要、邻近度和文档读取路由到文档所在的分片"""
+        reference = self.build_reference(self.documents)
+        results = self.sharded.search("机器 学习", top_k=3, scorer="bm25")
+        for doc_id, _, summary in results:
+            self.assertEqual(summary, reference.generate_summary(doc_id, ["机器", "学习"]))
+            self.assertEqual(self.sharded.get_document(doc_id), self.documents[doc_id])
+            self.assertAlmostEqual(self.sharded.proximity_score(doc_id, ["机器", "学习"]),
+                                   reference.proximity_score(doc_id, ["机器", "学习"]))
+        self.assertEqual(shard_of("sdoc1", 3), shard_of("sdoc1", 3))
+        self.assertEqual(sorted(self.sharded.get_term_postings("数据")), sorted(reference.get_term_postings("数据")))
+
+    def test_writes_refresh_global_stats(self):
+        """测试写入后全局统计量缓存失效，进程内分片与多进程结果一致"""
+        sharded = ShardedIndex(num_shards=2, use_processes=False)
+        documents = dict(list(self.documents.items())[:80])
+        sharded.add_documents(documents)
+        sharded.retrieve("机器 学习", top_k=5)
+
+        sharded.add_document("extra1", "机器，机器，学习，图像")
+        sharded.update_document("sdoc3", "图像，识别，机器")
+        self.assertFalse(sharded.update_document("missing", "机器"))
+        self.assertEqual(sharded.batch_delete_documents(["sdoc4", "sdoc5", "missing"]), 2)
+        documents.update({"extra1": "机器，机器，学习，图像", "sdoc3": "图像，识别，机器"})
+        del documents["sdoc4"], documents["sdoc5"]
+        self.assert_same_results(sharded, self.build_reference(documents), ["机器 学习", "图像", "NOT 机器"])
+
+        sharded.clear()
+        self.assertEqual(sharded.retrieve("机器", top_k=5), [])
+
+    def test_service_with_shards(self):
+        """测试服务层按分片数创建分片索引，保存后可按单个索引重新加载"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            index_file = os.path.join(tmpdir, "index.json")
+            service = InvertedIndexService(index_file, num_shards=2)
+            self.assertIsInstance(service.index, ShardedIndex)
+            self.assertTrue(service.clear_index())
+            self.assertEqual(service.batch_add_documents(self.documents), len(self.documents))
+            self.assertEqual(service.get_stats()['shard_count'], 2)
+            expected = service.search_doc_ids("机器 学习", top_k=10, scorer="bm25")
+            self.assertTrue(service.save_index())
+            service.index.close()
+
+            single = InvertedIndexService(index_file)
+            self.assertEqual(single.get_all_documents(), self.documents)
+            scores = dict(single.index.retrieve("机器 学习", top_k=1000, scorer="bm25"))
+            self.assertEqual(sorted(scores[doc_id] for doc_id in expected),
+                             sorted(scores.values())[-10:])
+
+            reopened = InvertedIndexService(index_file, num_shards=3)
+            self.assertEqual(reopened.get_document_count(), len(self.documents))
+            reopened.index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有序词典(前缀压缩)与前缀/通配符/联想查询测试用例
+"""
+
+import unittest
+import fnmatch
+import random
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.term_dictionary import TermDictionary
+from search_engine.index_tab.boolean_query import parse_boolean_query
+from search_engine.index_tab.segmented_index import SegmentedIndex
+from search_engine.index_tab.sharded_index import ShardedIndex
+
+
+class TestTermDictionary(unittest.TestCase):
+    """有序词典测试类"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(16)
+        alphabet = "ab机器学习数据"
+        terms = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 7))) for _ in range(3000)}
+        cls.terms = sorted(terms)
+        cls.doc_freqs = {term: rng.randint(1, 50) for term in cls.terms}
+        cls.dictionary = TermDictionary(cls.terms, (cls.doc_freqs[term] for term in cls.terms), block_size=8)
+
+        vocabulary = ["机器", "机器人", "机构", "学习", "学生", "深度", "数据", "数据库", "算法"]
+        cls.documents = {f"tdoc{i}": " ".join(rng.choice(vocabulary) for _ in range(rng.randint(2, 10)))
+                         for i in range(150)}
+        cls.index = InvertedIndex()
+        for doc_id, content in cls.documents.items():
+            cls.index.add_document(doc_id, content)
+
+    def test_lookup(self):
+        """测试按序号、按词项查找和顺序遍历与原词项列表一致"""
+        dictionary = self.dictionary
+        self.assertEqual(len(dictionary), len(self.terms))
+        self.assertEqual(list(dictionary), self.terms)
+        for ordinal in range(0, len(self.terms), 37):
+            term = self.terms[ordinal]
+            self.assertEqual(dictionary[ordinal], term)
+            self.assertEqual(dictionary.find(term), ordinal)
+            self.assertEqual(dictionary.doc_freq(term), self.doc_freqs[term])
+        self.assertEqual(dictionary[-1], self.terms[-1])
+        self.assertNotIn("不存在", dictionary)
+        self.assertEqual(dictionary.find(""), -1)
+        self.assertEqual(list(TermDictionary([], [])), [])
+        self.assertEqual(TermDictionary([], []).prefix_terms("a"), [])
+
+    def test_prefix_wildcard_suggest(self):
+        """测试前缀、通配符和联想结果与逐个扫描一致"""
+        dictionary = self.dictionary
+        for prefix in ["", "a", "机器", "学习数", "ba机", "zz"]:
+            expected = [term for term in self.terms if term.startswith(prefix)]
+            self.assertEqual(dictionary.prefix_terms(prefix), expected)
+            self.assertEqual(dictionary.prefix_terms(prefix, limit=3), expected[:3])
+            ranked = sorted(expected, key=lambda term: (-self.doc_freqs[term], term))[:5]
+            self.assertEqual(dictionary.suggest(prefix, 5), [(term, self.doc_freqs[term]) for term in ranked])
+        for pattern in ["a*b", "*学习", "机?", "?b*据", "ab", "*"]:
+            expected = [term for term in self.terms if fnmatch.fnmatchcase(term, pattern)]
+            self.assertEqual(dictionary.expand_wildcard(pattern), expected)
+            limited = dictionary.expand_wildcard(pattern, limit=4)
+            self.assertEqual(limited, sorted(sorted(expected, key=lambda term: (-self.doc_freqs[term], term))[:4]))
+
+    def test_memory(self):
+        """测试前缀压缩后的词典比词项字符串表小"""
+        stats = self.index.get_index_stats()
+        self.assertLess(stats['term_dictionary_bytes'], stats['term_table_bytes'])
+        self.assertLess(self.dictionary.nbytes, sum(sys.getsizeof(term) for term in self.terms) / 3)
+
+    def test_index_queries(self):
+        """测试索引上的前缀/联想查询随写入更新，通配符在查询语言中展开后参与打分"""
+        index = self.index.copy()
+        self.assertEqual(index.prefix_terms("机"), ["机器", "机器人", "机构"])
+        suggestions = index.suggest("数据")
+        self.assertEqual([term for term, _ in suggestions],
+                         sorted(["数据", "数据库"], key=lambda term: (-len(index.postings[term]), term)))
+        self.assertEqual(suggestions[0][1], len(index.postings[suggestions[0][0]]))
+        self.assertEqual(index.expand_wildcard("*器*"), ["机器", "机器人"])
+
+        index.add_document("new1", "机场 机器")
+        self.assertEqual(index.prefix_terms("机"), sorted(["机场", "机器", "机器人", "机构"]))
+        index.delete_document("new1")
+        self.assertEqual(index.prefix_terms("机"), ["机器", "机器人", "机构"])
+
+        self.assertEqual(parse_boolean_query("机* AND -content:学*"),
+                         ("and", [("wildcard", "机*"), ("not", ("wildcard", "学*"))]))
+        expected = {doc_id for doc_id, content in self.documents.items()
+                    if "机" in content and "学" not in content}
+        results = index.retrieve("机* AND -content:学*", top_k=1000)
+        self.assertEqual({doc_id for doc_id, _ in results}, expected)
+        self.assertTrue(all(score > 0 for _, score in results))
+        self.assertEqual(index.retrieve("机器*", top_k=1000), index.retrieve("机器 OR 机器人", top_k=1000))
+        self.assertEqual(index.retrieve("图像*", top_k=10), [])
+        self.assertEqual(len(index.retrieve("NOT 图像*", top_k=1000)), len(self.documents))
+
+    def test_segments_and_shards(self):
+        """测试分段/分片索引汇总各段、各分片的词典，结果与单个索引一致"""
+        sharded = ShardedIndex(num_shards=3, use_processes=False)
+        sharded.add_documents(self.documents)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            segmented = SegmentedIndex(os.path.join(tmpdir, "segments"), flush_threshold=40, background_merge=False)
+            segmented.add_documents(self.documents)
+            path = os.path.join(tmpdir, "index.seg")
+            self.index.save_segment(path)
+            loaded = InvertedIndex()
+            loaded.load_segment(path)
+            for other in (sharded, segmented, loaded):
+                self.assertEqual(other.prefix_terms("数"), self.index.prefix_terms("数"))
+                self.assertEqual(other.suggest("机", 2), self.index.suggest("机", 2))
+                self.assertEqual(other.expand_wildcard("?器*"), self.index.expand_wildcard("?器*"))
+                self.assertEqual({doc_id for doc_id, _ in other.retrieve("数据* -算法", top_k=1000)},
+                                 {doc_id for doc_id, _ in self.index.retrieve("数据* -算法", top_k=1000)})
+            self.assertGreater(segmented.get_index_stats()['term_dictionary_bytes'], 0)
+            segmented.close()
+        self.assertGreater(sharded.get_index_stats()['term_dictionary_bytes'], 0)
+        sharded.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
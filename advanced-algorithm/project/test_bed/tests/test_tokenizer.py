@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享分词组件测试用例
+"""
+
+import unittest
+import os
+import sys
+from unittest import mock
+import jieba
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine import tokenizer as tokenizer_module
+from search_engine.tokenizer import Tokenizer, get_tokenizer, MAX_CACHED_TEXT_LENGTH
+from search_engine.index_tab.offline_index import InvertedIndex
+
+
+class TestTokenizer(unittest.TestCase):
+    """共享分词组件测试类"""
+
+    texts = ["人工智能是计算机科学的一个分支", "机器学习 AND 深度学习", "Python和NumPy的数据分析",
+             "搜索引擎的倒排索引", "", "推荐系统，用户画像。点击率预估"]
+
+    def test_matches_jieba(self):
+        """测试cut与jieba.lcut一致，tokenize过滤短词和停用词并小写化"""
+        tokenizer = Tokenizer()
+        for text in self.texts:
+            self.assertEqual(tokenizer.cut(text), jieba.lcut(text))
+            expected = [(word.lower(), start, end) for word, start, end in jieba.tokenize(text.lower())
+                        if len(word) > 1 and word.lower() not in tokenizer.stop_words]
+            self.assertEqual(tokenizer.tokenize_with_offsets(text), expected)
+        self.assertEqual(tokenizer.tokenize("Python和NumPy"), ["python", "numpy"])
+
+    def test_cache(self):
+        """测试重复文本不再调用jieba，长文本不缓存，缓存按LRU淘汰"""
+        tokenizer = Tokenizer(cache_size=3)
+        with mock.patch.object(tokenizer_module.jieba, "tokenize", wraps=jieba.tokenize) as tokenize, \
+                mock.patch.object(tokenizer_module.jieba, "lcut", wraps=jieba.lcut) as lcut:
+            for _ in range(5):
+                tokenizer.tokenize("机器学习 深度学习")
+                tokenizer.cut("机器学习 深度学习")
+            self.assertEqual(tokenize.call_count, 1)
+            self.assertEqual(lcut.call_count, 1)
+
+            long_text = "数据" * MAX_CACHED_TEXT_LENGTH
+            tokenizer.tokenize(long_text)
+            tokenizer.tokenize(long_text)
+            self.assertEqual(tokenize.call_count, 3)
+
+            for text in ("一", "二", "三"):
+                tokenizer.tokenize(text)
+            tokenizer.tokenize("机器学习 深度学习")
+            self.assertEqual(tokenize.call_count, 7)
+
+        stats = tokenizer.get_stats()
+        self.assertEqual(stats['cache_hits'], 8)
+        self.assertGreater(stats['hit_rate'], 0)
+        tokenizer.clear_cache()
+        self.assertEqual(tokenizer.get_stats()['cache_entries'], 0)
+
+    def test_tokenize_many(self):
+        """测试批量分词(含jieba并行模式)与逐条分词一致"""
+        texts = self.texts * 3 + ["第一行\n第二行的内容"]
+        expected = [Tokenizer().tokenize(text) for text in texts]
+        expected_raw = [jieba.lcut(text) for text in texts]
+        for parallel in (False, True):
+            tokenizer = Tokenizer()
+            self.assertEqual(tokenizer.tokenize_many(texts, parallel=parallel), expected)
+            self.assertEqual(tokenizer.tokenize_many(texts, parallel=parallel, raw=True), expected_raw)
+            # 第二次全部命中缓存
+            with mock.patch.object(tokenizer_module.jieba, "lcut") as lcut:
+                self.assertEqual(tokenizer.tokenize_many(texts, raw=True), expected_raw)
+                lcut.assert_not_called()
+
+    def test_shared_by_index(self):
+        """测试索引默认使用共享分词器，修改停用词时换用独立的分词器"""
+        index = InvertedIndex()
+        self.assertIs(index.tokenizer, get_tokenizer())
+        index.add_document("doc1", "机器学习和深度学习")
+        with mock.patch.object(tokenizer_module.jieba, "tokenize") as tokenize:
+            index.parse_query("机器 学习")
+            index.parse_query("机器 学习")
+        self.assertLessEqual(tokenize.call_count, 1)
+
+        custom = InvertedIndex()
+        custom.stop_words = set(custom.stop_words) | {"学习"}
+        self.assertIsNot(custom.tokenizer, get_tokenizer())
+        self.assertEqual(custom.preprocess_text("机器学习"), ["机器"])
+        self.assertIn("学习", index.preprocess_text("机器学习"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+建索引吞吐基准测试
+对比逐篇串行写入与不同进程数的并行分片构建，输出 docs/s 和相对串行的加速比
+"""
+
+import argparse
+import time
+import os
+import sys
+from typing import List
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.bulk_builder import bulk_add_documents
+from search_benchmark import load_vocabulary, generate_corpus, build_index
+
+
+def parse_workers(value: str) -> List[int]:
+    return [int(x) for x in value.split(",") if x.strip()]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="建索引吞吐基准测试")
+    parser.add_argument("--docs", type=int, default=20000, help="合成文档数量")
+    parser.add_argument("--avg-length", type=int, default=120, help="平均文档词数")
+    parser.add_argument("--vocab", type=int, default=20000, help="词表大小")
+    parser.add_argument("--workers", type=parse_workers, default=[1, 2, 4, os.cpu_count() or 1],
+                        help="逗号分隔的进程数列表")
+    args = parser.parse_args()
+
+    print("⚡ 建索引吞吐基准测试")
+    print("=" * 50)
+
+    vocabulary = load_vocabulary(args.vocab)
+    documents = generate_corpus(args.docs, vocabulary, args.avg_length)
+    print(f"📄 合成文档: {len(documents)}个, CPU核数: {os.cpu_count()}")
+
+    start = time.perf_counter()
+    build_index(documents)
+    serial = len(documents) / (time.perf_counter() - start)
+
+    rows = [("逐篇串行", serial)]
+    for workers in dict.fromkeys(args.workers):
+        stats = bulk_add_documents(InvertedIndex(), documents, workers=workers)
+        rows.append((f"并行x{stats['workers']}", stats['docs_per_sec']))
+
+    print(f"\n{'构建方式':<12}{'吞吐(docs/s)':>14}{'加速比':>10}")
+    for name, throughput in rows:
+        print(f"{name:<12}{throughput:>14.0f}{throughput / serial:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引格式转换工具
+把JSON格式的索引文件(models/index_data.json)转换为可mmap加载的二进制索引段
+"""
+
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.segment import (
+    convert_json_to_segment, detect_index_format, document_store_path, IndexSegment
+)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="JSON索引转换为二进制索引段")
+    parser.add_argument("input", nargs="?", default="models/index_data.json", help="JSON索引文件路径")
+    parser.add_argument("output", nargs="?", default=None, help="索引段输出路径，默认与输入同名的.seg文件")
+    args = parser.parse_args()
+
+    print("🔄 索引格式转换")
+    print("=" * 50)
+
+    if not os.path.exists(args.input):
+        print(f"❌ 索引文件不存在: {args.input}")
+        sys.exit(1)
+    if detect_index_format(args.input) == "segment":
+        print(f"⚠️ 输入已经是二进制索引段: {args.input}")
+        return
+
+    start = time.perf_counter()
+    segment_path = convert_json_to_segment(args.input, args.output)
+    elapsed = time.perf_counter() - start
+
+    segment = IndexSegment(segment_path)
+    docs_path = document_store_path(segment_path)
+    print(f"✅ 转换完成，耗时{elapsed:.2f}s")
+    print(f"   文档数: {segment.num_docs}, 词项数: {segment.num_terms}, posting数: {segment.total_postings}")
+    print(f"   JSON索引: {os.path.getsize(args.input) / 1024:.1f} KB")
+    print(f"   索引段: {segment_path} ({os.path.getsize(segment_path) / 1024:.1f} KB)")
+    print(f"   文档库: {docs_path} ({os.path.getsize(docs_path) / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
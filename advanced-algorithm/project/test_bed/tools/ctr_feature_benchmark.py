@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTR特征提取基准测试
+对比原历史CTR特征(每个样本重新过滤全部历史，O(n²))与排序后分组累加的线性实现，
+小规模下校验两者结果一致，再在百万级合成点击日志上统计完整 extract_features 的耗时
+"""
+
+import argparse
+import time
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+import pandas as pd
+
+from search_engine.training_tab.ctr_model import CTRModel, historical_ctr
+
+
+def generate_ctr_log(num_samples: int, num_queries: int, num_docs: int, seed: int = 23) -> List[Dict[str, Any]]:
+    """合成点击日志：查询/文档按Zipf分布出现，点击概率随位置衰减，时间戳乱序且有重复"""
+    rng = np.random.default_rng(seed)
+    words = ["机器学习", "深度学习", "神经网络", "搜索引擎", "倒排索引", "推荐系统", "自然语言", "算法", "数据", "模型"]
+    queries = [" ".join(rng.choice(words, size=rng.integers(1, 4), replace=False)) for _ in range(num_queries)]
+    summaries = [" ".join(rng.choice(words, size=rng.integers(3, 12))) for _ in range(num_docs)]
+    query_nos = np.minimum(rng.zipf(1.3, num_samples) - 1, num_queries - 1)
+    doc_nos = np.minimum(rng.zipf(1.2, num_samples) - 1, num_docs - 1)
+    positions = rng.integers(1, 11, num_samples)
+    clicked = (rng.random(num_samples) < 0.3 / positions).astype(int)
+    base = datetime(2024, 1, 1)
+    seconds = rng.integers(0, max(num_samples // 2, 1), num_samples)
+    timestamps = [(base + timedelta(seconds=int(s))).isoformat() for s in seconds.tolist()]
+    return [
+        {'query': queries[q], 'doc_id': f"doc{d}", 'position': int(p), 'score': round(1.0 / p, 4),
+         'summary': summaries[d], 'clicked': int(c), 'timestamp': t}
+        for q, d, p, c, t in zip(query_nos.tolist(), doc_nos.tolist(), positions.tolist(), clicked.tolist(), timestamps)
+    ]
+
+
+def legacy_history_features(ctr_data: List[Dict[str, Any]]) -> np.ndarray:
+    """原实现：按时间排序后，每个样本在全部更早样本中过滤同查询/同文档求点击均值
+
+    按排序后的位置输出，只用于计时和与线性实现逐行比对(比对时线性实现同样换到排序后的顺序)。
+    """
+    df = pd.DataFrame(ctr_data)
+    df_sorted = df.iloc[np.argsort(df['timestamp'].values, kind='stable')].reset_index(drop=True)
+    features = []
+    for idx, row in df_sorted.iterrows():
+        history = df_sorted.loc[:idx - 1]
+        query_history = history[history['query'] == row['query']]
+        doc_history = history[history['doc_id'] == row['doc_id']]
+        features.append((query_history['clicked'].mean() if len(query_history) > 0 else 0.1,
+                         doc_history['clicked'].mean() if len(doc_history) > 0 else 0.1))
+    return np.array(features).reshape(-1, 2)
+
+
+def linear_history_features(ctr_data: List[Dict[str, Any]]) -> np.ndarray:
+    """线性实现：排序后分组累加，按排序后的位置输出"""
+    df = pd.DataFrame(ctr_data)
+    order = np.argsort(df['timestamp'].values, kind='stable')
+    features = np.column_stack([historical_ctr(df, 'query', order), historical_ctr(df, 'doc_id', order)])
+    return features[order]
+
+
+def timed(func, *args):
+    """返回 (结果, 耗时秒数)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="CTR特征提取基准测试")
+    parser.add_argument("--samples", type=int, default=1_000_000, help="完整特征提取的合成样本数")
+    parser.add_argument("--legacy-samples", type=int, default=3000, help="与原实现比对的样本数(原实现为O(n²))")
+    parser.add_argument("--queries", type=int, default=5000, help="不同查询数量")
+    parser.add_argument("--docs", type=int, default=20000, help="不同文档数量")
+    args = parser.parse_args()
+
+    print("⚡ CTR特征提取基准测试")
+    print("=" * 50)
+
+    small = generate_ctr_log(args.legacy_samples, args.queries, args.docs)
+    legacy, legacy_seconds = timed(legacy_history_features, small)
+    linear, linear_seconds = timed(linear_history_features, small)
+    consistent = np.allclose(legacy, linear)
+    print(f"🔍 历史CTR特征比对({len(small)}条样本): {'✅ 一致' if consistent else '❌ 不一致'}")
+
+    print(f"\n{'实现':<12}{'样本数':>10}{'耗时(s)':>12}")
+    print(f"{'逐条过滤':<12}{len(small):>10}{legacy_seconds:>12.3f}")
+    print(f"{'分组累加':<12}{len(small):>10}{linear_seconds:>12.3f}")
+    if linear_seconds > 0:
+        print(f"\n🚀 加速比: {legacy_seconds / linear_seconds:.1f}x")
+
+    large, generate_seconds = timed(generate_ctr_log, args.samples, args.queries, args.docs)
+    print(f"\n🔨 合成点击日志: {len(large)}条样本, 用时{generate_seconds:.1f}s")
+    (features, labels), extract_seconds = timed(CTRModel().extract_features, large)
+    print(f"📊 extract_features: {features.shape[0]}×{features.shape[1]}特征矩阵, 用时{extract_seconds:.2f}s "
+          f"({len(large) / max(extract_seconds, 1e-9):,.0f}条/s)")
+    print(f"   原实现按比对规模外推: 约{legacy_seconds * (len(large) / len(small)) ** 2 / 3600:,.0f}小时")
+
+
+if __name__ == "__main__":
+    main()
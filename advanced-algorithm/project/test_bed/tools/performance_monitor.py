@@ -10,7 +10,7 @@ import psutil
 import threading
 import json
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -203,10 +203,40 @@ class LoadTester:
             'error_rate': (len(results) - len(successful_results)) / len(results)
         }
     
-    def test_concurrent_search(self, queries: List[str], concurrent_users: int = 10) -> Dict[str, Any]:
-        """测试并发搜索"""
-        import concurrent.futures
+    def test_batch_search(self, queries: List[str], iterations: int = 100,
+                          batch_size: int = 1000) -> Dict[str, Any]:
+        """测试批量检索：与 test_search_performance 相同的查询序列，每 batch_size 条调用一次 search_many"""
+        workload = [queries[i % len(queries)] for i in range(iterations)]
+        start_time = time.time()
+        results_count = 0
+        failed = 0
+        for start in range(0, len(workload), batch_size):
+            batch = workload[start:start + batch_size]
+            try:
+                results_count += sum(len(results) for results in self.index_service.search_many(batch, top_k=5))
+            except Exception as e:
+                print(f"❌ 批量检索失败: {e}")
+                failed += len(batch)
+        total_time = time.time() - start_time
         
+        return {
+            'total_queries': len(workload),
+            'successful_queries': len(workload) - failed,
+            'failed_queries': failed,
+            'total_time_seconds': total_time,
+            'avg_response_time_ms': total_time * 1000 / len(workload) if workload else 0,
+            'avg_results_count': results_count / len(workload) if workload else 0,
+            'queries_per_second': len(workload) / total_time if total_time > 0 else 0,
+            'error_rate': failed / len(workload) if workload else 0
+        }
+    
+    def test_concurrent_search(self, queries: List[str], concurrent_users: int = 10,
+                               shard_counts: Optional[List[int]] = None) -> Dict[str, Any]:
+        """测试并发搜索
+        
+        shard_counts 不为空时，另用当前索引的全部文档分别构建这些分片数的分片索引，
+        以同样的并发度只测召回，结果中的 shard_scaling 给出各分片数的吞吐和相对1分片的加速比。
+        """
         def search_worker(query):
             start_time = time.time()
             try:
@@ -217,10 +247,63 @@ class LoadTester:
             except Exception as e:
                 return {'success': False, 'error': str(e), 'response_time_ms': 0}
         
+        result = self._run_concurrent(search_worker, queries, concurrent_users)
+        if shard_counts:
+            result['shard_scaling'] = self.test_shard_scaling(queries, shard_counts, concurrent_users)
+        return result
+    
+    def test_shard_scaling(self, queries: List[str], shard_counts: List[int],
+                           concurrent_users: int = 10) -> List[Dict[str, Any]]:
+        """对比不同分片数下的并发召回吞吐(分片数为1时用单个 InvertedIndex)"""
+        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+        from search_engine.index_tab.offline_index import InvertedIndex
+        from search_engine.index_tab.sharded_index import ShardedIndex
+        
+        documents = self.index_service.get_all_documents()
+        scaling = []
+        for num_shards in shard_counts:
+            if num_shards > 1:
+                index = ShardedIndex(num_shards)
+                index.add_documents(documents)
+            else:
+                index = InvertedIndex()
+                for doc_id, content in documents.items():
+                    index.add_document(doc_id, content)
+            
+            def retrieve_worker(query, index=index):
+                start_time = time.time()
+                try:
+                    results = index.retrieve(query, top_k=10)
+                    return {'success': True, 'response_time_ms': (time.time() - start_time) * 1000,
+                            'results_count': len(results)}
+                except Exception as e:
+                    return {'success': False, 'error': str(e), 'response_time_ms': 0}
+            
+            try:
+                result = self._run_concurrent(retrieve_worker, queries, concurrent_users)
+            finally:
+                if num_shards > 1:
+                    index.close()
+            scaling.append({
+                'shards': num_shards,
+                'queries_per_second': result['queries_per_second'],
+                'avg_response_time_ms': result['avg_response_time_ms'],
+                'error_rate': result['error_rate']
+            })
+        
+        baseline = scaling[0]['queries_per_second'] if scaling else 0
+        for row in scaling:
+            row['speedup'] = row['queries_per_second'] / baseline if baseline > 0 else 0
+        return scaling
+    
+    def _run_concurrent(self, worker, queries: List[str], concurrent_users: int) -> Dict[str, Any]:
+        """用线程池模拟并发用户(每个用户10次搜索)并汇总延迟和吞吐"""
+        import concurrent.futures
+        
         start_time = time.time()
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=concurrent_users) as executor:
-            futures = [executor.submit(search_worker, queries[i % len(queries)]) 
+            futures = [executor.submit(worker, queries[i % len(queries)]) 
                       for i in range(concurrent_users * 10)]  # 每个用户10次搜索
             results = [future.result() for future in concurrent.futures.as_completed(futures)]
         
@@ -280,15 +363,24 @@ def main():
         print(f"   查询吞吐量: {performance_result['queries_per_second']:.2f} QPS")
         print(f"   错误率: {performance_result['error_rate']:.2%}")
         
+        batch_result = load_tester.test_batch_search(test_queries, iterations=50)
+        speedup = (batch_result['queries_per_second'] / performance_result['queries_per_second']
+                   if performance_result['queries_per_second'] > 0 else 0)
+        print(f"   批量检索吞吐量: {batch_result['queries_per_second']:.2f} QPS (逐条的 {speedup:.1f} 倍)")
+        
         # 3. 运行并发测试
         print("\n3. 运行并发搜索测试...")
-        concurrent_result = load_tester.test_concurrent_search(test_queries, concurrent_users=5)
+        concurrent_result = load_tester.test_concurrent_search(test_queries, concurrent_users=5,
+                                                               shard_counts=[1, 2, 4])
         
         print(f"   并发用户数: {concurrent_result['concurrent_users']}")
         print(f"   总查询数: {concurrent_result['total_queries']}")
         print(f"   平均响应时间: {concurrent_result['avg_response_time_ms']:.2f}ms")
         print(f"   查询吞吐量: {concurrent_result['queries_per_second']:.2f} QPS")
         print(f"   错误率: {concurrent_result['error_rate']:.2%}")
+        for row in concurrent_result.get('shard_scaling', []):
+            print(f"   {row['shards']}个分片: {row['queries_per_second']:.2f} QPS, "
+                  f"平均 {row['avg_response_time_ms']:.2f}ms, 加速比 {row['speedup']:.2f}")
         
         # 4. 等待一段时间收集监控数据
         print("\n4. 收集监控数据...")
@@ -19,6 +19,7 @@ def reset_system():
     files_to_remove = [
         'models/ctr_model.pkl',           # CTR模型文件
         'index_data.json',         # 索引文件（可选）
+        'index_data.json.docs',    # 索引的压缩文档库
     ]
     
     # 要清理的文件模式
@@ -89,6 +90,7 @@ def backup_data():
         files_to_backup = [
             'models/ctr_model.pkl',
             'index_data.json',
+            'index_data.json.docs',
         ]
         
         patterns_to_backup = [
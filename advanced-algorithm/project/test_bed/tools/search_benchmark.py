@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检索性能基准测试
+在合成中文语料上对比穷举打分(TAAT)与动态剪枝(WAND / Block-Max WAND)的查询延迟，
+以及整批查询用稀疏矩阵一次打分(search_many)时均摊到每条查询的耗时
+"""
+
+import argparse
+import random
+import re
+import time
+import os
+import sys
+from typing import List, Dict, Any
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import jieba
+from search_engine.index_tab.offline_index import InvertedIndex
+
+CHINESE_WORD = re.compile(r'^[一-鿿]{2,4}$')
+
+
+def load_vocabulary(size: int) -> List[tuple]:
+    """从jieba词典中取高频中文词及其词频，作为合成语料的词表"""
+    jieba.initialize()
+    words = [(word, freq) for word, freq in jieba.dt.FREQ.items()
+             if freq > 0 and CHINESE_WORD.match(word)]
+    words.sort(key=lambda x: x[1], reverse=True)
+    return words[:size]
+
+
+def generate_corpus(num_docs: int, vocabulary: List[tuple], avg_length: int, seed: int = 42) -> Dict[str, str]:
+    """按词频(近似Zipf分布)采样生成合成中文文档，词之间用空格分隔"""
+    rng = random.Random(seed)
+    words = [word for word, _ in vocabulary]
+    weights = [freq for _, freq in vocabulary]
+    documents = {}
+    for i in range(num_docs):
+        length = max(5, int(rng.gauss(avg_length, avg_length / 3)))
+        documents[f"doc{i}"] = " ".join(rng.choices(words, weights=weights, k=length))
+    return documents
+
+
+def generate_queries(num_queries: int, vocabulary: List[tuple], min_terms: int, max_terms: int,
+                     seed: int = 7) -> List[str]:
+    """生成长OR查询：从中高频词中随机抽取多个词"""
+    rng = random.Random(seed)
+    candidates = [word for word, _ in vocabulary[20:2000]]
+    return [" ".join(rng.sample(candidates, rng.randint(min_terms, max_terms)))
+            for _ in range(num_queries)]
+
+
+def build_index(documents: Dict[str, str]) -> InvertedIndex:
+    """构建倒排索引"""
+    index = InvertedIndex()
+    for doc_id, content in documents.items():
+        index.add_document(doc_id, content)
+    index.refresh_scoring_tables()
+    return index
+
+
+def benchmark_strategies(index: InvertedIndex, queries: List[str], top_k: int, scorer: str,
+                         strategies: List[str]) -> Dict[str, Any]:
+    """对每种策略逐条执行查询，返回平均/P95延迟，并校验与穷举结果一致"""
+    # 预热：构建有序倒排链和得分上界缓存
+    for query in queries:
+        for strategy in strategies:
+            index.retrieve(query, top_k=top_k, strategy=strategy, scorer=scorer)
+
+    baseline = {query: index.retrieve(query, top_k=top_k, strategy="taat", scorer=scorer)
+                for query in queries}
+    report = {}
+    for strategy in strategies:
+        latencies = []
+        mismatches = 0
+        for query in queries:
+            start = time.perf_counter()
+            results = index.retrieve(query, top_k=top_k, strategy=strategy, scorer=scorer)
+            latencies.append((time.perf_counter() - start) * 1000)
+            expected = baseline[query]
+            if len(results) != len(expected) or any(
+                    abs(a[1] - b[1]) > 1e-9 for a, b in zip(results, expected)):
+                mismatches += 1
+        latencies.sort()
+        report[strategy] = {
+            'avg_ms': sum(latencies) / len(latencies),
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+            'mismatches': mismatches
+        }
+    return report
+
+
+def benchmark_batch(index: InvertedIndex, queries: List[str], top_k: int, scorer: str) -> Dict[str, Any]:
+    """整批调用 search_many，返回得分矩阵构建耗时、均摊到每条查询的延迟，并校验与穷举结果一致"""
+    start = time.perf_counter()
+    index.get_doc_term_matrix(scorer)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    batch_results = index.search_many(queries, top_k=top_k, scorer=scorer)
+    total_ms = (time.perf_counter() - start) * 1000
+    mismatches = 0
+    for query, results in zip(queries, batch_results):
+        expected = index.retrieve(query, top_k=top_k, strategy="taat", scorer=scorer)
+        if len(results) != len(expected) or any(abs(a[1] - b[1]) > 1e-9 for a, b in zip(results, expected)):
+            mismatches += 1
+    return {
+        'build_ms': build_ms,
+        'avg_ms': total_ms / len(queries) if queries else 0,
+        'mismatches': mismatches
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="检索剪枝基准测试")
+    parser.add_argument("--docs", type=int, default=20000, help="合成文档数量")
+    parser.add_argument("--avg-length", type=int, default=80, help="平均文档词数")
+    parser.add_argument("--vocab", type=int, default=20000, help="词表大小")
+    parser.add_argument("--queries", type=int, default=100, help="查询数量")
+    parser.add_argument("--min-terms", type=int, default=4, help="每个查询最少词数")
+    parser.add_argument("--max-terms", type=int, default=8, help="每个查询最多词数")
+    parser.add_argument("--top-k", type=int, default=20, help="返回结果数量")
+    parser.add_argument("--scorer", default="bm25", choices=["tfidf", "bm25", "bm25+"], help="打分器")
+    args = parser.parse_args()
+
+    print("⚡ 检索剪枝基准测试")
+    print("=" * 50)
+
+    vocabulary = load_vocabulary(args.vocab)
+    documents = generate_corpus(args.docs, vocabulary, args.avg_length)
+    queries = generate_queries(args.queries, vocabulary, args.min_terms, args.max_terms)
+
+    start = time.perf_counter()
+    index = build_index(documents)
+    stats = index.get_index_stats()
+    print(f"🔨 索引构建完成: {stats['total_documents']}个文档, {stats['total_terms']}个词项, "
+          f"耗时{time.perf_counter() - start:.1f}s")
+    print(f"💾 倒排链: {stats['total_postings']}个posting, {stats['posting_bytes'] / 1024 / 1024:.2f}MB, "
+          f"{stats['bytes_per_posting']:.2f}字节/posting")
+    print(f"🔍 查询: {len(queries)}条, 每条{args.min_terms}-{args.max_terms}个词, "
+          f"top_k={args.top_k}, 打分器={args.scorer}")
+
+    report = benchmark_strategies(index, queries, args.top_k, args.scorer, ["taat", "daat", "wand", "bmw"])
+    baseline_ms = report['taat']['avg_ms']
+    print(f"\n{'策略':<8}{'平均延迟(ms)':>14}{'P95(ms)':>10}{'加速比':>8}{'不一致':>8}")
+    for strategy, result in report.items():
+        speedup = baseline_ms / result['avg_ms'] if result['avg_ms'] > 0 else 0
+        print(f"{strategy:<8}{result['avg_ms']:>14.3f}{result['p95_ms']:>10.3f}"
+              f"{speedup:>8.2f}{result['mismatches']:>8}")
+
+    batch = benchmark_batch(index, queries, args.top_k, args.scorer)
+    speedup = baseline_ms / batch['avg_ms'] if batch['avg_ms'] > 0 else 0
+    print(f"{'batch':<8}{batch['avg_ms']:>14.3f}{'-':>10}{speedup:>8.2f}{batch['mismatches']:>8}"
+          f"  (得分矩阵构建 {batch['build_ms']:.0f}ms，只需一次)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+摘要生成基准测试
+对比原滑动窗口摘要(每个候选窗口重新分词，O(n²)次分词)与基于词元位置/字符区间的线性摘要，
+统计带摘要检索(search)的单次查询延迟
+"""
+
+import argparse
+import time
+import os
+import sys
+from typing import List, Dict, Callable
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_benchmark import load_vocabulary, generate_corpus, generate_queries, build_index
+
+
+def legacy_generate_summary(index: InvertedIndex, doc_id: str, query_words: List[str], max_length: int = 200) -> str:
+    """原实现：枚举最多50个词的所有窗口，每个窗口调用一次分词"""
+    content = index.documents[doc_id]
+    best_window = ""
+    best_score = 0
+    words = content.split()
+    for i in range(len(words)):
+        for j in range(i + 1, min(i + 50, len(words) + 1)):
+            window = " ".join(words[i:j])
+            window_words = index.preprocess_text(window)
+            score = sum(1 for word in query_words if word in window_words)
+            if score > best_score and len(window) <= max_length:
+                best_score = score
+                best_window = window
+    if not best_window:
+        best_window = content[:max_length]
+    return index.highlight_keywords(best_window, query_words)
+
+
+def benchmark_summaries(index: InvertedIndex, queries: List[str], top_k: int,
+                        summarize: Callable[[str, List[str]], str]) -> Dict[str, float]:
+    """召回top_k后逐条生成摘要，返回平均/P95查询延迟(ms)"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        query_words = index.preprocess_text(query)
+        for doc_id, _ in index.retrieve(query, top_k=top_k):
+            summarize(doc_id, query_words)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'avg_ms': sum(latencies) / len(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="摘要生成基准测试")
+    parser.add_argument("--docs", type=int, default=2000, help="合成文档数量")
+    parser.add_argument("--avg-length", type=int, default=80, help="平均文档词数")
+    parser.add_argument("--vocab", type=int, default=20000, help="词表大小")
+    parser.add_argument("--queries", type=int, default=20, help="查询数量")
+    parser.add_argument("--top-k", type=int, default=10, help="每个查询生成摘要的结果数")
+    args = parser.parse_args()
+
+    print("⚡ 摘要生成基准测试")
+    print("=" * 50)
+
+    vocabulary = load_vocabulary(args.vocab)
+    documents = generate_corpus(args.docs, vocabulary, args.avg_length)
+    queries = generate_queries(args.queries, vocabulary, 2, 4)
+    index = build_index(documents)
+    print(f"🔨 索引构建完成: {len(documents)}个文档, 查询{len(queries)}条, 每条生成{args.top_k}个摘要")
+
+    legacy = benchmark_summaries(index, queries, args.top_k,
+                                 lambda doc_id, words: legacy_generate_summary(index, doc_id, words))
+    linear = benchmark_summaries(index, queries, args.top_k, index.generate_summary)
+
+    print(f"\n{'实现':<12}{'平均延迟(ms)':>14}{'P95(ms)':>12}")
+    print(f"{'滑动窗口':<12}{legacy['avg_ms']:>14.2f}{legacy['p95_ms']:>12.2f}")
+    print(f"{'位置索引':<12}{linear['avg_ms']:>14.2f}{linear['p95_ms']:>12.2f}")
+    if linear['avg_ms'] > 0:
+        print(f"\n🚀 加速比: {legacy['avg_ms'] / linear['avg_ms']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()